@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Rapport de complétude de tous les QCM en base (CSV ou JSON)
+
+Pour chaque QCM: nombre de questions et de propositions, questions n'ayant pas
+5 propositions, questions sans réponse correcte et trous dans la numérotation.
+Les agrégats viennent de la vue `qcm_completeness`: une seule requête par exécution.
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+from qcm_extraction.report import fetch_completeness, is_complete, summarize, write_csv, write_json
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapport de complétude des QCM extraits")
+    parser.add_argument("qcm_ids", type=int, nargs="*", help="IDs des QCM à inclure (défaut: tous)")
+    parser.add_argument("--ue", help="Limiter à une UE (ex: UE2)")
+    parser.add_argument("--format", choices=["csv", "json"], default="csv", help="Format de sortie (défaut: csv)")
+    parser.add_argument("--output", "-o", help="Fichier de sortie (défaut: sortie standard)")
+    parser.add_argument("--incomplete", action="store_true", help="N'inclure que les QCM incomplets")
+    args = parser.parse_args()
+
+    load_dotenv()
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_KEY")
+    if not supabase_url or not supabase_key:
+        print("❌ Variables d'environnement SUPABASE_URL et SUPABASE_KEY requises", file=sys.stderr)
+        sys.exit(1)
+
+    supabase = create_client(supabase_url, supabase_key)
+    rows = fetch_completeness(supabase, qcm_ids=args.qcm_ids or None, ue=args.ue)
+    if args.incomplete:
+        rows = [row for row in rows if not is_complete(row)]
+
+    writer = write_json if args.format == "json" else write_csv
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            writer(rows, f)
+    else:
+        writer(rows, sys.stdout)
+
+    # Résumé sur la sortie d'erreur pour ne pas polluer le CSV/JSON
+    summary = summarize(rows)
+    print(f"📊 {summary['qcm']} QCM ({summary['qcm_complete']} complets), {summary['questions']} questions, "
+          f"{summary['propositions']} propositions, {summary['questions_not_5_propositions']} questions ≠ 5 propositions, "
+          f"{summary['questions_without_correct']} sans réponse correcte, {summary['missing_questions']} numéros manquants",
+          file=sys.stderr)
+    if args.output:
+        print(f"💾 Rapport écrit dans {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -76,13 +76,152 @@ CREATE TABLE IF NOT EXISTS tables (
     contenu_id UUID
 );
 
+-- Création de la table des empreintes de contenu (détection des doublons)
+-- signature: MinHash des énoncés normalisés, bands: bandes LSH indexées pour la recherche
+CREATE TABLE IF NOT EXISTS qcm_fingerprints (
+    qcm_id INTEGER PRIMARY KEY REFERENCES qcm(id) ON DELETE CASCADE,
+    signature BIGINT[] NOT NULL,
+    bands TEXT[] NOT NULL,
+    questions_count INTEGER,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Création de la table de l'état par page (réextraction incrémentale)
+-- content_hash: hash de la section "# Page N" du Markdown, question_numbers: questions touchées par la page
+CREATE TABLE IF NOT EXISTS qcm_pages (
+    qcm_id INTEGER REFERENCES qcm(id) ON DELETE CASCADE,
+    page_num INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    question_numbers INTEGER[] NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (qcm_id, page_num)
+);
+
+-- Création du cache de réutilisation des questions (propositions reprises d'un examen à l'autre)
+-- question_hash: sha256 du bloc normalisé de la question (énoncé + propositions du Markdown OCR)
+CREATE TABLE IF NOT EXISTS question_hashes (
+    question_hash TEXT PRIMARY KEY,
+    propositions JSONB NOT NULL,
+    correct_letters TEXT[] NOT NULL DEFAULT '{}',
+    source_question_id UUID REFERENCES questions(id) ON DELETE SET NULL,
+    source_qcm_id INTEGER REFERENCES qcm(id) ON DELETE SET NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Traçabilité des reprises: question importée depuis le cache et question d'origine
+CREATE TABLE IF NOT EXISTS question_reuse_log (
+    id SERIAL PRIMARY KEY,
+    qcm_id INTEGER REFERENCES qcm(id) ON DELETE CASCADE,
+    question_id UUID REFERENCES questions(id) ON DELETE CASCADE,
+    question_hash TEXT NOT NULL,
+    source_question_id UUID,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Date de dernière modification d'un QCM (questions et réponses comprises): filigrane des exports incrémentaux
+ALTER TABLE qcm ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+
+CREATE OR REPLACE FUNCTION touch_qcm() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Triggers par instruction avec tables de transition: une écriture groupée de questions ou de
+-- propositions met à jour chaque QCM concerné une seule fois, au lieu d'un UPDATE qcm par ligne
+-- (les transitions n'étant pas autorisées sur un trigger à plusieurs événements, un trigger par événement)
+CREATE OR REPLACE FUNCTION touch_qcm_rows() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'questions' THEN
+        IF TG_OP = 'INSERT' THEN
+            UPDATE qcm SET updated_at = NOW()
+            WHERE id IN (SELECT qcm_id FROM new_rows) AND updated_at IS DISTINCT FROM NOW();
+        ELSIF TG_OP = 'UPDATE' THEN
+            UPDATE qcm SET updated_at = NOW()
+            WHERE id IN (SELECT qcm_id FROM new_rows UNION SELECT qcm_id FROM old_rows) AND updated_at IS DISTINCT FROM NOW();
+        ELSE
+            UPDATE qcm SET updated_at = NOW()
+            WHERE id IN (SELECT qcm_id FROM old_rows) AND updated_at IS DISTINCT FROM NOW();
+        END IF;
+    ELSE
+        IF TG_OP = 'INSERT' THEN
+            UPDATE qcm SET updated_at = NOW()
+            WHERE id IN (SELECT q.qcm_id FROM questions q WHERE q.id IN (SELECT question_id FROM new_rows))
+              AND updated_at IS DISTINCT FROM NOW();
+        ELSIF TG_OP = 'UPDATE' THEN
+            UPDATE qcm SET updated_at = NOW()
+            WHERE id IN (SELECT q.qcm_id FROM questions q
+                         WHERE q.id IN (SELECT question_id FROM new_rows UNION SELECT question_id FROM old_rows))
+              AND updated_at IS DISTINCT FROM NOW();
+        ELSE
+            UPDATE qcm SET updated_at = NOW()
+            WHERE id IN (SELECT q.qcm_id FROM questions q WHERE q.id IN (SELECT question_id FROM old_rows))
+              AND updated_at IS DISTINCT FROM NOW();
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_qcm_touch ON qcm;
+CREATE TRIGGER trg_qcm_touch BEFORE UPDATE ON qcm
+    FOR EACH ROW WHEN (OLD.updated_at IS NOT DISTINCT FROM NEW.updated_at) EXECUTE FUNCTION touch_qcm();
+DROP TRIGGER IF EXISTS trg_questions_touch_qcm ON questions;
+DROP TRIGGER IF EXISTS trg_reponses_touch_qcm ON reponses;
+DROP TRIGGER IF EXISTS trg_questions_insert_touch_qcm ON questions;
+CREATE TRIGGER trg_questions_insert_touch_qcm AFTER INSERT ON questions
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION touch_qcm_rows();
+DROP TRIGGER IF EXISTS trg_questions_update_touch_qcm ON questions;
+CREATE TRIGGER trg_questions_update_touch_qcm AFTER UPDATE ON questions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION touch_qcm_rows();
+DROP TRIGGER IF EXISTS trg_questions_delete_touch_qcm ON questions;
+CREATE TRIGGER trg_questions_delete_touch_qcm AFTER DELETE ON questions
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION touch_qcm_rows();
+DROP TRIGGER IF EXISTS trg_reponses_insert_touch_qcm ON reponses;
+CREATE TRIGGER trg_reponses_insert_touch_qcm AFTER INSERT ON reponses
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION touch_qcm_rows();
+DROP TRIGGER IF EXISTS trg_reponses_update_touch_qcm ON reponses;
+CREATE TRIGGER trg_reponses_update_touch_qcm AFTER UPDATE ON reponses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION touch_qcm_rows();
+DROP TRIGGER IF EXISTS trg_reponses_delete_touch_qcm ON reponses;
+CREATE TRIGGER trg_reponses_delete_touch_qcm AFTER DELETE ON reponses
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION touch_qcm_rows();
+
+-- Texte d'un champ contenu: objet {"text": ...} ou chaîne JSON de cet objet (écrite via json.dumps côté client)
+CREATE OR REPLACE FUNCTION contenu_text(contenu JSONB) RETURNS TEXT AS $$
+BEGIN
+    IF jsonb_typeof(contenu) = 'object' THEN
+        RETURN contenu->>'text';
+    ELSIF jsonb_typeof(contenu) = 'string' THEN
+        BEGIN
+            RETURN (contenu #>> '{}')::jsonb ->> 'text';
+        EXCEPTION WHEN others THEN
+            RETURN contenu #>> '{}';
+        END;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Recherche plein texte (configuration française) sur les énoncés et les propositions
+ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('french', COALESCE(contenu_text(contenu), ''))) STORED;
+ALTER TABLE reponses ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('french', COALESCE(contenu_text(contenu), ''))) STORED;
+
 -- Index pour optimiser les performances
+CREATE INDEX IF NOT EXISTS idx_questions_search ON questions USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_reponses_search ON reponses USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_qcm_updated_at ON qcm(updated_at);
+CREATE INDEX IF NOT EXISTS idx_question_reuse_log_qcm ON question_reuse_log(qcm_id);
 CREATE INDEX IF NOT EXISTS idx_qcm_type_annee ON qcm(type, annee);
 CREATE INDEX IF NOT EXISTS idx_questions_qcm_id ON questions(qcm_id);
 CREATE INDEX IF NOT EXISTS idx_questions_numero ON questions(numero);
 CREATE INDEX IF NOT EXISTS idx_reponses_question_id ON reponses(question_id);
 CREATE INDEX IF NOT EXISTS idx_reponses_lettre ON reponses(lettre);
 CREATE INDEX IF NOT EXISTS idx_reponses_correcte ON reponses(est_correcte);
+CREATE INDEX IF NOT EXISTS idx_qcm_fingerprints_bands ON qcm_fingerprints USING GIN (bands);
 
 -- Contraintes additionnelles
 ALTER TABLE qcm ADD CONSTRAINT unique_qcm_type_annee_ue UNIQUE(type, annee, ue_id);
@@ -111,6 +250,8 @@ COMMENT ON TABLE qcm IS 'Table principale contenant les métadonnées des QCM m
 COMMENT ON TABLE questions IS 'Questions extraites des QCM avec contenu JSON';
 COMMENT ON TABLE reponses IS 'Propositions de réponses A, B, C, D, E pour chaque question';
 COMMENT ON TABLE corrections IS 'Corrections et explications associées aux réponses';
+COMMENT ON TABLE qcm_fingerprints IS 'Empreintes MinHash du contenu des QCM pour la détection des doublons';
+COMMENT ON TABLE qcm_pages IS 'Hash et questions de chaque page du Markdown OCR pour la réextraction incrémentale';
 
 -- Fonctions utilitaires
 CREATE OR REPLACE FUNCTION count_correct_answers(qcm_id_param INTEGER)
@@ -133,6 +274,97 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Fusion ensembliste de QCM dupliqués (appelée par fix_duplicate_qcms.py via RPC ou connexion directe)
+-- Pour chaque numéro, la question du QCM conservé l'emporte, sinon la première des doublons est rattachée.
+-- Les propositions des questions perdantes sont rattachées à la question gagnante; en cas de conflit
+-- (question_id, lettre), la proposition survivante garde son est_correcte (les désaccords sont comptés
+-- dans reponses_conflicts, jamais fusionnés), les corrections sont redirigées et la perdante supprimée. Les questions perdantes et les QCM vidés sont ensuite supprimés.
+-- Tout s'exécute dans la transaction de l'appel; avec dry_run, seul le rapport est calculé.
+CREATE OR REPLACE FUNCTION merge_duplicate_qcms(
+    keep_id INTEGER,
+    duplicate_ids INTEGER[],
+    dry_run BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE(action TEXT, affected INTEGER) AS $$
+BEGIN
+    DROP TABLE IF EXISTS _merge_questions;
+    CREATE TEMP TABLE _merge_questions ON COMMIT DROP AS
+    SELECT
+        q.id AS question_id,
+        q.qcm_id,
+        FIRST_VALUE(q.id) OVER (
+            PARTITION BY q.numero
+            ORDER BY (q.qcm_id = keep_id) DESC, array_position(duplicate_ids, q.qcm_id)
+        ) AS winner_id
+    FROM questions q
+    WHERE q.qcm_id = keep_id OR q.qcm_id = ANY(duplicate_ids);
+
+    DROP TABLE IF EXISTS _merge_reponses;
+    CREATE TEMP TABLE _merge_reponses ON COMMIT DROP AS
+    SELECT
+        r.id,
+        r.uuid,
+        r.est_correcte,
+        m.winner_id,
+        w.id IS NULL
+            AND ROW_NUMBER() OVER (
+                PARTITION BY m.winner_id, r.lettre ORDER BY array_position(duplicate_ids, m.qcm_id), r.id
+            ) = 1
+            AS is_moved,
+        COALESCE(w.id, FIRST_VALUE(r.id) OVER (
+            PARTITION BY m.winner_id, r.lettre ORDER BY array_position(duplicate_ids, m.qcm_id), r.id
+        )) AS survivor_id
+    FROM reponses r
+    JOIN _merge_questions m ON m.question_id = r.question_id AND m.question_id <> m.winner_id
+    LEFT JOIN reponses w ON w.question_id = m.winner_id AND w.lettre = r.lettre;
+
+    RETURN QUERY
+    SELECT 'questions_moved', COUNT(*)::INTEGER FROM _merge_questions
+        WHERE question_id = winner_id AND qcm_id <> keep_id
+    UNION ALL
+    SELECT 'questions_deleted', COUNT(*)::INTEGER FROM _merge_questions WHERE question_id <> winner_id
+    UNION ALL
+    SELECT 'reponses_moved', COUNT(*)::INTEGER FROM _merge_reponses WHERE is_moved
+    UNION ALL
+    SELECT 'reponses_merged', COUNT(*)::INTEGER FROM _merge_reponses WHERE NOT is_moved
+    UNION ALL
+    SELECT 'reponses_conflicts', COUNT(*)::INTEGER
+        FROM _merge_reponses mr JOIN reponses s ON s.id = mr.survivor_id
+        WHERE NOT mr.is_moved AND mr.est_correcte IS DISTINCT FROM s.est_correcte
+    UNION ALL
+    SELECT 'qcm_deleted', COUNT(*)::INTEGER FROM qcm WHERE id = ANY(duplicate_ids) AND id <> keep_id;
+
+    IF dry_run THEN
+        RETURN;
+    END IF;
+
+    -- Propositions en double: la survivante garde ses réponses, les corrections lui sont redirigées
+    UPDATE corrections c SET reponse_uuid = s.uuid
+    FROM _merge_reponses mr JOIN reponses s ON s.id = mr.survivor_id
+    WHERE c.reponse_uuid = mr.uuid AND NOT mr.is_moved;
+
+    DELETE FROM reponses r USING _merge_reponses mr WHERE r.id = mr.id AND NOT mr.is_moved;
+
+    -- Propositions sans équivalent: rattachement à la question gagnante
+    UPDATE reponses r SET question_id = mr.winner_id
+    FROM _merge_reponses mr WHERE r.id = mr.id AND mr.is_moved;
+
+    -- Questions: rattachement des gagnantes, redirection des images puis suppression des perdantes
+    UPDATE questions q SET qcm_id = keep_id
+    FROM _merge_questions m
+    WHERE q.id = m.question_id AND m.question_id = m.winner_id AND m.qcm_id <> keep_id;
+
+    UPDATE images i SET contenu_id = m.winner_id
+    FROM _merge_questions m
+    WHERE i.contenu_id = m.question_id AND m.question_id <> m.winner_id;
+
+    DELETE FROM questions q USING _merge_questions m
+    WHERE q.id = m.question_id AND m.question_id <> m.winner_id;
+
+    DELETE FROM qcm WHERE id = ANY(duplicate_ids) AND id <> keep_id;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Vue pour avoir un aperçu rapide des QCM
 CREATE OR REPLACE VIEW qcm_summary AS
 SELECT 
@@ -152,4 +384,89 @@ LEFT JOIN ue ON q.ue_id = ue.id
 LEFT JOIN questions quest ON q.id = quest.qcm_id
 LEFT JOIN reponses r ON quest.id = r.question_id
 GROUP BY q.id, q.type, q.annee, ue.numero
-ORDER BY q.id; 
\ No newline at end of file
+ORDER BY q.id; 
+-- Vue de synthèse par question (nombre de propositions et de réponses correctes)
+CREATE OR REPLACE VIEW question_rollup AS
+SELECT 
+    quest.id as question_id,
+    quest.qcm_id,
+    quest.numero,
+    COUNT(r.id) as propositions_count,
+    COUNT(r.id) FILTER (WHERE r.est_correcte = true) as correct_count
+FROM questions quest
+LEFT JOIN reponses r ON quest.id = r.question_id
+GROUP BY quest.id, quest.qcm_id, quest.numero;
+
+-- Vue de complétude par QCM (completeness_report.py): tout le corpus en une requête
+CREATE OR REPLACE VIEW qcm_completeness AS
+WITH per_qcm AS (
+    SELECT 
+        q.id as qcm_id,
+        q.type,
+        q.annee,
+        ue.numero as ue_numero,
+        COUNT(qr.question_id) as questions_count,
+        COALESCE(SUM(qr.propositions_count), 0) as propositions_count,
+        COALESCE(SUM(qr.correct_count), 0) as correct_answers_count,
+        COALESCE(ARRAY_AGG(qr.numero ORDER BY qr.numero) FILTER (WHERE qr.propositions_count <> 5), '{}') as numeros_not_5_propositions,
+        COALESCE(ARRAY_AGG(qr.numero ORDER BY qr.numero) FILTER (WHERE qr.correct_count = 0), '{}') as numeros_without_correct,
+        ARRAY_AGG(qr.numero) FILTER (WHERE qr.numero IS NOT NULL) as numeros,
+        MIN(qr.numero) as min_numero,
+        MAX(qr.numero) as max_numero
+    FROM qcm q
+    LEFT JOIN ue ON q.ue_id = ue.id
+    LEFT JOIN question_rollup qr ON q.id = qr.qcm_id
+    GROUP BY q.id, q.type, q.annee, ue.numero
+)
+SELECT 
+    qcm_id,
+    type,
+    annee,
+    ue_numero,
+    questions_count,
+    propositions_count,
+    correct_answers_count,
+    CARDINALITY(numeros_not_5_propositions) as questions_not_5_propositions,
+    numeros_not_5_propositions,
+    CARDINALITY(numeros_without_correct) as questions_without_correct,
+    numeros_without_correct,
+    ARRAY(
+        SELECT s FROM generate_series(min_numero, max_numero) s
+        WHERE s <> ALL(numeros)
+        ORDER BY s
+    ) as missing_numeros
+FROM per_qcm
+ORDER BY qcm_id;
+
+-- Recherche classée des questions (search.py): énoncé, plus la meilleure proposition à demi-poids
+CREATE OR REPLACE FUNCTION search_questions(query TEXT, ue_filter TEXT DEFAULT NULL, annee_filter TEXT DEFAULT NULL,
+                                            max_results INTEGER DEFAULT 20)
+RETURNS TABLE (question_id UUID, qcm_id INTEGER, numero INTEGER, ue_numero TEXT, annee TEXT, type TEXT,
+               texte TEXT, rank REAL) AS $$
+    WITH tsq AS (
+        SELECT websearch_to_tsquery('french', query) AS q
+    ),
+    hits AS (
+        SELECT h.id, SUM(h.rank) AS rank
+        FROM (
+            SELECT quest.id, ts_rank(quest.search_vector, tsq.q) AS rank
+            FROM questions quest, tsq
+            WHERE quest.search_vector @@ tsq.q
+            UNION ALL
+            SELECT r.question_id, MAX(ts_rank(r.search_vector, tsq.q)) * 0.5
+            FROM reponses r, tsq
+            WHERE r.search_vector @@ tsq.q
+            GROUP BY r.question_id
+        ) h
+        GROUP BY h.id
+    )
+    SELECT quest.id, quest.qcm_id, quest.numero, ue.numero, q.annee, q.type, contenu_text(quest.contenu), hits.rank::REAL
+    FROM hits
+    JOIN questions quest ON quest.id = hits.id
+    JOIN qcm q ON q.id = quest.qcm_id
+    LEFT JOIN ue ON ue.id = q.ue_id
+    WHERE (ue_filter IS NULL OR ue.numero = ue_filter)
+      AND (annee_filter IS NULL OR q.annee = annee_filter)
+    ORDER BY hits.rank DESC, quest.qcm_id, quest.numero
+    LIMIT max_results;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Export du corpus de QCM en instantanés compacts (JSONL ou Parquet)
+
+Lit tout le corpus (ou une UE / une année) par pages de QCM avec questions et
+propositions imbriquées, dans un ordre stable, et l'écrit dans
+exports/<horodatage>/ avec un manifeste. --incremental n'exporte que les QCM
+modifiés depuis le dernier export de la même sélection (filigrane).
+
+Exemples:
+  python export_corpus.py                                 # tout le corpus, JSONL gzip
+  python export_corpus.py --format parquet --ue UE2
+  python export_corpus.py --annee "2021 / 2022" --incremental
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from qcm_extraction.clients import create_supabase_client
+from qcm_extraction.export import export_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export du corpus de QCM (JSONL par QCM ou Parquet par table)")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl", help="Format (défaut: jsonl)")
+    parser.add_argument("--output", default="exports", help="Dossier des instantanés (défaut: exports)")
+    parser.add_argument("--ue", help="Limiter à une UE (ex: UE2)")
+    parser.add_argument("--annee", help="Limiter à une année (ex: \"2021 / 2022\")")
+    parser.add_argument("--since", help="Exporter les QCM modifiés après cette date (filigrane explicite)")
+    parser.add_argument("--incremental", action="store_true", help="Reprendre depuis le filigrane du dernier export")
+    parser.add_argument("--no-compress", action="store_true", help="JSONL non compressé")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not os.getenv("SUPABASE_URL") or not os.getenv("SUPABASE_KEY"):
+        print("❌ Variables d'environnement SUPABASE_URL et SUPABASE_KEY requises", file=sys.stderr)
+        sys.exit(1)
+
+    supabase = create_supabase_client()
+    try:
+        manifest = export_snapshot(supabase, args.output, fmt=args.format, ue=args.ue, annee=args.annee,
+                                   since=args.since, incremental=args.incremental, compress=not args.no_compress)
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+    counts = manifest["counts"]
+    since = f" depuis {manifest['since']}" if manifest["since"] else ""
+    print(f"📦 {counts['qcm']} QCM, {counts['questions']} questions, {counts['reponses']} propositions{since} "
+          f"en {manifest['duration_seconds']}s")
+    print(f"💾 Instantané: {manifest['path']} ({', '.join(manifest['files'])})")
+    if args.incremental:
+        print(f"🔖 Filigrane suivant: {manifest['watermark']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Extraction d'un lot de PDF en pipeline
+
+Les étapes (téléchargement, OCR, métadonnées, questions, propositions,
+réponses, enregistrement) ont chacune leurs threads et une file bornée: les
+étapes réseau d'un document se recouvrent avec les étapes LLM du précédent.
+Les statistiques par étape (file, workers occupés, utilisation) sont
+affichées périodiquement et indiquent l'étape goulot d'étranglement.
+
+Exemples:
+  python extract_batch.py https://.../qcm1.pdf https://.../qcm2.pdf
+  python extract_batch.py --file urls.txt --stage-concurrency ocr=6 --stage-concurrency propositions=4
+  python extract_batch.py --file urls.txt --report 30
+  python extract_batch.py --file urls.txt --max-calls 40 --max-seconds 600
+  python extract_batch.py --file urls.txt --hedge
+  python extract_batch.py --file urls.txt --deadline 600
+"""
+
+import argparse
+import time
+
+from dotenv import load_dotenv
+
+from qcm_extraction.budget import DEFAULT_MAX_CALLS, DEFAULT_MAX_SECONDS, DEFAULT_MAX_TOKENS
+from qcm_extraction.deadline import DEFAULT_DEADLINE_SECONDS
+from qcm_extraction.pipeline import DEFAULT_QUEUE_SIZE, DEFAULT_STAGE_CONCURRENCY, extraction_pipeline, format_stats
+from qcm_extraction.retry import retry_metrics
+
+
+def parse_concurrency(values):
+    limits = {}
+    for value in values or []:
+        stage, _, count = value.partition("=")
+        if stage not in DEFAULT_STAGE_CONCURRENCY or not count.isdigit():
+            raise argparse.ArgumentTypeError(f"étape=nombre attendu, étapes: {', '.join(DEFAULT_STAGE_CONCURRENCY)}")
+        limits[stage] = int(count)
+    return limits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction d'un lot de PDF en pipeline d'étapes")
+    parser.add_argument("urls", nargs="*", help="URL (ou chemins locaux) des PDF")
+    parser.add_argument("--file", help="Fichier texte d'URL (une par ligne)")
+    parser.add_argument("--force", action="store_true", help="Réextraire même les QCM déjà importés")
+    parser.add_argument("--figures", action="store_true", help="Extraire les figures des questions depuis la réponse OCR")
+    parser.add_argument("--stage-concurrency", action="append", metavar="ÉTAPE=N",
+                        help="Concurrence d'une étape (répétable), ex.: ocr=6")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"Documents en attente par étape (défaut: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--report", type=float, default=60, help="Intervalle d'affichage des statistiques en secondes")
+    parser.add_argument("--max-calls", type=int, default=DEFAULT_MAX_CALLS,
+                        help=f"Appels API maximum par document (défaut: {DEFAULT_MAX_CALLS})")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS,
+                        help=f"Tokens maximum par document (défaut: {DEFAULT_MAX_TOKENS})")
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS,
+                        help=f"Temps d'extraction maximum par document en secondes (défaut: {DEFAULT_MAX_SECONDS:.0f})")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE_SECONDS,
+                        help="Échéance de bout en bout par document en secondes, attente dans les files comprise; "
+                             f"0 pour aucune (défaut: {DEFAULT_DEADLINE_SECONDS:.0f})")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Doubler les appels LLM déterministes plus lents que le p95 récent (au plus 5%% d'appels en plus)")
+    args = parser.parse_args()
+
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if not urls:
+        parser.error("aucune URL fournie")
+    try:
+        concurrency = parse_concurrency(args.stage_concurrency)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    load_dotenv()
+    from qcm_extraction.extractor import QCMExtractor
+
+    budget_limits = {"max_calls": args.max_calls, "max_tokens": args.max_tokens, "max_seconds": args.max_seconds,
+                     "deadline_seconds": args.deadline}
+    pipeline = extraction_pipeline(lambda: QCMExtractor(extract_figures=args.figures, budget_limits=budget_limits,
+                                                        hedge_requests=args.hedge),
+                                   concurrency, queue_size=args.queue_size)
+    # L'état d'un document ne dépend pas de l'extracteur: n'importe quel thread peut prendre l'étape suivante
+    runs = [QCMExtractor.new_document_run(url, args.force) for url in urls]
+
+    print(f"🚀 {len(runs)} PDF en pipeline")
+    started = time.time()
+    pipeline.run(runs, report_interval=args.report,
+                 on_report=lambda stats: print("📊 Étapes:\n" + format_stats(stats)))
+    elapsed = time.time() - started
+
+    succeeded = [run for run in runs if run["result"]]
+    print("📊 Étapes:\n" + format_stats(pipeline.stats()))
+    print(f"🐢 Étape goulot: {pipeline.bottleneck()}")
+    for endpoint, metrics in sorted(retry_metrics().items()):
+        errors = ", ".join(f"{category}={count}" for category, count in sorted(metrics.get("errors", {}).items()))
+        breaker = metrics.get("breaker", {})
+        print(f"🔁 {endpoint}: {metrics.get('successes', 0)}/{metrics.get('calls', 0)} appels réussis, "
+              f"{metrics.get('retries', 0)} retries ({metrics.get('waited_seconds', 0)}s d'attente), "
+              f"{metrics.get('short_circuited', 0)} court-circuités, disjoncteur {breaker.get('state', 'closed')}"
+              + (f" [{errors}]" if errors else ""))
+        hedging = metrics.get("hedging")
+        if hedging and hedging["hedged"]:
+            print(f"⏱️ {endpoint}: {hedging['hedged']} doublon(s) sur {hedging['calls']} appels, "
+                  f"{hedging['hedge_wins']} plus rapide(s) que l'appel initial")
+    print(f"✅ {len(succeeded)}/{len(runs)} PDF extraits en {elapsed:.0f}s")
+    for run in runs:
+        if not run["result"]:
+            print(f"❌ {run['url']}: {run['error'] or 'extraction échouée'}")
+        elif run["result"].get("partial"):
+            budget = run["result"]["api_budget"]
+            print(f"💸 {run['url']}: extraction partielle, budget épuisé ({budget['exhausted']}, "
+                  f"{budget['calls']} appels, {budget['tokens']} tokens, {budget['refused']} refusé(s))")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,8 +12,6 @@ from pathlib import Path
 # Ajouter le chemin du module
 sys.path.append(str(Path(__file__).parent / "qcm_extraction"))
 
-from extractor import QCMExtractor
-
 def print_banner():
     """Affiche la bannière du système"""
     print("🏥 QCM MEDICAL EXTRACTION SYSTEM")
@@ -22,13 +20,14 @@ def print_banner():
     print("Support: UE1-UE7, tous formats QCM médicaux")
     print()
 
-def extract_qcm(pdf_url, verbose=False):
+def extract_qcm(pdf_url, verbose=False, figures=False):
     """
     Extrait un QCM depuis une URL PDF
     
     Args:
         pdf_url (str): URL du PDF à traiter
         verbose (bool): Affichage détaillé
+        figures (bool): Récupérer les figures des questions dans la réponse OCR
         
     Returns:
         dict: Métadonnées d'extraction
@@ -39,10 +38,11 @@ def extract_qcm(pdf_url, verbose=False):
         print(f"🔗 URL: {pdf_url}")
         print()
 
-    # Initialisation
+    # Initialisation (import différé: --help et --version n'importent pas l'extracteur)
     print("🔧 Initialisation de l'extracteur...")
     try:
-        extractor = QCMExtractor()
+        from extractor import QCMExtractor
+        extractor = QCMExtractor(extract_figures=figures)
         if verbose:
             print("✅ Extracteur initialisé")
     except Exception as e:
@@ -65,6 +65,10 @@ def extract_qcm(pdf_url, verbose=False):
         
         execution_time = time.time() - start_time
         
+        if metadata and metadata.get('existing'):
+            print(f"\nℹ️ QCM déjà importé (contenu identique, ID: {metadata.get('qcm_db_id')}) - extraction ignorée")
+            return metadata
+        
         # Affichage des résultats
         print("\n🎉 EXTRACTION TERMINÉE AVEC SUCCÈS!")
         print("=" * 40)
@@ -143,6 +147,12 @@ Exemples d'utilisation:
         help='Affichage détaillé du processus'
     )
     
+    parser.add_argument(
+        '--figures',
+        action='store_true',
+        help='Extraire les figures des questions (images OCR rattachées aux questions)'
+    )
+    
     parser.add_argument(
         '--version',
         action='version',
@@ -160,7 +170,7 @@ Exemples d'utilisation:
     print_banner()
     
     # Extraction
-    result = extract_qcm(args.pdf_url, args.verbose)
+    result = extract_qcm(args.pdf_url, args.verbose, args.figures)
     
     if result:
         print(f"\n📊 QCM sauvegardé avec l'ID: {result.get('qcm_db_id', 'N/A')}")
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Mode worker: extraction continue depuis une file de jobs persistante (SQLite)
+
+Les URL de PDF sont mises en file avec une priorité; un ou plusieurs processus
+workers les prennent en bail, les extraient et les retentent avec backoff en
+cas d'échec. Après épuisement des tentatives, le job passe en lettre morte avec
+son traceback et le chemin du Markdown OCR pour inspection. La file survit aux
+redémarrages: un bail expiré rend le job à nouveau disponible.
+
+Exemples:
+  python extract_worker.py enqueue https://.../qcm1.pdf https://.../qcm2.pdf --priority 5
+  python extract_worker.py enqueue --file urls.txt
+  python extract_worker.py work --processes 4
+  python extract_worker.py status
+  python extract_worker.py dead
+  python extract_worker.py retry 42
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from qcm_extraction.jobs import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, DEFAULT_QUEUE_PATH, JobQueue
+
+
+def _heartbeat(queue_path, job_id, worker, lease_seconds, done: threading.Event):
+    """Prolonge le bail du job tant que l'extraction est en cours (connexion SQLite propre au thread)."""
+    queue = JobQueue(queue_path)
+    try:
+        while not done.wait(lease_seconds / 3):
+            if not queue.heartbeat(job_id, worker, lease_seconds):
+                print(f"⚠️ Bail perdu pour le job {job_id}")
+                return
+    finally:
+        queue.close()
+
+
+def process_job(queue: JobQueue, extractor, job, worker: str, lease_seconds: float):
+    """Extrait le PDF d'un job et enregistre le résultat, l'échec ou la lettre morte."""
+    print(f"▶️ [{worker}] Job {job['id']} (tentative {job['attempts']}/{job['max_attempts']}): {job['url']}")
+    done = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(queue.path, job["id"], worker, lease_seconds, done), daemon=True)
+    heartbeat.start()
+    error = None
+    metadata = None
+    try:
+        run = extractor.run_document(job["url"])
+        metadata = run["result"]
+        if run["error"]:
+            # Étape en échec après les métadonnées (questions, propositions...): QCM incomplet, à retenter
+            error = run.get("traceback") or run["error"]
+        elif not metadata:
+            error = "Extraction échouée (téléchargement, OCR ou métadonnées)"
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        done.set()
+        heartbeat.join()
+
+    if error is None:
+        result = {key: value for key, value in metadata.items() if key != "document"}
+        result["partial"] = bool(metadata.get("partial"))
+        queue.complete(job["id"], worker, result)
+        if result["partial"]:
+            print(f"💸 [{worker}] Job {job['id']} terminé avec une extraction partielle (QCM ID: {metadata.get('qcm_db_id')})")
+        else:
+            print(f"✅ [{worker}] Job {job['id']} terminé (QCM ID: {metadata.get('qcm_db_id')})")
+        return
+
+    # Artefacts conservés pour l'inspection des lettres mortes
+    markdown_path = extractor.outputs_dir / Path(job["url"]).stem / "content.md"
+    artifacts = {
+        "traceback": error,
+        "markdown_path": str(markdown_path) if markdown_path.exists() else None,
+        "metadata": {key: value for key, value in (metadata or {}).items() if key != "document"},
+    }
+    status = queue.fail(job["id"], worker, error.strip().splitlines()[-1], artifacts)
+    if status == "dead":
+        print(f"💀 [{worker}] Job {job['id']} en lettre morte après {job['attempts']} tentatives: {job['url']}")
+    elif status == "pending":
+        print(f"🔁 [{worker}] Job {job['id']} replanifié: {error.strip().splitlines()[-1]}")
+
+
+def run_worker(queue_path, lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_interval: float = 10,
+               once: bool = False):
+    """Boucle d'un worker: prend les jobs en bail jusqu'à l'arrêt (SIGINT/SIGTERM) ou file vide avec once=True."""
+    load_dotenv()
+    from qcm_extraction.extractor import QCMExtractor
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"⏹️ [{worker}] Arrêt demandé, fin du job en cours...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    queue = JobQueue(queue_path)
+    extractor = QCMExtractor()  # un seul client Mistral/Supabase par worker
+    print(f"👷 Worker {worker} démarré sur {queue_path}")
+    try:
+        while not stop.is_set():
+            job = queue.lease(worker, lease_seconds)
+            if job is None:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+            process_job(queue, extractor, job, worker, lease_seconds)
+    finally:
+        queue.close()
+    print(f"👋 Worker {worker} arrêté")
+
+
+def print_jobs(jobs):
+    for job in jobs:
+        error = f" - {job['last_error']}" if job.get("last_error") else ""
+        print(f"  #{job['id']:<5} [{job['status']:<7}] prio={job['priority']:<3} tentatives={job['attempts']}/{job['max_attempts']} {job['url']}{error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="File de jobs d'extraction et workers")
+    parser.add_argument("--queue", default=str(DEFAULT_QUEUE_PATH), help=f"Base SQLite de la file (défaut: {DEFAULT_QUEUE_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Ajouter des URL de PDF à la file")
+    enqueue_parser.add_argument("urls", nargs="*", help="URL des PDF")
+    enqueue_parser.add_argument("--file", help="Fichier texte d'URL (une par ligne)")
+    enqueue_parser.add_argument("--priority", type=int, default=0, help="Priorité (plus haut = traité en premier)")
+    enqueue_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Tentatives avant lettre morte")
+    enqueue_parser.add_argument("--force", action="store_true", help="Remettre en file les URL déjà traitées")
+
+    work_parser = subparsers.add_parser("work", help="Lancer des workers")
+    work_parser.add_argument("--processes", type=int, default=1, help="Nombre de processus workers (défaut: 1)")
+    work_parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="Durée du bail en secondes")
+    work_parser.add_argument("--poll", type=float, default=10, help="Attente quand la file est vide (secondes)")
+    work_parser.add_argument("--once", action="store_true", help="S'arrêter quand la file est vide")
+
+    subparsers.add_parser("status", help="Nombre de jobs par statut")
+    list_parser = subparsers.add_parser("list", help="Lister les jobs")
+    list_parser.add_argument("--status", choices=["pending", "leased", "done", "dead"])
+    list_parser.add_argument("--limit", type=int, default=100)
+    subparsers.add_parser("dead", help="Lister les lettres mortes avec leurs artefacts")
+    retry_parser = subparsers.add_parser("retry", help="Remettre en file des jobs en lettre morte")
+    retry_parser.add_argument("job_ids", type=int, nargs="+")
+
+    args = parser.parse_args()
+
+    if args.command == "work":
+        if args.processes <= 1:
+            run_worker(args.queue, args.lease, args.poll, args.once)
+            return
+        processes = [
+            multiprocessing.Process(target=run_worker, args=(args.queue, args.lease, args.poll, args.once))
+            for _ in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            # Les workers reçoivent aussi SIGINT et terminent leur job en cours
+            for process in processes:
+                process.join()
+        return
+
+    queue = JobQueue(args.queue)
+    if args.command == "enqueue":
+        urls = list(args.urls)
+        if args.file:
+            with open(args.file, "r", encoding="utf-8") as f:
+                urls.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+        if not urls:
+            parser.error("aucune URL fournie")
+        for url in urls:
+            if not url.startswith(("http://", "https://")):
+                print(f"❌ URL invalide ignorée: {url}")
+                continue
+            job = queue.enqueue(url, priority=args.priority, max_attempts=args.max_attempts, force=args.force)
+            print(f"📥 Job {job['id']} [{job['status']}] {url}")
+    elif args.command == "status":
+        stats = queue.stats()
+        print("📊 " + ", ".join(f"{status}: {count}" for status, count in stats.items()))
+    elif args.command == "list":
+        print_jobs(queue.list_jobs(args.status, args.limit))
+    elif args.command == "dead":
+        for job in queue.list_jobs("dead"):
+            print_jobs([job])
+            artifacts = job.get("artifacts") or {}
+            if artifacts.get("markdown_path"):
+                print(f"         📄 Markdown: {artifacts['markdown_path']}")
+            if artifacts.get("traceback"):
+                print("         " + artifacts["traceback"].strip().replace("\n", "\n         "))
+    elif args.command == "retry":
+        for job_id in args.job_ids:
+            if queue.retry(job_id):
+                print(f"🔁 Job {job_id} remis en file")
+            else:
+                print(f"⚠️ Job {job_id} introuvable ou pas en lettre morte", file=sys.stderr)
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
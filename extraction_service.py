@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Service HTTP local d'extraction avec extracteurs chauds
+
+Démarre un serveur asyncio exposant la soumission d'extractions, le suivi des
+jobs et les statistiques d'un QCM, au-dessus d'un pool de `QCMExtractor`
+construit une fois: les outils internes déclenchent une extraction par une
+simple requête HTTP au lieu de lancer un processus par URL.
+
+Exemples:
+  python extraction_service.py --pool 4
+  curl -X POST localhost:8765/extractions -d '{"url": "https://.../qcm.pdf"}'
+  curl localhost:8765/extractions/1
+  curl localhost:8765/qcm/42/stats
+"""
+
+import argparse
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from qcm_extraction.service import (
+    DEFAULT_HOST, DEFAULT_MAX_PENDING, DEFAULT_POOL_SIZE, DEFAULT_PORT, ExtractionService, create_app
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP local d'extraction de QCM")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Adresse d'écoute (défaut: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (défaut: {DEFAULT_PORT})")
+    parser.add_argument("--pool", type=int, default=DEFAULT_POOL_SIZE,
+                        help=f"Extracteurs chauds = extractions simultanées (défaut: {DEFAULT_POOL_SIZE})")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                        help=f"Jobs en file ou en cours au-delà desquels les demandes sont refusées (défaut: {DEFAULT_MAX_PENDING})")
+    args = parser.parse_args()
+
+    load_dotenv()
+    from qcm_extraction.extractor import QCMExtractor
+
+    service = ExtractionService(QCMExtractor, pool_size=args.pool, max_pending=args.max_pending)
+    print(f"🌐 Service d'extraction sur http://{args.host}:{args.port}")
+    web.run_app(create_app(service), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent / "qcm_extraction"))
 
 from extractor import QCMExtractor
+from qcm_extraction.retry import APICallError
 
 class PerfectQCMExtractor(QCMExtractor):
     """Extracteur parfait et scalable pour QCM médicaux"""
@@ -26,15 +27,15 @@ class PerfectQCMExtractor(QCMExtractor):
             # Utiliser l'OCR Mistral standard SANS modifications
             document_input = {"type": "document_url", "document_url": original_url}
             
-            ocr_response = self._call_api_with_retry(
-                self.client.ocr.process,
-                model="mistral-ocr-latest",
-                document=document_input,
-                include_image_base64=False
-            )
-            
-            if ocr_response is None:
-                print("❌ Échec de l'appel API OCR")
+            try:
+                ocr_response = self._call_api_with_retry(
+                    self.client.ocr.process,
+                    model="mistral-ocr-latest",
+                    document=document_input,
+                    include_image_base64=False
+                )
+            except APICallError as e:
+                print(f"❌ Échec de l'appel API OCR ({e.category}): {str(e)}")
                 return None
             
             # Extraire le texte de TOUTES les pages SANS filtrage
@@ -199,14 +200,17 @@ Sois PARFAIT et EXHAUSTIF."""
                 max_tokens=4000
             )
 
-            if response and response.choices:
+            if response.choices:
                 extracted_text = response.choices[0].message.content
                 print(f"✅ API Chat: {len(extracted_text)} caractères extraits pour page {page_num}")
                 return extracted_text
             else:
-                print(f"⚠️ Échec API Chat pour page {page_num}")
+                print(f"⚠️ Réponse API Chat vide pour page {page_num}")
                 return ""
 
+        except APICallError as e:
+            print(f"⚠️ Échec API Chat pour page {page_num} ({e.category}): {str(e)}")
+            return ""
         except Exception as e:
             print(f"⚠️ Erreur API Chat page {page_num}: {str(e)}")
             return ""
@@ -1,134 +1,104 @@
 #!/usr/bin/env python3
 """
 Script de correction et intégration des réponses correctes - Version 2
-Objectif: Correction robuste même quand qcm_db_id n'est pas dans metadata.json
+Objectif: Retraitement en masse des réponses correctes depuis le Markdown archivé
+
+Chaque QCM est résolu vers son Markdown par l'index `qcm_extraction/temp/outputs/index.json`
+(reconstruit depuis les metadata.json avec --rebuild-index). Le parsing tourne dans un
+pool de processus et les résultats sont écrits par mises à jour groupées: une amélioration
+des regex de `parse_correct_answers` se déploie sur toute la base en quelques minutes.
 """
 
+import argparse
 import os
-import sys
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
-# Ajouter le chemin du module
-sys.path.append(str(Path(__file__).parent / "qcm_extraction"))
+from qcm_extraction.answers import (
+    diff_correct_answers, fetch_reponses, parse_correct_answers, write_correct_answers, IN_FILTER_BATCH_SIZE
+)
+from qcm_extraction.document import Document
+from qcm_extraction.extractor import QCMExtractor
+from qcm_extraction.markdown_index import DEFAULT_INDEX_PATH, load_index, rebuild_index
+from qcm_extraction.report import fetch_completeness, fetch_pages
 
-from extractor import QCMExtractor
+def load_questions(supabase, qcm_ids: List[int]) -> Dict[str, Tuple[int, int]]:
+    """Récupère {question_id: (qcm_id, numero)} pour tous les QCM, par lots"""
+    questions = {}
+    for start in range(0, len(qcm_ids), IN_FILTER_BATCH_SIZE):
+        batch = qcm_ids[start:start + IN_FILTER_BATCH_SIZE]
+        # Un lot de QCM dépasse la limite de lignes de PostgREST: lecture paginée
+        rows = fetch_pages(lambda: supabase.table('questions').select('id, qcm_id, numero').in_('qcm_id', batch).order('id'))
+        for q in rows:
+            questions[q['id']] = (q['qcm_id'], q['numero'])
+    return questions
 
-def find_markdown_for_qcm_enhanced(qcm_id):
-    """Trouve le fichier Markdown avec méthode améliorée et multiple critères"""
-    print(f"🔍 Recherche avancée du Markdown pour QCM ID {qcm_id}...")
-    
+def _parse_qcm(job: Tuple[int, str, List[int]]) -> Tuple[int, Optional[Dict[int, List[str]]], Optional[str]]:
+    """Tâche du pool: lit le Markdown d'un QCM et en extrait les réponses (sans accès réseau)"""
+    qcm_id, markdown_path, known_questions = job
     try:
-        extractor = QCMExtractor()
-        
-        # 1. D'abord, récupérer les infos du QCM depuis la base
-        qcm_info = extractor.supabase.table('qcm').select('type, annee, ue_id').eq('id', qcm_id).execute()
-        
-        if not qcm_info.data:
-            print(f"❌ QCM ID {qcm_id} non trouvé en base")
-            return None
-        
-        qcm_data = qcm_info.data[0]
-        qcm_type = qcm_data['type']
-        qcm_annee = qcm_data['annee']
-        ue_id = qcm_data['ue_id']
-        
-        # Récupérer l'UE
-        ue_info = extractor.supabase.table('ue').select('numero').eq('id', ue_id).execute()
-        ue_numero = ue_info.data[0]['numero'] if ue_info.data else None
-        
-        print(f"🎯 Recherche pour: {qcm_type} - {qcm_annee} - {ue_numero}")
-        
-        # 2. Chercher dans le dossier outputs par correspondance
-        outputs_dir = Path("qcm_extraction/temp/outputs")
-        if not outputs_dir.exists():
-            print(f"⚠️ Dossier outputs non trouvé: {outputs_dir}")
-            return None
-        
-        # Parcourir tous les sous-dossiers
-        for folder in outputs_dir.iterdir():
-            if folder.is_dir():
-                content_file = folder / "content.md"
-                metadata_file = folder / "metadata.json"
-                
-                if content_file.exists() and metadata_file.exists():
-                    try:
-                        import json
-                        with open(metadata_file, 'r', encoding='utf-8') as f:
-                            metadata = json.load(f)
-                        
-                        # Méthode 1: correspondance exacte par qcm_db_id
-                        if metadata.get('qcm_db_id') == qcm_id:
-                            print(f"✅ Markdown trouvé par qcm_db_id: {content_file}")
-                            return str(content_file)
-                        
-                        # Méthode 2: correspondance par type, année et UE
-                        file_type = metadata.get('type')
-                        file_annee = metadata.get('annee')
-                        file_ue = metadata.get('ue')
-                        
-                        if (file_type == qcm_type and 
-                            file_annee == qcm_annee and 
-                            file_ue == ue_numero):
-                            print(f"✅ Markdown trouvé par correspondance métadonnées: {content_file}")
-                            
-                            # Optionnel: mettre à jour les métadonnées avec qcm_db_id
-                            metadata['qcm_db_id'] = qcm_id
-                            with open(metadata_file, 'w', encoding='utf-8') as f:
-                                json.dump(metadata, f, ensure_ascii=False, indent=2)
-                            print(f"📝 Métadonnées mises à jour avec qcm_db_id")
-                            
-                            return str(content_file)
-                        
-                    except Exception as e:
-                        print(f"⚠️ Erreur lecture métadonnées {metadata_file}: {e}")
-                        continue
-        
-        print(f"⚠️ Markdown non trouvé pour QCM ID {qcm_id} avec toutes les méthodes")
-        return None
-        
+        document = Document.from_file(markdown_path)
+        return qcm_id, parse_correct_answers(document.text, known_questions), None
     except Exception as e:
-        print(f"❌ Erreur lors de la recherche améliorée: {e}")
-        return None
+        return qcm_id, None, str(e)
 
-def extract_correct_answers_for_qcm_v2(qcm_id):
-    """Version améliorée de l'extraction des réponses correctes"""
-    print(f"\n🔧 EXTRACTION DES RÉPONSES CORRECTES V2 - QCM ID {qcm_id}")
-    print("=" * 60)
+def reprocess_correct_answers(supabase, qcm_ids: Optional[List[int]] = None, workers: Optional[int] = None,
+                              dry_run: bool = False, index_path=DEFAULT_INDEX_PATH) -> Dict[str, int]:
+    """Réextrait les réponses correctes de plusieurs QCM en parallèle et les écrit en masse"""
+    if qcm_ids is None:
+        qcm_ids = [q['id'] for q in fetch_pages(lambda: supabase.table('qcm').select('id').order('id'))]
     
-    try:
-        extractor = QCMExtractor()
-        
-        # 1. Trouver le fichier Markdown avec méthode améliorée
-        markdown_path = find_markdown_for_qcm_enhanced(qcm_id)
-        if not markdown_path:
-            print(f"❌ Impossible de traiter QCM ID {qcm_id}: Markdown non trouvé")
-            return False
-        
-        # 2. Lire le contenu Markdown
-        with open(markdown_path, 'r', encoding='utf-8') as f:
-            markdown_content = f.read()
-        
-        print(f"📄 Contenu Markdown chargé ({len(markdown_content)} caractères)")
-        
-        # 3. Afficher un échantillon du contenu pour vérifier
-        print("📋 Échantillon du contenu Markdown:")
-        lines = markdown_content.split('\n')
-        for i, line in enumerate(lines[:10]):
-            if line.strip():
-                print(f"   {i+1}: {line[:100]}...")
-        
-        # 4. Appeler la méthode extract_correct_answers
-        print("🚀 Lancement de l'extraction des réponses correctes...")
-        updates_count = extractor.extract_correct_answers(markdown_content, qcm_id)
-        
-        # 5. Vérifier le résultat et retourner les compteurs
-        return updates_count if updates_count and updates_count > 0 else 0
-            
-    except Exception as e:
-        print(f"❌ Erreur lors de l'extraction: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+    index = load_index(index_path)
+    unindexed = [qcm_id for qcm_id in qcm_ids if qcm_id not in index or not os.path.exists(index[qcm_id])]
+    if unindexed:
+        print(f"⚠️ {len(unindexed)} QCM sans Markdown indexé (relancer avec --rebuild-index): {unindexed[:20]}")
+    indexed = [qcm_id for qcm_id in qcm_ids if qcm_id not in unindexed]
+    
+    # Une lecture groupée des questions pour tous les QCM
+    questions = load_questions(supabase, indexed)
+    known_by_qcm: Dict[int, List[int]] = {}
+    for qcm_id, numero in questions.values():
+        known_by_qcm.setdefault(qcm_id, []).append(numero)
+    
+    jobs = [(qcm_id, index[qcm_id], sorted(known_by_qcm[qcm_id])) for qcm_id in indexed if qcm_id in known_by_qcm]
+    print(f"🚀 Parsing de {len(jobs)} QCM avec {workers or os.cpu_count()} processus...")
+    
+    answers: Dict[Tuple[int, int], List[str]] = {}
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for qcm_id, qcm_answers, error in executor.map(_parse_qcm, jobs, chunksize=8):
+            if error:
+                failures += 1
+                print(f"❌ QCM ID {qcm_id}: {error}")
+                continue
+            for numero, letters in qcm_answers.items():
+                answers[(qcm_id, numero)] = letters
+    
+    # Comparaison avec l'état en base puis écriture groupée des seules propositions modifiées
+    question_keys = {question_id: key for question_id, key in questions.items() if key in answers}
+    diff = diff_correct_answers(fetch_reponses(supabase, list(question_keys)), question_keys, answers)
+    
+    changed_qcms = sorted({qcm_id for (qcm_id, _), _, _ in diff['changes']})
+    for (qcm_id, numero), old, new in diff['changes'][:50]:
+        print(f"   QCM {qcm_id} Q{numero}: {', '.join(old) or '-'} → {', '.join(new)}")
+    
+    updated = 0
+    if not dry_run:
+        updated = write_correct_answers(supabase, diff['to_correct'], diff['to_incorrect'])
+    
+    stats = {
+        'qcm_processed': len(jobs) - failures,
+        'qcm_unindexed': len(unindexed),
+        'qcm_failed': failures,
+        'qcm_changed': len(changed_qcms),
+        'questions_answered': len(answers),
+        'questions_changed': len(diff['changes']),
+        'reponses_updated': updated,
+    }
+    print(f"\n📈 RÉSUMÉ{' (simulation)' if dry_run else ''}:")
+    for key, value in stats.items():
+        print(f"   - {key}: {value}")
+    return stats
 
 def detailed_verification():
     """Vérification détaillée avec exemples de réponses"""
@@ -148,10 +118,6 @@ def detailed_verification():
         
         print(f"📊 Analyse détaillée pour QCM ID {qcm_id} ({len(questions.data)} questions):")
         
-        total_correct = 0
-        total_props = 0
-        questions_with_correct = 0
-        
         # Analyser les 3 premières questions en détail
         for i, q in enumerate(questions.data[:3]):
             q_id = q['id']
@@ -161,11 +127,6 @@ def detailed_verification():
             
             if props.data:
                 correct_count = sum(1 for p in props.data if p['est_correcte'])
-                total_props += len(props.data)
-                total_correct += correct_count
-                
-                if correct_count > 0:
-                    questions_with_correct += 1
                 
                 print(f"\n   Question {q_num} (ID: {q_id}):")
                 print(f"     Propositions: {len(props.data)}, Correctes: {correct_count}")
@@ -175,18 +136,11 @@ def detailed_verification():
                     content_preview = str(prop['contenu'])[:50] + "..." if len(str(prop['contenu'])) > 50 else str(prop['contenu'])
                     print(f"       {prop['lettre']}: {status} {content_preview}")
         
-        # Statistiques globales
-        for q in questions.data[3:]:
-            q_id = q['id']
-            props = extractor.supabase.table('reponses').select('est_correcte').eq('question_id', q_id).execute()
-            
-            if props.data:
-                correct_count = sum(1 for p in props.data if p['est_correcte'])
-                total_props += len(props.data)
-                total_correct += correct_count
-                
-                if correct_count > 0:
-                    questions_with_correct += 1
+        # Statistiques globales (une requête agrégée sur la vue qcm_completeness)
+        completeness = fetch_completeness(extractor.supabase, qcm_ids=[qcm_id])[0]
+        total_props = completeness['propositions_count']
+        total_correct = completeness['correct_answers_count']
+        questions_with_correct = completeness['questions_count'] - completeness['questions_without_correct']
         
         percentage = (total_correct / total_props * 100) if total_props > 0 else 0
         
@@ -209,32 +163,34 @@ def detailed_verification():
         return False
 
 def main():
-    """Fonction principale améliorée"""
+    """Fonction principale: retraitement en masse"""
+    parser = argparse.ArgumentParser(description="Retraitement en masse des réponses correctes depuis le Markdown archivé")
+    parser.add_argument("qcm_ids", type=int, nargs="*", help="IDs des QCM à retraiter (défaut: tous)")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus de parsing (défaut: nombre de CPU)")
+    parser.add_argument("--dry-run", action="store_true", help="Afficher les changements sans écrire en base")
+    parser.add_argument("--rebuild-index", action="store_true", help="Reconstruire l'index QCM → Markdown depuis les metadata.json")
+    parser.add_argument("--verify", action="store_true", help="Vérification détaillée du premier QCM après retraitement")
+    args = parser.parse_args()
+    
     print("🚀 CORRECTION DES RÉPONSES CORRECTES V2")
     print("=" * 60)
     
-    # 1. Diagnostic simple
     try:
         extractor = QCMExtractor()
-        qcms = extractor.supabase.table('qcm').select('id').execute()
-        
-        if not qcms.data:
-            print("❌ Aucun QCM en base")
-            return
         
-        qcm_id = qcms.data[0]['id']  # Prendre le premier QCM
-        print(f"🎯 Traitement du QCM ID {qcm_id}")
+        if args.rebuild_index:
+            rebuild_index(extractor.supabase, extractor.outputs_dir, extractor.outputs_dir / "index.json")
         
-        # 2. Extraction avec méthode améliorée
-        updates_count = extract_correct_answers_for_qcm_v2(qcm_id)
-        
-        if updates_count:
-            print(f"✅ {updates_count} réponses mises à jour!")
-        else:
-            print("⚠️ Aucune mise à jour")
+        reprocess_correct_answers(
+            extractor.supabase,
+            qcm_ids=args.qcm_ids or None,
+            workers=args.workers,
+            dry_run=args.dry_run,
+            index_path=extractor.outputs_dir / "index.json"
+        )
         
-        # 3. Vérification détaillée
-        detailed_verification()
+        if args.verify:
+            detailed_verification()
         
         print("\n🎯 CORRECTION TERMINÉE")
         
@@ -244,4 +200,4 @@ def main():
         traceback.print_exc()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,6 +1,17 @@
 #!/usr/bin/env python3
 """
 Script pour nettoyer les QCM dupliqués dans la base de données Supabase
+
+Les doublons sont regroupés par empreinte de contenu (table qcm_fingerprints):
+deux QCM ne sont dans le même groupe que s'ils sont directement similaires et
+ont le même type, la même année et la même UE (pas de fermeture transitive).
+Chaque groupe est fusionné côté serveur par la fonction SQL `merge_duplicate_qcms`
+(database/schema.sql), en une seule transaction et en requêtes ensemblistes:
+via RPC Supabase, ou directement sur une base PostgreSQL si DATABASE_URL est défini.
+
+Sans option, l'outil n'affiche que le rapport de fusion (simulation): rien n'est
+modifié tant que --apply n'est pas passé. Les QCM importés avant l'ajout des
+empreintes sont empreintés depuis leur Markdown archivé avec --backfill.
 """
 
 import os
@@ -9,9 +20,15 @@ import logging
 import argparse
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from typing import Dict, List, Any
-from datetime import datetime
-import json
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from qcm_extraction.document import Document
+from qcm_extraction.fingerprint import (
+    DUPLICATE_THRESHOLD, compute_fingerprint, fetch_exam_metadata, group_duplicates, save_fingerprint
+)
+from qcm_extraction.markdown_index import DEFAULT_INDEX_PATH, rebuild_index
+from qcm_extraction.report import fetch_pages
 
 # Configuration du logging
 logging.basicConfig(
@@ -24,248 +41,238 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+MERGE_ACTIONS = [
+    "questions_moved",
+    "questions_deleted",
+    "reponses_moved",
+    "reponses_merged",
+    "reponses_conflicts",
+    "qcm_deleted",
+]
+
 def setup_argparse() -> argparse.ArgumentParser:
     """Configure le parseur d'arguments"""
     parser = argparse.ArgumentParser(description="Outil de nettoyage des QCM dupliqués")
     parser.add_argument(
-        "--dry-run",
+        "--apply",
         action="store_true",
-        help="Mode simulation (n'effectue aucune modification)"
+        help="Appliquer les fusions (suppression définitive des QCM fusionnés); par défaut, simple rapport de simulation"
     )
     parser.add_argument(
-        "--force-delete",
+        "--backfill",
         action="store_true",
-        help="Supprimer les QCM dupliqués au lieu de les fusionner"
+        help="Calculer d'abord les empreintes manquantes depuis le Markdown archivé (index QCM → Markdown)"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DUPLICATE_THRESHOLD,
+        help=f"Similarité minimale entre empreintes pour considérer deux QCM comme doublons (défaut: {DUPLICATE_THRESHOLD})"
+    )
+    parser.add_argument(
+        "--database-url",
+        default=os.getenv("DATABASE_URL"),
+        help="Connexion PostgreSQL directe (psycopg2) au lieu du RPC Supabase (défaut: $DATABASE_URL)"
     )
     return parser
 
-def find_duplicate_qcms(supabase: Client) -> Dict[str, List[Dict[str, Any]]]:
-    """Trouve les QCM dupliqués par nom de fichier"""
-    logger.info("Recherche des QCM dupliqués...")
-    
-    # Récupérer tous les QCM
-    result = supabase.table("qcm").select("id", "ue_id", "type", "annee", "metadata", "created_at").execute()
-    if not result.data:
-        logger.info("Aucun QCM trouvé dans la base de données")
-        return {}
-    
-    # Grouper par nom de fichier
-    qcms_by_filename = {}
-    for qcm in result.data:
-        metadata = qcm.get("metadata", {})
-        if not metadata or not isinstance(metadata, dict):
+def fetch_fingerprints(supabase: Client) -> List[Dict[str, Any]]:
+    """Lit toutes les empreintes (paginé au-delà de la limite de lignes de PostgREST)"""
+    return fetch_pages(lambda: supabase.table("qcm_fingerprints").select("qcm_id", "signature", "bands").order("qcm_id"))
+
+def backfill_fingerprints(supabase: Client, outputs_dir: Path = DEFAULT_INDEX_PATH.parent,
+                          index_path: Path = DEFAULT_INDEX_PATH) -> int:
+    """Empreinte les QCM qui n'en ont pas à partir de leur Markdown archivé
+
+    Seuls les QCM insérés par l'extracteur sont empreintés à l'import: ceux qui
+    existaient avant sont retrouvés via l'index QCM → Markdown (reconstruit depuis
+    les metadata.json). Retourne le nombre d'empreintes ajoutées.
+    """
+    logger.info("Calcul des empreintes manquantes depuis le Markdown archivé...")
+    index = rebuild_index(supabase, outputs_dir, index_path)
+    existing = {row["qcm_id"] for row in fetch_pages(
+        lambda: supabase.table("qcm_fingerprints").select("qcm_id").order("qcm_id")
+    )}
+
+    added = 0
+    missing = [qcm_id for qcm_id in sorted(index) if qcm_id not in existing]
+    for qcm_id in missing:
+        markdown_path = index[qcm_id]
+        if not os.path.exists(markdown_path):
+            logger.warning(f"  QCM {qcm_id}: Markdown introuvable ({markdown_path})")
             continue
-            
-        filename = metadata.get("filename")
-        if not filename:
+        document = Document.from_file(markdown_path)
+        fingerprint = compute_fingerprint(document.text, document.normalized_text)
+        if not fingerprint:
+            logger.warning(f"  QCM {qcm_id}: pas assez de texte pour une empreinte")
             continue
-            
-        if filename not in qcms_by_filename:
-            qcms_by_filename[filename] = []
-        qcms_by_filename[filename].append(qcm)
-    
-    # Filtrer pour ne garder que les groupes avec plus d'un QCM
-    duplicate_qcms = {filename: qcms for filename, qcms in qcms_by_filename.items() if len(qcms) > 1}
-    
-    if duplicate_qcms:
-        logger.info(f"Trouvé {len(duplicate_qcms)} fichiers PDF avec QCM dupliqués")
-        for filename, qcms in duplicate_qcms.items():
-            logger.info(f"- {filename}: {len(qcms)} entrées (IDs: {', '.join(str(q['id']) for q in qcms)})")
+        try:
+            save_fingerprint(supabase, qcm_id, fingerprint)
+            added += 1
+        except Exception as e:
+            # QCM supprimé depuis l'archivage (clé étrangère), ou erreur réseau
+            logger.warning(f"  QCM {qcm_id}: empreinte non enregistrée: {str(e)}")
+
+    logger.info(f"{added} empreintes ajoutées ({len(missing)} QCM indexés sans empreinte)")
+    return added
+
+def find_duplicate_qcms(supabase: Client, threshold: float = DUPLICATE_THRESHOLD) -> List[List[int]]:
+    """Trouve les groupes de QCM dupliqués par similarité d'empreinte
+
+    Les paires candidates partagent une bande LSH; elles ne sont retenues que si
+    la similarité estimée dépasse le seuil et que les métadonnées concordent.
+    """
+    logger.info("Recherche des QCM dupliqués...")
+
+    fingerprints = fetch_fingerprints(supabase)
+    if not fingerprints:
+        logger.info("Aucune empreinte de QCM trouvée dans la base de données (relancer avec --backfill)")
+        return []
+
+    signatures = {row["qcm_id"]: row["signature"] for row in fingerprints}
+
+    # Candidats: QCM partageant au moins une bande
+    qcms_by_band: Dict[str, List[int]] = {}
+    for row in fingerprints:
+        for band in row["bands"] or []:
+            qcms_by_band.setdefault(band, []).append(row["qcm_id"])
+
+    candidate_pairs = set()
+    for candidates in qcms_by_band.values():
+        for i, qcm_a in enumerate(candidates):
+            for qcm_b in candidates[i + 1:]:
+                if qcm_a != qcm_b:
+                    candidate_pairs.add((min(qcm_a, qcm_b), max(qcm_a, qcm_b)))
+
+    candidate_ids = sorted({qcm_id for pair in candidate_pairs for qcm_id in pair})
+    metadata = {}
+    for start in range(0, len(candidate_ids), 200):
+        metadata.update(fetch_exam_metadata(supabase, candidate_ids[start:start + 200]))
+    duplicate_groups = group_duplicates(signatures, metadata, candidate_pairs, threshold)
+
+    if duplicate_groups:
+        logger.info(f"Trouvé {len(duplicate_groups)} groupes de QCM dupliqués")
+        for group in duplicate_groups:
+            logger.info(f"- {len(group)} entrées (IDs: {', '.join(str(q) for q in group)})")
     else:
         logger.info("Aucun QCM dupliqué trouvé")
-    
-    return duplicate_qcms
 
-def clean_duplicate_qcms(supabase: Client, duplicates: Dict[str, List[Dict[str, Any]]], 
-                         dry_run: bool = True, force_delete: bool = False) -> None:
-    """Nettoie les QCM dupliqués en gardant le plus récent et en fusionnant/supprimant les autres"""
+    return duplicate_groups
+
+def merge_group_rpc(supabase: Client, keep_id: int, duplicate_ids: List[int], dry_run: bool) -> Dict[str, int]:
+    """Fusionne un groupe via la fonction SQL appelée en RPC (une transaction)"""
+    result = supabase.rpc("merge_duplicate_qcms", {
+        "keep_id": keep_id,
+        "duplicate_ids": duplicate_ids,
+        "dry_run": dry_run,
+    }).execute()
+    return {row["action"]: row["affected"] for row in result.data or []}
+
+def merge_group_local(connection, keep_id: int, duplicate_ids: List[int], dry_run: bool) -> Dict[str, int]:
+    """Fusionne un groupe sur une connexion PostgreSQL directe (une transaction)"""
+    with connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT action, affected FROM merge_duplicate_qcms(%s, %s::INTEGER[], %s)",
+                (keep_id, duplicate_ids, dry_run)
+            )
+            return dict(cursor.fetchall())
+
+def clean_duplicate_qcms(supabase: Client, duplicates: List[List[int]], dry_run: bool = True,
+                         connection: Optional[Any] = None) -> Dict[str, int]:
+    """Fusionne chaque groupe de doublons dans son QCM le plus récent
+
+    En cas de désaccord sur est_correcte, la proposition conservée garde sa
+    valeur et le conflit est compté dans `reponses_conflicts`. Retourne le rapport cumulé (nombre de lignes par action).
+    """
+    totals = {action: 0 for action in MERGE_ACTIONS}
     if not duplicates:
         logger.info("Aucun QCM dupliqué à nettoyer")
-        return
-    
-    logger.info(f"Nettoyage de {len(duplicates)} groupes de QCM dupliqués (dry_run: {dry_run}, force_delete: {force_delete})")
-    
-    for filename, qcms in duplicates.items():
-        logger.info(f"Traitement des doublons pour {filename}")
-        
-        # Trier les QCM par date de création (le plus récent en premier)
-        sorted_qcms = sorted(qcms, key=lambda q: q.get("created_at", ""), reverse=True)
-        
-        # Garder le QCM le plus récent
-        qcm_to_keep = sorted_qcms[0]
-        qcms_to_clean = sorted_qcms[1:]
-        
-        logger.info(f"  QCM à conserver: ID {qcm_to_keep['id']}")
-        logger.info(f"  QCMs à traiter: {len(qcms_to_clean)} entrées")
-        
-        for qcm_to_clean in qcms_to_clean:
-            qcm_id = qcm_to_clean["id"]
-            logger.info(f"  - Traitement du QCM ID {qcm_id}")
-            
-            # Récupérer les questions associées à ce QCM
-            questions_result = supabase.table("questions").select("id", "numero").eq("qcm_id", qcm_id).execute()
-            
-            if not questions_result.data:
-                logger.info(f"    Aucune question trouvée pour ce QCM")
-                if not dry_run:
-                    if force_delete:
-                        logger.info(f"    Suppression du QCM ID {qcm_id}")
-                        supabase.table("qcm").delete().eq("id", qcm_id).execute()
-                    else:
-                        logger.info(f"    Mise à jour de la métadonnée pour marquer comme dupliqué")
-                        metadata = qcm_to_clean.get("metadata", {})
-                        if not metadata:
-                            metadata = {}
-                        metadata["is_duplicate"] = True
-                        metadata["original_qcm_id"] = qcm_to_keep["id"]
-                        metadata["cleaned_at"] = datetime.now().isoformat()
-                        supabase.table("qcm").update({"metadata": metadata}).eq("id", qcm_id).execute()
-                continue
-            
-            # Pour chaque question, récupérer ses réponses
-            questions_map = {q["numero"]: q["id"] for q in questions_result.data}
-            logger.info(f"    {len(questions_map)} questions trouvées")
-            
-            # Pour chaque question, vérifier si elle existe dans le QCM à conserver
-            main_questions_result = supabase.table("questions").select("id", "numero").eq("qcm_id", qcm_to_keep["id"]).execute()
-            
-            if not main_questions_result.data:
-                logger.info(f"    Le QCM principal n'a pas de questions. Déplacement des questions...")
-                if not dry_run:
-                    # Déplacer toutes les questions vers le QCM principal
-                    for q_id in [q["id"] for q in questions_result.data]:
-                        supabase.table("questions").update({"qcm_id": qcm_to_keep["id"]}).eq("id", q_id).execute()
-                    
-                    # Supprimer ou marquer le QCM dupliqué
-                    if force_delete:
-                        logger.info(f"    Suppression du QCM ID {qcm_id}")
-                        supabase.table("qcm").delete().eq("id", qcm_id).execute()
-                    else:
-                        logger.info(f"    Mise à jour de la métadonnée pour marquer comme dupliqué")
-                        metadata = qcm_to_clean.get("metadata", {})
-                        if not metadata:
-                            metadata = {}
-                        metadata["is_duplicate"] = True
-                        metadata["original_qcm_id"] = qcm_to_keep["id"]
-                        metadata["cleaned_at"] = datetime.now().isoformat()
-                        supabase.table("qcm").update({"metadata": metadata}).eq("id", qcm_id).execute()
-                continue
-            
-            # Cartographier les questions du QCM principal
-            main_questions_map = {q["numero"]: q["id"] for q in main_questions_result.data}
-            
-            # Pour chaque question du QCM dupliqué
-            for numero, question_id in questions_map.items():
-                # Si la question existe déjà dans le QCM principal
-                if numero in main_questions_map:
-                    main_question_id = main_questions_map[numero]
-                    logger.info(f"    Question {numero} existe déjà dans le QCM principal (ID: {main_question_id})")
-                    
-                    # Vérifier les réponses
-                    responses_result = supabase.table("reponses").select("id", "lettre", "est_correcte").eq("question_id", question_id).execute()
-                    if responses_result.data:
-                        logger.info(f"    Vérification de {len(responses_result.data)} réponses pour la question {numero}")
-                        
-                        # Récupérer les réponses de la question principale
-                        main_responses_result = supabase.table("reponses").select("id", "lettre", "est_correcte").eq("question_id", main_question_id).execute()
-                        
-                        # Si la question principale n'a pas de réponses mais la dupliquée en a
-                        if not main_responses_result.data and responses_result.data:
-                            logger.info(f"    Déplacement des réponses vers la question principale")
-                            if not dry_run:
-                                for response in responses_result.data:
-                                    # Mettre à jour question_id pour les réponses
-                                    supabase.table("reponses").update({"question_id": main_question_id}).eq("id", response["id"]).execute()
-                                
-                        # Si les deux questions ont des réponses, mettre à jour est_correcte si nécessaire
-                        elif main_responses_result.data:
-                            main_responses_map = {r["lettre"]: (r["id"], r["est_correcte"]) for r in main_responses_result.data}
-                            
-                            for response in responses_result.data:
-                                lettre = response["lettre"]
-                                est_correcte = response["est_correcte"]
-                                
-                                if lettre in main_responses_map:
-                                    main_resp_id, main_est_correcte = main_responses_map[lettre]
-                                    
-                                    # Si la réponse dupliquée a est_correcte=True mais pas la principale
-                                    if est_correcte and not main_est_correcte:
-                                        logger.info(f"    Mise à jour de est_correcte pour la réponse {lettre} de la question {numero}")
-                                        if not dry_run:
-                                            supabase.table("reponses").update({"est_correcte": True}).eq("id", main_resp_id).execute()
-                    
-                    # Supprimer la question dupliquée si nécessaire
-                    if not dry_run and force_delete:
-                        logger.info(f"    Suppression de la question dupliquée {numero} (ID: {question_id})")
-                        # Supprimer d'abord toutes les réponses
-                        supabase.table("reponses").delete().eq("question_id", question_id).execute()
-                        # Puis la question
-                        supabase.table("questions").delete().eq("id", question_id).execute()
-                else:
-                    # La question n'existe pas dans le QCM principal, déplacer
-                    logger.info(f"    Déplacement de la question {numero} vers le QCM principal")
-                    if not dry_run:
-                        supabase.table("questions").update({"qcm_id": qcm_to_keep["id"]}).eq("id", question_id).execute()
-            
-            # Une fois toutes les questions traitées, supprimer ou marquer le QCM dupliqué
-            if not dry_run:
-                if force_delete:
-                    logger.info(f"    Suppression du QCM ID {qcm_id}")
-                    supabase.table("qcm").delete().eq("id", qcm_id).execute()
-                else:
-                    logger.info(f"    Mise à jour de la métadonnée pour marquer comme dupliqué")
-                    metadata = qcm_to_clean.get("metadata", {})
-                    if not metadata:
-                        metadata = {}
-                    metadata["is_duplicate"] = True
-                    metadata["original_qcm_id"] = qcm_to_keep["id"]
-                    metadata["cleaned_at"] = datetime.now().isoformat()
-                    supabase.table("qcm").update({"metadata": metadata}).eq("id", qcm_id).execute()
-    
+        return totals
+
+    mode = "connexion directe" if connection is not None else "RPC Supabase"
+    logger.info(f"Nettoyage de {len(duplicates)} groupes de QCM dupliqués (dry_run: {dry_run}, {mode})")
+
+    for group in duplicates:
+        # Garder le QCM le plus récent (identifiant le plus élevé)
+        qcm_to_keep = max(group)
+        qcms_to_clean = sorted((q for q in group if q != qcm_to_keep), reverse=True)
+        logger.info(f"Groupe {group}: conservation du QCM ID {qcm_to_keep}, fusion de {qcms_to_clean}")
+
+        try:
+            if connection is not None:
+                report = merge_group_local(connection, qcm_to_keep, qcms_to_clean, dry_run)
+            else:
+                report = merge_group_rpc(supabase, qcm_to_keep, qcms_to_clean, dry_run)
+        except Exception as e:
+            logger.error(f"  Échec de la fusion du groupe {group} (aucune modification appliquée): {str(e)}")
+            continue
+
+        for action in MERGE_ACTIONS:
+            count = report.get(action, 0)
+            totals[action] += count
+            logger.info(f"  {action}: {count}")
+        if report.get("reponses_conflicts"):
+            logger.warning(
+                f"  ⚠️ {report['reponses_conflicts']} proposition(s) du groupe {group} ont une correction "
+                f"différente de celle du QCM conservé ({qcm_to_keep}): ses réponses sont gardées, à vérifier"
+            )
+
+    logger.info("Rapport de fusion" + (" (simulation)" if dry_run else "") + ":")
+    for action, count in totals.items():
+        logger.info(f"  {action}: {count}")
     logger.info("Nettoyage terminé")
+    return totals
 
 def main():
     """Point d'entrée principal"""
+    load_dotenv()
+
     parser = setup_argparse()
     args = parser.parse_args()
-    
-    load_dotenv()
-    
+
     # Vérifier les variables d'environnement requises
     supabase_url = os.getenv("SUPABASE_URL")
     supabase_key = os.getenv("SUPABASE_KEY")
-    
+
     if not supabase_url or not supabase_key:
         logger.error("Variables d'environnement SUPABASE_URL et SUPABASE_KEY requises")
         sys.exit(1)
-    
+
+    connection = None
     try:
         # Connexion à Supabase
         supabase = create_client(supabase_url, supabase_key)
-        
+
+        if args.database_url:
+            import psycopg2
+            connection = psycopg2.connect(args.database_url)
+
+        if args.backfill:
+            backfill_fingerprints(supabase)
+
         # Trouver les QCM dupliqués
-        duplicates = find_duplicate_qcms(supabase)
-        
-        # Nettoyer les doublons
+        duplicates = find_duplicate_qcms(supabase, threshold=args.threshold)
+
+        # Nettoyer les doublons (simulation sauf --apply explicite)
         if duplicates:
-            if args.dry_run:
-                logger.info("Mode simulation activé - aucune modification ne sera effectuée")
-            
-            clean_duplicate_qcms(
-                supabase, 
-                duplicates, 
-                dry_run=args.dry_run, 
-                force_delete=args.force_delete
-            )
-            
-            if args.dry_run:
-                logger.info("Pour appliquer les modifications, relancez sans l'option --dry-run")
+            dry_run = not args.apply
+            if dry_run:
+                logger.info("Mode simulation - aucune modification ne sera effectuée")
+
+            clean_duplicate_qcms(supabase, duplicates, dry_run=dry_run, connection=connection)
+
+            if dry_run:
+                logger.info("Pour appliquer les fusions (suppression définitive des doublons), relancez avec --apply")
         else:
             logger.info("Aucun nettoyage nécessaire")
-        
+
     except Exception as e:
         logger.error(f"Erreur lors du nettoyage des QCM dupliqués: {str(e)}", exc_info=True)
         sys.exit(1)
+    finally:
+        if connection is not None:
+            connection.close()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
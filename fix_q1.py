@@ -1,8 +1,9 @@
 import os
 import json
-from supabase import create_client
 from dotenv import load_dotenv
 
+from qcm_extraction.clients import lazy_supabase
+
 # Charger les variables d'environnement
 load_dotenv()
 
@@ -10,8 +11,8 @@ load_dotenv()
 supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_KEY')
 
-# Initialiser le client Supabase
-supabase = create_client(supabase_url, supabase_key)
+# Client Supabase construit à la première requête
+supabase = lazy_supabase(supabase_url, supabase_key)
 
 def update_question1_answers():
     """
@@ -1,9 +1,28 @@
-from .models import Universite, UE, QCM, Question, Option, Image
-from .database import Database
-from .extractor import QCMExtractor
-from .main import process_qcm
+# Les sous-modules (pydantic, mistralai, supabase...) ne sont importés qu'au premier accès:
+# `import qcm_extraction` et les commandes d'aide restent rapides
+import importlib
+
+_EXPORTS = {
+    'Universite': '.models', 'UE': '.models', 'QCM': '.models', 'Question': '.models',
+    'Option': '.models', 'Image': '.models',
+    'Database': '.database',
+    'QCMExtractor': '.extractor',
+    'process_qcm': '.main',
+}
 
 __all__ = [
     'Universite', 'UE', 'QCM', 'Question', 'Option', 'Image',
     'Database', 'QCMExtractor', 'process_qcm'
 ]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
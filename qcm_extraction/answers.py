@@ -0,0 +1,284 @@
+"""
+Identification et enregistrement des réponses correctes d'un QCM.
+
+`parse_correct_answers` est une fonction pure (texte → réponses) utilisée par la
+Phase 3 de l'extracteur comme par le retraitement en masse, où elle s'exécute
+dans un pool de processus. `apply_correct_answers` écrit les réponses d'un QCM
+entier en une mise à jour groupée.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from qcm_extraction.chunking import find_question_boundaries
+from qcm_extraction.reader import invalidate_qcm
+from qcm_extraction.report import fetch_pages
+
+
+def parse_correct_answers(markdown_text: str, known_questions: Optional[Iterable[int]] = None,
+                          verbose: bool = False) -> Dict[int, List[str]]:
+    """Extrait les lettres correctes de chaque question à partir du Markdown OCR.
+
+    Les méthodes sont appliquées par ordre de fiabilité ("Réponses justes : ...",
+    annotations Vrai/Faux, format multi-réponses, puis déduction par élimination);
+    les méthodes secondaires ne traitent que les questions de `known_questions`
+    (par défaut: les questions détectées dans le texte) encore sans réponse.
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+    if known_questions is None:
+        known_questions = {numero for _, numero in find_question_boundaries(markdown_text)}
+
+    # Créer un dictionnaire pour stocker toutes les lettres correctes par question
+    corrections_data = {}
+    questions_with_answers = set()  # Pour suivre les questions déjà traitées
+
+    # Méthode PRINCIPALE: Recherche "Réponses justes : X, Y, Z"
+    # Cette méthode est la plus fiable et a priorité sur les autres
+    log("🔍 Recherche directe des réponses justes explicites...")
+    reponses_justes_pattern = r'(?:Q(?:uestion)?\s*(\d+)[^A-E]*|^#*\s*(\d+)[^A-E]*|^[^\d]*(\d+)[\.:\)][^A-E]*)(?:.*\n)*?.*[Rr](?:é|e)ponses?\s+(?:justes?|correctes?|exactes?)\s*:?\s*([A-E][,\s]*(?:[A-E][,\s]*)*)'
+
+    reponses_justes_matches = list(re.finditer(reponses_justes_pattern, markdown_text, re.MULTILINE))
+    if reponses_justes_matches:
+        for match in reponses_justes_matches:
+            # Extraire le numéro de question (peut être dans différents groupes selon le format)
+            question_num = None
+            for i in range(1, 4):  # Vérifier les groupes 1, 2, 3
+                if match.group(i):
+                    try:
+                        question_num = int(match.group(i))
+                        break
+                    except (ValueError, TypeError):
+                        pass
+
+            if question_num is None:
+                continue
+
+            # Extraire les lettres des réponses correctes
+            answers_str = match.group(4)
+            letters = re.findall(r'[A-E]', answers_str)
+
+            if letters:
+                # Éviter les doublons
+                unique_letters = list(set(letters))
+
+                # Ajouter à corrections_data
+                corrections_data[question_num] = unique_letters
+                questions_with_answers.add(question_num)
+                log(f"✅ Trouvé directement: Question {question_num}, réponses correctes: {', '.join(unique_letters)}")
+
+    # Obtenir la liste des questions qui n'ont pas encore de réponses
+    missing_questions = set(known_questions) - questions_with_answers
+
+    # Continuer avec les autres méthodes UNIQUEMENT pour les questions non traitées
+    if missing_questions:
+        log(f"ℹ️ {len(missing_questions)} questions n'ont pas de 'Réponses justes' explicites, recherche avec méthodes secondaires...")
+
+        # Méthode 2: Analyse directe du texte pour les formats "A. Vrai" / "A. Faux"
+        log("🔍 Recherche des annotations Vrai/Faux pour chaque proposition...")
+
+        # AMÉLIORATION: Pattern étendu pour capturer plus de formats
+        vrai_faux_pattern = r'(?:Question\s+)?(\d+)[\.:\)]\s*(?:[^\n]+\n+)?([A-E])\.?\s+([Vv]rai|[Ff]aux|[Jj]uste|[Cc]orrect)'
+        all_vrai_faux_matches = list(re.finditer(vrai_faux_pattern, markdown_text))
+
+        if all_vrai_faux_matches:
+            # Grouper par numéro de question
+            vrai_faux_by_question = {}
+            for match in all_vrai_faux_matches:
+                try:
+                    question_num = int(match.group(1))
+                    # Ne traiter que si la question n'a pas déjà été traitée par la méthode principale
+                    if question_num not in questions_with_answers:
+                        lettre = match.group(2).upper()
+                        vf_status = match.group(3).lower()
+
+                        # Initialiser si la question n'existe pas encore
+                        if question_num not in vrai_faux_by_question:
+                            vrai_faux_by_question[question_num] = []
+
+                        # Ajouter seulement si c'est vrai/juste/correct
+                        if vf_status in ['vrai', 'juste', 'correct']:
+                            vrai_faux_by_question[question_num].append(lettre)
+                            log(f"Trouvé: Question {question_num}, proposition {lettre} est {vf_status}")
+                except (ValueError, IndexError):
+                    continue
+
+            # Ajouter aux corrections uniquement pour les questions manquantes
+            for question_num, lettres in vrai_faux_by_question.items():
+                if lettres and question_num in missing_questions:  # Seulement si on a au moins une réponse correcte et question non traitée
+                    corrections_data[question_num] = lettres
+                    questions_with_answers.add(question_num)
+                    log(f"✅ Question {question_num}: réponses correctes {', '.join(lettres)} (via Vrai/Faux)")
+
+        # Mettre à jour les questions manquantes
+        missing_questions = set(known_questions) - questions_with_answers
+
+        # Méthode 3: Extraction directe des réponses avec pattern plus inclusif
+        if missing_questions:
+            log("🔍 Recherche des réponses par format multi-réponses...")
+            # Formats typiques plus étendus: "1:A", "1: A,B,E", "Question 1 : A,D", etc.
+            multi_answer_pattern = r'(?:Question\s+)?(\d+)\s*[\.:\)]\s*([A-E][,\s]*(?:[A-E][,\s]*)*)'
+            multi_answers = list(re.finditer(multi_answer_pattern, markdown_text))
+
+            for match in multi_answers:
+                try:
+                    question_num = int(match.group(1))
+                    # Ne traiter que si la question n'a pas déjà été traitée par d'autres méthodes
+                    if question_num not in questions_with_answers:
+                        answers_str = match.group(2)
+                        letters = re.findall(r'[A-E]', answers_str)
+
+                        if letters:
+                            # Éviter de dédoubler les lettres
+                            unique_letters = list(set(letters))
+
+                            corrections_data[question_num] = unique_letters
+                            questions_with_answers.add(question_num)
+                            log(f"✅ Question {question_num}: réponses correctes {', '.join(unique_letters)} (via format multi-réponses)")
+                except (ValueError, IndexError):
+                    continue
+
+    # Si il reste des questions sans réponses, tenter l'approche par déduction
+    missing_questions = set(known_questions) - questions_with_answers
+    if missing_questions:
+        log(f"ℹ️ {len(missing_questions)} questions n'ont toujours pas de réponses correctes, tentative par déduction...")
+
+        # Tentative : détecter les questions où une seule proposition est correcte
+        # par déduction à partir des propositions marquées comme fausses
+        log("🔍 Tentative de déduction à partir des formulations 'A. Faux.'...")
+
+        # Patterns pour détecter des questions et propositions
+        question_pattern = r'(?:Question|Q\.?)?\s*(\d+)(?:\s*:|\.|\))'
+        proposition_pattern = r'([A-E])\.?\s+([Ff]aux|[Vv]rai)'
+
+        current_question = None
+        faux_propositions = {}
+
+        # Parcourir ligne par ligne
+        for line in markdown_text.split('\n'):
+            # Vérifier si c'est une nouvelle question
+            q_match = re.search(question_pattern, line)
+            if q_match:
+                try:
+                    current_question = int(q_match.group(1))
+                    if current_question not in faux_propositions:
+                        faux_propositions[current_question] = []
+                except (ValueError, IndexError):
+                    pass
+
+            # Si nous sommes dans une question, chercher les propositions
+            if current_question is not None and current_question in missing_questions:
+                prop_matches = re.finditer(proposition_pattern, line)
+                for prop_match in prop_matches:
+                    lettre = prop_match.group(1).upper()
+                    statut = prop_match.group(2).lower()
+
+                    if statut == 'faux':
+                        faux_propositions[current_question].append(lettre)
+
+        # Pour chaque question, déduire les bonnes réponses
+        for question_num, faux_lettres in faux_propositions.items():
+            if question_num in missing_questions and len(faux_lettres) > 0 and len(faux_lettres) < 5:  # Si toutes ne sont pas fausses
+                all_letters = ['A', 'B', 'C', 'D', 'E']
+                correct_letters = [l for l in all_letters if l not in faux_lettres]
+
+                if correct_letters:
+                    corrections_data[question_num] = correct_letters
+                    questions_with_answers.add(question_num)
+                    log(f"✅ Question {question_num}: réponses déduites {', '.join(correct_letters)} (par élimination)")
+
+
+    return corrections_data
+
+
+# Taille des lots pour les filtres `in` (longueur des URL PostgREST)
+IN_FILTER_BATCH_SIZE = 200
+
+
+def _batches(items: List[Any], size: int = IN_FILTER_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def fetch_reponses(supabase, question_ids: List[str]) -> List[Dict[str, Any]]:
+    """Lit les propositions d'un ensemble de questions, par lots (paginés: 200 questions × 5 lettres atteint la limite de PostgREST)."""
+    reponses = []
+    for batch in _batches(list(question_ids)):
+        reponses.extend(fetch_pages(
+            lambda: supabase.table("reponses").select("id", "question_id", "lettre", "est_correcte").in_("question_id", batch).order("id")
+        ))
+    return reponses
+
+
+def diff_correct_answers(reponses: List[Dict[str, Any]], question_keys: Dict[str, Any],
+                         answers: Dict[Any, List[str]]) -> Dict[str, Any]:
+    """Compare l'état en base aux réponses attendues.
+
+    `question_keys` associe chaque question_id à sa clé dans `answers` (numéro, ou
+    (qcm_id, numéro) pour plusieurs QCM). Retourne les propositions à passer à
+    vrai / faux et les changements par question.
+    """
+    to_correct, to_incorrect = [], []
+    current: Dict[Any, List[str]] = {}
+    for r in reponses:
+        key = question_keys[r["question_id"]]
+        expected = r["lettre"] in answers[key]
+        if r["est_correcte"]:
+            current.setdefault(key, []).append(r["lettre"])
+        if expected and not r["est_correcte"]:
+            to_correct.append(r["id"])
+        elif not expected and r["est_correcte"]:
+            to_incorrect.append(r["id"])
+
+    changes = []
+    for key in sorted(set(question_keys.values())):
+        old = sorted(current.get(key, []))
+        if old != sorted(answers[key]):
+            changes.append((key, old, sorted(answers[key])))
+    return {"to_correct": to_correct, "to_incorrect": to_incorrect, "changes": changes}
+
+
+def write_correct_answers(supabase, to_correct: List[int], to_incorrect: List[int]) -> int:
+    """Écrit `est_correcte` en mises à jour groupées (une par lot). Retourne le nombre de lignes."""
+    for value, ids in ((True, to_correct), (False, to_incorrect)):
+        for batch in _batches(ids):
+            supabase.table("reponses").update({"est_correcte": value}).in_("id", batch).execute()
+    return len(to_correct) + len(to_incorrect)
+
+
+def apply_correct_answers(supabase, qcm_id: int, answers: Dict[int, List[str]],
+                          dry_run: bool = False) -> Dict[str, Any]:
+    """Applique les réponses correctes de tout un QCM en une mise à jour groupée.
+
+    Deux lectures (questions, propositions) puis au plus deux mises à jour
+    (`est_correcte` vrai / faux) quel que soit le nombre de questions. Seules
+    les propositions dont l'état change sont modifiées.
+
+    Retourne {"changes": [(numero, anciennes, nouvelles)], "missing": [numéros], "updated": n}.
+    """
+    report = {"changes": [], "missing": [], "updated": 0}
+    if not answers:
+        return report
+
+    questions = supabase.table("questions").select("id", "numero").eq("qcm_id", qcm_id).in_("numero", list(answers)).execute()
+    question_nums = {q["id"]: q["numero"] for q in questions.data or []}
+    report["missing"] = sorted(set(answers) - set(question_nums.values()))
+    if not question_nums:
+        return report
+
+    diff = diff_correct_answers(fetch_reponses(supabase, list(question_nums)), question_nums, answers)
+    report["changes"] = diff["changes"]
+    if not dry_run:
+        report["updated"] = write_correct_answers(supabase, diff["to_correct"], diff["to_incorrect"])
+        if report["updated"]:
+            invalidate_qcm(qcm_id)
+    return report
+
+
+def print_answers_report(report: Dict[str, Any]):
+    """Affiche les différences calculées par `apply_correct_answers`."""
+    for numero, old, new in report["changes"]:
+        print(f"  Q{numero}: {', '.join(old) or '-'} → {', '.join(new)}")
+    if report["missing"]:
+        print(f"⚠️ Questions absentes de la base: {report['missing']}")
+    if not report["changes"]:
+        print("✅ Les réponses actuelles sont déjà correctes")
@@ -0,0 +1,80 @@
+"""
+Fichiers JSON partagés entre threads et processus.
+
+Les statistiques du routeur et l'index des Markdown sont mis à jour par tous
+les extracteurs (threads du pipeline, pool du service, processus workers).
+Chaque mise à jour est une lecture-modification-écriture faite sous un verrou
+de fichier (`<fichier>.lock`, fcntl; simple verrou de processus là où fcntl
+n'existe pas), et chaque écriture passe par un fichier temporaire unique
+remplacé atomiquement: deux écrivains ne partagent jamais le même `.tmp`.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_process_locks = {}
+_process_locks_guard = threading.Lock()
+
+
+def _process_lock(path: Path) -> threading.Lock:
+    with _process_locks_guard:
+        return _process_locks.setdefault(str(path.resolve()), threading.Lock())
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Verrou exclusif sur `path` pour les threads du processus et les autres processus."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock_path = path.with_name(path.name + ".lock")
+    with _process_lock(path):
+        with open(lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_json(path: Path, default: Any = None) -> Any:
+    """Contenu JSON de `path`, ou `default` si le fichier est absent ou illisible."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def write_json_atomic(path: Path, data: Any):
+    """Écrit `data` dans un fichier temporaire unique du même dossier puis le renomme sur `path`."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, prefix=path.name + ".",
+                                     suffix=".tmp", delete=False) as f:
+        tmp_path = f.name
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
+
+def update_json(path: Path, update: Callable[[Any], Any], default: Any = None) -> Any:
+    """Lecture-modification-écriture de `path` sous verrou; retourne le contenu écrit."""
+    with file_lock(path):
+        data = update(read_json(path, default))
+        write_json_atomic(path, data)
+        return data
@@ -0,0 +1,168 @@
+"""
+Budget d'appels API par document.
+
+Un document pathologique (scan illisible, mise en page inattendue) peut
+enchaîner extraction globale → pages → prompt simplifié → vision, chaque appel
+avec ses retries. Chaque document reçoit un `DocumentBudget` (appels, tokens,
+secondes d'exécution de ses étapes) activé pour le thread qui exécute l'étape:
+`_call_api_with_retry` le consulte avant chaque tentative et le routeur avant
+chaque escalade. Une fois le budget épuisé, les appels sont refusés
+(`APICallError` de catégorie budget) et l'extraction se replie sur les méthodes locales
+(index des titres, regex); le résultat du document est marqué `partial`.
+
+Le temps compté est celui passé dans les étapes du document, pas l'attente dans
+les files du pipeline. L'échéance de bout en bout (`deadline_seconds`, temps
+réel) est portée par le même budget: voir qcm_extraction/deadline.py.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from qcm_extraction.deadline import DEFAULT_DEADLINE_SECONDS, Deadline
+
+DEFAULT_MAX_CALLS = 60
+DEFAULT_MAX_TOKENS = 400_000
+DEFAULT_MAX_SECONDS = 900.0
+
+
+def response_tokens(response: Any) -> int:
+    """Tokens consommés d'après `response.usage` (0 si la réponse n'en indique pas)."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0
+    total = getattr(usage, "total_tokens", None)
+    if total is None:
+        total = (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+    return int(total or 0)
+
+
+class DocumentBudget:
+    """Plafonds d'appels, de tokens, de temps et échéance d'un document (sûr entre threads)."""
+
+    def __init__(self, max_calls: int = DEFAULT_MAX_CALLS, max_tokens: int = DEFAULT_MAX_TOKENS,
+                 max_seconds: float = DEFAULT_MAX_SECONDS,
+                 deadline_seconds: Optional[float] = DEFAULT_DEADLINE_SECONDS):
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        # Échéance démarrée à la création du budget (première étape du document); None ou 0: sans échéance
+        self.deadline = Deadline(deadline_seconds) if deadline_seconds else None
+        self.calls = 0
+        self.tokens = 0
+        self.refused = 0
+        self._seconds = 0.0
+        self._active_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def seconds(self) -> float:
+        with self._lock:
+            if self._active_since is None:
+                return self._seconds
+            return self._seconds + time.monotonic() - self._active_since
+
+    def exhausted_reason(self) -> Optional[str]:
+        """Plafond atteint ("appels", "tokens", "temps", "délai"), ou None."""
+        if self.calls >= self.max_calls:
+            return "appels"
+        if self.tokens >= self.max_tokens:
+            return "tokens"
+        if self.seconds >= self.max_seconds:
+            return "temps"
+        if self.deadline is not None and self.deadline.expired:
+            return "délai"
+        return None
+
+    @property
+    def exhausted(self) -> bool:
+        return self.exhausted_reason() is not None
+
+    def allow(self, label: str = "appel API") -> bool:
+        """Réserve un appel; retourne False (et le compte comme refusé) si le budget est épuisé."""
+        reason = self.exhausted_reason()
+        if reason is None:
+            with self._lock:
+                self.calls += 1
+            return True
+        self.refuse(reason, label)
+        return False
+
+    def refuse(self, reason: str, label: str):
+        """Compte un appel, une escalade ou un repli non tenté faute de budget."""
+        with self._lock:
+            self.refused += 1
+            first_refusal = self.refused == 1
+        if first_refusal and reason == "délai":
+            print(f"⌛ Échéance du document dépassée: {label} refusé, repli sur les méthodes locales")
+        elif first_refusal:
+            print(f"💸 Budget du document épuisé ({reason}): {label} refusé, repli sur les méthodes locales")
+
+    def charge(self, response: Any):
+        """Ajoute les tokens d'une réponse API."""
+        tokens = response_tokens(response)
+        with self._lock:
+            self.tokens += tokens
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "tokens": self.tokens,
+            "seconds": round(self.seconds, 1),
+            "refused": self.refused,
+            "limits": {"calls": self.max_calls, "tokens": self.max_tokens, "seconds": self.max_seconds,
+                       "deadline_seconds": self.deadline.seconds if self.deadline else None},
+            "deadline_remaining": round(self.deadline.remaining(), 1) if self.deadline else None,
+            "exhausted": self.exhausted_reason(),
+        }
+
+    def _start(self):
+        with self._lock:
+            if self._active_since is None:
+                self._active_since = time.monotonic()
+
+    def _stop(self):
+        with self._lock:
+            if self._active_since is not None:
+                self._seconds += time.monotonic() - self._active_since
+                self._active_since = None
+
+
+_local = threading.local()
+
+
+def current_budget() -> Optional[DocumentBudget]:
+    """Budget du document en cours sur ce thread (None hors d'une étape: pas de plafond)."""
+    return getattr(_local, "budget", None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Échéance du document en cours sur ce thread (None: délais par défaut des appels)."""
+    budget = current_budget()
+    return budget.deadline if budget is not None else None
+
+
+@contextmanager
+def activate(budget: Optional[DocumentBudget]):
+    """Rend `budget` courant pour le thread le temps d'une étape et compte son temps d'exécution."""
+    previous = current_budget()
+    _local.budget = budget
+    if budget is not None:
+        budget._start()
+    try:
+        yield budget
+    finally:
+        if budget is not None:
+            budget._stop()
+        _local.budget = previous
+
+
+def budget_allows(label: str = "repli") -> bool:
+    """Vrai si une escalade ou un repli coûteux peut encore être tenté (sans réserver d'appel)."""
+    budget = current_budget()
+    reason = budget.exhausted_reason() if budget is not None else None
+    if reason is None:
+        return True
+    budget.refuse(reason, label)
+    return False
@@ -0,0 +1,157 @@
+"""
+Découpage des entrées LLM en chunks mesurés en tokens et alignés sur les questions.
+
+Remplace les découpes par caractères (`[:40000]`, `[:25000]`, batchs de 10 000
+caractères) qui perdaient silencieusement la fin du texte et coupaient les
+questions entre deux appels.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Budget d'entrée (en tokens) par modèle. La sortie JSON des extractions est du
+# même ordre de grandeur que l'entrée, on garde donc une large marge sous la
+# fenêtre de contexte.
+MODEL_TOKEN_BUDGETS: Dict[str, int] = {
+    "mistral-small-latest": 8000,
+    "mistral-medium-latest": 12000,
+    "mistral-large-latest": 12000,
+}
+DEFAULT_TOKEN_BUDGET = 8000
+
+# Ratio prudent caractères/token pour du français médical quand le tokenizer
+# Mistral n'est pas installé (surestime légèrement le nombre de tokens).
+CHARS_PER_TOKEN = 3.2
+
+# Titre de question en tête de ligne: "## Q16.", "Q.16:", "Question 16 :", ou numéro seul
+# en titre Markdown ou en gras ("## 16.", "**16)**"). Un "1." nu est une énumération dans
+# l'énoncé ou une proposition, pas un début de question.
+QUESTION_BOUNDARY_PATTERN = re.compile(
+    r'^[ \t]*(?:(?:#+[ \t]*)?(?:\*\*)?Q(?:uestion)?[ \t]*\.?[ \t]*(\d{1,3})(?!\d)'
+    r'|(?:#+[ \t]*(?:\*\*)?|\*\*)(\d{1,3})[ \t]*[\.\)](?!\d))',
+    re.MULTILINE | re.IGNORECASE
+)
+
+_tokenizer = None
+_tokenizer_loaded = False
+
+
+def _get_tokenizer():
+    """Charge le tokenizer Mistral si `mistral_common` est disponible."""
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        try:
+            from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+            _tokenizer = MistralTokenizer.v3().instruct_tokenizer.tokenizer
+        except Exception:
+            _tokenizer = None
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """Compte (ou estime) le nombre de tokens d'un texte."""
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, bos=False, eos=False))
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def get_token_budget(model: str) -> int:
+    """Retourne le budget de tokens d'entrée pour un modèle."""
+    return MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+
+def find_question_boundaries(text: str) -> List[Tuple[int, int]]:
+    """Retourne les débuts de question détectés sous forme de (offset, numéro)."""
+    boundaries = []
+    for match in QUESTION_BOUNDARY_PATTERN.finditer(text):
+        numero = match.group(1) or match.group(2)
+        boundaries.append((match.start(), int(numero)))
+    return boundaries
+
+
+def split_at_questions(text: str) -> List[str]:
+    """Découpe un texte en segments commençant chacun à un début de question.
+
+    Le texte précédant la première question (en-tête de page, fin de la question
+    de la page précédente) forme le premier segment. Aucun caractère n'est perdu:
+    la concaténation des segments redonne le texte d'origine.
+    """
+    offsets = [offset for offset, _ in find_question_boundaries(text)]
+    if not offsets or offsets[0] != 0:
+        offsets = [0] + offsets
+    offsets.append(len(text))
+    return [text[start:end] for start, end in zip(offsets, offsets[1:]) if text[start:end]]
+
+
+class ChunkPacker:
+    """Regroupe des sections (pages, questions) en chunks sous un budget de tokens.
+
+    Les sections sont ajoutées telles quelles tant que le budget le permet. Une
+    section trop grande est redécoupée aux frontières de questions; une question
+    qui dépasse à elle seule le budget forme un chunk surdimensionné plutôt que
+    d'être tronquée.
+    """
+
+    def __init__(self, model: str = None, token_budget: Optional[int] = None, separator: str = "\n\n"):
+        self.model = model
+        self.token_budget = token_budget or get_token_budget(model)
+        self.separator = separator
+        self._separator_tokens = count_tokens(separator)
+
+    def pack(self, sections: List[str]) -> List[str]:
+        """Regroupe les sections en chunks, dans l'ordre, sans perte de contenu."""
+        return [self.separator.join(chunk) for chunk in self.pack_groups(sections)]
+
+    def pack_groups(self, sections: List[str]) -> List[List[str]]:
+        """Comme `pack`, mais retourne les sections de chaque chunk séparément."""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        current_tokens = 0
+
+        for section in sections:
+            if not section or not section.strip():
+                continue
+
+            section_tokens = count_tokens(section)
+            pieces = [(section, section_tokens)]
+            if section_tokens > self.token_budget:
+                pieces = [(piece, count_tokens(piece)) for piece in self._split_oversized(section)]
+
+            for piece, piece_tokens in pieces:
+                added_tokens = piece_tokens + (self._separator_tokens if current else 0)
+                if current and current_tokens + added_tokens > self.token_budget:
+                    groups.append(current)
+                    current, current_tokens = [], 0
+                    added_tokens = piece_tokens
+
+                if not current and piece_tokens > self.token_budget:
+                    print(f"    ⚠️ Question de {piece_tokens} tokens au-delà du budget ({self.token_budget}), envoyée seule sans troncature")
+
+                current.append(piece)
+                current_tokens += added_tokens
+
+        if current:
+            groups.append(current)
+        return groups
+
+    def _split_oversized(self, section: str) -> List[str]:
+        """Redécoupe une section trop grande en paquets de questions consécutives."""
+        pieces: List[str] = []
+        current = ""
+        for segment in split_at_questions(section):
+            if current and count_tokens(current + segment) > self.token_budget:
+                pieces.append(current)
+                current = segment
+            else:
+                current += segment
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def fits(self, text: str) -> bool:
+        """Indique si un texte tient dans le budget en un seul appel."""
+        return count_tokens(text) <= self.token_budget
@@ -0,0 +1,96 @@
+"""
+Construction différée des clients Mistral et Supabase.
+
+`mistralai` et `supabase` (et leurs dépendances: httpx, pydantic, gotrue...)
+coûtent plusieurs centaines de millisecondes à l'import. Ils ne sont importés
+qu'à la création du premier client, pour que l'aide des commandes, les
+commandes de métadonnées et l'analyse locale du Markdown démarrent sans eux.
+`LazyClient` permet aux scripts de garder un client global au niveau du module
+sans le construire à l'import.
+
+Les clients ont un délai par défaut (aucune requête sans délai). Chaque
+requête PostgREST le ramène au temps restant avant l'échéance du document actif
+dans le thread appelant (deadline.py): le client peut être partagé, rien n'est
+modifié en dehors de la requête.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Optional
+
+from qcm_extraction.budget import current_deadline
+from qcm_extraction.deadline import CHAT_TIMEOUT, DB_TIMEOUT, MIN_CALL_TIMEOUT
+
+
+def create_mistral_client(api_key: Optional[str] = None, timeout: float = CHAT_TIMEOUT):
+    """Client Mistral (import de mistralai au premier appel), `timeout` secondes par requête par défaut."""
+    from mistralai import Mistral
+    return Mistral(api_key=api_key or os.getenv("MISTRAL_API_KEY"), timeout_ms=int(timeout * 1000))
+
+
+def create_supabase_client(url: Optional[str] = None, key: Optional[str] = None, timeout: float = DB_TIMEOUT):
+    """Client Supabase (import de supabase au premier appel), `timeout` secondes par requête.
+
+    Sous l'échéance d'un document, chaque requête PostgREST reçoit le temps
+    restant (voir `deadline_db_timeout`).
+    """
+    from supabase import ClientOptions, create_client
+    options = ClientOptions(postgrest_client_timeout=timeout, storage_client_timeout=int(timeout))
+    client = create_client(url or os.getenv("SUPABASE_URL"), key or os.getenv("SUPABASE_KEY"), options=options)
+    bound_db_timeouts(client, lambda: deadline_db_timeout(timeout))
+    return client
+
+
+def deadline_db_timeout(cap: float = DB_TIMEOUT) -> Optional[float]:
+    """Délai d'une requête Supabase sous l'échéance active (au moins 1 s pour enregistrer l'état partiel)."""
+    deadline = current_deadline()
+    if deadline is None:
+        return None
+    return max(MIN_CALL_TIMEOUT, min(cap, deadline.remaining()))
+
+
+def bound_db_timeouts(client: Any, timeout_for: Callable[[], Optional[float]]):
+    """Fixe le délai de chaque requête PostgREST de `client` au moment de l'envoi (hook httpx).
+
+    `timeout_for()` est évalué dans le thread qui envoie la requête; None garde
+    le délai par défaut du client.
+    """
+    session = getattr(getattr(client, "postgrest", None), "session", None)
+    if session is None:
+        return
+
+    def set_timeout(request):
+        timeout = timeout_for()
+        if timeout is not None:
+            request.extensions["timeout"] = {"connect": timeout, "read": timeout, "write": timeout, "pool": timeout}
+
+    hooks = session.event_hooks
+    hooks["request"] = list(hooks.get("request", [])) + [set_timeout]
+    session.event_hooks = hooks
+
+
+class LazyClient:
+    """Proxy qui construit le client au premier accès à un de ses attributs."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+
+def lazy_mistral(api_key: Optional[str] = None) -> LazyClient:
+    return LazyClient(lambda: create_mistral_client(api_key))
+
+
+def lazy_supabase(url: Optional[str] = None, key: Optional[str] = None) -> LazyClient:
+    return LazyClient(lambda: create_supabase_client(url, key))
@@ -1,7 +1,9 @@
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
-from supabase import create_client, Client
+
+from .clients import create_supabase_client
+from .images import ImageUploader
 
 class Database:
     def __init__(self):
@@ -15,10 +17,11 @@ class Database:
             raise ValueError("Les variables d'environnement SUPABASE_URL et SUPABASE_KEY sont requises")
         
         # Connexion à Supabase
-        self.client: Client = create_client(self.supabase_url, self.supabase_key)
+        self.client = create_supabase_client(self.supabase_url, self.supabase_key)
         
         # Configuration du bucket de stockage pour les images
         self.bucket_name = "qcm_images"
+        self.images = ImageUploader(self.client, self.supabase_url, self.bucket_name)
         
         # Cache pour les IDs fréquemment utilisés
         self._cache: Dict[str, Dict[str, str]] = {
@@ -120,26 +123,9 @@ class Database:
         return result.data[0]["id"]
     
     def upload_image(self, file_path: str, qcm_id: str, question_num: int) -> str:
-        """Upload une image vers le stockage Supabase"""
-        import mimetypes
-        from pathlib import Path
-        
-        # Déterminer le type MIME
-        content_type, _ = mimetypes.guess_type(file_path)
-        if not content_type:
-            content_type = 'image/jpeg'  # Par défaut
-            
-        # Construire le chemin de stockage
-        filename = Path(file_path).name
-        storage_path = f"{qcm_id}/q{question_num}_{filename}"
-        
-        # Upload du fichier
-        with open(file_path, 'rb') as f:
-            self.client.storage.from_(self.bucket_name).upload(
-                path=storage_path,
-                file=f,
-                file_options={"content-type": content_type}
-            )
-        
-        # Construire l'URL publique
-        return f"{self.supabase_url}/storage/v1/object/public/{self.bucket_name}/{storage_path}" 
\ No newline at end of file
+        """Upload une image vers le stockage Supabase (adresse dérivée du contenu: pas de doublon)"""
+        return self.images.upload_files([file_path])[str(file_path)]
+    
+    def upload_images(self, images: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """Upload par lot des images de questions ({"question_id", "path"}) et insertion groupée des lignes images"""
+        return self.images.upload_question_images(images)
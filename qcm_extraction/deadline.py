@@ -0,0 +1,59 @@
+"""
+Échéance de bout en bout d'un document et délais des appels réseau.
+
+Chaque document reçoit une `Deadline` (temps réel, attente dans les files du
+pipeline comprise) portée par son `DocumentBudget`. Chaque appel réseau
+(téléchargement, OCR, chat, Supabase) reçoit un délai dérivé du temps restant,
+plafonné par le délai par défaut de son type: une connexion bloquée ne peut
+plus immobiliser un worker au-delà de l'échéance.
+
+À l'échéance, le budget refuse les appels API suivants (raison « délai »):
+les étapes restantes se terminent avec les méthodes locales, l'état partiel
+(questions trouvées, état des pages) est enregistré, le résultat est marqué
+`partial` et le worker passe au document suivant.
+"""
+
+import time
+from typing import Optional
+
+DEFAULT_DEADLINE_SECONDS = 1200.0   # au-delà du budget d'exécution (900 s): les files du pipeline comptent
+DOWNLOAD_TIMEOUT = 60.0             # secondes par téléchargement de PDF
+CONNECT_TIMEOUT = 10.0
+OCR_TIMEOUT = 300.0
+CHAT_TIMEOUT = 120.0
+DB_TIMEOUT = 30.0
+MIN_CALL_TIMEOUT = 1.0
+
+
+class DeadlineExceeded(TimeoutError):
+    """Échéance du document dépassée."""
+
+
+class Deadline:
+    """Échéance absolue (horloge monotone) d'un document."""
+
+    def __init__(self, seconds: float = DEFAULT_DEADLINE_SECONDS):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, label: str = "document"):
+        """Lève DeadlineExceeded si l'échéance est dépassée."""
+        if self.expired:
+            raise DeadlineExceeded(f"échéance de {self.seconds:.0f}s dépassée ({label})")
+
+    def timeout(self, cap: float, label: str = "appel") -> float:
+        """Délai d'un appel: temps restant plafonné par `cap` (lève DeadlineExceeded si dépassé)."""
+        self.check(label)
+        return max(MIN_CALL_TIMEOUT, min(cap, self.remaining()))
+
+
+def call_timeout(deadline: Optional[Deadline], cap: float, label: str = "appel") -> float:
+    """Délai d'un appel réseau: `cap` sans échéance, sinon dérivé du temps restant."""
+    return cap if deadline is None else deadline.timeout(cap, label)
@@ -0,0 +1,101 @@
+"""
+Représentation unique du Markdown OCR d'un QCM, construite une fois après l'OCR.
+
+Un `Document` garde le texte dans un seul buffer et décrit les pages par des
+intervalles d'offsets: le découpage `# Page N` n'est fait qu'une fois et toutes
+les phases (questions, propositions, réponses), l'état par page et les scripts
+de correction partagent la même vue des frontières de pages. Le texte normalisé,
+l'index des titres et les hash de pages sont calculés à la première utilisation
+puis conservés.
+"""
+
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Union
+
+from qcm_extraction.fingerprint import normalize_text
+from qcm_extraction.headings import HeadingIndex
+from qcm_extraction.pages import PAGE_HEADER_PATTERN, page_hash, page_question_numbers
+
+
+class Page(NamedTuple):
+    """Page du document: en-tête à `header_start`, contenu entre `start` et `end`."""
+    page_num: int
+    header_start: int
+    start: int
+    end: int
+
+
+class Document:
+    """Markdown OCR d'un QCM avec ses pages, son index des titres et ses hash de pages."""
+
+    def __init__(self, text: str, path: Optional[str] = None):
+        self.text = text
+        self.path = str(path) if path else None
+        headers = list(PAGE_HEADER_PATTERN.finditer(text))
+        if headers:
+            self.pages = [
+                Page(int(match.group(1)), match.start(), match.end(),
+                     headers[i + 1].start() if i + 1 < len(headers) else len(text))
+                for i, match in enumerate(headers)
+            ]
+        else:
+            # Document sans marqueurs de page: une seule page
+            self.pages = [Page(1, 0, 0, len(text))] if text.strip() else []
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path]) -> "Document":
+        """Lit un `content.md` et construit le document."""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read(), path)
+
+    def page_content(self, page: Page) -> str:
+        """Contenu d'une page, sans son en-tête."""
+        return self.text[page.start:page.end].strip()
+
+    def page_sections(self) -> List[Dict[str, Any]]:
+        """Pages non vides: [{"index", "page_num", "content"}] (index à partir de 1)."""
+        sections = []
+        for i, page in enumerate(self.pages):
+            content = self.page_content(page)
+            if content:
+                sections.append({"index": i + 1, "page_num": page.page_num, "content": content})
+        return sections
+
+    @cached_property
+    def headings(self) -> HeadingIndex:
+        """Index des titres de questions et des lignes A–E (voir `headings.py`)."""
+        return HeadingIndex(self.text, [(page.header_start, page.page_num) for page in self.pages])
+
+    @cached_property
+    def normalized_text(self) -> str:
+        """Texte sans en-têtes de pages, normalisé comme pour les empreintes."""
+        return normalize_text(" ".join(self.page_content(page) for page in self.pages))
+
+    @cached_property
+    def page_hashes(self) -> Dict[int, str]:
+        """Hash du contenu de chaque page."""
+        return {page.page_num: page_hash(self.page_content(page)) for page in self.pages}
+
+    def page_state(self, known_numbers: Optional[Set[int]] = None) -> Dict[int, Dict[str, Any]]:
+        """État par page: {page_num: {"content_hash", "question_numbers"}} (table `qcm_pages`)."""
+        numbers = page_question_numbers(
+            [{"page_num": page.page_num, "content": self.page_content(page)} for page in self.pages], known_numbers
+        )
+        return {
+            page_num: {"content_hash": content_hash, "question_numbers": numbers[page_num]}
+            for page_num, content_hash in self.page_hashes.items()
+        }
+
+    def select_pages(self, page_nums: Iterable[int]) -> "Document":
+        """Document restreint aux pages demandées (avec leurs en-têtes)."""
+        page_nums = set(page_nums)
+        return Document("\n\n".join(
+            f"# Page {page.page_num}\n\n{self.page_content(page)}"
+            for page in self.pages if page.page_num in page_nums
+        ), self.path)
+
+
+def as_document(source: Union[str, Document]) -> Document:
+    """Accepte un `Document` ou du Markdown brut (scripts existants)."""
+    return source if isinstance(source, Document) else Document(source)
@@ -0,0 +1,236 @@
+"""
+Export compact du corpus de QCM (instantanés JSONL ou Parquet).
+
+Le corpus est lu par pages de QCM avec une sélection imbriquée PostgREST
+(`qcm` → `questions` → `reponses` en une requête par page) et une pagination
+par clé sur l'identifiant du QCM: l'ordre est stable d'un export à l'autre et
+le corpus complet ne coûte que quelques dizaines de requêtes.
+
+Formats:
+  - JSONL: une ligne par QCM, questions triées par numéro et propositions par
+    lettre (`.jsonl.gz` compressé);
+  - Parquet: un fichier par table (qcm, questions, reponses), écrit par groupes
+    de lignes au fil de la lecture (pyarrow requis).
+
+Export incrémental: `qcm.updated_at` (mis à jour par trigger à chaque
+modification d'une question ou d'une réponse) sert de filigrane. Le filigrane
+suivant est lu avant l'export: un QCM modifié pendant l'export sera réexporté
+la fois suivante plutôt que perdu.
+"""
+
+import gzip
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+EXPORT_PAGE_SIZE = 20   # QCM par requête (chacun avec ses questions et propositions imbriquées)
+MANIFEST_NAME = "manifest.json"
+WATERMARK_NAME = "watermark.json"
+
+QCM_COLUMNS = "id,uuid,type,annee,date_examen,updated_at"
+QUESTION_COLUMNS = "id,uuid,numero,contenu"
+REPONSE_COLUMNS = "id,uuid,lettre,est_correcte,latex,contenu"
+
+
+def nested_qcm_select(filter_ue: bool = False) -> str:
+    """Sélection PostgREST d'un QCM avec son UE, ses questions et leurs propositions (une requête)."""
+    # Jointure interne sur l'UE uniquement si on filtre dessus
+    ue_join = "ue!inner(numero)" if filter_ue else "ue(numero)"
+    return f"{QCM_COLUMNS},{ue_join},questions({QUESTION_COLUMNS},reponses({REPONSE_COLUMNS}))"
+
+
+def current_watermark(supabase) -> Optional[str]:
+    """Plus grand `updated_at` des QCM: filigrane du prochain export incrémental."""
+    result = supabase.table("qcm").select("updated_at").order("updated_at", desc=True).limit(1).execute()
+    return result.data[0]["updated_at"] if result.data else None
+
+
+def normalize_qcm(qcm: Dict[str, Any]) -> Dict[str, Any]:
+    """QCM à plat (ue_numero) avec questions et propositions dans un ordre stable."""
+    ue = qcm.pop("ue", None) or {}
+    qcm["ue_numero"] = ue.get("numero")
+    questions = sorted(qcm.get("questions") or [], key=lambda q: (q["numero"], str(q["id"])))
+    for question in questions:
+        question["reponses"] = sorted(question.get("reponses") or [], key=lambda r: (r["lettre"], r["id"]))
+    qcm["questions"] = questions
+    return qcm
+
+
+def iter_corpus(supabase, ue: Optional[str] = None, annee: Optional[str] = None, since: Optional[str] = None,
+                page_size: int = EXPORT_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """QCM complets (questions et propositions imbriquées) par identifiant croissant.
+
+    `since`: seulement les QCM modifiés strictement après ce filigrane.
+    """
+    last_id = 0
+    while True:
+        query = supabase.table("qcm").select(nested_qcm_select(bool(ue))).gt("id", last_id)
+        if ue:
+            query = query.eq("ue.numero", ue)
+        if annee:
+            query = query.eq("annee", annee)
+        if since:
+            query = query.gt("updated_at", since)
+        page = query.order("id").limit(page_size).execute().data or []
+        for qcm in page:
+            yield normalize_qcm(qcm)
+        if len(page) < page_size:
+            return
+        last_id = page[-1]["id"]
+
+
+class JsonlWriter:
+    """Une ligne JSON par QCM (clés triées), compressée en gzip par défaut."""
+
+    def __init__(self, output_dir: Path, compress: bool = True):
+        self.path = output_dir / ("qcm.jsonl.gz" if compress else "qcm.jsonl")
+        self._file = gzip.open(self.path, "wt", encoding="utf-8") if compress else open(self.path, "w", encoding="utf-8")
+
+    def write(self, qcm: Dict[str, Any]):
+        self._file.write(json.dumps(qcm, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str))
+        self._file.write("\n")
+
+    def close(self) -> List[str]:
+        self._file.close()
+        return [str(self.path)]
+
+
+class ParquetWriter:
+    """Un fichier Parquet par table, écrit par groupes de lignes (contenu JSONB sérialisé en texte)."""
+
+    ROW_GROUP_QCM = 200
+
+    def __init__(self, output_dir: Path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("pyarrow est requis pour l'export Parquet (pip install pyarrow)")
+        self._pa = pa
+        self.output_dir = output_dir
+        self.schemas = {
+            "qcm": pa.schema([("id", pa.int64()), ("uuid", pa.string()), ("ue_numero", pa.string()),
+                              ("type", pa.string()), ("annee", pa.string()), ("date_examen", pa.string()),
+                              ("updated_at", pa.string())]),
+            "questions": pa.schema([("id", pa.string()), ("uuid", pa.string()), ("qcm_id", pa.int64()),
+                                    ("numero", pa.int32()), ("contenu", pa.string())]),
+            "reponses": pa.schema([("id", pa.int64()), ("uuid", pa.string()), ("question_id", pa.string()),
+                                   ("qcm_id", pa.int64()), ("lettre", pa.string()), ("est_correcte", pa.bool_()),
+                                   ("latex", pa.string()), ("contenu", pa.string())]),
+        }
+        self._writers = {name: pq.ParquetWriter(str(output_dir / f"{name}.parquet"), schema, compression="zstd")
+                         for name, schema in self.schemas.items()}
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {name: [] for name in self.schemas}
+        self._pending_qcm = 0
+
+    def write(self, qcm: Dict[str, Any]):
+        self._buffers["qcm"].append({key: qcm.get(key) for key in self.schemas["qcm"].names})
+        for question in qcm["questions"]:
+            self._buffers["questions"].append({
+                "id": question["id"], "uuid": question["uuid"], "qcm_id": qcm["id"],
+                "numero": question["numero"], "contenu": json.dumps(question["contenu"], ensure_ascii=False),
+            })
+            for reponse in question["reponses"]:
+                self._buffers["reponses"].append({
+                    "id": reponse["id"], "uuid": reponse["uuid"], "question_id": question["id"], "qcm_id": qcm["id"],
+                    "lettre": reponse["lettre"], "est_correcte": reponse["est_correcte"], "latex": reponse.get("latex"),
+                    "contenu": json.dumps(reponse["contenu"], ensure_ascii=False),
+                })
+        self._pending_qcm += 1
+        if self._pending_qcm >= self.ROW_GROUP_QCM:
+            self._flush()
+
+    def _flush(self):
+        for name, rows in self._buffers.items():
+            if rows:
+                self._writers[name].write_table(self._pa.Table.from_pylist(rows, schema=self.schemas[name]))
+                rows.clear()
+        self._pending_qcm = 0
+
+    def close(self) -> List[str]:
+        self._flush()
+        for writer in self._writers.values():
+            writer.close()
+        return [str(self.output_dir / f"{name}.parquet") for name in self.schemas]
+
+
+def load_watermark(output_root: Path, key: str) -> Optional[str]:
+    try:
+        with open(output_root / WATERMARK_NAME, "r", encoding="utf-8") as f:
+            return json.load(f).get(key)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_watermark(output_root: Path, key: str, watermark: Optional[str]):
+    path = output_root / WATERMARK_NAME
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            watermarks = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        watermarks = {}
+    watermarks[key] = watermark
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(watermarks, f, ensure_ascii=False, indent=2)
+
+
+def export_snapshot(supabase, output_root, fmt: str = "jsonl", ue: Optional[str] = None, annee: Optional[str] = None,
+                    since: Optional[str] = None, incremental: bool = False, compress: bool = True) -> Dict[str, Any]:
+    """Écrit un instantané dans `output_root/<horodatage>/` et retourne son manifeste.
+
+    Avec incremental=True, `since` est le filigrane du dernier export de la même
+    sélection (UE/année/format), mis à jour à la fin de l'export.
+    """
+    output_root = Path(output_root)
+    key = f"{fmt}|{ue or '*'}|{annee or '*'}"
+    if incremental and since is None:
+        since = load_watermark(output_root, key)
+    watermark = current_watermark(supabase)
+
+    snapshot_dir = output_root / time.strftime("%Y%m%dT%H%M%S")
+    suffix = 1
+    while snapshot_dir.exists():
+        snapshot_dir = output_root / f"{time.strftime('%Y%m%dT%H%M%S')}-{suffix}"
+        suffix += 1
+    snapshot_dir.mkdir(parents=True)
+    writer = ParquetWriter(snapshot_dir) if fmt == "parquet" else JsonlWriter(snapshot_dir, compress)
+    counts = {"qcm": 0, "questions": 0, "reponses": 0}
+    started = time.time()
+    try:
+        for qcm in iter_corpus(supabase, ue=ue, annee=annee, since=since):
+            writer.write(qcm)
+            counts["qcm"] += 1
+            counts["questions"] += len(qcm["questions"])
+            counts["reponses"] += sum(len(question["reponses"]) for question in qcm["questions"])
+    finally:
+        files = writer.close()
+
+    manifest = {
+        "format": fmt,
+        "filters": {"ue": ue, "annee": annee},
+        "since": since,
+        "watermark": watermark,
+        "counts": counts,
+        "files": [Path(path).name for path in files],
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "duration_seconds": round(time.time() - started, 1),
+    }
+    with open(snapshot_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    if incremental:
+        save_watermark(output_root, key, watermark)
+    manifest["path"] = str(snapshot_dir)
+    return manifest
+
+
+def read_jsonl_snapshot(path) -> Iterator[Dict[str, Any]]:
+    """Relit un instantané JSONL (fichier ou dossier d'instantané), un QCM à la fois."""
+    path = Path(path)
+    if path.is_dir():
+        path = next(iter(sorted(path.glob("qcm.jsonl*"))))
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
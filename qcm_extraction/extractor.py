@@ -4,34 +4,54 @@ import base64
 import json
 import time
 import uuid
-from typing import Dict, List, Any, Tuple
+from functools import cached_property
+from typing import Dict, List, Any, Optional, Set, Tuple
 from datetime import datetime
 from pathlib import Path
-import requests
-from PIL import Image
-from pdf2image import convert_from_path
-from mistralai import Mistral, UserMessage
-from io import BytesIO
-from supabase import create_client, Client
+
+# requests, PIL, pdf2image, mistralai et supabase sont importés à la première utilisation:
+# importer ce module (aide des commandes, analyse locale) reste rapide
+from qcm_extraction.answers import apply_correct_answers, parse_correct_answers
+from qcm_extraction.budget import DocumentBudget, activate, budget_allows, current_deadline
+from qcm_extraction.chunking import ChunkPacker
+from qcm_extraction.clients import create_mistral_client, create_supabase_client
+from qcm_extraction.deadline import CHAT_TIMEOUT, CONNECT_TIMEOUT, DOWNLOAD_TIMEOUT, OCR_TIMEOUT, call_timeout
+from qcm_extraction.document import Document, as_document
+from qcm_extraction.figures import drop_repeated, link_figures, load_manifest, save_manifest, save_page_figures
+from qcm_extraction.fingerprint import compute_fingerprint, find_duplicate_candidates, save_fingerprint
+from qcm_extraction.images import ImageUploader
+from qcm_extraction.markdown_index import register_markdown
+from qcm_extraction.pages import diff_page_states, load_page_state, save_page_state
+from qcm_extraction.reader import invalidate_qcm
+from qcm_extraction.report import fetch_question_rollup
+from qcm_extraction.retry import APICallError, call_api
+from qcm_extraction.reuse import find_reusable, question_hashes, record_reuse, save_question_hashes
+from qcm_extraction.routing import page_features, shared_router, validate_propositions, validate_questions
 
 class QCMExtractor:
-    def __init__(self, api_key: str = None, supabase_url: str = None, supabase_key: str = None):
-        """Initialise l'extracteur avec la clé API Mistral et les credentials Supabase"""
+    def __init__(self, api_key: str = None, supabase_url: str = None, supabase_key: str = None,
+                 extract_figures: bool = False, budget_limits: Optional[Dict[str, float]] = None,
+                 hedge_requests: bool = False):
+        """Initialise l'extracteur avec la clé API Mistral et les credentials Supabase
+        
+        Avec extract_figures=True, les figures des questions sont récupérées dans la
+        réponse OCR et rattachées aux questions (voir qcm_extraction/figures.py).
+        budget_limits (max_calls, max_tokens, max_seconds, deadline_seconds) plafonne les
+        appels API de chaque document et fixe son échéance de bout en bout, d'où sont
+        dérivés les délais des appels réseau (voir qcm_extraction/budget.py et
+        qcm_extraction/deadline.py). Avec hedge_requests=True,
+        les appels chat à temperature 0 trop lents sont doublés (voir qcm_extraction/hedging.py)."""
         # Configuration Mistral
         self.api_key = api_key or os.getenv("MISTRAL_API_KEY")
         if not self.api_key:
             raise ValueError("La clé API Mistral est requise")
         
-        self.client = Mistral(api_key=self.api_key)
-        
         # Configuration Supabase
         self.supabase_url = supabase_url or os.getenv("SUPABASE_URL")
         self.supabase_key = supabase_key or os.getenv("SUPABASE_KEY")
         if not self.supabase_url or not self.supabase_key:
             raise ValueError("Les credentials Supabase sont requis")
         
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
-        
         # Créer la structure de dossiers
         self.base_dir = Path("qcm_extraction")
         self.temp_dir = self.base_dir / "temp"
@@ -43,33 +63,46 @@ class QCMExtractor:
         # Créer tous les dossiers nécessaires
         for dir_path in [self.temp_dir, self.pdfs_dir, self.images_dir, self.outputs_dir, self.logs_dir]:
             dir_path.mkdir(parents=True, exist_ok=True)
-    
-    def _call_api_with_retry(self, func, *args, max_retries=3, delay=2, **kwargs):
-        """Appelle une fonction API avec retry en cas d'erreur"""
-        last_error = None
         
-        for attempt in range(max_retries):
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                last_error = e
-                if "rate limit exceeded" in str(e).lower() and attempt < max_retries - 1:
-                    print(f"⚠️ Rate limit atteint, attente de {delay} secondes...")
-                    time.sleep(delay)
-                    delay *= 2  # Augmenter le délai à chaque tentative
-                else:
-                    print(f"⚠️ Erreur API (tentative {attempt + 1}/{max_retries}): {str(e)}")
-                    if attempt < max_retries - 1:
-                        print(f"⏳ Nouvelle tentative dans {delay} secondes...")
-                        time.sleep(delay)
+        self.extract_figures = extract_figures
+        self.budget_limits = dict(budget_limits or {})
+        self.hedge_requests = hedge_requests
         
-        # Si on arrive ici, toutes les tentatives ont échoué
-        print(f"❌ Échec après {max_retries} tentatives. Dernière erreur: {str(last_error)}")
-        return None
+        # Routage adaptatif des appels LLM: un routeur par processus, statistiques persistées par lots
+        self.router = shared_router(self.logs_dir / "model_routing_stats.json")
+    
+    @cached_property
+    def client(self):
+        """Client Mistral, construit au premier appel API."""
+        return create_mistral_client(self.api_key)
+
+    @cached_property
+    def supabase(self):
+        """Client Supabase, construit à la première requête."""
+        return create_supabase_client(self.supabase_url, self.supabase_key)
+
+    @cached_property
+    def image_uploader(self) -> ImageUploader:
+        """Upload groupé et dédoublonné des figures vers le bucket qcm_images."""
+        return ImageUploader(self.supabase, self.supabase_url)
+    
+    def _call_api_with_retry(self, func, *args, max_retries=3, delay=2, timeout=CHAT_TIMEOUT, **kwargs):
+        """Appelle une fonction API avec retries (voir qcm_extraction/retry.py).
+        
+        Chaque tentative est limitée à `timeout` secondes, ramené au temps restant
+        avant l'échéance du document. Lève APICallError (catégorie: rate_limit, server,
+        timeout, client, circuit_open, budget, deadline...) si l'appel échoue
+        définitivement, au lieu de retourner None.
+        Seuls les appels déterministes (temperature 0, donc idempotents) sont doublés."""
+        return call_api(func, *args, max_retries=max_retries, delay=delay, timeout=timeout,
+                        hedge=self.hedge_requests, **kwargs)
     
     def download_pdf(self, url: str) -> str:
-        """Télécharge un PDF depuis une URL"""
-        response = requests.get(url)
+        """Télécharge un PDF depuis une URL (borné par l'échéance du document)"""
+        import requests
+        deadline = current_deadline()
+        read_timeout = call_timeout(deadline, DOWNLOAD_TIMEOUT, "téléchargement")
+        response = requests.get(url, timeout=(min(CONNECT_TIMEOUT, read_timeout), read_timeout), stream=True)
         response.raise_for_status()
         
         # Créer un dossier unique pour ce PDF
@@ -78,10 +111,13 @@ class QCMExtractor:
         pdf_dir = self.pdfs_dir / pdf_stem
         pdf_dir.mkdir(exist_ok=True)
         
-        # Sauvegarder le PDF
+        # Sauvegarder le PDF par blocs: le délai de lecture ne borne qu'un bloc, l'échéance borne le total
         pdf_path = pdf_dir / pdf_name
-        with open(pdf_path, "wb") as f:
-            f.write(response.content)
+        with response, open(pdf_path, "wb") as f:
+            for block in response.iter_content(chunk_size=1 << 13):
+                if deadline is not None:
+                    deadline.check("téléchargement")
+                f.write(block)
             
         return str(pdf_path)
     
@@ -95,6 +131,7 @@ class QCMExtractor:
         output_dir.mkdir(exist_ok=True)
         
         # Convertir le PDF en images
+        from pdf2image import convert_from_path
         images = convert_from_path(str(pdf_path))
         
         # Sauvegarder les images
@@ -123,26 +160,36 @@ class QCMExtractor:
         try:
             print("📝 Conversion du PDF en Markdown...")
             
-            # Utiliser l'URL originale pour l'API OCR
-            document_input = {"type": "document_url", "document_url": original_url}
+            if original_url and original_url.startswith(("http://", "https://")):
+                # Utiliser l'URL originale pour l'API OCR
+                document_input = {"type": "document_url", "document_url": original_url}
+            else:
+                # PDF local: envoyer directement les octets à l'OCR (data URL base64)
+                with open(pdf_path, "rb") as f:
+                    pdf_base64 = base64.b64encode(f.read()).decode("utf-8")
+                document_input = {"type": "document_url", "document_url": f"data:application/pdf;base64,{pdf_base64}"}
             
             # Appeler l'API OCR pour extraire le texte avec retry
-            ocr_response = self._call_api_with_retry(
-                self.client.ocr.process,
-                model="mistral-ocr-latest",
-                document=document_input,
-                include_image_base64=False
-            )
-            
-            # Vérifier si l'appel API a échoué
-            if ocr_response is None:
-                print("❌ Échec de l'appel API OCR pour la conversion en Markdown")
+            try:
+                ocr_response = self._call_api_with_retry(
+                    self.client.ocr.process,
+                    model="mistral-ocr-latest",
+                    document=document_input,
+                    include_image_base64=self.extract_figures,
+                    timeout=OCR_TIMEOUT
+                )
+            except APICallError as e:
+                print(f"❌ Échec de l'appel API OCR pour la conversion en Markdown ({e.category})")
                 return None
             
             # Extraire le texte de toutes les pages
             markdown_content = ""
+            figures = []
+            figures_dir = self.images_dir / Path(pdf_path).stem / "figures"
             for i, page in enumerate(ocr_response.pages):
                 markdown_content += f"# Page {i+1}\n\n"
+                if self.extract_figures:
+                    figures.extend(save_page_figures(page, i + 1, figures_dir))
                 
                 # Vérification de la qualité du texte extrait
                 page_markdown = page.markdown
@@ -168,7 +215,9 @@ class QCMExtractor:
                         quality_check_failed = True
                 
                 # Si l'extraction est de mauvaise qualité, essayer une méthode alternative
-                if quality_check_failed:
+                if quality_check_failed and i != 6 and not budget_allows("extraction par image"):
+                    print(f"💸 Budget épuisé: texte OCR de la page {i+1} conservé tel quel")
+                elif quality_check_failed:
                     print(f"⚠️ Qualité OCR faible détectée pour la page {i+1}, utilisation d'une méthode alternative...")
                     try:
                         # Si c'est la page 7 (index 6) et contient normalement les questions 16-18
@@ -240,6 +289,12 @@ D. Faux. Une chromatine dont les histones sont acétylées et l'ADN non méthyl
             with open(markdown_path, "w", encoding="utf-8") as f:
                 f.write(markdown_content)
             
+            if self.extract_figures:
+                # Logos et en-têtes répétés de page en page écartés par hash perceptuel
+                kept = drop_repeated(figures)
+                save_manifest(kept, output_dir)
+                print(f"🖼️ {len(kept)} figure(s) conservée(s) sur {len(figures)} image(s) OCR")
+            
             print(f"💾 Markdown sauvegardé: {markdown_path}")
             return str(markdown_path)
             
@@ -247,27 +302,11 @@ D. Faux. Une chromatine dont les histones sont acétylées et l'ADN non méthyl
             print(f"⚠️ Erreur lors de la conversion en Markdown: {str(e)}")
             return None
 
-    def save_to_supabase(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
-        """Sauvegarde les métadonnées dans Supabase"""
+    def save_to_supabase(self, metadata: Dict[str, Any], fingerprint: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Sauvegarde les métadonnées dans Supabase (et l'empreinte du contenu si fournie)"""
         try:
             print("💾 Sauvegarde dans Supabase...")
             
-            # Vérifier si un QCM avec ce type et année existe déjà
-            # Comme il n'y a pas de colonne metadata, nous vérifions par type et année
-            if metadata.get("type") and metadata.get("ue") and metadata.get("annee"):
-                try:
-                    type_qcm = metadata.get("type")
-                    annee = metadata.get("annee")
-                    
-                    existing_qcms = self.supabase.table("qcm").select("id", "type", "annee", "uuid").eq("type", type_qcm).eq("annee", annee).execute()
-                    
-                    if existing_qcms.data:
-                        # Le QCM existe déjà si type et année correspondent
-                        print(f"ℹ️ QCM de type '{type_qcm}' pour l'année '{annee}' existe déjà. ID: {existing_qcms.data[0]['id']}")
-                        return existing_qcms.data[0]
-                except Exception as check_err:
-                    print(f"⚠️ Erreur lors de la vérification des QCM existants: {str(check_err)}")
-            
             # Chercher l'ue_id correspondant dans la table 'ue'
             if metadata["ue"]:
                 result = self.supabase.table("ue").select("id").eq("numero", metadata["ue"]).execute()
@@ -280,6 +319,22 @@ D. Faux. Une chromatine dont les histones sont acétylées et l'ADN non méthyl
                 print("⚠️ Impossible de déterminer l'UE")
                 return None
             
+            # Les doublons de contenu sont détectés par empreinte avant cette étape; on vérifie ici
+            # la contrainte unique (type, annee, ue_id) pour ne pas échouer à l'insertion
+            if metadata.get("type") and metadata.get("annee"):
+                try:
+                    type_qcm = metadata.get("type")
+                    annee = metadata.get("annee")
+                    
+                    existing_qcms = self.supabase.table("qcm").select("id", "type", "annee", "uuid").eq("type", type_qcm).eq("annee", annee).eq("ue_id", ue_id).execute()
+                    
+                    if existing_qcms.data:
+                        print(f"ℹ️ QCM {metadata['ue']} de type '{type_qcm}' pour l'année '{annee}' existe déjà. ID: {existing_qcms.data[0]['id']}")
+                        # Même type, année et UE: QCM confirmé, réécrit en place par l'appelant
+                        return {**existing_qcms.data[0], "existing": True}
+                except Exception as check_err:
+                    print(f"⚠️ Erreur lors de la vérification des QCM existants: {str(check_err)}")
+            
             # Préparer les données pour Supabase en fonction du schéma réel
             supabase_data = {
                 "ue_id": ue_id,
@@ -297,6 +352,11 @@ D. Faux. Une chromatine dont les histones sont acétylées et l'ADN non méthyl
             
             if result.data:
                 print(f"✅ QCM sauvegardé dans Supabase (ID: {result.data[0]['id']})")
+                if fingerprint:
+                    try:
+                        save_fingerprint(self.supabase, result.data[0]['id'], fingerprint)
+                    except Exception as fp_err:
+                        print(f"⚠️ Erreur lors de la sauvegarde de l'empreinte: {str(fp_err)}")
                 # Stocker le chemin du fichier Markdown dans une variable d'instance
                 self._last_markdown_path = metadata.get('markdown_path')
                 return result.data[0]
@@ -308,230 +368,444 @@ D. Faux. Une chromatine dont les histones sont acétylées et l'ADN non méthyl
             print(f"⚠️ Erreur lors de la sauvegarde dans Supabase: {str(e)}")
             return None
 
-    def extract_metadata_from_path(self, url):
-        """Extrait les métadonnées d'un PDF à partir de son URL."""
+    # Étapes d'un document, dans l'ordre; exécutées à la suite par extract_metadata_from_path
+    # ou en pipeline (qcm_extraction/pipeline.py), chacune avec sa propre concurrence
+    DOCUMENT_STAGES = ("download", "ocr", "metadata", "questions", "propositions", "answers", "figures", "commit")
+
+    @staticmethod
+    def new_document_run(url, force: bool = False) -> Dict[str, Any]:
+        """État d'un document traversant les étapes (indépendant de l'extracteur qui l'exécute)."""
+        return {"url": url, "force": force, "result": None, "finished": False, "error": None}
+
+    def run_document_stage(self, run: Dict[str, Any], stage: str) -> bool:
+        """Exécute une étape sur un document; retourne False si le document est terminé (doublon, échec)."""
+        # Budget propre au document, quel que soit le thread (et l'extracteur) qui exécute l'étape
+        budget = run.setdefault("budget", DocumentBudget(**self.budget_limits))
+        deadline = budget.deadline
+        try:
+            with activate(budget):
+                if stage == "figures" and deadline is not None and deadline.expired:
+                    # Étape facultative: après l'échéance, passer à l'enregistrement de l'état partiel
+                    budget.refuse("délai", "figures")
+                else:
+                    getattr(self, f"_stage_{stage}")(run)
+        except Exception as e:
+            import traceback
+            run["error"] = str(e)
+            run["traceback"] = traceback.format_exc()
+            run["finished"] = True
+            if stage in ("download", "ocr", "metadata"):
+                print(f"⚠️ Erreur lors de l'extraction des métadonnées: {str(e)}")
+                run["result"] = None
+            else:
+                # Log plus détaillé de l'erreur; les métadonnées restent retournées
+                print(f"🔥 Erreur majeure lors du traitement des questions/propositions pour QCM ID {run.get('qcm_id')}: {str(e)}")
+                print(f"Traceback: {run['traceback']}")
+        # L'étape a pu écrire dans le QCM: la version en cache (reader.py) n'est plus à jour
+        invalidate_qcm(run.get("qcm_id"))
+        if isinstance(run.get("result"), dict):
+            run["result"]["api_budget"] = budget.summary()
+            if budget.refused:
+                # Des appels ont été refusés: extraction terminée avec les seules méthodes locales
+                run["result"]["partial"] = True
+        return not run["finished"]
+
+    def extract_metadata_from_path(self, url, force: bool = False):
+        """Extrait les métadonnées d'un PDF à partir de son URL (ou de son chemin local).
+        
+        Si les pages sont identiques à celles d'un QCM déjà importé (empreinte puis hash
+        des pages), retourne ce QCM avec 'existing': True sans appel LLM, sauf si force=True."""
+        return self.run_document(url, force)["result"]
+
+    def run_document(self, url, force: bool = False) -> Dict[str, Any]:
+        """Exécute toutes les étapes d'un document et retourne son état complet.
+        
+        Contrairement à extract_metadata_from_path, l'appelant voit `error` (et `traceback`)
+        quand une étape a échoué après l'enregistrement des métadonnées."""
         print("🔍 Extraction des métadonnées...")
+        run = self.new_document_run(url, force)
+        for stage in self.DOCUMENT_STAGES:
+            if not self.run_document_stage(run, stage):
+                break
+        return run
+
+    def _stage_download(self, run: Dict[str, Any]):
+        url = run["url"]
+        if os.path.isfile(url):
+            # PDF local (dossier surveillé): pas de téléchargement
+            run["pdf_path"] = url
+            print(f"📂 PDF local: {url}")
+        else:
+            # Télécharger le PDF
+            run["pdf_path"] = self.download_pdf(url)
+            print(f"📥 PDF téléchargé: {run['pdf_path']}")
+
+    def _stage_ocr(self, run: Dict[str, Any]):
+        # Convertir le PDF en Markdown en utilisant l'URL originale
+        markdown_path = self.convert_pdf_to_markdown(run["pdf_path"], run["url"])
+        if not markdown_path:
+            run["finished"] = True
+            return
+        run["markdown_path"] = markdown_path
+        # Document construit une seule fois: pages, index des titres et hash partagés par toutes les phases
+        run["document"] = Document.from_file(markdown_path)
+
+    def _stage_metadata(self, run: Dict[str, Any]):
+        url = run["url"]
+        document = run["document"]
+        markdown_path = run["markdown_path"]
+        
+        # Extraire les métadonnées du nom de fichier
+        filename = url.split('/')[-1]
+        
+        # Empreinte du contenu: QCM candidats en une requête, avant tout appel LLM
+        fingerprint = compute_fingerprint(document.text, document.normalized_text)
+        if fingerprint and not run["force"]:
+            try:
+                candidates = find_duplicate_candidates(self.supabase, fingerprint)
+            except Exception as fp_err:
+                print(f"⚠️ Erreur lors de la recherche par empreinte: {str(fp_err)}")
+                candidates = []
+            run["duplicate_candidates"] = candidates
+            
+            # Seules des pages identiques confirment le doublon sans métadonnées (questions recyclées ≠ même QCM)
+            identical = self._find_identical_qcm(document, candidates)
+            if identical:
+                print(f"ℹ️ Pages identiques à un QCM existant (ID: {identical['qcm_id']}, similarité: {identical['similarity']:.0%})")
+                run["result"] = {
+                    'filename': filename,
+                    'markdown_path': markdown_path,
+                    'url': url,
+                    'qcm_db_id': identical['qcm_id'],
+                    'existing': True,
+                    'duplicate_similarity': identical['similarity'],
+                    'incremental': {"changed_pages": [], "touched_questions": [], "deleted_questions": []},
+                    'document': document
+                }
+                run["finished"] = True
+                return
+            if candidates:
+                print(f"ℹ️ Contenu proche de {len(candidates)} QCM existant(s) (meilleur: ID {candidates[0]['qcm_id']}, "
+                      f"similarité {candidates[0]['similarity']:.0%}): à confirmer par les métadonnées")
+        
+        type_doc = "Unknown"
+        annee = None
+        ue = None
+        
+        # Utiliser l'IA pour extraire le type de document, l'année et l'UE
+        prompt = f"""Tu es un agent spécialisé dans l'analyse de documents PDF de QCM et corrections.
+        Voici un exemple de ce que je veux :
+        - Pour un fichier 'ue3-correction-cb1-s40-21-22-48479.pdf', le type doit être 'Concours Blanc N°1'
+        - Pour le texte 'SESSION 2021 / 2022', l'année doit être '2021 / 2022'
+        - Pour le texte 'UE2', l'UE doit être 'UE2'
+        
+        Analyse le texte suivant et détermine :
+        1. Le type de document (exactement 'Concours Blanc N°1' si c'est une correction de concours blanc, ou 'Colle N°1' si c'est une colle)
+        2. L'année de la session (format: 'XXXX / XXXX')
+        3. L'UE (format: 'UE1', 'UE2', etc.)
+        
+        Texte à analyser :
+        {document.text[:1000]}
+        
+        Réponds uniquement avec le format suivant, sans autre texte :
+        TYPE: [type]
+        ANNEE: [année]
+        UE: [ue]"""
+        
+        response_text = self._complete_with_routing(
+            "metadata",
+            document.text[:1000],
+            prompt,
+            parse=lambda response: response.choices[0].message.content.strip(),
+            validate=lambda result, _content: None if result and re.search(r'UE:\s*\S', result) else "TYPE/ANNEE/UE absents"
+        )
+        
+        # Vérifier si l'appel API a échoué
+        if response_text is None:
+            print("❌ Échec de l'appel API pour l'extraction des métadonnées")
+            run["finished"] = True
+            return
+        
+        # Parser la réponse de l'IA
+        type_match = re.search(r'TYPE:\s*(.*)', response_text)
+        annee_match = re.search(r'ANNEE:\s*(.*)', response_text)
+        ue_match = re.search(r'UE:\s*(.*)', response_text)
+        
+        if type_match:
+            type_doc = type_match.group(1).strip()
+        if annee_match:
+            annee = annee_match.group(1).strip()
+        if ue_match:
+            ue = ue_match.group(1).strip()
+
+        metadata = {
+            'filename': filename,
+            'ue': ue,
+            'type': type_doc,
+            'annee': annee,
+            'markdown_path': markdown_path,
+            'url': url  # Ajouter l'URL originale
+        }
+        
+        print(f"✅ Métadonnées extraites: {metadata}")
+        
+        # Sauvegarder les métadonnées localement
+        metadata_path = self.save_metadata(metadata, run["pdf_path"])
+        print(f"💾 Métadonnées sauvegardées localement: {metadata_path}")
+        # Document déjà lu transmis à l'appelant (non sérialisé dans metadata.json)
+        metadata['document'] = document
+        run["result"] = metadata
+        
+        # Sauvegarder dans Supabase
+        qcm_table_entry = self.save_to_supabase(metadata, fingerprint)
+        if not qcm_table_entry:
+            print("⚠️ Échec de la sauvegarde des métadonnées QCM dans Supabase")
+            run["finished"] = True  # Retourne les métadonnées extraites même si la sauvegarde Supabase échoue pour le QCM
+            return
+        
+        # Ajouter l'ID du QCM créé aux métadonnées qui seront retournées
+        if qcm_table_entry and isinstance(qcm_table_entry, dict) and 'id' in qcm_table_entry:
+            metadata['qcm_db_id'] = qcm_table_entry['id']
+            # Index QCM → Markdown pour les retraitements (fix_correct_answers_v2.py)
+            register_markdown(qcm_table_entry['id'], markdown_path, self.outputs_dir / "index.json")
+        else:
+            print("⚠️ L'ID du QCM sauvegardé n'a pas pu être ajouté aux métadonnées retournées.")
+            # On continue quand même, qcm_id sera utilisé en interne
+
+        # Extraire et sauvegarder les questions et ensuite les propositions
+        qcm_id = qcm_table_entry.get('id')
+        run["qcm_id"] = qcm_id
+
+        candidates = run.get("duplicate_candidates") or []
+        if not qcm_table_entry.get("existing") and candidates:
+            # Contenu proche mais métadonnées différentes (questions recyclées): nouveau QCM, les candidats ne sont pas touchés
+            print(f"ℹ️ Candidats par empreinte non confirmés ({', '.join(str(c['qcm_id']) for c in candidates)}): "
+                  f"importé comme nouveau QCM {qcm_id}")
+
+        # QCM déjà extrait, confirmé par le type, l'année et l'UE: ne retraiter que les pages modifiées
+        if qcm_id and qcm_table_entry.get("existing") and not run["force"]:
+            incremental = self.reextract_changed_pages(document, qcm_id)
+            if incremental is not None:
+                metadata["incremental"] = incremental
+                run["finished"] = True
+                return
+
+        if not qcm_id or not markdown_path:
+            missing_info = []
+            if not qcm_id: missing_info.append("qcm_id de la table qcm")
+            if not markdown_path: missing_info.append("markdown_path des métadonnées")
+            print(f"⚠️ Impossible d'extraire les questions/propositions: {', '.join(missing_info)} manquant.")
+            run["finished"] = True
+
+    def _count_propositions(self, qcm_id: int) -> int:
+        """Nombre de propositions enregistrées pour un QCM (une requête sur la vue question_rollup)."""
+        return sum(row["propositions_count"] for row in fetch_question_rollup(self.supabase, qcm_id))
+
+    def _stage_questions(self, run: Dict[str, Any]):
+        print("▶️ Lancement de la Phase 1: Extraction des questions...")
+        # Pause avant la première série d'appels API pour les questions
+        print("⏸️ Pause de 5 secondes avant l'extraction des questions...")
+        time.sleep(5)
+        run["saved_questions_details"] = self._extract_and_save_questions_only(run["document"], run["qcm_id"])
+        if not run["saved_questions_details"]:
+            print("⚠️ Aucune question n'a été sauvegardée en Phase 1, donc la Phase 2 (propositions) est ignorée.")
+            run["finished"] = True
+
+    def _stage_propositions(self, run: Dict[str, Any]):
+        qcm_id = run["qcm_id"]
+        print(f"ℹ️ Phase 1 terminée. {len(run['saved_questions_details'])} question(s) ont des détails sauvegardés.")
+        print("▶️ Lancement de la Phase 2: Extraction des propositions...")
+        # Pause avant la deuxième série d'appels API pour les propositions
+        print("⏸️ Pause de 10 secondes avant l'extraction des propositions...")
+        time.sleep(10)
         
+        # Obtenir le nombre initial de propositions pour ce QCM
+        run["prop_count_before"] = 0
         try:
-            # Télécharger le PDF
-            pdf_path = self.download_pdf(url)
-            print(f"📥 PDF téléchargé: {pdf_path}")
-            
-            # Convertir le PDF en Markdown en utilisant l'URL originale
-            markdown_path = self.convert_pdf_to_markdown(pdf_path, url)
-            if not markdown_path:
-                return None
-            
-            # Lire le contenu Markdown
-            with open(markdown_path, "r", encoding="utf-8") as f:
-                text = f.read()
-            
-            # Extraire les métadonnées du nom de fichier
-            filename = url.split('/')[-1]
-            
-            type_doc = "Unknown"
-            annee = None
-            ue = None
-            
-            # Utiliser l'IA pour extraire le type de document, l'année et l'UE
-            prompt = f"""Tu es un agent spécialisé dans l'analyse de documents PDF de QCM et corrections.
-            Voici un exemple de ce que je veux :
-            - Pour un fichier 'ue3-correction-cb1-s40-21-22-48479.pdf', le type doit être 'Concours Blanc N°1'
-            - Pour le texte 'SESSION 2021 / 2022', l'année doit être '2021 / 2022'
-            - Pour le texte 'UE2', l'UE doit être 'UE2'
-            
-            Analyse le texte suivant et détermine :
-            1. Le type de document (exactement 'Concours Blanc N°1' si c'est une correction de concours blanc, ou 'Colle N°1' si c'est une colle)
-            2. L'année de la session (format: 'XXXX / XXXX')
-            3. L'UE (format: 'UE1', 'UE2', etc.)
-            
-            Texte à analyser :
-            {text[:1000]}
-            
-            Réponds uniquement avec le format suivant, sans autre texte :
-            TYPE: [type]
-            ANNEE: [année]
-            UE: [ue]"""
-            
-            messages = [UserMessage(content=prompt)]
-            response = self._call_api_with_retry(
-                self.client.chat.complete,
-                model="mistral-small-latest",
-                messages=messages,
-                temperature=0.0
-            )
-            
-            # Vérifier si l'appel API a échoué
-            if response is None:
-                print("❌ Échec de l'appel API pour l'extraction des métadonnées")
-                return None
-            
-            # Parser la réponse de l'IA
-            response_text = response.choices[0].message.content.strip()
-            type_match = re.search(r'TYPE:\s*(.*)', response_text)
-            annee_match = re.search(r'ANNEE:\s*(.*)', response_text)
-            ue_match = re.search(r'UE:\s*(.*)', response_text)
-            
-            if type_match:
-                type_doc = type_match.group(1).strip()
-            if annee_match:
-                annee = annee_match.group(1).strip()
-            if ue_match:
-                ue = ue_match.group(1).strip()
-
-            metadata = {
-                'filename': filename,
-                'ue': ue,
-                'type': type_doc,
-                'annee': annee,
-                'markdown_path': markdown_path,
-                'url': url  # Ajouter l'URL originale
-            }
-            
-            print(f"✅ Métadonnées extraites: {metadata}")
-            
-            # Sauvegarder les métadonnées localement
-            metadata_path = self.save_metadata(metadata, pdf_path)
-            print(f"💾 Métadonnées sauvegardées localement: {metadata_path}")
-            
-            # Sauvegarder dans Supabase
-            qcm_table_entry = self.save_to_supabase(metadata)
-            if not qcm_table_entry:
-                print("⚠️ Échec de la sauvegarde des métadonnées QCM dans Supabase")
-                return metadata # Retourne les métadonnées extraites même si la sauvegarde Supabase échoue pour le QCM
-            
-            # Ajouter l'ID du QCM créé aux métadonnées qui seront retournées
-            if qcm_table_entry and isinstance(qcm_table_entry, dict) and 'id' in qcm_table_entry:
-                metadata['qcm_db_id'] = qcm_table_entry['id']
-            else:
-                print("⚠️ L'ID du QCM sauvegardé n'a pas pu être ajouté aux métadonnées retournées.")
-                # On continue quand même, qcm_id_for_processing sera utilisé en interne
+            run["prop_count_before"] = self._count_propositions(qcm_id)
+        except Exception as e:
+            print(f"⚠️ Erreur lors du comptage initial des propositions: {str(e)}")
+        
+        # Extraire les propositions
+        self._extract_and_save_propositions(run["document"], qcm_id, run["saved_questions_details"])
+        print("🏁 Phase 2 terminée.")
 
-            # PAUSE pour éviter le rate limiting de l'API
-            # print("⏸️ Pause de 10 secondes avant l'extraction des questions pour éviter le rate limiting...")
-            # time.sleep(10) # Pause de 10 secondes - Déplacé avant chaque phase d'extraction majeure
+    def _stage_answers(self, run: Dict[str, Any]):
+        metadata = run["result"]
+        # Phase 3: Extraction des réponses correctes
+        print("▶️ Lancement de la Phase 3: Extraction des réponses correctes...")
+        print("⏸️ Pause de 5 secondes avant l'extraction des réponses correctes...")
+        time.sleep(5)
+        
+        updates_count = self.extract_correct_answers(run["document"], run["qcm_id"])
+        if updates_count and updates_count > 0:
+            print(f"✅ Phase 3 terminée: {updates_count} réponses correctes mises à jour")
+            metadata["correct_answers_updated"] = updates_count
+        else:
+            print("⚠️ Phase 3: Aucune réponse correcte mise à jour")
+            metadata["correct_answers_updated"] = 0
 
-            # Extraire et sauvegarder les questions et ensuite les propositions
-            qcm_id_for_processing = qcm_table_entry.get('id')
-            markdown_file_path = metadata.get('markdown_path') 
+    def _stage_figures(self, run: Dict[str, Any]):
+        if not self.extract_figures:
+            return
+        # Un échec des figures n'empêche pas l'enregistrement de l'état des pages et des statistiques
+        try:
+            run["result"]["figures_count"] = self.attach_figures(run["document"], run["qcm_id"], run["markdown_path"])
+        except Exception as e:
+            print(f"⚠️ Erreur lors du rattachement des figures: {str(e)}")
 
-            if qcm_id_for_processing and markdown_file_path:
-                try:
-                    with open(markdown_file_path, "r", encoding="utf-8") as f:
-                        markdown_content_for_processing = f.read()
-                    
-                    print("▶️ Lancement de la Phase 1: Extraction des questions...")
-                    # Pause avant la première série d'appels API pour les questions
-                    print("⏸️ Pause de 5 secondes avant l'extraction des questions...")
-                    time.sleep(5)
-                    saved_questions_details = self._extract_and_save_questions_only(markdown_content_for_processing, qcm_id_for_processing)
-                    
-                    if saved_questions_details:
-                        print(f"ℹ️ Phase 1 terminée. {len(saved_questions_details)} question(s) ont des détails sauvegardés.")
-                        print("▶️ Lancement de la Phase 2: Extraction des propositions...")
-                        # Pause avant la deuxième série d'appels API pour les propositions
-                        print("⏸️ Pause de 10 secondes avant l'extraction des propositions...")
-                        time.sleep(10) 
-                        
-                        # Obtenir le nombre initial de propositions pour cette question
-                        prop_count_before = 0
-                        try:
-                            # Récupérer les IDs des questions de ce QCM
-                            question_ids_result = self.supabase.table("questions").select("id").eq("qcm_id", qcm_id_for_processing).execute()
-                            
-                            if question_ids_result.data:
-                                question_ids = [q["id"] for q in question_ids_result.data]
-                                
-                                # On peut faire une requête générale pour compter toutes les propositions
-                                if question_ids:
-                                    # Convertir la liste d'IDs en format pour la requête "in"
-                                    # Comme on ne peut pas utiliser "in" directement avec Supabase Python,
-                                    # on va faire plusieurs requêtes et additionner les résultats
-                                    for q_id in question_ids:
-                                        count_result = self.supabase.table("reponses").select("id").eq("question_id", q_id).execute()
-                                        if count_result.data:
-                                            prop_count_before += len(count_result.data)
-                        except Exception as e:
-                            print(f"⚠️ Erreur lors du comptage initial des propositions: {str(e)}")
-                        
-                        # Extraire les propositions
-                        self._extract_and_save_propositions(markdown_content_for_processing, qcm_id_for_processing, saved_questions_details)
-                        print("🏁 Phase 2 terminée.")
-                        
-                        # Phase 3: Extraction des réponses correctes
-                        print("▶️ Lancement de la Phase 3: Extraction des réponses correctes...")
-                        print("⏸️ Pause de 5 secondes avant l'extraction des réponses correctes...")
-                        time.sleep(5)
-                        
-                        updates_count = self.extract_correct_answers(markdown_content_for_processing, qcm_id_for_processing)
-                        if updates_count and updates_count > 0:
-                            print(f"✅ Phase 3 terminée: {updates_count} réponses correctes mises à jour")
-                            metadata["correct_answers_updated"] = updates_count
-                        else:
-                            print("⚠️ Phase 3: Aucune réponse correcte mise à jour")
-                            metadata["correct_answers_updated"] = 0
-                        
-                        # Compter les propositions après insertion pour les statistiques
-                        prop_count_after = 0
-                        try:
-                            # Récupérer les IDs des questions de ce QCM
-                            question_ids_result = self.supabase.table("questions").select("id").eq("qcm_id", qcm_id_for_processing).execute()
-                            
-                            if question_ids_result.data:
-                                question_ids = [q["id"] for q in question_ids_result.data]
-                                
-                                # On peut faire une requête générale pour compter toutes les propositions
-                                if question_ids:
-                                    for q_id in question_ids:
-                                        count_result = self.supabase.table("reponses").select("id").eq("question_id", q_id).execute()
-                                        if count_result.data:
-                                            prop_count_after += len(count_result.data)
-                        except Exception as e:
-                            print(f"⚠️ Erreur lors du comptage final des propositions: {str(e)}")
-                        
-                        # Calculer le nombre de propositions insérées
-                        propositions_inserted = prop_count_after - prop_count_before
-                        
-                        # Ajouter les statistiques aux métadonnées
-                        metadata["questions_count"] = len(saved_questions_details)
-                        metadata["propositions_count"] = propositions_inserted
-                        
-                        # Vérifier si toutes les questions ont des propositions
-                        if propositions_inserted > 0:
-                            avg_props_per_question = propositions_inserted / len(saved_questions_details)
-                            metadata["avg_propositions_per_question"] = avg_props_per_question
-                            
-                            # Estimer la complétude (idéalement on devrait avoir 5 propositions par question)
-                            expected_total = len(saved_questions_details) * 5
-                            completeness = (propositions_inserted / expected_total) * 100 if expected_total > 0 else 0
-                            metadata["extraction_completeness"] = completeness
-                            
-                            print(f"📊 Statistiques d'extraction: {propositions_inserted} propositions pour {len(saved_questions_details)} questions")
-                            print(f"📊 Moyenne de {avg_props_per_question:.1f} propositions par question (complétude: {completeness:.1f}%)")
-                    else:
-                        print("⚠️ Aucune question n'a été sauvegardée en Phase 1, donc la Phase 2 (propositions) est ignorée.")
+    def attach_figures(self, document: Document, qcm_id: int, markdown_path: str) -> int:
+        """Rattache les figures OCR d'un document à ses questions (upload et lignes images groupés)."""
+        figures = load_manifest(markdown_path)
+        if not figures:
+            return 0
+        result = self.supabase.table("questions").select("id", "numero").eq("qcm_id", qcm_id).execute()
+        question_ids = {q["numero"]: q["id"] for q in result.data or []}
+        linked = [figure for figure in link_figures(document, figures, question_ids) if figure["numero"] is not None]
+        if len(linked) < len(figures):
+            print(f"ℹ️ {len(figures) - len(linked)} figure(s) hors de toute question, ignorée(s)")
+        if not linked:
+            return 0
+        self.image_uploader.upload_question_images([
+            {"question_id": question_ids[figure["numero"]], "path": figure["path"]} for figure in linked
+        ])
+        return len(linked)
 
-                except FileNotFoundError:
-                    print(f"⚠️ Fichier Markdown non trouvé à {markdown_file_path}")
-                except Exception as e:
-                    # Log plus détaillé de l'erreur
-                    import traceback
-                    print(f"🔥 Erreur majeure lors du traitement des questions/propositions pour QCM ID {qcm_id_for_processing}: {str(e)}")
-                    print(f"Traceback: {traceback.format_exc()}")
-            else:
-                missing_info = []
-                if not qcm_id_for_processing: missing_info.append("qcm_id de la table qcm")
-                if not markdown_file_path: missing_info.append("markdown_path des métadonnées")
-                print(f"⚠️ Impossible d'extraire les questions/propositions: {', '.join(missing_info)} manquant.")
-            
-            return metadata
-            
+    def _stage_commit(self, run: Dict[str, Any]):
+        metadata = run["result"]
+        qcm_id = run["qcm_id"]
+        saved_questions_details = run["saved_questions_details"]
+        
+        # État par page (hash + questions) pour les prochaines réextractions incrémentales
+        self._save_page_state(run["document"], qcm_id)
+        # Questions complètes réutilisables par les prochains imports (reuse.py)
+        self._save_question_hashes(run["document"], qcm_id)
+        
+        # Compter les propositions après insertion pour les statistiques
+        prop_count_after = 0
+        try:
+            prop_count_after = self._count_propositions(qcm_id)
+        except Exception as e:
+            print(f"⚠️ Erreur lors du comptage final des propositions: {str(e)}")
+        
+        # Calculer le nombre de propositions insérées
+        propositions_inserted = prop_count_after - run.get("prop_count_before", 0)
+        
+        # Ajouter les statistiques aux métadonnées
+        metadata["questions_count"] = len(saved_questions_details)
+        metadata["propositions_count"] = propositions_inserted
+        
+        # Vérifier si toutes les questions ont des propositions
+        if propositions_inserted > 0:
+            avg_props_per_question = propositions_inserted / len(saved_questions_details)
+            metadata["avg_propositions_per_question"] = avg_props_per_question
+            
+            # Estimer la complétude (idéalement on devrait avoir 5 propositions par question)
+            expected_total = len(saved_questions_details) * 5
+            completeness = (propositions_inserted / expected_total) * 100 if expected_total > 0 else 0
+            metadata["extraction_completeness"] = completeness
+            
+            print(f"📊 Statistiques d'extraction: {propositions_inserted} propositions pour {len(saved_questions_details)} questions")
+            print(f"📊 Moyenne de {avg_props_per_question:.1f} propositions par question (complétude: {completeness:.1f}%)")
+
+    def _save_page_state(self, document: Document, qcm_id: int):
+        """Enregistre le hash et les questions de chaque page du document pour ce QCM."""
+        try:
+            result = self.supabase.table("questions").select("numero").eq("qcm_id", qcm_id).execute()
+            known_numbers = {q["numero"] for q in result.data or []}
+            save_page_state(self.supabase, qcm_id, document.page_state(known_numbers))
+        except Exception as e:
+            print(f"⚠️ Erreur lors de l'enregistrement de l'état des pages: {str(e)}")
+
+    def _save_question_hashes(self, document: Document, qcm_id: int):
+        """Enregistre les questions complètes du QCM dans le cache de réutilisation."""
+        try:
+            saved = save_question_hashes(self.supabase, document, qcm_id)
+            if saved:
+                print(f"♻️ {saved} question(s) enregistrée(s) pour réutilisation")
+        except Exception as e:
+            print(f"⚠️ Erreur lors de l'enregistrement des questions réutilisables: {str(e)}")
+
+    def _find_identical_qcm(self, document: Document, candidates: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Premier candidat dont l'état des pages enregistré a exactement les mêmes hash que le document."""
+        current = document.page_hashes
+        for candidate in candidates:
+            try:
+                stored = load_page_state(self.supabase, candidate["qcm_id"])
+            except Exception as e:
+                print(f"⚠️ Erreur lors de la lecture de l'état des pages: {str(e)}")
+                return None
+            if stored and {page_num: page["content_hash"] for page_num, page in stored.items()} == current:
+                return candidate
+        return None
+
+    def reextract_changed_pages(self, document: Document, qcm_id: int) -> Optional[Dict[str, Any]]:
+        """Réextrait uniquement les questions touchées par les pages modifiées depuis le dernier passage.
+        
+        Les pages sont comparées par hash à l'état enregistré dans `qcm_pages`; les questions
+        des pages modifiées sont réextraites (Phases 1 et 2) et réécrites en place, les autres
+        ne sont pas touchées. Les questions qui ont disparu des pages modifiées sont supprimées.
+        La grille de correction pouvant être sur une page sans titre de question, la Phase 3
+        (sans appel API) est rejouée sur tout le QCM. Retourne None si aucun état n'est
+        enregistré pour ce QCM.
+        """
+        try:
+            stored_state = load_page_state(self.supabase, qcm_id)
         except Exception as e:
-            print(f"⚠️ Erreur lors de l'extraction des métadonnées: {str(e)}")
+            print(f"⚠️ Erreur lors de la lecture de l'état des pages: {str(e)}")
+            return None
+        if not stored_state:
             return None
+        
+        current_state = document.page_state()
+        diff = diff_page_states(stored_state, current_state)
+        changed_pages = diff["changed_pages"]
+        touched = diff["touched_questions"]
+        
+        if not changed_pages:
+            print(f"✅ Aucune page modifiée depuis la dernière extraction du QCM {qcm_id}")
+            return {"changed_pages": [], "touched_questions": [], "deleted_questions": []}
+        
+        # Questions des pages modifiées qui n'ont plus de titre nulle part dans le document
+        current_numbers = {numero for page in current_state.values() for numero in page["question_numbers"]}
+        vanished = touched - current_numbers if current_numbers else set()
+        touched -= vanished
+        
+        print(f"🔄 Pages modifiées: {changed_pages} → questions à réextraire: {sorted(touched)}")
+        if vanished:
+            self._delete_questions(qcm_id, vanished)
+        if touched:
+            # Pages utiles: celles qui contiennent une partie d'une question touchée
+            pages_needed = {page_num for page_num, page in current_state.items() if touched & set(page["question_numbers"])}
+            pages_needed |= set(changed_pages) & set(current_state)
+            subset = document.select_pages(pages_needed)
+            
+            saved_questions_details = self._extract_and_save_questions_only(subset, qcm_id, refresh_numbers=touched)
+            self._extract_and_save_propositions(subset, qcm_id, saved_questions_details, only_numbers=touched)
+        # Une grille modifiée ne touche que la question de la page précédente: réponses rejouées pour tout le QCM
+        # (parsing local, seules les propositions dont la correction change sont écrites)
+        self.extract_correct_answers(document, qcm_id)
+        
+        self._save_page_state(document, qcm_id)
+        self._save_question_hashes(document, qcm_id)
+        invalidate_qcm(qcm_id)
+        return {"changed_pages": changed_pages, "touched_questions": sorted(touched), "deleted_questions": sorted(vanished)}
+
+    def _delete_questions(self, qcm_id: int, numbers: Set[int]):
+        """Supprime des questions d'un QCM et leurs propositions (questions disparues du document)."""
+        try:
+            result = self.supabase.table("questions").select("id", "numero").eq("qcm_id", qcm_id).in_("numero", sorted(numbers)).execute()
+            question_ids = [q["id"] for q in result.data or []]
+            if question_ids:
+                self.supabase.table("reponses").delete().in_("question_id", question_ids).execute()
+                self.supabase.table("questions").delete().in_("id", question_ids).execute()
+            print(f"🗑️ Questions disparues du document supprimées: {sorted(numbers)}")
+        except Exception as e:
+            print(f"⚠️ Questions disparues du document conservées (suppression impossible: {str(e)}): {sorted(numbers)}")
 
     def encode_image_to_base64(self, image_path: str, max_size: int = 1000) -> str:
         """Encode une image en Base64 avec redimensionnement si nécessaire"""
+        from PIL import Image
         with Image.open(image_path) as img:
             # Convertir en RGB si nécessaire
             if img.mode != 'RGB':
@@ -579,20 +853,26 @@ D. Faux. Une chromatine dont les histones sont acétylées et l'ADN non méthyl
                 }
             ]
 
-            response = self._call_api_with_retry(
-                self.client.chat.complete,
-                model="mistral-small-latest",
-                messages=messages,
-                temperature=0.0,
-                max_tokens=1000
-            )
+            def call(model):
+                response = self._call_api_with_retry(
+                    self.client.chat.complete,
+                    model=model,
+                    messages=messages,
+                    temperature=0.0,
+                    max_tokens=1000
+                )
+                return response.choices[0].message.content
+
+            # Pas de texte OCR exploitable pour cette page: caractéristiques neutres
+            features = {"tokens": 0, "questions": 0, "ocr_quality": "poor"}
+            text = self.router.run("image_text", features, call, lambda result: None if result and result.strip() else "texte vide")
 
             # Vérifier si l'appel API a échoué
-            if response is None:
+            if text is None:
                 print(f"❌ Échec de l'appel API pour l'extraction de texte de l'image {image_path}")
                 return ""
 
-            return response.choices[0].message.content
+            return text
 
         except Exception as e:
             print(f"Error extracting text from image: {e}")
@@ -628,10 +908,61 @@ D. Faux. Une chromatine dont les histones sont acétylées et l'ADN non méthyl
             print(f"Error during OCR processing: {e}")
             return metadata, []
 
-    def _extract_and_save_questions_only(self, markdown_text: str, qcm_id: int) -> List[Dict[str, Any]]:
+    def _complete_with_routing(self, task: str, content: str, prompt: str, parse, validate, **kwargs):
+        """Appelle le modèle choisi par le routeur et escalade si la validation du résultat parsé échoue."""
+        from mistralai import UserMessage
+
+        def call(model):
+            response = self._call_api_with_retry(
+                self.client.chat.complete,
+                model=model,
+                messages=[UserMessage(content=prompt)],
+                temperature=0.0,
+                **kwargs
+            )
+            return parse(response)
+        
+        return self.router.run(task, page_features(content), call, lambda result: validate(result, content))
+
+    def _parse_questions_response(self, response, label: str) -> List[Dict[str, Any]]:
+        """Parse la réponse JSON d'une extraction de questions en liste de questions."""
+        if not (response.choices and response.choices[0].message and response.choices[0].message.content):
+            print(f"    ⚠️ Réponse API invalide pour {label}")
+            return []
+        
+        try:
+            raw_data = json.loads(response.choices[0].message.content)
+        except json.JSONDecodeError as e:
+            print(f"    ⚠️ Erreur JSON dans {label}: {str(e)}")
+            return []
+        
+        questions_list = []
+        if isinstance(raw_data, dict):
+            questions_list = raw_data.get("questions", [])
+        elif isinstance(raw_data, list):
+            questions_list = raw_data
+        
+        if not isinstance(questions_list, list):
+            print(f"    ⚠️ Format de questions inattendu pour {label} (pas une liste). Reçu: {questions_list}")
+            return []
+        
+        # Gérer le cas où l'API retourne un dict imbriqué
+        if len(questions_list) == 1 and \
+           isinstance(questions_list[0], dict) and \
+           "questions" in questions_list[0] and \
+           isinstance(questions_list[0]["questions"], list):
+            questions_list = questions_list[0]["questions"]
+        
+        return [q for q in questions_list if isinstance(q, dict) and "numero" in q]
+
+    def _extract_and_save_questions_only(self, document: Document, qcm_id: int, refresh_numbers: Optional[Set[int]] = None) -> List[Dict[str, Any]]:
         """Phase 1: Extrait UNIQUEMENT les questions du texte Markdown page par page,
-        les sauvegarde dans Supabase, et retourne les détails des questions sauvegardées."""
+        les sauvegarde dans Supabase, et retourne les détails des questions sauvegardées.
+        
+        Avec refresh_numbers (réextraction incrémentale), seules ces questions sont
+        écrites: mises à jour si elles existent déjà, insérées sinon."""
         print(f"📝 Phase 1: Extraction des questions uniquement pour QCM ID: {qcm_id}...")
+        document = as_document(document)
         
         # Vérifier si des questions existent déjà pour ce QCM
         try:
@@ -644,55 +975,30 @@ D. Faux. Une chromatine dont les histones sont acétylées et l'ADN non méthyl
             print(f"⚠️ Erreur lors de la vérification des questions existantes: {str(e)}")
             existing_question_numbers = set()
         
-        # Améliorer le découpage des pages pour éviter les pertes
+        # Pages déjà découpées par le Document (intervalles d'offsets dans un seul buffer)
         page_sections = []
-        header_matches = list(re.finditer(r'^# Page \d+', markdown_text, flags=re.MULTILINE))
-        
-        if not header_matches:
-            if markdown_text.strip(): 
-                page_sections.append(markdown_text.strip())
-                print("    📄 Document sans marqueurs de page, traité comme une seule section")
-        else:
-            # Extraire les sections de page avec une meilleure gestion des limites
-            for i, match in enumerate(header_matches):
-                start_content = match.end()
-                end_content = header_matches[i+1].start() if (i + 1) < len(header_matches) else len(markdown_text)
-                page_content = markdown_text[start_content:end_content].strip()
-                
-                # Extraire le numéro de page pour référence
-                page_header = match.group(0)
-                page_num = re.search(r'Page (\d+)', page_header)
-                page_num = int(page_num.group(1)) if page_num else i + 1
-                
-                # Ajouter un chevauchement pour éviter de perdre des questions à la frontière des pages
-                if i > 0 and page_content:
-                    # Ajouter les 200 derniers caractères de la page précédente
-                    prev_start = header_matches[i-1].end()
-                    prev_content = markdown_text[prev_start:start_content].strip()
-                    overlap = prev_content[-200:] if len(prev_content) > 200 else prev_content
-                    page_content = overlap + "\n\n" + page_content
-                
-                if page_content: 
-                    page_sections.append(page_content)
-                    print(f"    📄 Section de page {i+1} correspond à la Page {page_num} du PDF")
-                else:
-                    print(f"    ⚠️ Section de page {i+1} (Page {page_num} du PDF) est vide après nettoyage")
+        previous_content = None
+        for section in document.page_sections():
+            page_content = section["content"]
+            # Ajouter un chevauchement pour éviter de perdre des questions à la frontière des pages
+            if previous_content is not None:
+                page_content = previous_content[-200:] + "\n\n" + page_content
+            previous_content = section["content"]
+            page_sections.append(page_content)
+            print(f"    📄 Section de page {section['index']} correspond à la Page {section['page_num']} du PDF")
 
         if not page_sections:
             print("ℹ️ Aucun contenu de page trouvé pour l'extraction des questions.")
             return []
 
-        # Traiter toutes les pages d'un coup si contenu total raisonnable
-        total_content_length = sum(len(section) for section in page_sections)
+        # Traiter toutes les pages d'un coup si le document tient dans le budget de tokens
+        combined_content = "\n\n".join(page_sections)
         all_questions_from_all_pages_api_data = []
         
-        # Stratégie adaptative: traiter en une fois si contenu petit, sinon par pages
-        if total_content_length < 40000 and len(page_sections) <= 3:
-            print(f"📄 Document de taille raisonnable ({total_content_length} caractères), traitement en une fois...")
-            combined_content = "\n\n".join(page_sections)
-            
-            # Tronquer si nécessaire tout en gardant un maximum de contenu
-            truncated_content = combined_content[:40000]
+        # Stratégie adaptative: traiter en une fois si le contenu tient dans le budget, sinon par chunks
+        single_shot_packer = ChunkPacker("mistral-medium-latest")
+        if single_shot_packer.fits(combined_content):
+            print(f"📄 Document de taille raisonnable ({len(combined_content)} caractères), traitement en une fois...")
             
             # NOUVELLE APPROCHE MULTI-PATTERNS pour extraction exhaustive
             prompt = f"""Tu es un expert en extraction de questions de QCM médical.
@@ -714,7 +1020,7 @@ INSTRUCTIONS ABSOLUES:
 SPÉCIAL: Cherche particulièrement les questions 9, 16, 17, 18, 26 qui sont souvent manquées.
 
 TEXTE À ANALYSER:
-{truncated_content}
+{combined_content}
 
 FORMAT JSON STRICT:
 {{
@@ -725,48 +1031,35 @@ FORMAT JSON STRICT:
 }}"""
             
             try:
-                # Utiliser un modèle plus puissant pour l'extraction complète
-                messages = [UserMessage(content=prompt)]
-                response = self._call_api_with_retry(
-                    self.client.chat.complete,
-                    model="mistral-medium-latest", 
-                    messages=messages,
-                    temperature=0.0,
+                # Le routeur part du modèle le moins cher susceptible de réussir et escalade si des questions manquent
+                all_questions_from_all_pages_api_data = self._complete_with_routing(
+                    "questions_document",
+                    combined_content,
+                    prompt,
+                    parse=lambda response: self._parse_questions_response(response, "l'extraction globale"),
+                    validate=validate_questions,
                     response_format={"type": "json_object"}
-                )
-                
-                # Vérifier si l'appel API a échoué
-                if response is None:
-                    print("    ❌ Échec de l'appel API pour l'extraction globale des questions")
-                    # Continuer avec les autres méthodes d'extraction
-                    pass
-                elif response.choices and response.choices[0].message and response.choices[0].message.content:
-                    extracted_data_str = response.choices[0].message.content
-                    try:
-                        raw_data = json.loads(extracted_data_str)
-                        if isinstance(raw_data, dict) and "questions" in raw_data and isinstance(raw_data["questions"], list):
-                            all_questions_from_all_pages_api_data = raw_data["questions"]
-                            print(f"    ✅ Extraction globale réussie: {len(all_questions_from_all_pages_api_data)} questions trouvées")
-                    except json.JSONDecodeError as e_json:
-                        print(f"    ⚠️ Erreur JSON dans l'extraction globale: {e_json}")
-                else:
-                    print(f"    ⚠️ Réponse API invalide pour l'extraction globale")
+                ) or []
+                if all_questions_from_all_pages_api_data:
+                    print(f"    ✅ Extraction globale réussie: {len(all_questions_from_all_pages_api_data)} questions trouvées")
             except Exception as e_api:
                 print(f"    🔥 Erreur API pour l'extraction globale: {str(e_api)}")
         
-        # Si l'extraction globale a échoué ou n'a pas été tentée, traiter page par page
+        # Si l'extraction globale a échoué ou n'a pas été tentée, traiter par chunks de pages
         if not all_questions_from_all_pages_api_data:
-            print(f"📄 Traitement page par page ({len(page_sections)} sections)...")
-            
-            for i, page_markdown_content in enumerate(page_sections):
-                print(f"📄 Traitement section {i + 1}/{len(page_sections)} pour questions...")
+            page_chunks = ChunkPacker("mistral-small-latest").pack(page_sections)
+            print(f"📄 Traitement par chunks ({len(page_sections)} sections regroupées en {len(page_chunks)} chunks)...")
+            
+            for i, page_markdown_content in enumerate(page_chunks):
+                if not budget_allows("extraction des questions par section"):
+                    print(f"💸 Budget épuisé: sections {i + 1} à {len(page_chunks)} non envoyées")
+                    break
+                print(f"📄 Traitement section {i + 1}/{len(page_chunks)} pour questions...")
                 
                 if not page_markdown_content.strip():
                     print(f"    ⏩ Section de page {i + 1} vide, ignorée pour questions.")
                     continue
 
-                truncated_page_markdown = page_markdown_content[:25000]
-
                 # Ajouter une instruction spécifique pour chercher les questions souvent manquantes
                 prompt = f"""Tu es un expert en analyse de QCM (Questionnaires à Choix Multiples).
                 À partir du contenu Markdown d'une section de page d'un document QCM fourni ci-dessous, identifie et extrais chaque question.
@@ -786,7 +1079,7 @@ FORMAT JSON STRICT:
 
                 Contenu Markdown de la section de page à analyser :
                 ---
-                {truncated_page_markdown}
+                {page_markdown_content}
                 ---
 
                 Retourne les questions extraites sous la forme d'un objet JSON. Cet objet doit contenir une unique clé "questions",
@@ -803,58 +1096,32 @@ FORMAT JSON STRICT:
                 }}
                 """
                 try:
-                    messages = [UserMessage(content=prompt)]
-                    response = self._call_api_with_retry(
-                        self.client.chat.complete,
-                        model="mistral-small-latest", 
-                        messages=messages,
-                        temperature=0.0,
+                    actual_questions_for_page = self._complete_with_routing(
+                        "questions_page",
+                        page_markdown_content,
+                        prompt,
+                        parse=lambda response: self._parse_questions_response(response, f"la section {i+1}"),
+                        validate=validate_questions,
                         response_format={"type": "json_object"}
-                    )
-                    
-                    # Vérifier si l'appel API a échoué
-                    if response is None:
-                        print(f"    ❌ Échec de l'appel API pour l'extraction de la section {i+1}")
-                        continue
+                    ) or []
                     
-                    if response.choices and response.choices[0].message and response.choices[0].message.content:
-                        extracted_data_str = response.choices[0].message.content
-                        try:
-                            raw_page_data = json.loads(extracted_data_str)
-                            page_questions_list = []
-                            if isinstance(raw_page_data, dict):
-                                page_questions_list = raw_page_data.get("questions", [])
-                            elif isinstance(raw_page_data, list): 
-                                page_questions_list = raw_page_data
-                            
-                            if not isinstance(page_questions_list, list):
-                                print(f"    ⚠️ Format de questions inattendu pour section {i+1} (pas une liste). Reçu: {page_questions_list}")
-                                continue
-                            
-                            # Déballage amélioré de la liste des questions
-                            actual_questions_for_page = []
-                            if not page_questions_list: # Gère une liste vide retournée par .get("questions", []) ou par l'API
-                                pass # actual_questions_for_page reste vide
-                            elif len(page_questions_list) == 1 and \
-                                 isinstance(page_questions_list[0], dict) and \
-                                 "questions" in page_questions_list[0] and \
-                                 isinstance(page_questions_list[0]["questions"], list):  # Gérer le cas où l'API retourne un dict imbriqué
-                                actual_questions_for_page = page_questions_list[0]["questions"]
-                            else:
-                                actual_questions_for_page = page_questions_list
-                            
-                            # Ajouter les questions de cette page
-                            print(f"    ✅ {len(actual_questions_for_page)} questions trouvées dans la section {i+1}")
-                            all_questions_from_all_pages_api_data.extend(actual_questions_for_page)
-                        except json.JSONDecodeError as e:
-                            print(f"    ⚠️ Erreur JSON dans l'extraction pour la section {i+1}: {str(e)}")
-                    else:
-                        print(f"    ⚠️ Réponse API invalide pour la section {i+1}")
+                    # Ajouter les questions de cette page
+                    print(f"    ✅ {len(actual_questions_for_page)} questions trouvées dans la section {i+1}")
+                    all_questions_from_all_pages_api_data.extend(actual_questions_for_page)
                 except Exception as e:
                     print(f"    ⚠️ Erreur lors de l'extraction des questions pour la section {i+1}: {str(e)}")
                 
                 time.sleep(2)  # Réduit à 2 secondes au lieu de 5
 
+        # Budget épuisé sans aucune question: repli sur l'index des titres du Document
+        if not all_questions_from_all_pages_api_data and not budget_allows("extraction des questions"):
+            heading_index = document.headings
+            for numero in sorted(heading_index.questions):
+                contenu = heading_index.question_text(numero)
+                if contenu:
+                    all_questions_from_all_pages_api_data.append({"numero": numero, "contenu": contenu})
+            print(f"💸 {len(all_questions_from_all_pages_api_data)} question(s) récupérée(s) depuis l'index des titres (sans API)")
+
         # Après avoir extrait toutes les questions, vérifier s'il y a des numéros manquants
         all_questions = all_questions_from_all_pages_api_data
         
@@ -911,56 +1178,34 @@ FORMAT JSON STRICT:
             missing_questions = set(expected_range) - set(all_question_numbers)
             if missing_questions:
                 print(f"⚠️ Questions manquantes détectées: {sorted(missing_questions)}")
-                print("🔍 Tentative de récupération par patterns regex avancés...")
+                print("🔍 Tentative de récupération par l'index des titres...")
                 
-                # Récupération ciblée par regex pour chaque question manquante
-                for missing_num in missing_questions:
-                    print(f"   🎯 Recherche spécifique de Q{missing_num}...")
-                    
-                    # Patterns spécialisés pour cette question
-                    specific_patterns = [
-                        rf'[^\d]{missing_num}[\.:\)]\s*([^A-E]{{20,400}}?)(?=\s*A\.|[^\d]\d+[\.:\)]|$)',
-                        rf'Q\s*{missing_num}[^0-9]([^A-E]{{20,400}}?)(?=\s*A\.|Q\s*\d+|$)',
-                        rf'Question\s+{missing_num}[^0-9]([^A-E]{{20,400}}?)(?=\s*A\.|Question\s+\d+|$)',
-                        rf'#{missing_num}[^0-9]([^A-E]{{20,400}}?)(?=\s*A\.|#\d+|$)',
-                        rf'{missing_num}[\.\)]\s*([^A-E]{{20,400}}?)(?=\s*A\.|^\d+[\.\)]|$)'
-                    ]
-                    
-                    # Recombiner le contenu pour les patterns regex  
-                    if 'combined_content' not in locals():
-                        combined_content = "\n\n".join(page_sections)
-                    
-                    for pattern_idx, pattern in enumerate(specific_patterns):
-                        matches = re.finditer(pattern, combined_content, re.MULTILINE | re.DOTALL)
-                        for match in matches:
-                            try:
-                                contenu = match.group(1).strip()
-                                # Nettoyer le contenu
-                                contenu = re.sub(r'\s+', ' ', contenu)
-                                contenu = contenu.strip()
-                                
-                                if contenu and len(contenu) > 15:
-                                    questions_by_number[missing_num] = {"numero": missing_num, "contenu": contenu}
-                                    print(f"   ✅ Q{missing_num} récupérée avec pattern {pattern_idx+1}")
-                                    break
-                            except (IndexError, AttributeError):
-                                continue
-                        
-                        # Si trouvé, passer à la question suivante
-                        if missing_num in questions_by_number:
-                            break
-                    
-                    if missing_num not in questions_by_number:
-                        print(f"   ❌ Q{missing_num} non trouvée malgré tous les patterns")
+                # Index des titres du Document: chaque question manquante est une lecture + découpage
+                heading_index = document.headings
+                for missing_num in sorted(missing_questions):
+                    contenu = heading_index.question_text(missing_num)
+                    if contenu:
+                        questions_by_number[missing_num] = {"numero": missing_num, "contenu": contenu}
+                        print(f"   ✅ Q{missing_num} récupérée depuis l'index des titres")
+                    else:
+                        print(f"   ❌ Q{missing_num} non trouvée dans l'index des titres")
                 
                 print(f"📊 Après récupération: {len(questions_by_number)} questions au total")
         
         # Créer liste finale pour insertion, en filtrant les questions déjà existantes
         questions_to_insert_in_supabase = []
+        questions_to_refresh = []
         for numero, q_data in questions_by_number.items():
-            # Ne pas réinsérer les questions qui existent déjà
+            # Réextraction incrémentale: ne toucher qu'aux questions des pages modifiées
+            if refresh_numbers is not None and numero not in refresh_numbers:
+                continue
+            
+            # Ne pas réinsérer les questions qui existent déjà (sauf pour les rafraîchir)
             if numero in existing_question_numbers:
-                print(f"ℹ️ Question {numero} existe déjà, ignorée pour insertion.")
+                if refresh_numbers is not None:
+                    questions_to_refresh.append(q_data)
+                else:
+                    print(f"ℹ️ Question {numero} existe déjà, ignorée pour insertion.")
                 continue
                 
             questions_to_insert_in_supabase.append({
@@ -972,6 +1217,14 @@ FORMAT JSON STRICT:
 
         saved_questions_details = []
         
+        # Mettre à jour le contenu des questions rafraîchies (identifiants et propositions conservés)
+        for q_data in questions_to_refresh:
+            try:
+                self.supabase.table("questions").update({"contenu": json.dumps({"text": q_data["contenu"]})}).eq("qcm_id", qcm_id).eq("numero", q_data["numero"]).execute()
+                print(f"🔄 Question {q_data['numero']} mise à jour")
+            except Exception as e:
+                print(f"⚠️ Erreur lors de la mise à jour de la question {q_data['numero']}: {str(e)}")
+        
         # Si certaines questions existent déjà, récupérer leurs détails
         if existing_question_numbers:
             try:
@@ -1021,8 +1274,13 @@ FORMAT JSON STRICT:
         print(f"📊 Total de {len(saved_questions_details)} questions disponibles pour la suite du traitement.")
         return saved_questions_details
 
-    def _extract_and_save_propositions(self, markdown_text: str, qcm_id: int, saved_questions_details: List[Dict[str, Any]]):
-        """Phase 2: Extrait les propositions pour des questions déjà sauvegardées et les insère dans Supabase."""
+    def _extract_and_save_propositions(self, document: Document, qcm_id: int, saved_questions_details: List[Dict[str, Any]],
+                                       only_numbers: Optional[Set[int]] = None):
+        """Phase 2: Extrait les propositions pour des questions déjà sauvegardées et les insère dans Supabase.
+        
+        Avec only_numbers (réextraction incrémentale), seules ces questions sont traitées
+        et leurs propositions existantes sont réécrites en place (upsert sur question_id, lettre)."""
+        document = as_document(document)
         if not saved_questions_details:
             print("ℹ️ Phase 2 Propositions: Aucune question sauvegardée fournie, donc pas de propositions à extraire.")
             return
@@ -1061,26 +1319,15 @@ FORMAT JSON STRICT:
             question_id_list = [q["db_id"] for q in saved_questions_details if q.get("db_id")]
             print(f"📌 Utilisation du mappage fourni en argument (fallback): {len(question_map_by_numero)} questions")
 
-        # Diviser le document en sections
-        page_sections = []
-        header_matches = list(re.finditer(r'^# Page \d+', markdown_text, flags=re.MULTILINE))
-        
-        if not header_matches:
-            if markdown_text.strip(): 
-                page_sections.append({"index": 1, "content": markdown_text.strip(), "page_num": 1})
-        else:
-            for i, match in enumerate(header_matches):
-                start_content = match.end()
-                end_content = header_matches[i+1].start() if (i + 1) < len(header_matches) else len(markdown_text)
-                page_content = markdown_text[start_content:end_content].strip()
-                
-                # Extraire le numéro de page
-                page_header = match.group(0)
-                page_num = re.search(r'Page (\d+)', page_header)
-                page_num = int(page_num.group(1)) if page_num else i + 1
-                
-                if page_content:
-                    page_sections.append({"index": i+1, "content": page_content, "page_num": page_num})
+        refresh = only_numbers is not None
+        if refresh:
+            question_map_by_numero = {numero: q_id for numero, q_id in question_map_by_numero.items() if numero in only_numbers}
+            print(f"🔄 Réextraction incrémentale des propositions pour {len(question_map_by_numero)} questions")
+            if not question_map_by_numero:
+                return
+
+        # Sections de pages issues du Document
+        page_sections = document.page_sections()
 
         if not page_sections:
             print("ℹ️ Aucun contenu de page trouvé pour l'extraction des propositions.")
@@ -1092,24 +1339,30 @@ FORMAT JSON STRICT:
         # Liste des numéros de questions pour lesquelles on recherche des propositions
         missing_questions = set(question_map_by_numero.keys())
         
-        # OPTIMISATION: Traiter les sections par groupes pour réduire les appels API
-        # Regrouper les sections en batch de 2-3 pour réduire le nombre d'appels API tout en gardant un contexte pertinent
-        batched_sections = []
-        current_batch = []
-        current_batch_size = 0
-        target_batch_size = 10000  # Viser ~10K caractères par batch pour un bon équilibre
-        
-        for section in page_sections:
-            if current_batch_size + len(section["content"]) > target_batch_size and current_batch:
-                batched_sections.append(current_batch)
-                current_batch = [section]
-                current_batch_size = len(section["content"])
-            else:
-                current_batch.append(section)
-                current_batch_size += len(section["content"])
+        # Questions déjà extraites dans un autre QCM (même bloc normalisé): propositions reprises sans appel API.
+        # Les réponses correctes ne sont pas reprises: elles viennent de la grille de ce document (Phase 3)
+        try:
+            reused = find_reusable(self.supabase, question_hashes(document, missing_questions))
+        except Exception as e:
+            print(f"⚠️ Erreur lors de la recherche des questions déjà extraites: {str(e)}")
+            reused = {}
+        if reused:
+            for numero, entry in reused.items():
+                all_propositions.append({"numero_question": numero, "propositions": entry["propositions"]})
+            missing_questions -= set(reused)
+            # Pages dont toutes les questions sont reprises: rien à envoyer au LLM
+            page_state = document.page_state(set(question_map_by_numero))
+            covered_pages = {page_num for page_num, page in page_state.items()
+                             if page["question_numbers"] and not set(page["question_numbers"]) & missing_questions}
+            page_sections = [section for section in page_sections if section["page_num"] not in covered_pages]
+            print(f"♻️ {len(reused)} question(s) reprises d'extractions précédentes: {sorted(reused)} "
+                  f"({len(covered_pages)} page(s) sans appel API)")
         
-        if current_batch:  # Ajouter le dernier batch
-            batched_sections.append(current_batch)
+        # OPTIMISATION: Traiter les sections par groupes pour réduire les appels API
+        # Regrouper les sections jusqu'au budget de tokens du modèle, en ne coupant qu'aux frontières de questions
+        batch_separator = "\n\n==== NOUVELLE SECTION ====\n\n"
+        batch_packer = ChunkPacker("mistral-medium-latest", separator=batch_separator)
+        batched_sections = batch_packer.pack_groups([section["content"] for section in page_sections])
             
         print(f"📊 Optimisation: {len(page_sections)} sections regroupées en {len(batched_sections)} batchs pour réduire les appels API")
         
@@ -1123,8 +1376,7 @@ FORMAT JSON STRICT:
         # Traiter les batchs de sections
         for batch_index, batch in enumerate(batched_sections):
             # Construire un contenu combiné avec des séparateurs clairs pour ce batch
-            batch_content = "\n\n==== NOUVELLE SECTION ====\n\n".join([section["content"] for section in batch])
-            batch_indexes = [section["index"] for section in batch]
+            batch_content = batch_separator.join(batch)
             
             # Afficher la progression
             progress = int((batch_index / total_batches) * 100)
@@ -1135,6 +1387,9 @@ FORMAT JSON STRICT:
             if not missing_questions:
                 print(f"\n✅ Toutes les questions ont des propositions! Arrêt anticipé du traitement.")
                 break
+            if not budget_allows("extraction des propositions"):
+                print(f"\n💸 Budget épuisé: {total_batches - batch_index} batch(s) laissé(s) à l'index des propositions")
+                break
             
             # Extraire les propositions avec un seul appel API pour tout le batch
             extracted_props = self._extract_propositions_with_api(
@@ -1153,7 +1408,7 @@ FORMAT JSON STRICT:
                     print(f" | ✓ {len(question_nums)} question(s) traitées")
             else:
                 # Fallback - essayer avec le prompt simplifié seulement si on a moins de 50% des questions
-                if len(missing_questions) > len(question_map_by_numero) / 2:
+                if len(missing_questions) > len(question_map_by_numero) / 2 and budget_allows("prompt simplifié"):
                     extracted_props_fallback = self._extract_propositions_with_api(
                         batch_content, 
                         prompt_type="simplified",
@@ -1183,54 +1438,19 @@ FORMAT JSON STRICT:
         # Si après les passes précédentes il reste des questions sans propositions, utiliser des regex
         if missing_questions:
             print(f"⚠️ Après l'extraction par API, il reste {len(missing_questions)} questions sans propositions.")
-            print("🔍 Tentative d'extraction par regex patterns...")
-            
-            # Définir des patterns courants pour les propositions A, B, C, D, E
-            proposition_patterns = [
-                r'([A-E])\.\s+(.*?)(?=(?:[A-E]\.|\n\n|$))',  # A. Texte
-                r'([A-E])\s*[:]\s+(.*?)(?=(?:[A-E]\s*:|\n\n|$))',  # A : Texte
-                r'([A-E])\)\s+(.*?)(?=(?:[A-E]\)|\n\n|$))',  # A) Texte
-                r'([A-E])\s+-\s+(.*?)(?=(?:[A-E]\s+-|\n\n|$))',  # A - Texte
-                r'(?<!\w)([A-E])(?!\w)\s+(.*?)(?=(?:(?<!\w)[A-E](?!\w)|\n\n|$))'  # A Texte (sans ponctuation)
-            ]
+            print("🔍 Tentative d'extraction par l'index des propositions...")
             
-            # Parcourir TOUTES les sections pour les questions manquantes
+            # Index des titres et des lignes A–E du Document (construit une fois)
+            heading_index = document.headings
             regex_propositions = []
+            for missing_num in sorted(missing_questions):
+                found_props = heading_index.question_propositions(missing_num)
+                if found_props:
+                    regex_propositions.append({
+                        "numero_question": missing_num,
+                        "propositions": found_props
+                    })
             
-            # Rechercher les questions manquantes dans toutes les sections
-            for missing_num in missing_questions:
-                # Construire un pattern pour détecter la question
-                question_pattern = fr"(?:{missing_num}\s*[\.:)]|[Qq]uestion\s*{missing_num}|{missing_num}\s*[^\d])"
-                
-                # Chercher dans toutes les sections
-                for section in page_sections:
-                    section_content = section["content"]
-                    
-                    # Tenter de trouver la question dans cette section
-                    question_match = re.search(question_pattern, section_content)
-                    if question_match:
-                        # Définir la zone de recherche pour les propositions
-                        start_pos = question_match.start()
-                        # Chercher dans un intervalle de 2000 caractères après la question
-                        search_zone = section_content[start_pos:start_pos + 2000]
-                        
-                        # Rechercher les propositions dans cette zone
-                        found_props = {}
-                        for pattern in proposition_patterns:
-                            for match in re.finditer(pattern, search_zone, re.DOTALL):
-                                lettre, texte = match.groups()
-                                texte = texte.strip()
-                                if texte and lettre in "ABCDE" and lettre not in found_props:
-                                    found_props[lettre] = texte
-                        
-                        if found_props:
-                            regex_propositions.append({
-                                "numero_question": missing_num,
-                                "propositions": found_props
-                            })
-                            # Ne plus chercher cette question
-                            break
-                        
             if regex_propositions:
                 print(f"✅ Extraction par regex réussie pour {len(regex_propositions)} questions")
                 all_propositions.extend(regex_propositions)
@@ -1281,19 +1501,30 @@ FORMAT JSON STRICT:
         questions_coverage = {}  # Tracker le nombre de propositions par question
         
         for (question_id, lettre), texte_clean in unique_propositions.items():
-            # Vérifier si cette proposition existe déjà
-            if question_id in existing_propositions and lettre in existing_propositions[question_id]:
-                print(f"ℹ️ Proposition {lettre} pour question ID {question_id} existe déjà, ignorée")
-                continue
-            
-            all_reponses_to_insert.append({
-                "question_id": question_id,
-                "lettre": lettre,
-                "contenu": json.dumps({"text": texte_clean}),
-                "uuid": str(uuid.uuid4()),
-                "est_correcte": False,
-                "latex": None
-            })
+            # Réextraction incrémentale: réécriture en place, sans toucher uuid ni est_correcte
+            if refresh:
+                all_reponses_to_insert.append({
+                    "question_id": question_id,
+                    "lettre": lettre,
+                    "contenu": json.dumps({"text": texte_clean}),
+                    "latex": None
+                })
+                existing_propositions.get(question_id, set()).discard(lettre)
+            else:
+                # Vérifier si cette proposition existe déjà
+                if question_id in existing_propositions and lettre in existing_propositions[question_id]:
+                    print(f"ℹ️ Proposition {lettre} pour question ID {question_id} existe déjà, ignorée")
+                    continue
+                
+                all_reponses_to_insert.append({
+                    "question_id": question_id,
+                    "lettre": lettre,
+                    "contenu": json.dumps({"text": texte_clean}),
+                    "uuid": str(uuid.uuid4()),
+                    # Fixé par la Phase 3 depuis la grille de correction de ce document, question reprise ou non
+                    "est_correcte": False,
+                    "latex": None
+                })
             
             # Tracker la couverture
             if question_id not in questions_coverage:
@@ -1325,6 +1556,7 @@ FORMAT JSON STRICT:
         else:
             print("✅ Toutes les questions ont des propositions!")
 
+        inserted_keys = set()  # (question_id, lettre) écrits
         if all_reponses_to_insert:
             print(f"💾 Sauvegarde de {len(all_reponses_to_insert)} propositions dans Supabase...")
             
@@ -1343,15 +1575,23 @@ FORMAT JSON STRICT:
                 print(f"\r⌛ [{progress_bar}] {progress}% - Insertion des propositions", end="")
                 
                 try:
-                    result = self.supabase.table("reponses").insert(chunk).execute()
+                    if refresh:
+                        result = self.supabase.table("reponses").upsert(chunk, on_conflict="question_id,lettre").execute()
+                    else:
+                        result = self.supabase.table("reponses").insert(chunk).execute()
                     if result.data:
                         total_inserted += len(result.data)
+                    inserted_keys.update((row["question_id"], row["lettre"]) for row in chunk)
                 except Exception as e:
                     print(f"\n    🔥 Erreur lors de l'insertion d'un chunk: {str(e)}")
                     # Continuer avec le prochain chunk plutôt que d'abandonner
             
             print(f"\n✅ {total_inserted} propositions sauvegardées dans Supabase")
             
+            # Réextraction incrémentale: lettres en base absentes de la nouvelle extraction d'une question réextraite
+            if refresh:
+                self._delete_vanished_letters(existing_propositions, questions_coverage)
+            
             # Ajouter des statistiques sur les performances
             end_time = datetime.datetime.now()
             duration = end_time - start_time
@@ -1361,12 +1601,56 @@ FORMAT JSON STRICT:
         else:
             print("ℹ️ Aucune proposition à sauvegarder")
         
+        # Traçabilité des reprises: seules les questions dont une proposition reprise a été écrite
+        # (la déduplication garde un texte LLM plus long, une lettre déjà en base n'est pas réinsérée)
+        if reused:
+            written = {
+                numero: entry for numero, entry in reused.items()
+                if numero in question_map_by_numero and any(
+                    (question_map_by_numero[numero], lettre) in inserted_keys
+                    and unique_propositions.get((question_map_by_numero[numero], lettre)) == str(texte).strip()
+                    for lettre, texte in entry["propositions"].items()
+                )
+            }
+            try:
+                record_reuse(self.supabase, qcm_id, question_map_by_numero, written)
+            except Exception as e:
+                print(f"⚠️ Erreur lors de la traçabilité des reprises: {str(e)}")
+        
         print("🏁 Phase 2 terminée.")
     
-    def _extract_propositions_with_api(self, content: str, prompt_type: str = "standard", section_index: int = 0) -> List[Dict]:
+    def _delete_vanished_letters(self, existing_propositions: Dict[str, Set[str]], questions_coverage: Dict[str, Set[str]]):
+        """Supprime les propositions qui ont disparu d'une question réextraite.
+
+        Seules les questions dont la réextraction a retourné des propositions sont
+        concernées: une question sans résultat garde ses propositions.
+        """
+        for question_id, letters in existing_propositions.items():
+            if not letters or question_id not in questions_coverage:
+                continue
+            try:
+                self.supabase.table("reponses").delete().eq("question_id", question_id).in_("lettre", sorted(letters)).execute()
+                print(f"🗑️ Propositions disparues supprimées pour la question ID {question_id}: {', '.join(sorted(letters))}")
+            except Exception as e:
+                print(f"⚠️ Propositions disparues conservées pour la question ID {question_id} ({str(e)}): {', '.join(sorted(letters))}")
+
+    def _extract_propositions_with_api(self, content: str, prompt_type: str = "standard", section_index: str = "0") -> List[Dict]:
         """Méthode générique pour extraire les propositions via l'API Mistral."""
-        # Tronquer le contenu pour respecter les limites de l'API
-        truncated_content = content[:25000]  # Augmenté à 25K caractères pour couvrir plus de contenu
+        # Le routeur choisit le modèle (historiquement medium pour l'optimisé, small sinon)
+        task = f"propositions_{prompt_type}"
+        features = page_features(content)
+        model = self.router.choose(task, features)
+        
+        # Redécouper aux frontières de questions plutôt que tronquer si le contenu dépasse le budget
+        packer = ChunkPacker(model)
+        if not packer.fits(content):
+            chunks = packer.pack([content])
+            if len(chunks) > 1:
+                print(f"    ✂️ Section {section_index} découpée en {len(chunks)} chunks aux frontières de questions")
+                merged_props = []
+                for chunk_index, chunk in enumerate(chunks):
+                    merged_props.extend(self._extract_propositions_with_api(chunk, prompt_type, f"{section_index}.{chunk_index + 1}"))
+                return merged_props
         
         # Construire le prompt en fonction du type demandé
         if prompt_type == "optimized":
@@ -1389,7 +1673,7 @@ FORMAT JSON STRICT:
             
             Texte à analyser:
             ---
-            {truncated_content}
+            {content}
             ---
             
             FORMAT DE RÉPONSE:
@@ -1423,7 +1707,7 @@ FORMAT JSON STRICT:
             
             Texte à analyser:
             ---
-            {truncated_content}
+            {content}
             ---
             
             Retourne un JSON avec cette structure:
@@ -1444,7 +1728,7 @@ FORMAT JSON STRICT:
             2. Les propositions A, B, C, D, E pour chaque question
             
             Texte:
-            {truncated_content}
+            {content}
             
             Format JSON attendu:
             [
@@ -1456,81 +1740,84 @@ FORMAT JSON STRICT:
             """
         
         try:
-            # Utiliser le modèle small pour les extractions standard, medium pour l'optimisé
-            model = "mistral-medium-latest" if prompt_type == "optimized" else "mistral-small-latest"
-            
-            messages = [UserMessage(content=prompt)]
-            response = self._call_api_with_retry(
-                self.client.chat.complete,
-                model=model,
-                messages=messages,
-                temperature=0.0,
-                response_format={"type": "json_object"}
-            )
+            from mistralai import UserMessage
+
+            def call(routed_model):
+                response = self._call_api_with_retry(
+                    self.client.chat.complete,
+                    model=routed_model,
+                    messages=[UserMessage(content=prompt)],
+                    temperature=0.0,
+                    response_format={"type": "json_object"}
+                )
+                return self._parse_propositions_response(response, section_index)
             
-            # Vérifier si l'appel API a échoué
-            if response is None:
-                print(f"    ❌ Échec de l'appel API pour l'extraction des propositions de la section {section_index}")
-                return []
+            return self.router.run(task, features, call, lambda result: validate_propositions(result, content), model=model) or []
+        except Exception as e:
+            print(f"    🔥 Erreur API pour section {section_index}: {str(e)}")
+        
+        return []
+
+    def _parse_propositions_response(self, response, section_index: str) -> List[Dict]:
+        """Parse la réponse JSON d'une extraction de propositions."""
+        if response.choices and response.choices[0].message and response.choices[0].message.content:
+            response_text = response.choices[0].message.content
+            print(f"    🔍 [DEBUG] Réponse API section {section_index}: {response_text[:200]}...")
             
-            if response.choices and response.choices[0].message and response.choices[0].message.content:
-                response_text = response.choices[0].message.content
-                print(f"    🔍 [DEBUG] Réponse API section {section_index}: {response_text[:200]}...")
+            try:
+                data = json.loads(response_text)
+                props_list = []
                 
-                try:
-                    data = json.loads(response_text)
-                    props_list = []
-                    
-                    # Gérer plusieurs formats possibles
-                    if isinstance(data, dict) and "propositions" in data:
-                        # Format standard {"propositions": [...]}
-                        props_list = data["propositions"]
-                    elif isinstance(data, list):
-                        # Format brut [{"numero_question": 1, "propositions": {...}}]
-                        # ou format spécial [{"propositions": [{}, {}]}]
-                        for item in data:
-                            if isinstance(item, dict):
-                                if "propositions" in item and isinstance(item["propositions"], list):
-                                    # Format [{"propositions": [{}, {}]}]
-                                    props_list.extend(item["propositions"])
-                                elif "numero_question" in item and "propositions" in item:
-                                    # Format [{"numero_question": 1, "propositions": {...}}]
-                                    props_list.append(item)
+                # Gérer plusieurs formats possibles
+                if isinstance(data, dict) and "propositions" in data:
+                    # Format standard {"propositions": [...]}
+                    props_list = data["propositions"]
+                elif isinstance(data, list):
+                    # Format brut [{"numero_question": 1, "propositions": {...}}]
+                    # ou format spécial [{"propositions": [{}, {}]}]
+                    for item in data:
+                        if isinstance(item, dict):
+                            if "propositions" in item and isinstance(item["propositions"], list):
+                                # Format [{"propositions": [{}, {}]}]
+                                props_list.extend(item["propositions"])
+                            elif "numero_question" in item and "propositions" in item:
+                                # Format [{"numero_question": 1, "propositions": {...}}]
+                                props_list.append(item)
+                
+                if isinstance(props_list, list) and props_list:
+                    # Formater les données pour être cohérent avec notre structure
+                    formatted_props = []
                     
-                    if isinstance(props_list, list) and props_list:
-                        # Formater les données pour être cohérent avec notre structure
-                        formatted_props = []
-                        
-                        for item in props_list:
-                            if not isinstance(item, dict):
-                                continue
-                                
-                            numero = item.get("numero_question")
-                            props = item.get("propositions")
+                    for item in props_list:
+                        if not isinstance(item, dict):
+                            continue
                             
-                            if not numero or not isinstance(props, dict):
-                                continue
-                                
-                            formatted_props.append({
-                                "numero_question": int(numero),
-                                "propositions": props
-                            })
+                        numero = item.get("numero_question")
+                        props = item.get("propositions")
                         
-                        if formatted_props:
-                            question_nums = [item["numero_question"] for item in formatted_props]
-                            print(f"    ✅ Extraction réussie pour les questions: {question_nums}")
-                            return formatted_props
-                except json.JSONDecodeError:
-                    print(f"    ⚠️ Erreur JSON dans la réponse API section {section_index}")
-            else:
-                print(f"    ⚠️ Réponse API invalide pour section {section_index}")
-        except Exception as e:
-            print(f"    🔥 Erreur API pour section {section_index}: {str(e)}")
+                        if not numero or not isinstance(props, dict):
+                            continue
+                            
+                        formatted_props.append({
+                            "numero_question": int(numero),
+                            "propositions": props
+                        })
+                    
+                    if formatted_props:
+                        question_nums = [item["numero_question"] for item in formatted_props]
+                        print(f"    ✅ Extraction réussie pour les questions: {question_nums}")
+                        return formatted_props
+            except json.JSONDecodeError:
+                print(f"    ⚠️ Erreur JSON dans la réponse API section {section_index}")
+        else:
+            print(f"    ⚠️ Réponse API invalide pour section {section_index}")
         
         return []
         
-    def extract_correct_answers(self, markdown_text: str, qcm_id: int):
-        """Identifie les réponses correctes à partir du contenu Markdown et met à jour la base de données."""
+    def extract_correct_answers(self, document: Document, qcm_id: int, only_numbers: Optional[Set[int]] = None):
+        """Identifie les réponses correctes à partir du document (ou du Markdown brut) et met à jour la base de données.
+        
+        Avec only_numbers, seules ces questions sont mises à jour (réextraction incrémentale)."""
         print(f"🔍 Extraction des réponses correctes pour le QCM ID: {qcm_id}...")
         
         # Initialisation du compteur de mises à jour - IMPORTANT: Doit être initialisé ici
@@ -1547,6 +1834,8 @@ FORMAT JSON STRICT:
                 
             # Créer un mappage numéro de question -> ID de question
             question_map = {q["numero"]: q["id"] for q in questions_result.data if "numero" in q and "id" in q}
+            if only_numbers is not None:
+                question_map = {numero: q_id for numero, q_id in question_map.items() if numero in only_numbers}
             
             if not question_map:
                 print("⚠️ Aucune question n'a pu être mappée par numéro depuis Supabase.")
@@ -1554,163 +1843,11 @@ FORMAT JSON STRICT:
                 
             print(f"📌 {len(question_map)} questions mappées depuis Supabase.")
 
-            # Créer un dictionnaire pour stocker toutes les lettres correctes par question
-            corrections_data = {}
-            questions_with_answers = set()  # Pour suivre les questions déjà traitées
-            
-            # Méthode PRINCIPALE: Recherche "Réponses justes : X, Y, Z"
-            # Cette méthode est la plus fiable et a priorité sur les autres
-            print("🔍 Recherche directe des réponses justes explicites...")
-            reponses_justes_pattern = r'(?:Q(?:uestion)?\s*(\d+)[^A-E]*|^#*\s*(\d+)[^A-E]*|^[^\d]*(\d+)[\.:\)][^A-E]*)(?:.*\n)*?.*[Rr](?:é|e)ponses?\s+(?:justes?|correctes?|exactes?)\s*:?\s*([A-E][,\s]*(?:[A-E][,\s]*)*)'
-            
-            reponses_justes_matches = list(re.finditer(reponses_justes_pattern, markdown_text, re.MULTILINE))
-            if reponses_justes_matches:
-                for match in reponses_justes_matches:
-                    # Extraire le numéro de question (peut être dans différents groupes selon le format)
-                    question_num = None
-                    for i in range(1, 4):  # Vérifier les groupes 1, 2, 3
-                        if match.group(i):
-                            try:
-                                question_num = int(match.group(i))
-                                break
-                            except (ValueError, TypeError):
-                                pass
-                    
-                    if question_num is None:
-                        continue
-                        
-                    # Extraire les lettres des réponses correctes
-                    answers_str = match.group(4)
-                    letters = re.findall(r'[A-E]', answers_str)
-                    
-                    if letters:
-                        # Éviter les doublons
-                        unique_letters = list(set(letters))
-                        
-                        # Ajouter à corrections_data
-                        corrections_data[question_num] = unique_letters
-                        questions_with_answers.add(question_num)
-                        print(f"✅ Trouvé directement: Question {question_num}, réponses correctes: {', '.join(unique_letters)}")
-            
-            # Obtenir la liste des questions qui n'ont pas encore de réponses
-            missing_questions = set(question_map.keys()) - questions_with_answers
-            
-            # Continuer avec les autres méthodes UNIQUEMENT pour les questions non traitées
-            if missing_questions:
-                print(f"ℹ️ {len(missing_questions)} questions n'ont pas de 'Réponses justes' explicites, recherche avec méthodes secondaires...")
-                
-                # Méthode 2: Analyse directe du texte pour les formats "A. Vrai" / "A. Faux"
-                print("🔍 Recherche des annotations Vrai/Faux pour chaque proposition...")
-                
-                # AMÉLIORATION: Pattern étendu pour capturer plus de formats
-                vrai_faux_pattern = r'(?:Question\s+)?(\d+)[\.:\)]\s*(?:[^\n]+\n+)?([A-E])\.?\s+([Vv]rai|[Ff]aux|[Jj]uste|[Cc]orrect)'
-                all_vrai_faux_matches = list(re.finditer(vrai_faux_pattern, markdown_text))
-                
-                if all_vrai_faux_matches:
-                    # Grouper par numéro de question
-                    vrai_faux_by_question = {}
-                    for match in all_vrai_faux_matches:
-                        try:
-                            question_num = int(match.group(1))
-                            # Ne traiter que si la question n'a pas déjà été traitée par la méthode principale
-                            if question_num not in questions_with_answers:
-                                lettre = match.group(2).upper()
-                                vf_status = match.group(3).lower()
-                                
-                                # Initialiser si la question n'existe pas encore
-                                if question_num not in vrai_faux_by_question:
-                                    vrai_faux_by_question[question_num] = []
-                                
-                                # Ajouter seulement si c'est vrai/juste/correct
-                                if vf_status in ['vrai', 'juste', 'correct']:
-                                    vrai_faux_by_question[question_num].append(lettre)
-                                    print(f"Trouvé: Question {question_num}, proposition {lettre} est {vf_status}")
-                        except (ValueError, IndexError):
-                            continue
-                    
-                    # Ajouter aux corrections uniquement pour les questions manquantes
-                    for question_num, lettres in vrai_faux_by_question.items():
-                        if lettres and question_num in missing_questions:  # Seulement si on a au moins une réponse correcte et question non traitée
-                            corrections_data[question_num] = lettres
-                            questions_with_answers.add(question_num)
-                            print(f"✅ Question {question_num}: réponses correctes {', '.join(lettres)} (via Vrai/Faux)")
-                
-                # Mettre à jour les questions manquantes
-                missing_questions = set(question_map.keys()) - questions_with_answers
-                
-                # Méthode 3: Extraction directe des réponses avec pattern plus inclusif
-                if missing_questions:
-                    print("🔍 Recherche des réponses par format multi-réponses...")
-                    # Formats typiques plus étendus: "1:A", "1: A,B,E", "Question 1 : A,D", etc.
-                    multi_answer_pattern = r'(?:Question\s+)?(\d+)\s*[\.:\)]\s*([A-E][,\s]*(?:[A-E][,\s]*)*)'
-                    multi_answers = list(re.finditer(multi_answer_pattern, markdown_text))
-                    
-                    for match in multi_answers:
-                        try:
-                            question_num = int(match.group(1))
-                            # Ne traiter que si la question n'a pas déjà été traitée par d'autres méthodes
-                            if question_num not in questions_with_answers:
-                                answers_str = match.group(2)
-                                letters = re.findall(r'[A-E]', answers_str)
-                                
-                                if letters:
-                                    # Éviter de dédoubler les lettres
-                                    unique_letters = list(set(letters))
-                                    
-                                    corrections_data[question_num] = unique_letters
-                                    questions_with_answers.add(question_num)
-                                    print(f"✅ Question {question_num}: réponses correctes {', '.join(unique_letters)} (via format multi-réponses)")
-                        except (ValueError, IndexError):
-                            continue
-            
-            # Si il reste des questions sans réponses, tenter l'approche par déduction
-            missing_questions = set(question_map.keys()) - questions_with_answers
-            if missing_questions:
-                print(f"ℹ️ {len(missing_questions)} questions n'ont toujours pas de réponses correctes, tentative par déduction...")
-                
-                # Tentative : détecter les questions où une seule proposition est correcte
-                # par déduction à partir des propositions marquées comme fausses
-                print("🔍 Tentative de déduction à partir des formulations 'A. Faux.'...")
-                
-                # Patterns pour détecter des questions et propositions
-                question_pattern = r'(?:Question|Q\.?)?\s*(\d+)(?:\s*:|\.|\))'
-                proposition_pattern = r'([A-E])\.?\s+([Ff]aux|[Vv]rai)'
-                
-                current_question = None
-                faux_propositions = {}
-                
-                # Parcourir ligne par ligne
-                for line in markdown_text.split('\n'):
-                    # Vérifier si c'est une nouvelle question
-                    q_match = re.search(question_pattern, line)
-                    if q_match:
-                        try:
-                            current_question = int(q_match.group(1))
-                            if current_question not in faux_propositions:
-                                faux_propositions[current_question] = []
-                        except (ValueError, IndexError):
-                            pass
-                    
-                    # Si nous sommes dans une question, chercher les propositions
-                    if current_question is not None and current_question in missing_questions:
-                        prop_matches = re.finditer(proposition_pattern, line)
-                        for prop_match in prop_matches:
-                            lettre = prop_match.group(1).upper()
-                            statut = prop_match.group(2).lower()
-                            
-                            if statut == 'faux':
-                                faux_propositions[current_question].append(lettre)
-                
-                # Pour chaque question, déduire les bonnes réponses
-                for question_num, faux_lettres in faux_propositions.items():
-                    if question_num in missing_questions and len(faux_lettres) > 0 and len(faux_lettres) < 5:  # Si toutes ne sont pas fausses
-                        all_letters = ['A', 'B', 'C', 'D', 'E']
-                        correct_letters = [l for l in all_letters if l not in faux_lettres]
-                        
-                        if correct_letters:
-                            corrections_data[question_num] = correct_letters
-                            questions_with_answers.add(question_num)
-                            print(f"✅ Question {question_num}: réponses déduites {', '.join(correct_letters)} (par élimination)")
+            # Parsing pur (sans accès à la base): partagé avec le retraitement en masse
+            corrections_data = parse_correct_answers(as_document(document).text, set(question_map.keys()), verbose=True)
+            if only_numbers is not None:
+                corrections_data = {numero: lettres for numero, lettres in corrections_data.items() if numero in question_map}
+            questions_with_answers = set(corrections_data.keys())
 
             # Si des questions n'ont toujours pas de réponses, on pourrait utiliser l'API Mistral ici
             # Mais nous allons conserver les questions déjà trouvées
@@ -1730,81 +1867,19 @@ FORMAT JSON STRICT:
             print(f"📊 Réponses correctes trouvées pour {len(corrections_data)} questions")
             print(f"🔄 Mise à jour des réponses dans Supabase...")
             
-            # MÉTHODE SIMPLIFIÉE ET PLUS ROBUSTE pour mettre à jour les réponses
-            for numero, lettres_correctes in corrections_data.items():
-                # Vérification si la question existe dans la base de données
-                if numero not in question_map:
-                    print(f"⚠️ Question {numero} non trouvée dans le mappage Supabase")
-                    continue
-                
-                question_id = question_map[numero]
-                
-                # 1. D'abord, récupérer toutes les réponses pour cette question
-                try:
-                    responses_result = self.supabase.table("reponses").select("id", "lettre").eq("question_id", question_id).execute()
-                    
-                    if not responses_result.data:
-                        print(f"⚠️ Aucune réponse trouvée pour la question {numero}")
-                        continue
-                    
-                    print(f"📊 Question {numero}: {len(responses_result.data)} propositions trouvées, {len(lettres_correctes)} correctes ({', '.join(lettres_correctes)})")
-                    
-                    # 2. Mettre à jour chaque réponse individuellement (approche fiable)
-                    for response in responses_result.data:
-                        response_id = response.get("id")
-                        lettre = response.get("lettre")
-                        
-                        if not response_id or not lettre:
-                            continue
-                        
-                        # Déterminer si cette réponse est correcte
-                        est_correcte = lettre in lettres_correctes
-                        
-                        try:
-                            # Mise à jour explicite avec vérification du résultat
-                            result = self.supabase.table("reponses").update({"est_correcte": est_correcte}).eq("id", response_id).execute()
-                            
-                            if result.data:
-                                updates_counter += 1
-                                status_str = "CORRECTE" if est_correcte else "incorrecte"
-                                print(f"    ✅ Proposition {lettre} (ID: {response_id}) marquée comme {status_str}")
-                            else:
-                                print(f"    ⚠️ Mise à jour non confirmée pour proposition {lettre} (ID: {response_id})")
-                        except Exception as e:
-                            print(f"    ⚠️ Erreur lors de la mise à jour de la proposition {lettre} (ID: {response_id}): {str(e)}")
-                except Exception as e:
-                    print(f"⚠️ Erreur lors de la récupération des réponses pour la question {numero}: {str(e)}")
+            # Mise à jour groupée: une lecture des propositions, au plus deux écritures pour tout le QCM
+            report = apply_correct_answers(self.supabase, qcm_id, corrections_data)
+            for numero in report["missing"]:
+                print(f"⚠️ Question {numero} non trouvée dans le mappage Supabase")
+            for numero, old_letters, new_letters in report["changes"]:
+                print(f"    ✅ Question {numero}: {', '.join(old_letters) or '-'} → {', '.join(new_letters)}")
+            updates_counter = report["updated"]
             
-            # Vérification finale des mises à jour
             if updates_counter > 0:
                 print(f"✅ Mise à jour terminée: {updates_counter} réponses mises à jour.")
                 print(f"✅ {len(corrections_data)} questions ont leurs réponses correctes identifiées.")
             else:
-                print("⚠️ Aucune mise à jour n'a été effectuée. Tentative de méthode alternative...")
-                
-                # MÉTHODE ALTERNATIVE: mise à jour directe par lettre et question
-                alt_updates = 0
-                for numero, lettres_correctes in corrections_data.items():
-                    if numero not in question_map:
-                        continue
-                    
-                    question_id = question_map[numero]
-                    
-                    # Mettre à jour directement par lettres
-                    for lettre in "ABCDE":
-                        est_correcte = lettre in lettres_correctes
-                        try:
-                            result = self.supabase.table("reponses").update({"est_correcte": est_correcte}).eq("question_id", question_id).eq("lettre", lettre).execute()
-                            if result.data and len(result.data) > 0:
-                                alt_updates += 1
-                                print(f"    ✅ Question {numero}, Proposition {lettre}: mise à jour alternative réussie")
-                        except Exception as e:
-                            print(f"    ⚠️ Erreur lors de la mise à jour alternative pour Q{numero}, Prop {lettre}: {str(e)}")
-                
-                if alt_updates > 0:
-                    print(f"✅ Méthode alternative: {alt_updates} réponses mises à jour.")
-                else:
-                    print("❌ Toutes les méthodes de mise à jour ont échoué.")
+                print("ℹ️ Aucune réponse à modifier: les réponses en base sont déjà à jour.")
             
         except Exception as e:
             print(f"🔥 Erreur lors de la récupération des données depuis Supabase: {str(e)}")
@@ -0,0 +1,130 @@
+"""
+Figures des questions récupérées dans la réponse OCR.
+
+Avec `include_image_base64=True`, l'OCR Mistral renvoie les images de chaque
+page dans le même appel et les référence dans le Markdown (`![img-0.jpeg](img-0.jpeg)`).
+Chaque image est décodée par blocs directement dans un fichier, puis les images
+répétées sur plusieurs pages (logo, en-tête) sont écartées par hash perceptuel.
+Les figures restantes sont rattachées à la question dont l'intervalle d'offsets
+contient leur référence dans le Markdown: pas de second rendu du PDF ni d'appel
+vision.
+"""
+
+import base64
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+FIGURES_MANIFEST = "figures.json"
+DECODE_CHUNK_SIZE = 1 << 16           # caractères base64 décodés à la fois (multiple de 4)
+PHASH_MAX_DISTANCE = 6                # bits différents tolérés entre deux images « identiques »
+REPEATED_MIN_PAGES = 2                # présente sur autant de pages: logo ou en-tête
+
+
+def decode_data_url(data_url: str, path: Path, chunk_size: int = DECODE_CHUNK_SIZE) -> int:
+    """Décode une image base64 (data URL ou base64 brut) par blocs dans un fichier; retourne la taille écrite."""
+    header, separator, payload = data_url.partition(",")
+    if not separator:
+        payload = header
+    chunk_size -= chunk_size % 4
+    written = 0
+    with open(path, "wb") as f:
+        for i in range(0, len(payload), chunk_size):
+            written += f.write(base64.b64decode(payload[i:i + chunk_size]))
+    return written
+
+
+def perceptual_hash(path: Path) -> Optional[int]:
+    """dHash 64 bits (gradients horizontaux d'une miniature 9×8 en niveaux de gris)."""
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            pixels = list(img.convert("L").resize((9, 8)).getdata())
+    except Exception:
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def _same_image(a: Optional[int], b: Optional[int]) -> bool:
+    return a is not None and b is not None and bin(a ^ b).count("1") <= PHASH_MAX_DISTANCE
+
+
+def drop_repeated(figures: List[Dict[str, Any]], min_pages: int = REPEATED_MIN_PAGES) -> List[Dict[str, Any]]:
+    """Retire les images présentes (à la gigue près) sur au moins `min_pages` pages différentes."""
+    groups: List[Dict[str, Any]] = []   # [{"phash", "pages", "members"}]
+    for figure in figures:
+        for group in groups:
+            if _same_image(group["phash"], figure.get("phash")):
+                group["pages"].add(figure["page_num"])
+                group["members"].append(figure)
+                break
+        else:
+            groups.append({"phash": figure.get("phash"), "pages": {figure["page_num"]}, "members": [figure]})
+    kept = []
+    for group in groups:
+        if len(group["pages"]) >= min_pages:
+            for figure in group["members"]:
+                Path(figure["path"]).unlink(missing_ok=True)
+        else:
+            kept.extend(group["members"])
+    return sorted(kept, key=lambda figure: (figure["page_num"], figure["id"]))
+
+
+def save_page_figures(page, page_num: int, output_dir: Path) -> List[Dict[str, Any]]:
+    """Écrit les images d'une page de la réponse OCR et libère leur base64."""
+    figures = []
+    for image in getattr(page, "images", None) or []:
+        data = getattr(image, "image_base64", None)
+        if not data:
+            continue
+        output_dir.mkdir(parents=True, exist_ok=True)
+        path = output_dir / f"page{page_num}_{image.id}"
+        if decode_data_url(data, path) == 0:
+            continue
+        image.image_base64 = None  # la réponse OCR ne garde pas les images en mémoire
+        figures.append({
+            "id": image.id,
+            "page_num": page_num,
+            "path": str(path),
+            "phash": perceptual_hash(path),
+            "bbox": [getattr(image, attr, None) for attr in ("top_left_x", "top_left_y", "bottom_right_x", "bottom_right_y")],
+        })
+    return figures
+
+
+def save_manifest(figures: List[Dict[str, Any]], output_dir: Path) -> str:
+    path = output_dir / FIGURES_MANIFEST
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(figures, f, ensure_ascii=False, indent=2)
+    return str(path)
+
+
+def load_manifest(markdown_path: str) -> List[Dict[str, Any]]:
+    """Figures enregistrées à côté d'un `content.md` (liste vide si l'option était désactivée)."""
+    try:
+        with open(Path(markdown_path).parent / FIGURES_MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+def link_figures(document, figures: List[Dict[str, Any]], numbers) -> List[Dict[str, Any]]:
+    """Numéro de question de chaque figure, d'après l'offset de sa référence Markdown dans sa page.
+
+    Seuls les titres des questions enregistrées (`numbers`) délimitent les intervalles;
+    une figure avant la première question (ou sans référence) reste sans question.
+    """
+    pages = {page.page_num: page for page in document.pages}
+    linked = []
+    for figure in figures:
+        page = pages.get(figure["page_num"])
+        if page is None:
+            continue
+        offset = document.text.find(f"![{figure['id']}](", page.start, page.end)
+        numero = document.headings.question_at(offset, numbers) if offset >= 0 else None
+        linked.append(dict(figure, offset=offset if offset >= 0 else None, numero=numero))
+    return linked
@@ -0,0 +1,211 @@
+"""
+Empreintes de contenu des QCM pour la détection des doublons.
+
+Une signature MinHash est calculée sur les énoncés normalisés des questions dès
+la sortie de l'OCR. Elle est découpée en bandes (LSH) stockées dans la table
+`qcm_fingerprints` avec un index GIN: retrouver les QCM candidats se fait en une
+seule requête, avant tout appel LLM, indépendamment du nom du fichier.
+
+Une forte similarité ne suffit pas à conclure au doublon: colles et concours
+blancs reprennent des questions d'une session à l'autre. Les candidats sont
+confirmés par l'appelant (pages identiques, ou même type, année et UE via
+`same_exam`).
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+from qcm_extraction.chunking import split_at_questions, QUESTION_BOUNDARY_PATTERN
+
+NUM_PERMUTATIONS = 64
+BAND_SIZE = 4  # 16 bandes de 4 valeurs
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 0.8  # Similarité de Jaccard estimée au-delà de laquelle un QCM est candidat doublon
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _permutation_coefficients() -> List[tuple]:
+    """Coefficients (a, b) déterministes des permutations MinHash."""
+    coefficients = []
+    for i in range(NUM_PERMUTATIONS):
+        digest = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "big") % (_MERSENNE_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:], "big") % _MERSENNE_PRIME
+        coefficients.append((a, b))
+    return coefficients
+
+
+_COEFFICIENTS = _permutation_coefficients()
+
+# Début de proposition: "A.", "A)", "A :", "A -"
+_PROPOSITION_START = re.compile(r'^[ \t]*[-*]?[ \t]*A[ \t]*[\.\):\-]', re.MULTILINE)
+
+
+def normalize_text(text: str) -> str:
+    """Minuscules, sans accents, sans ponctuation ni chiffres, espaces compactés."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"[^a-z]+", " ", text)
+    return text.strip()
+
+
+def extract_question_stems(markdown_text: str) -> List[str]:
+    """Énoncés normalisés des questions (texte entre le titre et la proposition A)."""
+    stems = []
+    for segment in split_at_questions(markdown_text):
+        heading = QUESTION_BOUNDARY_PATTERN.match(segment)
+        if not heading:
+            continue
+        body = segment[heading.end():]
+        proposition = _PROPOSITION_START.search(body)
+        if proposition:
+            body = body[:proposition.start()]
+        stem = normalize_text(body)
+        if len(stem.split()) >= SHINGLE_SIZE:
+            stems.append(stem)
+    return stems
+
+
+def _shingles(stems: List[str]) -> set:
+    shingles = set()
+    for stem in stems:
+        words = stem.split()
+        for i in range(len(words) - SHINGLE_SIZE + 1):
+            shingles.add(" ".join(words[i:i + SHINGLE_SIZE]))
+    return shingles
+
+
+def minhash_signature(shingles: set) -> List[int]:
+    """Signature MinHash (entiers 32 bits) d'un ensemble de shingles."""
+    hashed = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles]
+    if not hashed:
+        return []
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed) for a, b in _COEFFICIENTS]
+
+
+def signature_bands(signature: List[int]) -> List[str]:
+    """Découpe une signature en bandes LSH indexables ("indice:hash")."""
+    bands = []
+    for index in range(0, len(signature), BAND_SIZE):
+        band = ",".join(str(v) for v in signature[index:index + BAND_SIZE])
+        digest = hashlib.blake2b(band.encode(), digest_size=8).hexdigest()
+        bands.append(f"{index // BAND_SIZE}:{digest}")
+    return bands
+
+
+def compute_fingerprint(markdown_text: str, normalized_text: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Calcule l'empreinte d'un QCM à partir de son Markdown OCR.
+
+    Si aucun titre de question n'est détecté, le texte entier est utilisé
+    (`normalized_text` s'il est déjà calculé, cf. `Document.normalized_text`).
+    Retourne None si le document ne contient pas assez de texte.
+    """
+    stems = extract_question_stems(markdown_text)
+    if not stems:
+        if normalized_text is None:
+            normalized_text = normalize_text(re.sub(r'^# Page \d+', ' ', markdown_text, flags=re.MULTILINE))
+        stems = [normalized_text]
+    signature = minhash_signature(_shingles(stems))
+    if not signature:
+        return None
+    return {
+        "signature": signature,
+        "bands": signature_bands(signature),
+        "questions_count": len(stems),
+    }
+
+
+def estimated_similarity(signature_a: List[int], signature_b: List[int]) -> float:
+    """Similarité de Jaccard estimée entre deux signatures MinHash."""
+    if not signature_a or len(signature_a) != len(signature_b):
+        return 0.0
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / len(signature_a)
+
+
+def find_duplicate_candidates(supabase, fingerprint: Dict[str, Any],
+                              threshold: float = DUPLICATE_THRESHOLD) -> List[Dict[str, Any]]:
+    """QCM existants de contenu proche (une requête sur l'index des bandes), du plus similaire au moins similaire.
+
+    Retourne [{"qcm_id", "similarity"}]; ce ne sont que des candidats, à confirmer
+    avant de traiter le document comme un doublon.
+    """
+    result = supabase.table("qcm_fingerprints").select("qcm_id", "signature").ov("bands", fingerprint["bands"]).execute()
+    candidates = []
+    for row in result.data or []:
+        similarity = estimated_similarity(fingerprint["signature"], row["signature"])
+        if similarity >= threshold:
+            candidates.append({"qcm_id": row["qcm_id"], "similarity": similarity})
+    return sorted(candidates, key=lambda candidate: (-candidate["similarity"], candidate["qcm_id"]))
+
+
+def _normalize_field(value: Any) -> str:
+    return re.sub(r"\s+", "", str(value or "")).lower()
+
+
+def same_exam(metadata_a: Dict[str, Any], metadata_b: Dict[str, Any]) -> bool:
+    """Vrai si deux QCM ont le même type, la même année et la même UE (tous renseignés)."""
+    fields = ("type", "annee", "ue")
+    values_a = [_normalize_field(metadata_a.get(field)) for field in fields]
+    values_b = [_normalize_field(metadata_b.get(field)) for field in fields]
+    return all(values_a) and values_a == values_b
+
+
+def fetch_exam_metadata(supabase, qcm_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Type, année et UE de QCM existants ({qcm_id: {"type", "annee", "ue"}}, une requête)."""
+    if not qcm_ids:
+        return {}
+    result = supabase.table("qcm").select("id,type,annee,ue(numero)").in_("id", list(qcm_ids)).execute()
+    return {
+        row["id"]: {"type": row.get("type"), "annee": row.get("annee"), "ue": (row.get("ue") or {}).get("numero")}
+        for row in result.data or []
+    }
+
+
+def group_duplicates(signatures: Dict[int, List[int]], metadata: Dict[int, Dict[str, Any]],
+                     candidate_pairs: Iterable[tuple], threshold: float = DUPLICATE_THRESHOLD) -> List[List[int]]:
+    """Regroupe les QCM deux à deux similaires et de mêmes métadonnées
+
+    Chaque groupe part du QCM le plus récent non encore placé; un candidat n'y
+    entre que s'il est similaire (seuil) à chacun des membres et décrit le même
+    examen. A~B et B~C ne suffisent donc pas à fusionner A et C.
+    """
+    def directly_similar(qcm_a: int, qcm_b: int) -> bool:
+        return (
+            same_exam(metadata.get(qcm_a, {}), metadata.get(qcm_b, {}))
+            and estimated_similarity(signatures[qcm_a], signatures[qcm_b]) >= threshold
+        )
+
+    neighbors: Dict[int, set] = {}
+    for qcm_a, qcm_b in candidate_pairs:
+        if directly_similar(qcm_a, qcm_b):
+            neighbors.setdefault(qcm_a, set()).add(qcm_b)
+            neighbors.setdefault(qcm_b, set()).add(qcm_a)
+
+    assigned = set()
+    groups = []
+    for qcm_id in sorted(neighbors, reverse=True):
+        if qcm_id in assigned:
+            continue
+        group = [qcm_id]
+        for candidate in sorted(neighbors[qcm_id] - assigned, reverse=True):
+            if all(candidate in neighbors.get(member, ()) or directly_similar(candidate, member)
+                   for member in group[1:]):
+                group.append(candidate)
+        if len(group) > 1:
+            assigned.update(group)
+            groups.append(sorted(group))
+    return groups
+
+
+def save_fingerprint(supabase, qcm_id: int, fingerprint: Dict[str, Any]):
+    """Enregistre (ou remplace) l'empreinte d'un QCM."""
+    supabase.table("qcm_fingerprints").upsert({
+        "qcm_id": qcm_id,
+        "signature": fingerprint["signature"],
+        "bands": fingerprint["bands"],
+        "questions_count": fingerprint["questions_count"],
+    }).execute()
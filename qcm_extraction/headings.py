@@ -0,0 +1,120 @@
+"""
+Index des titres de questions et des lignes de propositions d'un Markdown OCR.
+
+Construit une seule fois par document: chaque numéro de question candidat
+est associé à sa page et à ses offsets, chaque ligne `A.`–`E.` à son offset. Les
+récupérations par regex des Phases 1 et 2 (questions ou propositions manquantes)
+deviennent des lectures de dictionnaire suivies d'un découpage du texte, au lieu
+de plusieurs `finditer` sur tout le document par question manquante.
+"""
+
+import bisect
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from qcm_extraction.chunking import QUESTION_BOUNDARY_PATTERN
+from qcm_extraction.pages import PAGE_HEADER_PATTERN
+
+PROPOSITION_LINE_PATTERN = re.compile(r'^[ \t]*(?:[-*][ \t]*)?(?:\*\*)?\(?([A-E])(?:\*\*)?[ \t]*[\.\):-](?:\*\*)?[ \t]+', re.MULTILINE)
+
+QUESTION_TEXT_MAX_LENGTH = 400  # comme les anciens patterns {20,400}
+PROPOSITIONS_WINDOW = 2000      # zone de recherche des propositions après le titre
+
+
+class HeadingIndex:
+    """Positions des titres de questions, des propositions et des pages d'un Markdown."""
+
+    def __init__(self, markdown_text: str, pages: Optional[List[Tuple[int, int]]] = None):
+        self.text = markdown_text
+        # numéro → [{"page_num", "start", "content_start"}], dans l'ordre du document
+        self.questions: Dict[int, List[Dict[str, int]]] = {}
+        # [(offset de la ligne, lettre, début du texte)], triés par offset
+        self.propositions: List[tuple] = []
+        self._page_offsets: List[int] = []
+        self._page_nums: List[int] = []
+
+        # Pages déjà découpées par le Document: [(offset de l'en-tête, numéro)]
+        if pages is None:
+            pages = [(match.start(), int(match.group(1))) for match in PAGE_HEADER_PATTERN.finditer(markdown_text)]
+        for offset, page_num in pages:
+            self._page_offsets.append(offset)
+            self._page_nums.append(page_num)
+        for match in QUESTION_BOUNDARY_PATTERN.finditer(markdown_text):
+            numero = int(match.group(1) or match.group(2))
+            self.questions.setdefault(numero, []).append({
+                "page_num": self.page_at(match.start()),
+                "start": match.start(),
+                "content_start": match.end(),
+            })
+        for match in PROPOSITION_LINE_PATTERN.finditer(markdown_text):
+            self.propositions.append((match.start(), match.group(1), match.end()))
+
+        # Toutes les frontières (pages, questions, propositions) pour borner les découpages
+        self._boundaries = sorted(
+            set(self._page_offsets)
+            | {heading["start"] for headings in self.questions.values() for heading in headings}
+            | {offset for offset, _, _ in self.propositions}
+        )
+        self._question_offsets = sorted(heading["start"] for headings in self.questions.values() for heading in headings)
+        self._proposition_offsets = [offset for offset, _, _ in self.propositions]
+
+    def page_at(self, offset: int) -> int:
+        """Numéro de la page contenant cet offset (1 si le document n'a pas d'en-têtes)."""
+        i = bisect.bisect_right(self._page_offsets, offset) - 1
+        return self._page_nums[i] if i >= 0 else (self._page_nums[0] if self._page_nums else 1)
+
+    def question_at(self, offset: int, numbers: Optional[Iterable[int]] = None) -> Optional[int]:
+        """Numéro de la question dont l'intervalle contient cet offset (dernier titre avant lui).
+
+        Avec `numbers`, seuls les titres de ces numéros (questions enregistrées) comptent.
+        """
+        allowed = set(numbers) if numbers is not None else None
+        best_start, best_numero = -1, None
+        for numero, headings in self.questions.items():
+            if allowed is not None and numero not in allowed:
+                continue
+            for heading in headings:
+                if best_start < heading["start"] <= offset:
+                    best_start, best_numero = heading["start"], numero
+        return best_numero
+
+    def _next_boundary(self, offset: int) -> int:
+        i = bisect.bisect_right(self._boundaries, offset)
+        return self._boundaries[i] if i < len(self._boundaries) else len(self.text)
+
+    def question_text(self, numero: int) -> Optional[str]:
+        """Énoncé d'une question: du titre à la première proposition ou question suivante."""
+        for heading in self.questions.get(numero, []):
+            end = min(self._next_boundary(heading["start"]), heading["content_start"] + QUESTION_TEXT_MAX_LENGTH)
+            # Le titre peut se poursuivre par "**", ":" ou "-" avant l'énoncé
+            contenu = re.sub(r'\s+', ' ', self.text[heading["content_start"]:end]).strip().lstrip("*:.)- ")
+            if len(contenu) > 15:
+                return contenu
+        return None
+
+    def question_block(self, numero: int) -> Optional[str]:
+        """Texte brut d'une question (énoncé et propositions): du titre à la question suivante."""
+        for heading in self.questions.get(numero, []):
+            j = bisect.bisect_right(self._question_offsets, heading["start"])
+            next_question = self._question_offsets[j] if j < len(self._question_offsets) else len(self.text)
+            return self.text[heading["content_start"]:min(next_question, heading["start"] + PROPOSITIONS_WINDOW)]
+        return None
+
+    def question_propositions(self, numero: int) -> Dict[str, str]:
+        """Propositions A–E suivant le titre d'une question (première occurrence de chaque lettre)."""
+        for heading in self.questions.get(numero, []):
+            j = bisect.bisect_right(self._question_offsets, heading["start"])
+            next_question = self._question_offsets[j] if j < len(self._question_offsets) else len(self.text)
+            zone_end = min(next_question, heading["start"] + PROPOSITIONS_WINDOW)
+            found: Dict[str, str] = {}
+            i = bisect.bisect_right(self._proposition_offsets, heading["start"])
+            while i < len(self.propositions) and self.propositions[i][0] < zone_end:
+                offset, lettre, text_start = self.propositions[i]
+                end = min(self._next_boundary(offset), zone_end)
+                texte = self.text[text_start:end].split("\n\n")[0].strip()
+                if texte and lettre not in found:
+                    found[lettre] = texte
+                i += 1
+            if found:
+                return found
+        return {}
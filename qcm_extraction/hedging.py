@@ -0,0 +1,158 @@
+"""
+Requêtes doublées (« hedging ») pour couper la queue de latence des appels LLM.
+
+Option réservée aux appels idempotents (`temperature=0.0`): s'il n'a pas
+répondu après le percentile de latence observé récemment pour le même point
+d'accès et la même taille de prompt, un doublon est envoyé et la première
+réponse réussie est retenue. Sans doublon possible (historique trop court,
+plafond atteint), l'appel s'exécute dans le thread appelant; sinon dans un
+thread dédié. Seuls les doublons passent par le pool, et la latence est
+mesurée à partir du démarrage effectif de l'appel. Le doublon perdant est
+annulé s'il n'a pas encore démarré; sinon (client HTTP synchrone) sa réponse
+est simplement ignorée, ses tokens restant comptés dans le budget du document.
+
+Le taux de doublons est plafonné (`max_ratio` des appels du point d'accès):
+un ralentissement général de l'API n'entraîne pas un doublement du trafic.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_HEDGE_PERCENTILE = 0.95
+DEFAULT_HEDGE_MAX_RATIO = 0.05   # au plus 5 % d'appels supplémentaires
+DEFAULT_MIN_SAMPLES = 20         # latences observées avant le premier doublon
+LATENCY_WINDOW = 200             # latences récentes conservées par clé
+HEDGE_WORKERS = 32               # threads des doublons uniquement
+
+
+def prompt_size_bucket(kwargs: Dict[str, Any]) -> str:
+    """Classe de taille du prompt ("s", "m", "l"): la latence dépend surtout de sa longueur."""
+    length = 0
+    for message in kwargs.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+        length += len(content) if isinstance(content, str) else sum(len(str(part)) for part in content or [])
+    return "s" if length < 8000 else "m" if length < 20000 else "l"
+
+
+class LatencyTracker:
+    """Latences récentes des appels réussis, par clé (point d'accès|taille)."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, latency: float):
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=self.window)).append(latency)
+
+    def percentile(self, key: str, fraction: float, min_samples: int = DEFAULT_MIN_SAMPLES) -> Optional[float]:
+        """Percentile des latences récentes, ou None si l'historique est trop court."""
+        with self._lock:
+            samples = sorted(self._latencies.get(key, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class Hedger:
+    """Double un appel lent au-delà du percentile de latence, dans la limite de `max_ratio`."""
+
+    def __init__(self, percentile: float = DEFAULT_HEDGE_PERCENTILE, max_ratio: float = DEFAULT_HEDGE_MAX_RATIO,
+                 min_samples: int = DEFAULT_MIN_SAMPLES, workers: int = HEDGE_WORKERS):
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.latencies = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+        self._counts: Dict[str, Dict[str, int]] = {}   # point d'accès → {"calls", "hedged", "hedge_wins"}
+        self._lock = threading.Lock()
+
+    def _run(self, key: str, func: Callable, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """Exécute l'appel et enregistre sa latence (hors attente d'un thread libre)."""
+        started = time.monotonic()
+        result = func(*args, **kwargs)
+        self.latencies.record(key, time.monotonic() - started)
+        return result
+
+    def _start_primary(self, key: str, func: Callable, args: tuple, kwargs: Dict[str, Any]) -> Future:
+        """Lance l'appel principal dans un thread dédié (pas dans le pool des doublons)."""
+        future: Future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._run(key, func, args, kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="hedge-primary", daemon=True).start()
+        return future
+
+    def _can_hedge(self, endpoint: str) -> bool:
+        with self._lock:
+            counts = self._counts[endpoint]
+            return counts["hedged"] + 1 <= self.max_ratio * counts["calls"]
+
+    def _may_hedge(self, endpoint: str) -> bool:
+        with self._lock:
+            counts = self._counts[endpoint]
+            if counts["hedged"] + 1 > self.max_ratio * counts["calls"]:
+                return False
+            counts["hedged"] += 1
+            return True
+
+    def call(self, func: Callable, args: tuple, kwargs: Dict[str, Any], endpoint: str, budget=None) -> Any:
+        """Exécute `func(*args, **kwargs)`; retourne la première réponse réussie (ou lève la dernière erreur).
+
+        `budget` réserve l'appel du doublon et reçoit les tokens du perdant
+        (ceux du gagnant sont comptés par l'appelant).
+        """
+        key = f"{endpoint}|{prompt_size_bucket(kwargs)}"
+        with self._lock:
+            self._counts.setdefault(endpoint, {"calls": 0, "hedged": 0, "hedge_wins": 0})["calls"] += 1
+        threshold = self.latencies.percentile(key, self.percentile, self.min_samples)
+        if threshold is None or not self._can_hedge(endpoint):
+            # Aucun doublon possible: appel direct dans le thread appelant
+            return self._run(key, func, args, kwargs)
+        primary = self._start_primary(key, func, args, kwargs)
+        done, _ = wait([primary], timeout=threshold)
+        if done or not self._may_hedge(endpoint):
+            return primary.result()
+        if budget is not None and not budget.allow(f"doublon {endpoint}"):
+            # Doublon non envoyé: il ne compte pas dans le plafond
+            with self._lock:
+                self._counts[endpoint]["hedged"] -= 1
+            return primary.result()
+
+        print(f"⏱️ {endpoint}: pas de réponse après {threshold:.1f}s (p{self.percentile * 100:.0f}), envoi d'un doublon")
+        hedge = self._executor.submit(self._run, key, func, args, kwargs)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for loser in pending:
+                    if not loser.cancel() and budget is not None:
+                        # Le perdant déjà parti consomme aussi des tokens s'il va au bout
+                        loser.add_done_callback(lambda f: budget.charge(f.result()) if f.exception() is None else None)
+                if future is hedge:
+                    with self._lock:
+                        self._counts[endpoint]["hedge_wins"] += 1
+                return future.result()
+        raise error
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {endpoint: dict(counts) for endpoint, counts in self._counts.items()}
+
+
+# Historique de latence partagé par les extracteurs du processus
+HEDGER = Hedger()
@@ -0,0 +1,140 @@
+"""
+Upload des images (figures des questions) vers le stockage Supabase, par lot.
+
+Les images sont stockées à une adresse dérivée de leur contenu
+(`sha256/ab/abcdef....png`): un logo ou une figure identique, répété sur
+plusieurs pages ou dans plusieurs QCM, n'est stocké qu'une fois. Un lot est
+dédoublonné en mémoire, les contenus déjà présents dans le bucket sont
+détectés par un listing par préfixe, et le reste est uploadé en parallèle avec
+retries. Les lignes `images` correspondantes sont insérées en une requête.
+"""
+
+import hashlib
+import mimetypes
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+
+from qcm_extraction.jobs import backoff_delay
+
+DEFAULT_BUCKET = "qcm_images"
+DEFAULT_UPLOAD_WORKERS = 8
+DEFAULT_MAX_RETRIES = 3
+IMAGE_CONTENT_TYPE = "question"
+
+
+def content_path(data: bytes, filename: str = "") -> str:
+    """Chemin de stockage d'une image d'après le hash de son contenu (extension conservée)."""
+    digest = hashlib.sha256(data).hexdigest()
+    suffix = Path(filename).suffix.lower() or ".jpg"
+    return f"sha256/{digest[:2]}/{digest}{suffix}"
+
+
+def _is_duplicate_error(error: Exception) -> bool:
+    # Upload concurrent du même contenu par un autre processus: l'objet existe déjà
+    message = str(error).lower()
+    return "duplicate" in message or "already exists" in message or "409" in message
+
+
+class ImageUploader:
+    """Upload par lot, adressé par contenu, d'images vers un bucket Supabase."""
+
+    def __init__(self, supabase, supabase_url: str, bucket: str = DEFAULT_BUCKET,
+                 workers: int = DEFAULT_UPLOAD_WORKERS, max_retries: int = DEFAULT_MAX_RETRIES):
+        self.supabase = supabase
+        self.supabase_url = supabase_url.rstrip("/")
+        self.bucket = bucket
+        self.workers = max(1, workers)
+        self.max_retries = max(1, max_retries)
+
+    def public_url(self, storage_path: str) -> str:
+        return f"{self.supabase_url}/storage/v1/object/public/{self.bucket}/{storage_path}"
+
+    def existing_paths(self, storage_paths: Iterable[str]) -> Set[str]:
+        """Chemins déjà présents dans le bucket (un listing par dossier de préfixe)."""
+        by_folder: Dict[str, Set[str]] = {}
+        for storage_path in storage_paths:
+            folder, _, name = storage_path.rpartition("/")
+            by_folder.setdefault(folder, set()).add(name)
+        existing = set()
+        storage = self.supabase.storage.from_(self.bucket)
+        for folder, names in by_folder.items():
+            try:
+                listed = storage.list(folder, {"limit": 1000})
+            except Exception as e:
+                print(f"⚠️ Listing du stockage impossible ({folder}): {str(e)}")
+                continue
+            existing.update(f"{folder}/{item['name']}" for item in listed or [] if item.get("name") in names)
+        return existing
+
+    def _upload(self, storage_path: str, data: bytes, content_type: str) -> bool:
+        storage = self.supabase.storage.from_(self.bucket)
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                storage.upload(path=storage_path, file=data, file_options={"content-type": content_type})
+                return True
+            except Exception as e:
+                if _is_duplicate_error(e):
+                    return True
+                if attempt == self.max_retries:
+                    print(f"❌ Échec de l'upload de {storage_path} après {attempt} tentatives: {str(e)}")
+                    return False
+                time.sleep(backoff_delay(attempt, base=1, maximum=10))
+        return False
+
+    def upload_files(self, files: Iterable[Union[str, Path]]) -> Dict[str, Optional[str]]:
+        """Uploade des fichiers image et retourne {chemin local: URL publique} (None si échec)."""
+        payloads: Dict[str, tuple] = {}   # chemin de stockage → (octets, type MIME)
+        paths_by_file: Dict[str, str] = {}
+        for file_path in files:
+            file_path = str(file_path)
+            with open(file_path, "rb") as f:
+                data = f.read()
+            storage_path = content_path(data, file_path)
+            paths_by_file[file_path] = storage_path
+            if storage_path not in payloads:
+                content_type, _ = mimetypes.guess_type(file_path)
+                payloads[storage_path] = (data, content_type or "image/jpeg")
+
+        existing = self.existing_paths(payloads)
+        to_upload = [storage_path for storage_path in payloads if storage_path not in existing]
+        uploaded = set(existing)
+        if to_upload:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(to_upload))) as executor:
+                results = executor.map(lambda storage_path: self._upload(storage_path, *payloads[storage_path]), to_upload)
+                uploaded.update(storage_path for storage_path, ok in zip(to_upload, results) if ok)
+
+        print(f"🖼️ Images: {len(paths_by_file)} fichier(s), {len(payloads)} contenu(s) distinct(s), "
+              f"{len(existing)} déjà stocké(s), {len(uploaded) - len(existing)}/{len(to_upload)} uploadé(s)")
+        return {
+            file_path: self.public_url(storage_path) if storage_path in uploaded else None
+            for file_path, storage_path in paths_by_file.items()
+        }
+
+    def upload_question_images(self, images: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """Uploade les images de questions ({"question_id", "path"}) et insère les lignes `images` en une requête.
+
+        Retourne {chemin local: URL publique}; une image déjà rattachée à la même
+        question n'est pas réinsérée.
+        """
+        urls = self.upload_files(image["path"] for image in images)
+        rows = []
+        seen = set()
+        for image in images:
+            url = urls.get(str(image["path"]))
+            key = (str(image["question_id"]), url)
+            if url and key not in seen:
+                seen.add(key)
+                rows.append({"type_contenu": IMAGE_CONTENT_TYPE, "image_url": url, "contenu_id": image["question_id"]})
+        if not rows:
+            return urls
+
+        question_ids = sorted({row["contenu_id"] for row in rows}, key=str)
+        existing = self.supabase.table("images").select("contenu_id", "image_url").in_("contenu_id", question_ids).execute()
+        known = {(str(row["contenu_id"]), row["image_url"]) for row in existing.data or []}
+        rows = [row for row in rows if (str(row["contenu_id"]), row["image_url"]) not in known]
+        if rows:
+            self.supabase.table("images").insert(rows).execute()
+            print(f"✅ {len(rows)} image(s) rattachée(s) aux questions")
+        return urls
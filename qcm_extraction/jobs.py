@@ -0,0 +1,226 @@
+"""
+File d'attente persistante des extractions (SQLite local).
+
+Les jobs sont identifiés par l'URL du PDF et traités par ordre de priorité.
+Un worker prend un job en bail (`lease`) pour une durée limitée et le prolonge
+tant qu'il travaille; un bail expiré (worker tué, machine redémarrée) rend le
+job à nouveau disponible. Un échec replanifie le job avec un backoff
+exponentiel; après `max_attempts` tentatives il passe en lettre morte (`dead`)
+avec l'erreur et les artefacts utiles à l'inspection (traceback, Markdown OCR).
+
+La base est en mode WAL: plusieurs processus workers partagent la même file,
+chaque prise de bail est une transaction `BEGIN IMMEDIATE`.
+"""
+
+import json
+import random
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_QUEUE_PATH = Path("qcm_extraction/temp/jobs.sqlite3")
+
+DEFAULT_LEASE_SECONDS = 900      # 15 min, prolongé par le worker pendant l'extraction
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+
+JOB_STATUSES = ("pending", "leased", "done", "dead")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    available_at REAL NOT NULL,
+    lease_expires_at REAL,
+    worker TEXT,
+    last_error TEXT,
+    result TEXT,
+    artifacts TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_next ON jobs (status, priority DESC, available_at, id);
+"""
+
+
+def backoff_delay(attempts: int, base: float = BACKOFF_BASE_SECONDS, maximum: float = BACKOFF_MAX_SECONDS) -> float:
+    """Délai avant la tentative suivante: exponentiel, plafonné, avec gigue."""
+    delay = min(maximum, base * (2 ** max(0, attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class JobQueue:
+    """File de jobs d'extraction partagée entre processus via SQLite."""
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _row(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("result", "artifacts"):
+            if job.get(key):
+                job[key] = json.loads(job[key])
+        return job
+
+    def enqueue(self, url: str, priority: int = 0, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                force: bool = False) -> Dict[str, Any]:
+        """Ajoute une URL à la file et retourne le job.
+
+        Une URL déjà en file n'est pas dupliquée (sa priorité est relevée si besoin);
+        un job terminé ou en lettre morte n'est remis en file qu'avec force=True.
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = self._conn.execute("SELECT * FROM jobs WHERE url = ?", (url,)).fetchone()
+            if existing is None:
+                self._conn.execute(
+                    "INSERT INTO jobs (url, priority, max_attempts, available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, priority, max_attempts, now, now, now)
+                )
+            elif existing["status"] in ("pending", "leased"):
+                self._conn.execute("UPDATE jobs SET priority = MAX(priority, ?), updated_at = ? WHERE id = ?",
+                                   (priority, now, existing["id"]))
+            elif force:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'pending', priority = ?, attempts = 0, max_attempts = ?, available_at = ?, "
+                    "lease_expires_at = NULL, worker = NULL, last_error = NULL, updated_at = ? WHERE id = ?",
+                    (priority, max_attempts, now, now, existing["id"])
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return self.get(url=url)
+
+    def get(self, job_id: Optional[int] = None, url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Job par identifiant ou par URL."""
+        if job_id is not None:
+            return self._row(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        return self._row(self._conn.execute("SELECT * FROM jobs WHERE url = ?", (url,)).fetchone())
+
+    def lease(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        """Prend en bail le prochain job disponible (priorité la plus haute, puis le plus ancien).
+
+        Les jobs en bail expiré sont repris comme des jobs en attente, sauf s'ils ont
+        épuisé leurs tentatives (worker tué à chaque essai): ils passent en lettre morte.
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'dead', lease_expires_at = NULL, updated_at = ?, "
+                "last_error = 'Bail expiré sans fin de traitement (worker interrompu)' "
+                "WHERE status = 'leased' AND lease_expires_at < ? AND attempts >= max_attempts",
+                (now, now)
+            )
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE (status = 'pending' AND available_at <= ?) "
+                "OR (status = 'leased' AND lease_expires_at < ?) "
+                "ORDER BY priority DESC, available_at, id LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'leased', attempts = attempts + 1, worker = ?, "
+                "lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (worker, now + lease_seconds, now, row["id"])
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id=row["id"])
+
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Prolonge le bail d'un job; False si le bail a été perdu (repris par un autre worker)."""
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            (now + lease_seconds, now, job_id, worker)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, result: Optional[Dict[str, Any]] = None) -> bool:
+        """Marque un job terminé avec son résultat."""
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = 'done', lease_expires_at = NULL, last_error = NULL, result = ?, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'leased'",
+            (json.dumps(result or {}, ensure_ascii=False, default=str), time.time(), job_id, worker)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str, artifacts: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Enregistre un échec: replanifie avec backoff, ou passe en lettre morte si les tentatives sont épuisées.
+
+        Retourne le nouveau statut ('pending' ou 'dead'), None si le bail avait été perdu.
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            job = self._conn.execute("SELECT * FROM jobs WHERE id = ? AND worker = ? AND status = 'leased'",
+                                     (job_id, worker)).fetchone()
+            if job is None:
+                self._conn.execute("COMMIT")
+                return None
+            status = "dead" if job["attempts"] >= job["max_attempts"] else "pending"
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, lease_expires_at = NULL, last_error = ?, "
+                "artifacts = ?, updated_at = ? WHERE id = ?",
+                (status, now + (0 if status == "dead" else backoff_delay(job["attempts"])), error,
+                 json.dumps(artifacts or {}, ensure_ascii=False, default=str), now, job_id)
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return status
+
+    def retry(self, job_id: int) -> bool:
+        """Remet en file un job en lettre morte (tentatives et dernière erreur remises à zéro)."""
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, available_at = ?, worker = NULL, last_error = NULL, "
+            "updated_at = ? "
+            "WHERE id = ? AND status = 'dead'",
+            (now, now, job_id)
+        )
+        return cursor.rowcount == 1
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Jobs d'un statut donné (ou tous), du plus prioritaire au moins prioritaire."""
+        if status:
+            rows = self._conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY priority DESC, id LIMIT ?",
+                                      (status, limit)).fetchall()
+        else:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY priority DESC, id LIMIT ?", (limit,)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """Nombre de jobs par statut (les baux expirés sont comptés à part)."""
+        counts = {status: 0 for status in JOB_STATUSES}
+        for row in self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        counts["expired_leases"] = self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'leased' AND lease_expires_at < ?", (time.time(),)
+        ).fetchone()[0]
+        return counts
@@ -3,11 +3,9 @@ import argparse
 from typing import Dict, Any
 from pathlib import Path
 from dotenv import load_dotenv
-import urllib.parse
 
-from .database import Database
+from .document import Document
 from .extractor import QCMExtractor
-from .models import QCM, Question, Option, Image
 
 def setup_argparse() -> argparse.ArgumentParser:
     """Configure le parseur d'arguments"""
@@ -39,77 +37,10 @@ def process_qcm(url: str, skip_corrections: bool = False, force: bool = False) -
         # Initialiser l'extracteur
         extractor = QCMExtractor()
         
-        # Vérifier si le QCM existe déjà dans la base de données
-        if not force:
-            print(f"🔍 Vérification si le QCM existe déjà pour l'URL: {url}")
-            # Extraire le nom de fichier de l'URL
-            filename = Path(urllib.parse.unquote(url.split('/')[-1])).name
-            
-            # Extraire des informations du nom de fichier pour aider à la recherche
-            parts = filename.split('-')
-            if len(parts) >= 3:
-                try:
-                    # Essayer d'extraire l'UE et le type
-                    ue_part = next((p for p in parts if p.startswith('ue')), None)
-                    type_part = next((p for p in parts if p in ['correction', 'qcm', 'colle', 'cb']), None)
-                    
-                    if ue_part and type_part:
-                        # Récupérer l'UE ID
-                        ue_result = extractor.supabase.table("ue").select("id").ilike("numero", f"%{ue_part}%").execute()
-                        
-                        if ue_result.data:
-                            ue_id = ue_result.data[0]["id"]
-                            
-                            # Rechercher les QCM correspondants
-                            qcm_query = extractor.supabase.table("qcm").select("id").eq("ue_id", ue_id)
-                            
-                            # Ajouter des filtres supplémentaires si disponibles
-                            if 'correction' in filename.lower():
-                                qcm_query = qcm_query.like("type", "%correction%")
-                            if 'colle' in filename.lower():
-                                qcm_query = qcm_query.like("type", "%colle%")
-                            if 'cb' in filename.lower() or 'concours' in filename.lower():
-                                qcm_query = qcm_query.like("type", "%concours%")
-                                
-                            qcm_result = qcm_query.execute()
-                            
-                            if qcm_result.data:
-                                qcm_id = qcm_result.data[0]["id"]
-                                print(f"⚠️ Un QCM similaire a déjà été importé (ID: {qcm_id})")
-                                
-                                # Vérifier si des questions existent pour ce QCM
-                                questions_query = extractor.supabase.table("questions").select("id").eq("qcm_id", qcm_id).execute()
-                                
-                                if questions_query.data:
-                                    print(f"✅ {len(questions_query.data)} questions trouvées pour ce QCM")
-                                    
-                                    # Si demandé, mettre à jour les corrections
-                                    if not skip_corrections:
-                                        # Télécharger le PDF et extraire le Markdown
-                                        pdf_path = extractor.download_pdf(url)
-                                        markdown_path = extractor.convert_pdf_to_markdown(pdf_path, url)
-                                        
-                                        if markdown_path:
-                                            with open(markdown_path, 'r', encoding='utf-8') as f:
-                                                markdown_content = f.read()
-                                            
-                                            print(f"📑 Mise à jour des réponses correctes pour le QCM existant (ID: {qcm_id})...")
-                                            extractor.extract_correct_answers(markdown_content, qcm_id)
-                                    
-                                    # Retourner les informations du QCM existant
-                                    return {
-                                        'success': True,
-                                        'qcm_id': qcm_id,
-                                        'existing': True,
-                                        'metadata': {"filename": filename}
-                                    }
-                except Exception as e:
-                    print(f"⚠️ Erreur lors de la vérification d'existence du QCM: {str(e)}")
-                    # On continue l'importation en cas d'erreur de vérification
-        
         # Extraire les métadonnées et traiter le QCM
+        # Un QCM déjà importé est reconnu par l'empreinte de son contenu juste après l'OCR
         print(f"🚀 Lancement du traitement complet pour l'URL: {url}")
-        processed_metadata = extractor.extract_metadata_from_path(url)
+        processed_metadata = extractor.extract_metadata_from_path(url, force=force)
         
         if not processed_metadata:
             print("❌ Échec critique: Impossible d'obtenir les métadonnées initiales ou le QCM de base.")
@@ -118,6 +49,28 @@ def process_qcm(url: str, skip_corrections: bool = False, force: bool = False) -
                 'error': "Échec de l'extraction des métadonnées initiales ou de la conversion Markdown."
             }
 
+        if processed_metadata.get('existing'):
+            qcm_id = processed_metadata['qcm_db_id']
+            print(f"⚠️ Ce QCM a déjà été importé (ID: {qcm_id})")
+            
+            # Si demandé, mettre à jour les corrections à partir du Markdown déjà produit
+            if not skip_corrections:
+                try:
+                    # Document déjà construit par l'extracteur après l'OCR
+                    document = processed_metadata.get('document') or Document.from_file(processed_metadata['markdown_path'])
+                    
+                    print(f"📑 Mise à jour des réponses correctes pour le QCM existant (ID: {qcm_id})...")
+                    extractor.extract_correct_answers(document, qcm_id)
+                except Exception as e:
+                    print(f"⚠️ Erreur lors de la mise à jour des réponses correctes: {str(e)}")
+            
+            return {
+                'success': True,
+                'qcm_id': qcm_id,
+                'existing': True,
+                'metadata': processed_metadata
+            }
+
         qcm_id_from_extraction = processed_metadata.get('qcm_db_id')
         
         if qcm_id_from_extraction:
@@ -126,13 +79,12 @@ def process_qcm(url: str, skip_corrections: bool = False, force: bool = False) -
                 markdown_path = processed_metadata['markdown_path']
                 print(f"📑 Extraction des réponses correctes à partir du Markdown: {markdown_path}")
                 
-                # Lire le contenu du fichier Markdown
+                # Réutiliser le Document de l'extracteur plutôt que relire le fichier Markdown
                 try:
-                    with open(markdown_path, 'r', encoding='utf-8') as f:
-                        markdown_content = f.read()
+                    document = processed_metadata.get('document') or Document.from_file(markdown_path)
                     
                     # Extraire les réponses correctes et mettre à jour la base de données
-                    extractor.extract_correct_answers(markdown_content, qcm_id_from_extraction)
+                    extractor.extract_correct_answers(document, qcm_id_from_extraction)
                 except Exception as e:
                     print(f"⚠️ Erreur lors de l'extraction des réponses correctes: {str(e)}")
             elif skip_corrections:
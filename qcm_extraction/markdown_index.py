@@ -0,0 +1,98 @@
+"""
+Index QCM → Markdown archivé.
+
+L'extracteur enregistre le chemin du `content.md` de chaque QCM sauvegardé dans
+`qcm_extraction/temp/outputs/index.json`. Les scripts de retraitement retrouvent
+ainsi le Markdown d'un QCM par simple lecture, sans parcourir les dossiers de
+sortie ni comparer les métadonnées.
+
+L'index est partagé par tous les extracteurs (threads, pool du service,
+processus workers): chaque mise à jour est faite sous verrou de fichier avec un
+fichier temporaire unique (voir `qcm_extraction.atomic`).
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from qcm_extraction.atomic import file_lock, read_json, update_json, write_json_atomic
+from qcm_extraction.report import fetch_pages
+
+DEFAULT_INDEX_PATH = Path("qcm_extraction/temp/outputs/index.json")
+
+
+def _to_json(index: Dict[int, str]) -> Dict[str, str]:
+    return {str(qcm_id): path for qcm_id, path in sorted(index.items())}
+
+
+def _from_json(data) -> Dict[int, str]:
+    return {int(qcm_id): path for qcm_id, path in (data or {}).items()}
+
+
+def load_index(index_path: Path = DEFAULT_INDEX_PATH) -> Dict[int, str]:
+    """Charge l'index {qcm_id: chemin du Markdown} (vide s'il n'existe pas)."""
+    return _from_json(read_json(index_path, {}))
+
+
+def save_index(index: Dict[int, str], index_path: Path = DEFAULT_INDEX_PATH):
+    """Remplace l'index complet (sous verrou, écriture atomique)."""
+    with file_lock(index_path):
+        write_json_atomic(index_path, _to_json(index))
+
+
+def register_markdown(qcm_id: int, markdown_path: str, index_path: Path = DEFAULT_INDEX_PATH):
+    """Associe un QCM à son Markdown archivé."""
+    def add_entry(data):
+        index = _from_json(data)
+        index[int(qcm_id)] = str(markdown_path)
+        return _to_json(index)
+    update_json(index_path, add_entry, {})
+
+
+def get_markdown_path(qcm_id: int, index_path: Path = DEFAULT_INDEX_PATH) -> Optional[str]:
+    """Chemin du Markdown d'un QCM, ou None s'il n'est pas indexé ou a disparu."""
+    path = load_index(index_path).get(int(qcm_id))
+    return path if path and os.path.exists(path) else None
+
+
+def rebuild_index(supabase, outputs_dir: Path = DEFAULT_INDEX_PATH.parent,
+                  index_path: Path = DEFAULT_INDEX_PATH) -> Dict[int, str]:
+    """Reconstruit l'index à partir des `metadata.json` des sorties existantes.
+
+    Un dossier est rattaché par `qcm_db_id` s'il est présent, sinon par
+    correspondance type / année / UE avec la table `qcm` (lue par pages).
+    Les entrées déjà indexées (y compris celles ajoutées pendant la
+    reconstruction par un autre processus) sont conservées.
+    """
+    index = load_index(index_path)
+
+    ue_numbers = {ue["id"]: ue["numero"] for ue in fetch_pages(lambda: supabase.table("ue").select("id", "numero").order("id"))}
+    qcm_by_key = {}
+    for qcm in fetch_pages(lambda: supabase.table("qcm").select("id", "type", "annee", "ue_id").order("id")):
+        qcm_by_key[(qcm["type"], qcm["annee"], ue_numbers.get(qcm["ue_id"]))] = qcm["id"]
+
+    for folder in sorted(Path(outputs_dir).iterdir()):
+        content_file = folder / "content.md"
+        metadata_file = folder / "metadata.json"
+        if not folder.is_dir() or not content_file.exists() or not metadata_file.exists():
+            continue
+        try:
+            with open(metadata_file, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Erreur lecture métadonnées {metadata_file}: {e}")
+            continue
+
+        qcm_id = metadata.get("qcm_db_id") or qcm_by_key.get((metadata.get("type"), metadata.get("annee"), metadata.get("ue")))
+        if qcm_id and int(qcm_id) not in index:
+            index[int(qcm_id)] = str(content_file)
+
+    def add_missing(data):
+        merged = _from_json(data)
+        for qcm_id, path in index.items():
+            merged.setdefault(qcm_id, path)
+        return _to_json(merged)
+    index = _from_json(update_json(index_path, add_missing, {}))
+    print(f"📇 Index Markdown reconstruit: {len(index)} QCM indexés")
+    return index
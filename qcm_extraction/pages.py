@@ -0,0 +1,86 @@
+"""
+État par page des QCM extraits, pour la réextraction incrémentale.
+
+Pour chaque section `# Page N` du Markdown OCR, on stocke dans la table
+`qcm_pages` un hash du contenu et les numéros des questions que la page
+contient. Lors d'un nouveau passage (PDF corrigé, OCR différent), seules les
+questions des pages dont le hash a changé sont réextraites et réécrites.
+Le découpage en pages et le calcul de l'état courant sont faits par `Document`.
+"""
+
+import hashlib
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from qcm_extraction.chunking import find_question_boundaries
+
+PAGE_HEADER_PATTERN = re.compile(r'^# Page (\d+)', re.MULTILINE)
+
+
+def page_hash(content: str) -> str:
+    """Hash du contenu d'une page, insensible aux variations d'espaces."""
+    return hashlib.sha256(" ".join(content.split()).encode("utf-8")).hexdigest()
+
+
+def page_question_numbers(pages: List[Dict[str, Any]], known_numbers: Optional[Set[int]] = None) -> Dict[int, List[int]]:
+    """Questions touchées par chaque page.
+
+    Une page contient les questions dont le titre y apparaît, plus la dernière
+    question de la page précédente si la page commence par sa suite (propositions
+    ou correction sans nouveau titre). Si `known_numbers` est fourni, seules ces
+    questions (celles en base) sont retenues.
+    """
+    by_page: Dict[int, List[int]] = {}
+    previous_question = None
+    for page in pages:
+        content = page["content"]
+        boundaries = find_question_boundaries(content)
+        numbers = []
+        if previous_question is not None and (not boundaries or content[:boundaries[0][0]].strip()):
+            numbers.append(previous_question)
+        for _, numero in boundaries:
+            if numero not in numbers:
+                numbers.append(numero)
+        if known_numbers is not None:
+            numbers = [n for n in numbers if n in known_numbers]
+        by_page[page["page_num"]] = sorted(numbers)
+        if boundaries:
+            previous_question = boundaries[-1][1]
+    return by_page
+
+
+def diff_page_states(stored: Dict[int, Dict[str, Any]], current: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """Compare l'état stocké à l'état courant.
+
+    Retourne les pages modifiées (ajoutées, supprimées ou de hash différent) et
+    l'ensemble des questions touchées, avant comme après la modification.
+    """
+    changed_pages = sorted(
+        page_num for page_num in set(stored) | set(current)
+        if stored.get(page_num, {}).get("content_hash") != current.get(page_num, {}).get("content_hash")
+    )
+    touched: Set[int] = set()
+    for page_num in changed_pages:
+        touched.update(stored.get(page_num, {}).get("question_numbers") or [])
+        touched.update(current.get(page_num, {}).get("question_numbers") or [])
+    return {"changed_pages": changed_pages, "touched_questions": touched}
+
+
+def load_page_state(supabase, qcm_id: int) -> Dict[int, Dict[str, Any]]:
+    """État par page stocké pour un QCM (vide si jamais enregistré)."""
+    result = supabase.table("qcm_pages").select("page_num", "content_hash", "question_numbers").eq("qcm_id", qcm_id).execute()
+    return {
+        row["page_num"]: {"content_hash": row["content_hash"], "question_numbers": row["question_numbers"] or []}
+        for row in result.data or []
+    }
+
+
+def save_page_state(supabase, qcm_id: int, state: Dict[int, Dict[str, Any]]):
+    """Remplace l'état par page d'un QCM (un upsert, plus la suppression des pages disparues)."""
+    if state:
+        supabase.table("qcm_pages").upsert([
+            {"qcm_id": qcm_id, "page_num": page_num, "content_hash": page["content_hash"],
+             "question_numbers": page["question_numbers"]}
+            for page_num, page in sorted(state.items())
+        ], on_conflict="qcm_id,page_num").execute()
+    supabase.table("qcm_pages").delete().eq("qcm_id", qcm_id).not_.in_("page_num", list(state) or [0]).execute()
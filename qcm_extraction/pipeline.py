@@ -0,0 +1,186 @@
+"""
+Exécution en pipeline des étapes d'extraction sur plusieurs documents.
+
+Chaque étape (téléchargement, OCR, métadonnées, Phases 1 à 3, enregistrement)
+a ses propres threads et une file d'entrée bornée: le document N+1 passe à
+l'OCR pendant que le document N est en extraction des propositions, et une
+étape saturée freine les précédentes au lieu d'accumuler des documents en
+mémoire. Les statistiques par étape (file, workers occupés, utilisation)
+désignent l'étape goulot d'étranglement.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+DEFAULT_STAGE_CONCURRENCY = {
+    "download": 4,
+    "ocr": 4,
+    "metadata": 4,
+    "questions": 2,
+    "propositions": 2,
+    "answers": 2,
+    "figures": 4,
+    "commit": 4,
+}
+DEFAULT_QUEUE_SIZE = 2
+
+_STOP = object()
+
+
+class StageStats:
+    """Compteurs d'une étape (mis à jour sous verrou par ses workers)."""
+
+    def __init__(self, name: str, concurrency: int, input_queue: queue.Queue):
+        self.name = name
+        self.concurrency = concurrency
+        self.input_queue = input_queue
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+
+class StagePipeline:
+    """Pipeline d'étapes à concurrence propre, reliées par des files bornées.
+
+    `stages` est une liste de (nom, fonction, concurrence); chaque fonction reçoit
+    l'élément et retourne False si l'élément s'arrête là (doublon, échec).
+    `worker_init` est appelé une fois par thread (ex.: un extracteur par thread).
+    """
+
+    def __init__(self, stages: List[tuple], queue_size: int = DEFAULT_QUEUE_SIZE,
+                 worker_init: Optional[Callable[[], Any]] = None):
+        self.stages: List[StageStats] = []
+        self._functions: List[Callable] = []
+        for name, function, concurrency in stages:
+            self.stages.append(StageStats(name, max(1, concurrency), queue.Queue(maxsize=max(1, queue_size))))
+            self._functions.append(function)
+        self.worker_init = worker_init
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._done: "queue.Queue[Any]" = queue.Queue()
+        self._started_at: Optional[float] = None
+
+    def context(self):
+        """Objet initialisé par `worker_init` pour le thread courant."""
+        if not hasattr(self._local, "context"):
+            self._local.context = self.worker_init() if self.worker_init else None
+        return self._local.context
+
+    def _worker(self, index: int):
+        stats = self.stages[index]
+        function = self._functions[index]
+        next_queue = self.stages[index + 1].input_queue if index + 1 < len(self.stages) else None
+        while True:
+            item = stats.input_queue.get()
+            if item is _STOP:
+                return
+            with self._lock:
+                stats.busy += 1
+            started = time.monotonic()
+            try:
+                keep_going = function(self.context(), item) is not False
+            except Exception as e:
+                print(f"🔥 Étape {stats.name}: {str(e)}")
+                keep_going = False
+                with self._lock:
+                    stats.failed += 1
+            finally:
+                with self._lock:
+                    stats.busy -= 1
+                    stats.processed += 1
+                    stats.busy_seconds += time.monotonic() - started
+            if keep_going and next_queue is not None:
+                next_queue.put(item)  # bloquant: l'étape suivante saturée freine celle-ci
+            else:
+                self._done.put(item)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Par étape: taille de la file, workers occupés, éléments traités et utilisation (0–1)."""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        with self._lock:
+            return [
+                {
+                    "stage": stage.name,
+                    "concurrency": stage.concurrency,
+                    "queued": stage.input_queue.qsize(),
+                    "busy": stage.busy,
+                    "processed": stage.processed,
+                    "failed": stage.failed,
+                    "utilization": stage.busy_seconds / (elapsed * stage.concurrency) if elapsed > 0 else 0.0,
+                }
+                for stage in self.stages
+            ]
+
+    def bottleneck(self) -> Optional[str]:
+        """Étape la plus utilisée (celle à qui donner plus de concurrence)."""
+        stats = self.stats()
+        return max(stats, key=lambda stage: stage["utilization"])["stage"] if stats else None
+
+    def run(self, items: Iterable[Any], report_interval: Optional[float] = None,
+            on_report: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> List[Any]:
+        """Fait passer tous les éléments dans le pipeline; retourne les éléments dans l'ordre de fin."""
+        self._started_at = time.monotonic()
+        threads = [
+            threading.Thread(target=self._worker, args=(index,), daemon=True, name=f"{stage.name}-{n}")
+            for index, stage in enumerate(self.stages) for n in range(stage.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+
+        submitted = 0
+        feeder_done = threading.Event()
+
+        def feed():
+            nonlocal submitted
+            for item in items:
+                self.stages[0].input_queue.put(item)
+                submitted += 1
+            feeder_done.set()
+
+        threading.Thread(target=feed, daemon=True, name="feeder").start()
+
+        finished: List[Any] = []
+        last_report = time.monotonic()
+        while not (feeder_done.is_set() and len(finished) == submitted):
+            try:
+                finished.append(self._done.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            if report_interval and on_report and time.monotonic() - last_report >= report_interval:
+                on_report(self.stats())
+                last_report = time.monotonic()
+
+        for stage in self.stages:
+            for _ in range(stage.concurrency):
+                stage.input_queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+        return finished
+
+
+def extraction_pipeline(extractor_factory: Callable[[], Any], concurrency: Optional[Dict[str, int]] = None,
+                        queue_size: int = DEFAULT_QUEUE_SIZE) -> StagePipeline:
+    """Pipeline des étapes de `QCMExtractor.DOCUMENT_STAGES`, un extracteur par thread."""
+    limits = dict(DEFAULT_STAGE_CONCURRENCY)
+    limits.update(concurrency or {})
+
+    def stage_function(stage: str):
+        return lambda extractor, run: extractor.run_document_stage(run, stage)
+
+    from qcm_extraction.extractor import QCMExtractor
+    stages = [(stage, stage_function(stage), limits.get(stage, 1)) for stage in QCMExtractor.DOCUMENT_STAGES]
+    return StagePipeline(stages, queue_size=queue_size, worker_init=extractor_factory)
+
+
+def format_stats(stats: List[Dict[str, Any]]) -> str:
+    """Tableau lisible des statistiques par étape."""
+    lines = [f"{'Étape':<14}{'File':>6}{'Occupés':>10}{'Traités':>9}{'Échecs':>8}{'Utilisation':>13}"]
+    for stage in stats:
+        lines.append(
+            f"{stage['stage']:<14}{stage['queued']:>6}{stage['busy']:>6}/{stage['concurrency']:<3}"
+            f"{stage['processed']:>9}{stage['failed']:>8}{stage['utilization']:>12.0%}"
+        )
+    return "\n".join(lines)
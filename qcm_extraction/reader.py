@@ -0,0 +1,144 @@
+"""
+Lecture des QCM complets (questions, propositions, réponses correctes) avec cache.
+
+Un QCM est lu en une seule requête PostgREST imbriquée (`qcm` → `questions` →
+`reponses`, même sélection que l'export) au lieu d'une requête sur `reponses`
+par question. Les QCM lus sont gardés dans un cache LRU en mémoire avec TTL,
+partagé par le processus: un QCM servi à chaud ne coûte aucune requête.
+L'extracteur et `apply_correct_answers` invalident l'entrée d'un QCM dès
+qu'ils y écrivent (`invalidate_qcm`). Chaque invalidation incrémente la
+génération du QCM: une lecture commencée avant l'écriture ne remet pas en
+cache l'état antérieur.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from qcm_extraction.export import nested_qcm_select, normalize_qcm
+
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_CACHE_TTL = 300   # secondes: borne la fraîcheur face aux écritures d'autres processus
+
+
+class QCMCache:
+    """Cache LRU à durée de vie limitée, sûr entre threads."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()   # qcm_id → (expire_at, qcm)
+        self._generations: Dict[int, int] = {}   # qcm_id → nombre d'invalidations
+        self._epoch = 0                          # invalidations complètes
+        self.writes = 0                          # toutes invalidations confondues
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, qcm_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(qcm_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[qcm_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(qcm_id)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, qcm_id: int) -> int:
+        """Génération d'un QCM, à relever avant de le lire puis à passer à `put`."""
+        with self._lock:
+            return self._epoch + self._generations.get(qcm_id, 0)
+
+    def put(self, qcm_id: int, qcm: Dict[str, Any], generation: Optional[int] = None, writes: Optional[int] = None):
+        """Met un QCM en cache, sauf s'il a été invalidé depuis `generation` (ou si une écriture
+        quelconque a eu lieu depuis `writes`): la lecture est alors peut-être périmée."""
+        with self._lock:
+            if generation is not None and generation != self._epoch + self._generations.get(qcm_id, 0):
+                return
+            if writes is not None and writes != self.writes:
+                return
+            self._entries[qcm_id] = (time.monotonic() + self.ttl, qcm)
+            self._entries.move_to_end(qcm_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, qcm_id: Optional[int] = None):
+        """Oublie un QCM (ou tout le cache si qcm_id est None)."""
+        with self._lock:
+            self.writes += 1
+            if qcm_id is None:
+                self._entries.clear()
+                self._epoch += 1
+            else:
+                self._entries.pop(qcm_id, None)
+                self._generations[qcm_id] = self._generations.get(qcm_id, 0) + 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Cache du processus, invalidé par les écritures de l'extracteur
+QCM_CACHE = QCMCache()
+
+
+def invalidate_qcm(qcm_id: Optional[int]):
+    """À appeler après toute écriture sur un QCM (questions, propositions, réponses, images)."""
+    if qcm_id is not None:
+        QCM_CACHE.invalidate(qcm_id)
+
+
+class QCMReader:
+    """API de lecture: `get_qcm` (une requête à froid, zéro à chaud) et `get_qcms` (une requête par lot)."""
+
+    def __init__(self, supabase, cache: QCMCache = QCM_CACHE):
+        self.supabase = supabase
+        self.cache = cache
+
+    def get_qcm(self, qcm_id: int) -> Optional[Dict[str, Any]]:
+        """QCM complet: métadonnées, ue_numero, questions triées et propositions avec est_correcte."""
+        cached = self.cache.get(qcm_id)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        generation = self.cache.generation(qcm_id)
+        result = self.supabase.table("qcm").select(nested_qcm_select()).eq("id", qcm_id).limit(1).execute()
+        if not result.data:
+            return None
+        qcm = normalize_qcm(result.data[0])
+        self.cache.put(qcm_id, qcm, generation)
+        return copy.deepcopy(qcm)
+
+    def get_qcms(self, qcm_ids: Optional[Iterable[int]] = None, ue: Optional[str] = None,
+                 annee: Optional[str] = None, type: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """QCM complets par identifiants (ceux en cache ne sont pas relus) ou par filtre UE / année / type."""
+        if qcm_ids is not None:
+            qcm_ids = list(dict.fromkeys(qcm_ids))
+            found = {qcm_id: self.cache.get(qcm_id) for qcm_id in qcm_ids}
+            missing = [qcm_id for qcm_id, qcm in found.items() if qcm is None]
+            if missing:
+                generations = {qcm_id: self.cache.generation(qcm_id) for qcm_id in missing}
+                result = self.supabase.table("qcm").select(nested_qcm_select()).in_("id", missing).execute()
+                for row in result.data or []:
+                    qcm = normalize_qcm(row)
+                    self.cache.put(qcm["id"], qcm, generations.get(qcm["id"]))
+                    found[qcm["id"]] = qcm
+            return [copy.deepcopy(found[qcm_id]) for qcm_id in qcm_ids if found.get(qcm_id) is not None]
+
+        # Identifiants inconnus avant la requête: rien n'est mis en cache si une écriture a eu lieu pendant
+        writes = self.cache.writes
+        query = self.supabase.table("qcm").select(nested_qcm_select(bool(ue)))
+        if ue:
+            query = query.eq("ue.numero", ue)
+        if annee:
+            query = query.eq("annee", annee)
+        if type:
+            query = query.eq("type", type)
+        qcms = [normalize_qcm(row) for row in query.order("id").limit(limit).execute().data or []]
+        for qcm in qcms:
+            self.cache.put(qcm["id"], qcm, writes=writes)
+        return copy.deepcopy(qcms)
@@ -0,0 +1,106 @@
+"""
+Rapport de complétude des QCM extraits.
+
+S'appuie sur les vues `question_rollup` et `qcm_completeness` (database/schema.sql):
+les agrégats sont calculés côté serveur et tout le corpus est lu en une requête
+(paginée au-delà de la limite de lignes de PostgREST), au lieu d'un SELECT sur
+`reponses` par question.
+"""
+
+import csv
+import json
+from typing import Any, Dict, IO, List, Optional
+
+# Colonnes de la vue qcm_completeness, dans l'ordre du rapport
+REPORT_COLUMNS = [
+    "qcm_id",
+    "type",
+    "annee",
+    "ue_numero",
+    "questions_count",
+    "propositions_count",
+    "correct_answers_count",
+    "questions_not_5_propositions",
+    "numeros_not_5_propositions",
+    "questions_without_correct",
+    "numeros_without_correct",
+    "missing_numeros",
+]
+
+PAGE_SIZE = 1000  # max-rows par défaut de PostgREST
+
+
+def fetch_pages(build_query, page_size: int = PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Lit toutes les lignes d'une requête page par page (`.range()`), jusqu'à une page incomplète.
+
+    `build_query` retourne une requête neuve et triée (ordre stable entre les pages).
+    """
+    rows: List[Dict[str, Any]] = []
+    offset = 0
+    while True:
+        result = build_query().range(offset, offset + page_size - 1).execute()
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+
+def fetch_completeness(supabase, qcm_ids: Optional[List[int]] = None, ue: Optional[str] = None,
+                       page_size: int = PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Lit la complétude de tous les QCM (ou d'une sélection) depuis la vue agrégée."""
+    def build_query():
+        query = supabase.table("qcm_completeness").select(*REPORT_COLUMNS)
+        if qcm_ids:
+            query = query.in_("qcm_id", qcm_ids)
+        if ue:
+            query = query.eq("ue_numero", ue)
+        return query.order("qcm_id")
+    return fetch_pages(build_query, page_size)
+
+
+def fetch_question_rollup(supabase, qcm_id: int) -> List[Dict[str, Any]]:
+    """Nombre de propositions et de réponses correctes de chaque question d'un QCM (une requête)."""
+    result = supabase.table("question_rollup").select("numero", "propositions_count", "correct_count").eq("qcm_id", qcm_id).order("numero").execute()
+    return result.data or []
+
+
+def is_complete(row: Dict[str, Any]) -> bool:
+    """Un QCM est complet s'il a des questions, toutes à 5 propositions et au moins une réponse correcte, sans trou."""
+    return (
+        row["questions_count"] > 0
+        and row["questions_not_5_propositions"] == 0
+        and row["questions_without_correct"] == 0
+        and not row["missing_numeros"]
+    )
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Totaux du corpus à partir des lignes du rapport."""
+    return {
+        "qcm": len(rows),
+        "qcm_complete": sum(1 for row in rows if is_complete(row)),
+        "questions": sum(row["questions_count"] for row in rows),
+        "propositions": sum(row["propositions_count"] for row in rows),
+        "correct_answers": sum(row["correct_answers_count"] for row in rows),
+        "questions_not_5_propositions": sum(row["questions_not_5_propositions"] for row in rows),
+        "questions_without_correct": sum(row["questions_without_correct"] for row in rows),
+        "missing_questions": sum(len(row["missing_numeros"] or []) for row in rows),
+    }
+
+
+def write_csv(rows: List[Dict[str, Any]], output: IO[str]):
+    """Écrit le rapport en CSV (les listes de numéros séparées par des espaces)."""
+    writer = csv.DictWriter(output, fieldnames=REPORT_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            column: " ".join(str(n) for n in value) if isinstance(value, list) else value
+            for column, value in ((column, row.get(column)) for column in REPORT_COLUMNS)
+        })
+
+
+def write_json(rows: List[Dict[str, Any]], output: IO[str]):
+    """Écrit le rapport en JSON, avec les totaux du corpus."""
+    json.dump({"summary": summarize(rows), "qcms": rows}, output, ensure_ascii=False, indent=2)
+    output.write("\n")
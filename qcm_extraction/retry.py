@@ -0,0 +1,338 @@
+"""
+Retries des appels API (Mistral) avec classification des erreurs et disjoncteur.
+
+Chaque erreur est classée (429, 5xx, timeout, réseau, 4xx): les erreurs
+client (4xx hors 429) ne sont pas retentées, un 429 attend le `Retry-After`
+indiqué par l'API, les autres erreurs transitoires attendent un délai à gigue
+complète (uniforme entre 0 et le plafond exponentiel) pour que les appelants
+parallèles ne retentent pas en cadence.
+
+Un disjoncteur partagé par point d'accès (`Chat.complete:mistral-small-latest`,
+`Ocr.process:mistral-ocr-latest`, ...) s'ouvre après plusieurs échecs
+transitoires consécutifs: les appels échouent alors immédiatement jusqu'à la
+fin du délai de repos, puis un seul appel d'essai décide de la refermeture.
+
+Avec l'échéance du document (`budget.deadline`), chaque tentative reçoit un
+délai `timeout_ms` dérivé du temps restant et aucune attente ne la dépasse.
+
+Un échec définitif lève `APICallError` (avec sa catégorie) au lieu de retourner
+None: l'appelant distingue « pas de données » de « API indisponible ». Les
+compteurs par point d'accès et l'état des disjoncteurs sont exposés par
+`retry_metrics()` (route `/health` du service, fin de `extract_batch.py`).
+
+`call_api` est le point d'entrée commun (extracteur, scripts de correction):
+budget et échéance du document actif, politique de retries, doublement des
+appels déterministes.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+from qcm_extraction.budget import current_budget
+from qcm_extraction.deadline import CHAT_TIMEOUT, DeadlineExceeded, call_timeout as deadline_timeout
+from qcm_extraction.hedging import HEDGER
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 2.0
+DEFAULT_MAX_DELAY = 30.0
+MAX_RETRY_AFTER = 60.0          # au-delà, abandon plutôt que de bloquer le worker
+BREAKER_FAILURE_THRESHOLD = 5   # échecs transitoires consécutifs avant ouverture
+BREAKER_RESET_TIMEOUT = 30.0    # secondes d'ouverture avant un appel d'essai
+
+RETRYABLE_CATEGORIES = {"rate_limit", "server", "timeout", "network", "unknown"}
+# Catégories qui signalent une API dégradée (le 429 est géré par Retry-After)
+BREAKER_CATEGORIES = {"server", "timeout", "network"}
+
+
+class APICallError(Exception):
+    """Échec définitif d'un appel API: `category` parmi rate_limit, server, timeout,
+    network, client, unknown, circuit_open, budget, deadline."""
+
+    def __init__(self, message: str, category: str, endpoint: str, attempts: int = 0):
+        super().__init__(message)
+        self.category = category
+        self.endpoint = endpoint
+        self.attempts = attempts
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for source in (error, getattr(error, "raw_response", None), getattr(error, "response", None)):
+        status = getattr(source, "status_code", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def classify_error(error: Exception) -> str:
+    """Catégorie d'une exception levée par un client HTTP / SDK."""
+    status = _status_code(error)
+    if status == 429:
+        return "rate_limit"
+    if status is not None and status >= 500:
+        return "server"
+    if status is not None and status >= 400:
+        return "client"
+    name = type(error).__name__.lower()
+    message = str(error).lower()
+    if isinstance(error, TimeoutError) or "timeout" in name or "timed out" in message:
+        return "timeout"
+    if isinstance(error, ConnectionError) or any(word in name for word in ("connect", "network", "protocol")):
+        return "network"
+    if "rate limit" in message or "429" in message:
+        return "rate_limit"
+    return "unknown"
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Délai demandé par l'en-tête `Retry-After` (secondes ou date HTTP), ou None."""
+    for source in (error, getattr(error, "raw_response", None), getattr(error, "response", None)):
+        headers = getattr(source, "headers", None)
+        value = headers.get("retry-after") or headers.get("Retry-After") if headers else None
+        if not value:
+            continue
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def full_jitter_delay(attempt: int, base: float = DEFAULT_BASE_DELAY, maximum: float = DEFAULT_MAX_DELAY) -> float:
+    """Délai uniforme entre 0 et le plafond exponentiel de la tentative (gigue complète)."""
+    return random.uniform(0, min(maximum, base * (2 ** max(0, attempt - 1))))
+
+
+class RetryPolicy:
+    """Nombre de tentatives et délais d'un appel."""
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY, max_retry_after: float = MAX_RETRY_AFTER):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+
+class CircuitBreaker:
+    """Disjoncteur d'un point d'accès: fermé → ouvert après N échecs → demi-ouvert (un essai)."""
+
+    def __init__(self, endpoint: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Vrai si un appel peut partir (en demi-ouvert: un seul appel d'essai à la fois)."""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"🔌 Disjoncteur {self.endpoint} refermé")
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release(self):
+        """Libère l'appel d'essai sans conclure (appel interrompu par l'échéance du document)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self, category: str):
+        with self._lock:
+            self._probe_in_flight = False
+            if category not in BREAKER_CATEGORIES:
+                if self.state == "half_open":
+                    # L'API a répondu (429, 4xx): elle n'est plus indisponible
+                    self.state = "closed"
+                    self.failures = 0
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    print(f"🔌 Disjoncteur {self.endpoint} ouvert après {self.failures} échec(s) "
+                          f"({category}), nouvel essai dans {self.reset_timeout:.0f}s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.times_opened}
+
+
+class RetryMetrics:
+    """Compteurs par point d'accès: appels, succès, retries, erreurs par catégorie, attente."""
+
+    def __init__(self):
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, endpoint: str) -> Dict[str, Any]:
+        return self._endpoints.setdefault(endpoint, {
+            "calls": 0, "successes": 0, "failures": 0, "retries": 0, "short_circuited": 0,
+            "waited_seconds": 0.0, "errors": {},
+        })
+
+    def record(self, endpoint: str, event: str, category: Optional[str] = None, waited: float = 0.0):
+        with self._lock:
+            entry = self._entry(endpoint)
+            entry[event] += 1
+            entry["waited_seconds"] += waited
+            if category:
+                entry["errors"][category] = entry["errors"].get(category, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {endpoint: dict(entry, errors=dict(entry["errors"]), waited_seconds=round(entry["waited_seconds"], 1))
+                    for endpoint, entry in self._endpoints.items()}
+
+
+RETRY_METRICS = RetryMetrics()
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker_for(endpoint: str) -> CircuitBreaker:
+    """Disjoncteur partagé (par processus) d'un point d'accès."""
+    with _BREAKERS_LOCK:
+        if endpoint not in _BREAKERS:
+            _BREAKERS[endpoint] = CircuitBreaker(endpoint)
+        return _BREAKERS[endpoint]
+
+
+def api_endpoint(func: Callable, model: Optional[str] = None) -> str:
+    """Nom du point d'accès d'un appel SDK (ex.: `Chat.complete:mistral-small-latest`)."""
+    name = getattr(func, "__qualname__", None) or getattr(func, "__name__", "api")
+    return f"{name}:{model}" if model else name
+
+
+def retry_metrics() -> Dict[str, Any]:
+    """Compteurs, état des disjoncteurs et doublons (hedging) par point d'accès."""
+    metrics = RETRY_METRICS.snapshot()
+    with _BREAKERS_LOCK:
+        breakers = {endpoint: breaker.snapshot() for endpoint, breaker in _BREAKERS.items()}
+    for endpoint, breaker in breakers.items():
+        metrics.setdefault(endpoint, {})["breaker"] = breaker
+    for endpoint, hedges in HEDGER.stats().items():
+        metrics.setdefault(endpoint, {})["hedging"] = hedges
+    return metrics
+
+
+def call_with_retry(func: Callable, *args, endpoint: Optional[str] = None, policy: Optional[RetryPolicy] = None,
+                    budget=None, hedger=None, timeout: Optional[float] = None,
+                    sleep: Callable[[float], None] = time.sleep, **kwargs) -> Any:
+    """Appelle `func(*args, **kwargs)` avec retries; lève `APICallError` en cas d'échec définitif.
+
+    `budget` (DocumentBudget) est consulté avant chaque tentative et reçoit les
+    tokens de la réponse. Avec `timeout` (secondes, plafond par tentative), chaque
+    tentative reçoit `timeout_ms` (convention du SDK Mistral), réduit au temps
+    restant avant l'échéance du budget. Avec `hedger` (appels idempotents
+    seulement), chaque tentative trop lente est doublée (voir `qcm_extraction.hedging`).
+    """
+    endpoint = endpoint or api_endpoint(func, kwargs.get("model"))
+    policy = policy or RetryPolicy()
+    breaker = breaker_for(endpoint)
+    deadline = budget.deadline if budget is not None else None
+
+    for attempt in range(1, policy.max_attempts + 1):
+        if budget is not None and not budget.allow(endpoint):
+            if budget.exhausted_reason() == "délai":
+                raise APICallError(f"échéance du document dépassée ({endpoint})", "deadline", endpoint, attempt - 1)
+            raise APICallError(f"budget du document épuisé ({endpoint})", "budget", endpoint, attempt - 1)
+        if timeout is not None:
+            try:
+                kwargs["timeout_ms"] = int(deadline_timeout(deadline, timeout, endpoint) * 1000)
+            except DeadlineExceeded as e:
+                budget.refuse("délai", endpoint)
+                raise APICallError(str(e), "deadline", endpoint, attempt - 1) from e
+        if not breaker.allow():
+            RETRY_METRICS.record(endpoint, "short_circuited", "circuit_open")
+            raise APICallError(f"disjoncteur ouvert pour {endpoint}", "circuit_open", endpoint, attempt - 1)
+
+        RETRY_METRICS.record(endpoint, "calls")
+        try:
+            if hedger is not None:
+                response = hedger.call(func, args, kwargs, endpoint, budget=budget)
+            else:
+                response = func(*args, **kwargs)
+        except Exception as e:
+            if deadline is not None and deadline.expired:
+                # Délai coupé par l'échéance du document: pas un signe de panne de l'API
+                breaker.release()
+                budget.refuse("délai", endpoint)
+                RETRY_METRICS.record(endpoint, "failures", "deadline")
+                print(f"⌛ {endpoint}: échéance du document dépassée pendant l'appel")
+                raise APICallError(str(e), "deadline", endpoint, attempt) from e
+            category = classify_error(e)
+            breaker.record_failure(category)
+            # Disjoncteur ouvert par cet échec: inutile d'attendre pour un appel qui sera refusé
+            if category not in RETRYABLE_CATEGORIES or attempt == policy.max_attempts or breaker.state == "open":
+                RETRY_METRICS.record(endpoint, "failures", category)
+                print(f"❌ Échec de {endpoint} ({category}) après {attempt} tentative(s): {str(e)}")
+                raise APICallError(str(e), category, endpoint, attempt) from e
+
+            delay = retry_after_seconds(e) if category == "rate_limit" else None
+            if delay is not None and delay > policy.max_retry_after:
+                RETRY_METRICS.record(endpoint, "failures", category)
+                print(f"❌ {endpoint}: Retry-After de {delay:.0f}s, abandon")
+                raise APICallError(str(e), category, endpoint, attempt) from e
+            if delay is None:
+                delay = full_jitter_delay(attempt, policy.base_delay, policy.max_delay)
+            if deadline is not None and delay >= deadline.remaining():
+                budget.refuse("délai", endpoint)
+                RETRY_METRICS.record(endpoint, "failures", category)
+                print(f"⌛ {endpoint}: attente de {delay:.1f}s au-delà de l'échéance du document, abandon")
+                raise APICallError(str(e), "deadline", endpoint, attempt) from e
+            RETRY_METRICS.record(endpoint, "retries", category, waited=delay)
+            print(f"⚠️ {endpoint} ({category}, tentative {attempt}/{policy.max_attempts}): {str(e)} "
+                  f"— nouvel essai dans {delay:.1f}s")
+            sleep(delay)
+            continue
+
+        breaker.record_success()
+        RETRY_METRICS.record(endpoint, "successes")
+        if budget is not None:
+            budget.charge(response)
+        return response
+
+
+def call_api(func: Callable, *args, max_retries: int = DEFAULT_MAX_ATTEMPTS, delay: float = DEFAULT_BASE_DELAY,
+             timeout: float = CHAT_TIMEOUT, hedge: bool = False, **kwargs) -> Any:
+    """`call_with_retry` avec le budget du document actif (voir `qcm_extraction.budget.activate`).
+
+    Seuls les appels déterministes (temperature 0, donc idempotents) sont doublés avec `hedge`.
+    """
+    hedge = hedge and kwargs.get("temperature") == 0.0
+    return call_with_retry(
+        func, *args,
+        endpoint=api_endpoint(func, kwargs.get("model")),
+        policy=RetryPolicy(max_attempts=max_retries, base_delay=delay),
+        budget=current_budget(),
+        hedger=HEDGER if hedge else None,
+        timeout=timeout,
+        **kwargs
+    )
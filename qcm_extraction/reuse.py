@@ -0,0 +1,116 @@
+"""
+Réutilisation des propositions déjà extraites d'une question identique.
+
+Colles et concours blancs reprennent beaucoup de questions d'une année ou
+d'une UE à l'autre. Chaque question extraite avec succès (5 propositions) est
+enregistrée dans `question_hashes` sous le hash de son bloc normalisé (énoncé
+et propositions du Markdown OCR, sans accents, ponctuation ni en-têtes de
+pages), avec ses propositions et ses réponses correctes. En Phase 2, une
+question dont le bloc a déjà été vu reprend ces propositions sans appel LLM, et
+les pages dont toutes les questions sont reprises ne sont pas envoyées. Les
+réponses correctes ne sont pas reprises: la même question peut être corrigée
+différemment d'un examen à l'autre, la Phase 3 les lit dans la grille du
+document.
+
+Le hash porte sur le bloc entier et non sur l'énoncé seul: un énoncé générique
+(« Concernant la glycolyse : ») revient avec d'autres propositions. Chaque
+reprise est tracée dans `question_reuse_log`.
+"""
+
+import hashlib
+import json
+import re
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+from qcm_extraction.pages import PAGE_HEADER_PATTERN
+from qcm_extraction.search import contenu_text
+
+REUSE_MIN_WORDS = 20        # en dessous, un bloc est trop court pour identifier une question
+REUSE_PROPOSITIONS = 5      # seules les questions complètes sont enregistrées
+
+
+def normalize_block(text: str) -> str:
+    """Bloc sans en-têtes de pages, minuscules sans accents ni ponctuation (chiffres conservés)."""
+    text = PAGE_HEADER_PATTERN.sub(" ", text)
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+def question_hashes(document, numbers: Iterable[int]) -> Dict[int, str]:
+    """Hash du bloc normalisé de chaque question du document (questions trop courtes ignorées)."""
+    hashes = {}
+    for numero in numbers:
+        block = normalize_block(document.headings.question_block(numero) or "")
+        if len(block.split()) >= REUSE_MIN_WORDS:
+            hashes[numero] = hashlib.sha256(block.encode()).hexdigest()
+    return hashes
+
+
+def find_reusable(supabase, hashes: Dict[int, str]) -> Dict[int, Dict[str, Any]]:
+    """Propositions connues par numéro de question (une requête sur `question_hashes`)."""
+    if not hashes:
+        return {}
+    result = supabase.table("question_hashes").select(
+        "question_hash", "propositions", "correct_letters", "source_question_id"
+    ).in_("question_hash", sorted(set(hashes.values()))).execute()
+    known = {row["question_hash"]: row for row in result.data or []}
+    reusable = {}
+    for numero, question_hash in hashes.items():
+        row = known.get(question_hash)
+        propositions = row["propositions"] if row else None
+        if isinstance(propositions, str):
+            propositions = json.loads(propositions)
+        if propositions:
+            reusable[numero] = {
+                "question_hash": question_hash,
+                "propositions": propositions,
+                "correct_letters": row.get("correct_letters") or [],
+                "source_question_id": row.get("source_question_id"),
+            }
+    return reusable
+
+
+def record_reuse(supabase, qcm_id: int, question_ids: Dict[int, Any], reused: Dict[int, Dict[str, Any]]):
+    """Trace les reprises d'un QCM dans `question_reuse_log` (une insertion)."""
+    rows = [
+        {"qcm_id": qcm_id, "question_id": question_ids[numero], "question_hash": entry["question_hash"],
+         "source_question_id": entry["source_question_id"]}
+        for numero, entry in sorted(reused.items()) if numero in question_ids
+    ]
+    if rows:
+        supabase.table("question_reuse_log").insert(rows).execute()
+
+
+def save_question_hashes(supabase, document, qcm_id: int) -> int:
+    """Enregistre les questions complètes d'un QCM extrait; retourne le nombre de questions enregistrées."""
+    result = supabase.table("questions").select("id,numero,reponses(lettre,contenu,est_correcte)").eq("qcm_id", qcm_id).execute()
+    questions = {q["numero"]: q for q in result.data or [] if q.get("numero") is not None}
+    hashes = question_hashes(document, questions)
+    rows: List[Dict[str, Any]] = []
+    seen = set()
+    updated_at = datetime.now().isoformat()
+    for numero, question_hash in sorted(hashes.items()):
+        reponses = questions[numero].get("reponses") or []
+        propositions = {}
+        for reponse in reponses:
+            texte = contenu_text(reponse.get("contenu"))
+            if texte:
+                propositions[reponse["lettre"]] = texte
+        # Deux questions du même QCM au bloc identique: une seule ligne par hash dans l'upsert
+        if len(propositions) != REUSE_PROPOSITIONS or question_hash in seen:
+            continue
+        seen.add(question_hash)
+        rows.append({
+            "question_hash": question_hash,
+            "propositions": propositions,
+            "correct_letters": sorted(r["lettre"] for r in reponses if r.get("est_correcte")),
+            "source_question_id": questions[numero]["id"],
+            "source_qcm_id": qcm_id,
+            "updated_at": updated_at,
+        })
+    if rows:
+        supabase.table("question_hashes").upsert(rows, on_conflict="question_hash").execute()
+    return len(rows)
+
@@ -0,0 +1,351 @@
+"""
+Routage adaptatif des appels LLM entre mistral-small, medium et large.
+
+Chaque appel est décrit par une tâche ("questions_page", "propositions_optimized", ...)
+et par les caractéristiques de la page (longueur, nombre de questions détectées,
+qualité OCR). Le routeur choisit le modèle le moins cher susceptible de réussir
+(un modèle plus cher seulement s'il est nettement plus rapide), n'escalade vers
+le modèle supérieur qu'en cas d'échec de validation et persiste les taux de
+succès et latences par modèle pour affiner ses choix.
+"""
+
+import atexit
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from qcm_extraction.atomic import read_json, update_json
+from qcm_extraction.budget import budget_allows
+from qcm_extraction.chunking import count_tokens, find_question_boundaries
+from qcm_extraction.retry import APICallError
+
+# Modèles du moins cher au plus cher
+MODEL_LADDER: List[str] = ["mistral-small-latest", "mistral-medium-latest", "mistral-large-latest"]
+
+# Modèle utilisé historiquement pour chaque tâche: c'est lui qui reçoit un a priori favorable
+TASK_DEFAULT_MODELS: Dict[str, str] = {
+    "metadata": "mistral-small-latest",
+    "image_text": "mistral-small-latest",
+    "questions_document": "mistral-medium-latest",
+    "questions_page": "mistral-small-latest",
+    "propositions_optimized": "mistral-medium-latest",
+    "propositions_standard": "mistral-small-latest",
+    "propositions_simplified": "mistral-small-latest",
+    "vision_answers": "mistral-large-latest",
+    "vision_page_answers": "mistral-large-latest",
+}
+
+DEFAULT_STATS_PATH = Path("qcm_extraction/logs/model_routing_stats.json")
+SAVE_EVERY = 20          # appels enregistrés entre deux sauvegardes
+SAVE_INTERVAL = 30.0     # secondes maximum entre deux sauvegardes
+SLOWER_FACTOR = 1.5      # un modèle plus cher n'est préféré que si le moins cher est au moins 1,5 fois plus lent
+
+# Titres de question explicites ("Q16.", "## Question 16") utilisés pour la validation
+EXPLICIT_QUESTION_PATTERN = re.compile(
+    r'^[ \t]*(?:#+[ \t]*)?(?:\*\*)?Q(?:uestion)?[ \t]*\.?[ \t]*(\d{1,3})(?!\d)',
+    re.MULTILINE | re.IGNORECASE
+)
+
+
+def ocr_quality(text: str) -> str:
+    """Classe grossièrement la qualité OCR d'un texte: 'good' ou 'poor'."""
+    stripped = text.strip()
+    if len(stripped) < 100 or "00000000000000" in stripped:
+        return "poor"
+    letters = sum(1 for c in stripped if c.isalpha())
+    return "good" if letters / len(stripped) >= 0.5 else "poor"
+
+
+def page_features(text: str) -> Dict[str, Any]:
+    """Calcule les caractéristiques d'un contenu utilisées pour le routage."""
+    return {
+        "tokens": count_tokens(text),
+        "questions": len({numero for _, numero in find_question_boundaries(text)}),
+        "ocr_quality": ocr_quality(text),
+    }
+
+
+def _feature_bucket(features: Dict[str, Any]) -> str:
+    """Regroupe les caractéristiques en classes pour agréger les statistiques."""
+    tokens = features.get("tokens", 0)
+    questions = features.get("questions", 0)
+    size = "s" if tokens < 2000 else "m" if tokens < 6000 else "l"
+    density = "few" if questions <= 3 else "some" if questions <= 10 else "many"
+    return f"{size}/{density}/{features.get('ocr_quality', 'good')}"
+
+
+def expected_question_numbers(text: str) -> set:
+    """Numéros de questions explicitement titrés dans un texte."""
+    return {int(m.group(1)) for m in EXPLICIT_QUESTION_PATTERN.finditer(text)}
+
+
+def validate_questions(questions: List[Dict[str, Any]], content: str) -> Optional[str]:
+    """Valide une extraction de questions. Retourne la raison de l'échec, ou None."""
+    if not questions:
+        return "aucune question extraite"
+    numbers = set()
+    for q in questions:
+        try:
+            numbers.add(int(q["numero"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if not numbers:
+        return "aucun numéro de question valide"
+    missing = expected_question_numbers(content) - numbers
+    if missing:
+        return f"questions manquantes {sorted(missing)}"
+    gaps = set(range(min(numbers), max(numbers) + 1)) - numbers
+    if gaps:
+        return f"trous dans la numérotation {sorted(gaps)}"
+    return None
+
+
+def validate_propositions(propositions: List[Dict[str, Any]], content: str) -> Optional[str]:
+    """Valide une extraction de propositions. Retourne la raison de l'échec, ou None.
+
+    La dernière question du contenu est tolérée incomplète: ses propositions
+    peuvent continuer sur la page suivante, traitée par un autre appel.
+    """
+    if not propositions:
+        return "aucune proposition extraite"
+    last_question = max(item["numero_question"] for item in propositions)
+    incomplete = sorted(
+        item["numero_question"] for item in propositions
+        if item["numero_question"] != last_question and len(item.get("propositions", {})) < 5
+    )
+    if incomplete:
+        return f"moins de 5 propositions pour les questions {incomplete}"
+    return None
+
+
+def validate_vision_answers(result: Optional[Dict[str, Any]], question_num: int) -> Optional[str]:
+    """Valide la réponse JSON d'une vérification visuelle pour une question donnée."""
+    if not isinstance(result, dict) or "correct_answers" not in result:
+        return "réponse mal formatée"
+    if "question_num" in result and result["question_num"] != question_num:
+        return f"réponse pour la question {result['question_num']}"
+    if not result["correct_answers"]:
+        return "aucune réponse correcte"
+    return None
+
+
+def validate_page_vision_answers(result: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Valide la réponse JSON d'une vérification visuelle d'une page entière.
+
+    Une liste vide est acceptée: une page peut ne contenir aucune correction.
+    """
+    if not isinstance(result, dict) or not isinstance(result.get("questions"), list):
+        return "réponse mal formatée"
+    for item in result["questions"]:
+        if not isinstance(item, dict) or "question_num" not in item or "correct_answers" not in item:
+            return "question mal formatée"
+    return None
+
+
+# Caractéristiques d'une vérification visuelle (image seule, une question ciblée)
+VISION_FEATURES: Dict[str, Any] = {"tokens": 0, "questions": 1, "ocr_quality": "good"}
+
+
+class ModelRouter:
+    """Choisit le modèle de chaque appel et apprend de ses succès et latences."""
+
+    def __init__(self, stats_path: Path = DEFAULT_STATS_PATH, target_success: float = 0.8,
+                 explore_rate: float = 0.1, min_samples: int = 5, save_every: int = SAVE_EVERY,
+                 save_interval: float = SAVE_INTERVAL):
+        self.stats_path = Path(stats_path)
+        self.target_success = target_success
+        self.explore_rate = explore_rate
+        self.min_samples = min_samples
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        try:
+            self.stats: Dict[str, Dict[str, float]] = read_json(self.stats_path, {}) or {}
+        except OSError as e:
+            print(f"⚠️ Statistiques de routage illisibles ({str(e)}), a priori seuls")
+            self.stats = {}
+        # Incréments pas encore persistés: fusionnés dans le fichier, pas écrasés par l'instantané local
+        self._pending: Dict[str, Dict[str, float]] = {}
+        self._pending_records = 0
+        self._last_save = time.monotonic()
+
+    def save(self):
+        """Ajoute les incréments en attente au fichier (sous verrou, autres processus compris).
+
+        Une erreur d'écriture est signalée sans être levée: les incréments restent en
+        attente pour la prochaine sauvegarde et l'extraction continue.
+        """
+        with self._lock:
+            pending, self._pending, self._pending_records = self._pending, {}, 0
+            self._last_save = time.monotonic()
+        if not pending:
+            return
+
+        def merge(stats):
+            stats = stats if isinstance(stats, dict) else {}
+            for key, delta in pending.items():
+                entry = stats.setdefault(key, {"calls": 0, "successes": 0, "latency_total": 0.0})
+                for field, value in delta.items():
+                    entry[field] = entry.get(field, 0) + value
+            return stats
+
+        try:
+            merged = update_json(self.stats_path, merge, {})
+        except Exception as e:
+            print(f"⚠️ Statistiques de routage non sauvegardées ({str(e)}), nouvel essai plus tard")
+            with self._lock:
+                for key, delta in pending.items():
+                    entry = self._pending.setdefault(key, {"calls": 0, "successes": 0, "latency_total": 0.0})
+                    for field, value in delta.items():
+                        entry[field] += value
+                self._pending_records += 1
+            return
+        with self._lock:
+            # Les statistiques des autres processus sont reprises; les incréments arrivés entre-temps restent en attente
+            for key, delta in self._pending.items():
+                entry = merged.setdefault(key, {"calls": 0, "successes": 0, "latency_total": 0.0})
+                for field, value in delta.items():
+                    entry[field] = entry.get(field, 0) + value
+            self.stats = merged
+
+    def _prior(self, task: str, model: str) -> float:
+        """A priori de succès: favorable au modèle historique et aux modèles plus puissants."""
+        default_model = TASK_DEFAULT_MODELS.get(task, MODEL_LADDER[0])
+        if MODEL_LADDER.index(model) >= MODEL_LADDER.index(default_model):
+            return 0.9
+        return 0.6
+
+    def _entry(self, task: str, bucket: str, model: str) -> Dict[str, float]:
+        return self.stats.get(f"{task}|{bucket}|{model}", {"calls": 0, "successes": 0, "latency_total": 0.0})
+
+    def success_rate(self, task: str, features: Dict[str, Any], model: str, prior_weight: int = 4) -> float:
+        """Taux de succès estimé (lissé par l'a priori) d'un modèle pour ces caractéristiques."""
+        entry = self._entry(task, _feature_bucket(features), model)
+        prior = self._prior(task, model)
+        return (entry["successes"] + prior * prior_weight) / (entry["calls"] + prior_weight)
+
+    def average_latency(self, task: str, features: Dict[str, Any], model: str) -> Optional[float]:
+        """Latence moyenne observée d'un modèle, ou None s'il a moins de `min_samples` appels."""
+        entry = self._entry(task, _feature_bucket(features), model)
+        if entry["calls"] < self.min_samples:
+            return None
+        return entry["latency_total"] / entry["calls"]
+
+    def choose(self, task: str, features: Dict[str, Any]) -> str:
+        """Retourne le modèle le moins cher dont le succès estimé atteint l'objectif.
+
+        Parmi les modèles qui atteignent l'objectif, la latence départage: un modèle
+        plus cher n'est retenu que si le moins cher est nettement plus lent
+        (`SLOWER_FACTOR`, latences observées sur assez d'appels). Si aucun
+        n'atteint l'objectif, le plus sûr est retenu (le plus rapide à égalité).
+        """
+        bucket = _feature_bucket(features)
+        rates = {model: self.success_rate(task, features, model) for model in MODEL_LADDER}
+        latencies = {model: self.average_latency(task, features, model) for model in MODEL_LADDER}
+        likely = [model for model in MODEL_LADDER if rates[model] >= self.target_success]
+        if likely:
+            chosen = likely[0]
+            for model in likely[1:]:
+                if (latencies[chosen] is not None and latencies[model] is not None
+                        and latencies[chosen] > SLOWER_FACTOR * latencies[model]):
+                    chosen = model
+        else:
+            best = max(rates.values())
+            tied = [model for model in MODEL_LADDER if rates[model] == best]
+            chosen = min(tied, key=lambda m: (latencies[m] is None, latencies[m] or 0.0, MODEL_LADDER.index(m)))
+
+        # Exploration: essayer de temps en temps le modèle moins cher encore peu observé
+        index = MODEL_LADDER.index(chosen)
+        if index > 0 and random.random() < self.explore_rate:
+            cheaper = MODEL_LADDER[index - 1]
+            if self._entry(task, bucket, cheaper)["calls"] < self.min_samples:
+                chosen = cheaper
+        return chosen
+
+    def escalate(self, model: str) -> Optional[str]:
+        """Modèle immédiatement supérieur, ou None si déjà au sommet."""
+        index = MODEL_LADDER.index(model) if model in MODEL_LADDER else len(MODEL_LADDER) - 1
+        return MODEL_LADDER[index + 1] if index + 1 < len(MODEL_LADDER) else None
+
+    def record(self, task: str, model: str, features: Dict[str, Any], success: bool, latency: float):
+        """Enregistre le résultat d'un appel; les statistiques sont persistées par lots."""
+        key = f"{task}|{_feature_bucket(features)}|{model}"
+        with self._lock:
+            for stats in (self.stats, self._pending):
+                entry = stats.setdefault(key, {"calls": 0, "successes": 0, "latency_total": 0.0})
+                entry["calls"] += 1
+                entry["successes"] += 1 if success else 0
+                entry["latency_total"] += latency
+            self._pending_records += 1
+            due = (self._pending_records >= self.save_every
+                   or time.monotonic() - self._last_save >= self.save_interval)
+        if due:
+            self.save()
+
+    def run(self, task: str, features: Dict[str, Any], call: Callable[[str], Any],
+            validate: Callable[[Any], Optional[str]], model: str = None) -> Any:
+        """Exécute `call(model)` et escalade tant que `validate(résultat)` signale un échec.
+
+        Une exception levée par `call` compte comme un échec de validation (sans
+        statistique si l'appel n'est pas parti: disjoncteur ouvert, budget épuisé).
+        Retourne le résultat du dernier appel effectué, même s'il n'a pas été validé.
+        """
+        model = model or self.choose(task, features)
+        result = None
+        while model:
+            start = time.time()
+            try:
+                result = call(model)
+                failure = validate(result)
+            except APICallError as e:
+                result, failure = None, f"erreur API {e.category}: {e}"
+                # Disjoncteur ouvert, budget épuisé ou échéance dépassée: l'échec ne dit rien du modèle
+                if e.category in ("circuit_open", "budget", "deadline"):
+                    start = None
+            except Exception as e:
+                result, failure = None, f"erreur {type(e).__name__}: {e}"
+            if start is not None:
+                self.record(task, model, features, success=failure is None, latency=time.time() - start)
+            if failure is None:
+                return result
+            model = self.escalate(model)
+            if model and not budget_allows(f"escalade vers {model}"):
+                print(f"    💸 Validation échouée ({failure}), pas d'escalade: budget du document épuisé")
+                break
+            if model:
+                print(f"    ⬆️ Validation échouée ({failure}), escalade vers {model}")
+        return result
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Statistiques agrégées par tâche, classe de caractéristiques et modèle."""
+        rows = []
+        for key, entry in sorted(self.stats.items()):
+            task, bucket, model = key.split("|")
+            calls = entry["calls"] or 1
+            rows.append({
+                "task": task,
+                "bucket": bucket,
+                "model": model,
+                "calls": entry["calls"],
+                "success_rate": entry["successes"] / calls,
+                "avg_latency": entry["latency_total"] / calls,
+            })
+        return rows
+
+
+_ROUTERS: Dict[str, ModelRouter] = {}
+_ROUTERS_LOCK = threading.Lock()
+
+
+def shared_router(stats_path: Path = DEFAULT_STATS_PATH) -> ModelRouter:
+    """Routeur unique du processus pour un fichier de statistiques (sauvegardé à la sortie)."""
+    key = str(Path(stats_path).resolve())
+    with _ROUTERS_LOCK:
+        if key not in _ROUTERS:
+            router = ModelRouter(stats_path)
+            atexit.register(router.save)
+            _ROUTERS[key] = router
+        return _ROUTERS[key]
@@ -0,0 +1,186 @@
+"""
+Recherche plein texte sur les énoncés des questions et leurs propositions.
+
+Côté serveur, `questions.search_vector` et `reponses.search_vector` sont des
+colonnes `tsvector` générées (configuration `french`) indexées en GIN, et la
+fonction SQL `search_questions` classe les questions en une requête RPC: rang de
+l'énoncé plus la meilleure proposition à demi-poids. Plus besoin de rapatrier
+les questions pour les parcourir côté client.
+
+`LocalSearchIndex` est l'équivalent hors ligne: un index inversé en mémoire
+(BM25, même pondération énoncé / propositions) construit depuis un instantané
+JSONL de l'export ou depuis des QCM lus avec `QCMReader`. La requête suit la
+sémantique de `websearch_to_tsquery` (sans `or`): tous les termes doivent
+figurer dans l'énoncé ou dans une même proposition, et aucun terme exclu (`-mot`).
+"""
+
+import json
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_SEARCH_LIMIT = 20
+PROPOSITION_WEIGHT = 0.5   # comme dans la fonction SQL search_questions
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Mots vides les plus fréquents des énoncés (le dictionnaire `french` en retire davantage)
+STOPWORDS = frozenset("""
+a au aux avec ce ces cet cette d dans de des du elle en est et etre il ils l la le les leur leurs
+lui mais me meme ne ni nos notre on ou par pas plus pour qu que qui s sa se ses son sont sur ta te
+tes ton tu un une vos votre vous y
+""".split())
+
+# Suffixes flexionnels remplacés pour rapprocher singulier / pluriel et masculin / féminin (canaux → canal)
+_SUFFIXES = (("ements", ""), ("ement", ""), ("ations", ""), ("ation", ""), ("euses", ""), ("euse", ""),
+             ("eaux", "eau"), ("eux", ""), ("aux", "al"), ("es", ""), ("s", ""), ("x", ""), ("e", ""))
+
+
+def contenu_text(contenu: Any) -> str:
+    """Texte d'un champ `contenu`: objet {"text": ...} ou chaîne JSON de cet objet."""
+    if isinstance(contenu, dict):
+        return contenu.get("text") or ""
+    if isinstance(contenu, str):
+        try:
+            value = json.loads(contenu)
+        except ValueError:
+            return contenu
+        return contenu_text(value) if isinstance(value, (dict, str)) and value != contenu else str(value)
+    return ""
+
+
+def stem(token: str) -> str:
+    for suffix, replacement in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)] + replacement
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Termes indexés: minuscules sans accents, mots vides retirés, suffixes flexionnels retirés."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    return [stem(token) for token in re.findall(r"[a-z0-9]+", text) if token not in STOPWORDS]
+
+
+def parse_query(query: str) -> tuple:
+    """Termes requis et termes exclus (`-mot`, `-"expression"`) d'une requête de recherche web."""
+    required, excluded = [], []
+    for negated, phrase, word in re.findall(r'(-?)(?:"([^"]*)"|(\S+))', query):
+        terms = tokenize(phrase or word)
+        (excluded if negated else required).extend(terms)
+    return list(dict.fromkeys(required)), set(excluded)
+
+
+def search_questions(supabase, query: str, ue: Optional[str] = None, annee: Optional[str] = None,
+                     limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict[str, Any]]:
+    """Questions classées par pertinence (une requête RPC sur l'index GIN).
+
+    Chaque résultat: question_id, qcm_id, numero, ue_numero, annee, type, texte, rank.
+    """
+    if not query.strip():
+        return []
+    result = supabase.rpc("search_questions", {
+        "query": query, "ue_filter": ue, "annee_filter": annee, "max_results": limit,
+    }).execute()
+    return result.data or []
+
+
+class LocalSearchIndex:
+    """Index inversé en mémoire des questions et propositions, classement BM25."""
+
+    def __init__(self):
+        self.questions: List[Dict[str, Any]] = []   # métadonnées des résultats, par indice de question
+        # Documents indexés (énoncés et propositions): [(indice de question, poids, longueur)]
+        self._documents: List[tuple] = []
+        self._postings: Dict[str, Dict[int, int]] = {}   # terme → {document: fréquence}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def _add_document(self, question_index: int, weight: float, text: str):
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        document = len(self._documents)
+        self._documents.append((question_index, weight, len(tokens)))
+        self._total_length += len(tokens)
+        for term, count in Counter(tokens).items():
+            self._postings.setdefault(term, {})[document] = count
+
+    def add_qcm(self, qcm: Dict[str, Any]):
+        """Indexe un QCM normalisé (instantané JSONL, `QCMReader.get_qcm` ou `iter_corpus`)."""
+        for question in qcm.get("questions") or []:
+            question_index = len(self.questions)
+            texte = contenu_text(question.get("contenu"))
+            self.questions.append({
+                "question_id": question.get("id"),
+                "qcm_id": qcm.get("id"),
+                "numero": question.get("numero"),
+                "ue_numero": qcm.get("ue_numero"),
+                "annee": qcm.get("annee"),
+                "type": qcm.get("type"),
+                "texte": texte,
+            })
+            self._add_document(question_index, 1.0, texte)
+            for reponse in question.get("reponses") or []:
+                self._add_document(question_index, PROPOSITION_WEIGHT, contenu_text(reponse.get("contenu")))
+
+    @classmethod
+    def from_qcms(cls, qcms: Iterable[Dict[str, Any]]) -> "LocalSearchIndex":
+        index = cls()
+        for qcm in qcms:
+            index.add_qcm(qcm)
+        return index
+
+    @classmethod
+    def from_snapshot(cls, path) -> "LocalSearchIndex":
+        """Index d'un instantané JSONL de `export_corpus.py` (fichier ou dossier)."""
+        from qcm_extraction.export import read_jsonl_snapshot
+        return cls.from_qcms(read_jsonl_snapshot(path))
+
+    def search(self, query: str, ue: Optional[str] = None, annee: Optional[str] = None,
+               limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict[str, Any]]:
+        """Mêmes résultats que `search_questions`, rang BM25 (énoncé + meilleure proposition / 2)."""
+        terms, excluded = parse_query(query)
+        if not terms or not self._documents:
+            return []
+        postings = [self._postings.get(term, {}) for term in terms]
+        # Tous les termes dans un même document (intersection en partant de la liste la plus courte)
+        candidates = set(min(postings, key=len))
+        for posting in postings:
+            candidates.intersection_update(posting)
+        for term in excluded:
+            candidates.difference_update(self._postings.get(term, {}))
+        if not candidates:
+            return []
+
+        n_documents = len(self._documents)
+        average_length = self._total_length / n_documents
+        weighted = [(posting, math.log(1 + (n_documents - len(posting) + 0.5) / (len(posting) + 0.5)))
+                    for posting in postings]
+        question_scores: Dict[int, float] = {}
+        best_proposition: Dict[int, float] = {}
+        for document in candidates:
+            question_index, weight, length = self._documents[document]
+            metadata = self.questions[question_index]
+            if (ue and metadata["ue_numero"] != ue) or (annee and metadata["annee"] != annee):
+                continue
+            score = 0.0
+            for posting, idf in weighted:
+                frequency = posting[document]
+                score += idf * frequency * (BM25_K1 + 1) / (
+                    frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+            if weight == 1.0:
+                question_scores[question_index] = score
+            else:
+                best_proposition[question_index] = max(best_proposition.get(question_index, 0.0), score * weight)
+
+        ranks = dict(question_scores)
+        for question_index, score in best_proposition.items():
+            ranks[question_index] = ranks.get(question_index, 0.0) + score
+        ranked = sorted(ranks.items(), key=lambda item: (-item[1], self.questions[item[0]]["qcm_id"] or 0,
+                                                         self.questions[item[0]]["numero"] or 0))
+        return [dict(self.questions[question_index], rank=round(rank, 4)) for question_index, rank in ranked[:limit]]
@@ -0,0 +1,217 @@
+"""
+Service HTTP local d'extraction (asyncio / aiohttp).
+
+Un pool de `QCMExtractor` est construit une seule fois au démarrage: les
+clients Mistral et Supabase restent chauds et chaque demande ne coûte plus le
+démarrage de l'interpréteur ni les imports. Les extractions (synchrones)
+s'exécutent dans des threads, au plus une par extracteur du pool; les demandes
+au-delà de `max_pending` sont refusées (429). Deux demandes pour la même URL
+pendant qu'elle est en file ou en cours sont regroupées sur le même job.
+
+Routes:
+  POST /extractions          {"url": "...", "force": false} → job
+  GET  /extractions/{job_id} → statut du job
+  GET  /qcm/{qcm_id}         → QCM complet (questions, propositions, réponses), en cache
+  GET  /qcm/{qcm_id}/stats   → complétude du QCM (vue qcm_completeness)
+  GET  /health               → état du pool, des files, des retries et des disjoncteurs API
+"""
+
+import asyncio
+import functools
+import itertools
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from aiohttp import web
+
+from qcm_extraction.clients import create_supabase_client
+from qcm_extraction.reader import QCM_CACHE, QCMReader
+from qcm_extraction.report import fetch_completeness
+from qcm_extraction.retry import retry_metrics
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_PENDING = 100
+FINISHED_JOBS_KEPT = 1000
+
+
+class ExtractionService:
+    """Pool d'extracteurs chauds, jobs en mémoire et regroupement des URL identiques."""
+
+    def __init__(self, extractor_factory: Callable[[], Any], pool_size: int = DEFAULT_POOL_SIZE,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        self.extractor_factory = extractor_factory
+        self.pool_size = max(1, pool_size)
+        self.max_pending = max_pending
+        self.jobs: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._active_by_url: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._pool: Optional[asyncio.Queue] = None
+        self._supabase = None
+        self._reader: Optional[QCMReader] = None
+        self._tasks = set()
+
+    async def start(self, app=None):
+        """Construit les extracteurs (dans des threads: création des clients bloquante)."""
+        loop = asyncio.get_running_loop()
+        self._pool = asyncio.Queue()
+        extractors = await asyncio.gather(*(loop.run_in_executor(None, self._build_extractor) for _ in range(self.pool_size)))
+        for extractor in extractors:
+            self._pool.put_nowait(extractor)
+        # Lectures (QCM, statistiques) sur un client propre, distinct de ceux des extractions en cours
+        self._supabase = await loop.run_in_executor(
+            None, create_supabase_client, extractors[0].supabase_url, extractors[0].supabase_key
+        )
+        self._reader = QCMReader(self._supabase)
+        print(f"🔥 {self.pool_size} extracteur(s) prêts")
+
+    def _build_extractor(self):
+        """Extracteur du pool avec ses clients déjà construits (propriétés paresseuses touchées ici)."""
+        extractor = self.extractor_factory()
+        extractor.client
+        extractor.supabase
+        return extractor
+
+    def _pending_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if job["status"] in ("queued", "running"))
+
+    def submit(self, url: str, force: bool = False) -> Optional[Dict[str, Any]]:
+        """Crée un job (ou retourne le job déjà actif pour cette URL); None si la file est pleine."""
+        job_id = self._active_by_url.get(url)
+        if job_id is not None:
+            job = self.jobs[job_id]
+            job["coalesced"] += 1
+            return job
+        if self._pending_count() >= self.max_pending:
+            return None
+        job = {
+            "id": next(self._ids),
+            "url": url,
+            "force": force,
+            "status": "queued",
+            "coalesced": 0,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "qcm_id": None,
+            "result": None,
+            "error": None,
+        }
+        self.jobs[job["id"]] = job
+        self._active_by_url[url] = job["id"]
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._trim()
+        return job
+
+    async def _run(self, job: Dict[str, Any]):
+        extractor = await self._pool.get()
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            metadata = await loop.run_in_executor(None, lambda: extractor.extract_metadata_from_path(job["url"], force=job["force"]))
+            if metadata:
+                job["status"] = "done"
+                job["qcm_id"] = metadata.get("qcm_db_id")
+                job["result"] = {key: value for key, value in metadata.items() if key != "document"}
+            else:
+                job["status"] = "failed"
+                job["error"] = "Extraction échouée (téléchargement, OCR ou métadonnées)"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = time.time()
+            self._active_by_url.pop(job["url"], None)
+            self._pool.put_nowait(extractor)
+
+    def _trim(self):
+        """Oublie les plus anciens jobs terminés au-delà de FINISHED_JOBS_KEPT."""
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self.jobs[job_id]
+
+    async def get_qcm(self, qcm_id: int) -> Optional[Dict[str, Any]]:
+        """QCM complet: une requête imbriquée à froid, aucune à chaud (invalidé par les extractions du pool)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._reader.get_qcm, qcm_id)
+
+    async def qcm_stats(self, qcm_id: int) -> Optional[Dict[str, Any]]:
+        """Complétude d'un QCM (une requête sur la vue qcm_completeness)."""
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(None, fetch_completeness, self._supabase, [qcm_id])
+        return rows[0] if rows else None
+
+    def health(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "pool_size": self.pool_size,
+            "idle_extractors": self._pool.qsize() if self._pool else 0,
+            "max_pending": self.max_pending,
+            "jobs": counts,
+            "qcm_cache": QCM_CACHE.stats(),
+            "api": retry_metrics(),
+        }
+
+
+_dumps = functools.partial(json.dumps, ensure_ascii=False, default=str)
+
+
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in job.items() if key != "force"}
+
+
+def create_app(service: ExtractionService) -> web.Application:
+    """Application aiohttp exposant le service."""
+    routes = web.RouteTableDef()
+
+    @routes.post("/extractions")
+    async def submit_extraction(request):
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Corps JSON invalide")
+        url = str(payload.get("url", "")).strip()
+        if not url.startswith(("http://", "https://")):
+            raise web.HTTPBadRequest(text="URL invalide (doit commencer par http:// ou https://)")
+        job = service.submit(url, force=bool(payload.get("force", False)))
+        if job is None:
+            raise web.HTTPTooManyRequests(text="File d'extraction pleine, réessayer plus tard")
+        return web.json_response(_job_view(job), status=202, dumps=_dumps)
+
+    @routes.get(r"/extractions/{job_id:\d+}")
+    async def job_status(request):
+        job = service.jobs.get(int(request.match_info["job_id"]))
+        if job is None:
+            raise web.HTTPNotFound(text="Job inconnu")
+        return web.json_response(_job_view(job), dumps=_dumps)
+
+    @routes.get(r"/qcm/{qcm_id:\d+}")
+    async def get_qcm(request):
+        qcm = await service.get_qcm(int(request.match_info["qcm_id"]))
+        if qcm is None:
+            raise web.HTTPNotFound(text="QCM inconnu")
+        return web.json_response(qcm, dumps=_dumps)
+
+    @routes.get(r"/qcm/{qcm_id:\d+}/stats")
+    async def qcm_stats(request):
+        stats = await service.qcm_stats(int(request.match_info["qcm_id"]))
+        if stats is None:
+            raise web.HTTPNotFound(text="QCM inconnu")
+        return web.json_response(stats, dumps=_dumps)
+
+    @routes.get("/health")
+    async def health(request):
+        return web.json_response(service.health())
+
+    app = web.Application()
+    app.add_routes(routes)
+    app.on_startup.append(service.start)
+    return app
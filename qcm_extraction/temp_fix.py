@@ -3,6 +3,16 @@ Code temporaire pour corriger la fonction _extract_and_save_questions_only
 A copier-coller dans extractor.py
 """
 
+import json
+import re
+import time
+import uuid
+from typing import Any, Dict, List
+
+from mistralai import UserMessage
+
+from qcm_extraction.retry import APICallError
+
 def _extract_and_save_questions_only(self, markdown_text: str, qcm_id: int) -> List[Dict[str, Any]]:
     """Phase 1: Extrait UNIQUEMENT les questions du texte Markdown page par page,
     les sauvegarde dans Supabase, et retourne les détails des questions sauvegardées."""
@@ -110,12 +120,7 @@ def _extract_and_save_questions_only(self, markdown_text: str, qcm_id: int) -> L
                 response_format={"type": "json_object"}
             )
             
-            # Vérifier si l'appel API a échoué
-            if response is None:
-                print("    ❌ Échec de l'appel API pour l'extraction globale des questions")
-                # Continuer avec les autres méthodes d'extraction
-                pass
-            elif response.choices and response.choices[0].message and response.choices[0].message.content:
+            if response.choices and response.choices[0].message and response.choices[0].message.content:
                 extracted_data_str = response.choices[0].message.content
                 try:
                     raw_data = json.loads(extracted_data_str)
@@ -126,6 +131,9 @@ def _extract_and_save_questions_only(self, markdown_text: str, qcm_id: int) -> L
                     print(f"    ⚠️ Erreur JSON dans l'extraction globale: {e_json}")
             else:
                 print(f"    ⚠️ Réponse API invalide pour l'extraction globale")
+        except APICallError as e_api:
+            # Continuer avec l'extraction page par page
+            print(f"    ❌ Échec de l'appel API pour l'extraction globale des questions ({e_api.category}): {str(e_api)}")
         except Exception as e_api:
             print(f"    🔥 Erreur API pour l'extraction globale: {str(e_api)}")
     
@@ -187,11 +195,6 @@ def _extract_and_save_questions_only(self, markdown_text: str, qcm_id: int) -> L
                     response_format={"type": "json_object"}
                 )
                 
-                # Vérifier si l'appel API a échoué
-                if response is None:
-                    print(f"    ❌ Échec de l'appel API pour l'extraction de la section {i+1}")
-                    continue
-                
                 if response.choices and response.choices[0].message and response.choices[0].message.content:
                     extracted_data_str = response.choices[0].message.content
                     try:
@@ -225,6 +228,9 @@ def _extract_and_save_questions_only(self, markdown_text: str, qcm_id: int) -> L
                         print(f"    ⚠️ Erreur JSON dans l'extraction pour la section {i+1}: {str(e)}")
                 else:
                     print(f"    ⚠️ Réponse API invalide pour la section {i+1}")
+            except APICallError as e:
+                print(f"    ❌ Échec de l'appel API pour l'extraction de la section {i+1} ({e.category}): {str(e)}")
+                continue
             except Exception as e:
                 print(f"    ⚠️ Erreur lors de l'extraction des questions pour la section {i+1}: {str(e)}")
             
@@ -0,0 +1,128 @@
+"""
+Vérification visuelle des réponses correctes, page par page.
+
+Chaque image de page est envoyée une seule fois au modèle vision, qui renvoie
+les réponses correctes de toutes les questions visibles sur la page. Les pages
+sont traitées en parallèle et les corrections de tout le QCM sont appliquées en
+une mise à jour groupée: un QCM est vérifié en autant d'appels qu'il a de pages.
+"""
+
+import base64
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from qcm_extraction.routing import ModelRouter, validate_page_vision_answers
+
+VALID_LETTERS = ["A", "B", "C", "D", "E"]
+
+PAGE_VISION_PROMPT = """Analyse cette image d'une page de QCM médical et identifie les RÉPONSES CORRECTES de TOUTES les questions visibles sur la page.
+
+CONSIGNES PRÉCISES:
+1. Repère chaque question dont le numéro est visible sur la page
+2. Cherche des indications comme "Réponses justes", "Réponses correctes", "Bonnes réponses", etc.
+3. Tu peux aussi repérer les réponses marquées individuellement comme "Vrai" ou "Faux"
+4. Si plusieurs réponses sont correctes, liste-les toutes (A, B, C, D, E)
+5. N'inclus PAS une question dont les réponses correctes ne sont pas visibles sur la page
+
+RÉPONDS UNIQUEMENT AU FORMAT JSON:
+{
+  "questions": [
+    {"question_num": 12, "correct_answers": ["A", "C"], "confidence": 0.95},
+    {"question_num": 13, "correct_answers": ["B", "D", "E"], "confidence": 0.9}
+  ]
+}
+
+Si aucune réponse correcte n'est visible, réponds {"questions": []}.
+N'ajoute AUCUN texte avant ou après ce JSON."""
+
+
+def list_page_images(images_dir: str) -> List[Tuple[int, str]]:
+    """Retourne les images de pages d'un dossier (`page_N.jpg`), triées par numéro."""
+    pages = []
+    for filename in os.listdir(images_dir):
+        match = re.fullmatch(r"page_(\d+)\.jpg", filename)
+        if match:
+            pages.append((int(match.group(1)), os.path.join(images_dir, filename)))
+    return sorted(pages)
+
+
+def _page_answers(result: Optional[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Normalise la réponse JSON d'une page en {numéro: {"letters", "confidence"}}."""
+    answers = {}
+    for item in (result or {}).get("questions", []):
+        try:
+            question_num = int(item["question_num"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        letters = sorted({str(l).strip().upper() for l in item.get("correct_answers", [])} & set(VALID_LETTERS))
+        if letters:
+            answers[question_num] = {"letters": letters, "confidence": float(item.get("confidence", 0) or 0)}
+    return answers
+
+
+def verify_page_with_vision(complete: Callable, router: ModelRouter, image_path: str,
+                            page_num: int) -> Dict[int, Dict[str, Any]]:
+    """Analyse une page et retourne les réponses correctes de chaque question visible.
+
+    `complete` est la fonction d'appel du chat, passée par les retries du
+    projet (ex: `lambda **kwargs: call_api(mistral.chat.complete, **kwargs)`):
+    disjoncteur, budget et échéance du document s'appliquent à chaque page.
+    """
+    with open(image_path, "rb") as image_file:
+        base64_image = base64.b64encode(image_file.read()).decode("utf-8")
+
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": PAGE_VISION_PROMPT},
+                {"type": "image_url", "image_url": f"data:image/jpeg;base64,{base64_image}"}
+            ]
+        }
+    ]
+
+    def call(model):
+        response = complete(
+            model=model,
+            messages=messages,
+            temperature=0.0,
+            response_format={"type": "json_object"}
+        )
+        return json.loads(response.choices[0].message.content.strip())
+
+    features = {"tokens": 0, "questions": 0, "ocr_quality": "good"}
+    try:
+        result = router.run("vision_page_answers", features, call, validate_page_vision_answers)
+    except Exception as e:
+        print(f"❌ Erreur lors de l'analyse visuelle de la page {page_num}: {str(e)}")
+        return {}
+
+    answers = _page_answers(result)
+    if answers:
+        summary = ", ".join(f"Q{num}: {''.join(a['letters'])}" for num, a in sorted(answers.items()))
+        print(f"✅ Page {page_num}: {summary}")
+    else:
+        print(f"ℹ️ Page {page_num}: aucune réponse correcte visible")
+    return answers
+
+
+def verify_pages_with_vision(complete: Callable, router: ModelRouter, pages: List[Tuple[int, str]],
+                             max_workers: int = 4) -> Dict[int, List[str]]:
+    """Analyse plusieurs pages en parallèle et fusionne les réponses par question.
+
+    Si une question apparaît sur plusieurs pages, la réponse la plus confiante
+    l'emporte (à confiance égale, la première page).
+    """
+    print(f"🔍 Vérification visuelle de {len(pages)} pages ({max_workers} en parallèle)...")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(lambda page: verify_page_with_vision(complete, router, page[1], page[0]), pages))
+
+    merged: Dict[int, Dict[str, Any]] = {}
+    for answers in results:
+        for question_num, answer in answers.items():
+            if question_num not in merged or answer["confidence"] > merged[question_num]["confidence"]:
+                merged[question_num] = answer
+    return {question_num: answer["letters"] for question_num, answer in sorted(merged.items())}
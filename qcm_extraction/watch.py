@@ -0,0 +1,212 @@
+"""
+Ingestion des PDF déposés dans un dossier surveillé.
+
+Les changements du dossier sont suivis par inotify via `watchdog` s'il est
+installé, sinon par un scan périodique. Un fichier n'est traité qu'une fois
+stable (taille et date de modification inchangées pendant `settle_seconds`),
+pour ne jamais lire un PDF en cours de copie. Chaque PDF est identifié par le
+hash SHA-256 de son contenu: un fichier renommé ou recopié à l'identique n'est
+pas retraité, un fichier modifié l'est. Les extractions tournent dans un pool
+de threads borné, chaque thread gardant son propre `QCMExtractor`, et le PDF
+est envoyé directement à l'OCR sans passer par une URL.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
+DEFAULT_STATE_PATH = Path("qcm_extraction/temp/watch_state.json")
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_SECONDS = 2.0
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Hash SHA-256 du contenu d'un fichier, lu par blocs."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_state(state_path: Path) -> Dict[str, Dict[str, Any]]:
+    """PDF déjà traités: {sha256: {"path", "qcm_id", "processed_at"}}."""
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state: Dict[str, Dict[str, Any]], state_path: Path):
+    """Écrit l'état du dossier surveillé (écriture atomique)."""
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+class FolderWatcher:
+    """Surveille un dossier et extrait chaque nouveau PDF stable avec une concurrence bornée."""
+
+    def __init__(self, directory, extractor_factory: Callable[[], Any], workers: int = 4,
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS, poll_seconds: float = DEFAULT_POLL_SECONDS,
+                 state_path: Path = DEFAULT_STATE_PATH, recursive: bool = False, force: bool = False):
+        self.directory = Path(directory)
+        self.extractor_factory = extractor_factory
+        self.workers = max(1, workers)
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.state_path = Path(state_path)
+        self.recursive = recursive
+        self.force = force
+
+        self.state = load_state(self.state_path)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._observations: Dict[Path, tuple] = {}   # chemin → (taille, mtime, stable depuis)
+        self._in_flight: Set[str] = set()            # hash en cours d'extraction
+        self._failed: Dict[Path, str] = {}           # chemin → hash en échec (retenté s'il change)
+        self._hashes: Dict[Path, tuple] = {}         # chemin → (taille, mtime, hash): pas de relecture à chaque scan
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+
+    def _extractor(self):
+        # Un extracteur (clients Mistral/Supabase) par thread du pool
+        if not hasattr(self._local, "extractor"):
+            self._local.extractor = self.extractor_factory()
+        return self._local.extractor
+
+    def _list_pdfs(self):
+        pattern = "**/*.pdf" if self.recursive else "*.pdf"
+        return [path for path in self.directory.glob(pattern) if path.is_file()]
+
+    def stable_files(self, now: Optional[float] = None):
+        """PDF dont la taille et la date n'ont pas changé depuis `settle_seconds` (anti-rebond)."""
+        now = time.time() if now is None else now
+        stable = []
+        seen = set()
+        for path in self._list_pdfs():
+            seen.add(path)
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            previous = self._observations.get(path)
+            if previous is None or previous[:2] != (stat.st_size, stat.st_mtime):
+                self._observations[path] = (stat.st_size, stat.st_mtime, now)
+                continue
+            if stat.st_size > 0 and now - previous[2] >= self.settle_seconds:
+                stable.append(path)
+        for path in set(self._observations) - seen:
+            del self._observations[path]
+        return stable
+
+    def _claim(self, path: Path) -> Optional[str]:
+        """Hash du PDF s'il doit être extrait (nouveau ou modifié), None sinon."""
+        size, mtime = self._observations[path][:2]
+        cached = self._hashes.get(path)
+        if cached and cached[:2] == (size, mtime):
+            content_hash = cached[2]
+        else:
+            try:
+                content_hash = file_sha256(path)
+            except OSError:
+                return None
+            self._hashes[path] = (size, mtime, content_hash)
+        with self._lock:
+            if content_hash in self._in_flight or self._failed.get(path) == content_hash:
+                return None
+            if content_hash in self.state and not self.force:
+                return None
+            self._in_flight.add(content_hash)
+        return content_hash
+
+    def process_file(self, path: Path, content_hash: str):
+        """Extrait un PDF et enregistre son hash en cas de succès."""
+        print(f"📄 Nouveau PDF: {path.name} ({content_hash[:12]})")
+        try:
+            metadata = self._extractor().extract_metadata_from_path(str(path), force=self.force)
+            with self._lock:
+                if metadata:
+                    self.state[content_hash] = {
+                        "path": str(path),
+                        "qcm_id": metadata.get("qcm_db_id"),
+                        "processed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    }
+                    self._failed.pop(path, None)
+                    save_state(self.state, self.state_path)
+                    print(f"✅ {path.name} traité (QCM ID: {metadata.get('qcm_db_id')})")
+                else:
+                    self._failed[path] = content_hash
+                    print(f"❌ Échec de l'extraction de {path.name} (retenté si le fichier change)")
+        except Exception as e:
+            with self._lock:
+                self._failed[path] = content_hash
+            print(f"❌ Erreur lors du traitement de {path.name}: {str(e)}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(content_hash)
+
+    def _start_observer(self):
+        if not WATCHDOG_AVAILABLE:
+            print(f"ℹ️ watchdog non installé: scan du dossier toutes les {self.poll_seconds}s")
+            return None
+        dirty = self._dirty
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if not event.is_directory:
+                    dirty.set()
+
+        observer = Observer()
+        observer.schedule(_Handler(), str(self.directory), recursive=self.recursive)
+        observer.start()
+        print(f"👀 Surveillance inotify de {self.directory}")
+        return observer
+
+    def stop(self):
+        self._stop.set()
+        self._dirty.set()
+
+    def run(self, once: bool = False):
+        """Boucle principale: soumet les PDF stables au pool jusqu'à stop() (ou dossier traité avec once=True)."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        observer = None if once else self._start_observer()
+        pending = set()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while not self._stop.is_set():
+                    for path in self.stable_files():
+                        content_hash = self._claim(path)
+                        if content_hash:
+                            pending.add(executor.submit(self.process_file, path, content_hash))
+                    pending = {future for future in pending if not future.done()}
+
+                    if once and not pending and self._settled():
+                        break
+                    # Avec inotify, un événement réveille la boucle; le délai reste nécessaire pour l'anti-rebond
+                    self._dirty.wait(self.poll_seconds)
+                    self._dirty.clear()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def _settled(self) -> bool:
+        """Tous les PDF observés sont stables depuis `settle_seconds`."""
+        now = time.time()
+        return all(now - observation[2] >= self.settle_seconds for observation in self._observations.values())
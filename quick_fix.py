@@ -1,9 +1,10 @@
 import os
 import json
 import re
-from supabase import create_client
 from dotenv import load_dotenv
 
+from qcm_extraction.clients import lazy_supabase
+
 # Charger les variables d'environnement
 load_dotenv()
 
@@ -11,8 +12,8 @@ load_dotenv()
 supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_KEY')
 
-# Initialiser le client Supabase
-supabase = create_client(supabase_url, supabase_key)
+# Client Supabase construit à la première requête
+supabase = lazy_supabase(supabase_url, supabase_key)
 
 def extract_correct_answers_from_text(file_path, question_num):
     """
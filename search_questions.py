@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Recherche plein texte des questions (énoncés et propositions)
+
+Par défaut la recherche passe par la fonction SQL search_questions (index GIN,
+configuration française). --local interroge un instantané JSONL de
+export_corpus.py sans connexion à Supabase.
+
+Exemples:
+  python search_questions.py "potentiel de membrane"
+  python search_questions.py "canal sodique" --ue UE2 --annee "2021 / 2022"
+  python search_questions.py "glycolyse -anaérobie" --local exports/20240101T120000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from qcm_extraction.search import DEFAULT_SEARCH_LIMIT, LocalSearchIndex, search_questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recherche plein texte des questions de QCM")
+    parser.add_argument("query", help="Termes recherchés (syntaxe web: \"expression\", -exclu)")
+    parser.add_argument("--ue", help="Limiter à une UE (ex: UE2)")
+    parser.add_argument("--annee", help="Limiter à une année (ex: \"2021 / 2022\")")
+    parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT,
+                        help=f"Nombre de résultats (défaut: {DEFAULT_SEARCH_LIMIT})")
+    parser.add_argument("--local", metavar="INSTANTANÉ", help="Chercher dans un instantané JSONL (hors ligne)")
+    args = parser.parse_args()
+
+    if args.local:
+        started = time.time()
+        index = LocalSearchIndex.from_snapshot(args.local)
+        print(f"📚 {len(index)} questions indexées en {time.time() - started:.2f}s")
+        started = time.time()
+        hits = index.search(args.query, ue=args.ue, annee=args.annee, limit=args.limit)
+    else:
+        from dotenv import load_dotenv
+        from qcm_extraction.clients import create_supabase_client
+
+        load_dotenv()
+        if not os.getenv("SUPABASE_URL") or not os.getenv("SUPABASE_KEY"):
+            print("❌ Variables d'environnement SUPABASE_URL et SUPABASE_KEY requises", file=sys.stderr)
+            sys.exit(1)
+        supabase = create_supabase_client()
+        started = time.time()
+        hits = search_questions(supabase, args.query, ue=args.ue, annee=args.annee, limit=args.limit)
+
+    print(f"🔍 {len(hits)} résultat(s) en {(time.time() - started) * 1000:.0f} ms")
+    for hit in hits:
+        texte = " ".join((hit.get("texte") or "").split())
+        if len(texte) > 120:
+            texte = texte[:117] + "..."
+        print(f"  [{hit['rank']:.3f}] QCM {hit['qcm_id']} ({hit.get('ue_numero') or '?'}, {hit.get('annee') or '?'}) "
+              f"Q{hit['numero']}: {texte}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,13 @@ import json
 import re
 import base64
 import argparse
-from supabase import create_client
 from dotenv import load_dotenv
-from mistralai import Mistral
+from qcm_extraction.clients import lazy_mistral, lazy_supabase
+from qcm_extraction.retry import call_api
+from qcm_extraction.routing import VISION_FEATURES, shared_router, validate_vision_answers
+from qcm_extraction.answers import apply_correct_answers, print_answers_report
+from qcm_extraction.document import Document
+from qcm_extraction.vision import list_page_images, verify_pages_with_vision
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -15,27 +19,21 @@ supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_KEY')
 mistral_api_key = os.getenv('MISTRAL_API_KEY')
 
-# Initialiser les clients
-supabase = create_client(supabase_url, supabase_key)
-mistral = Mistral(api_key=mistral_api_key)
+# Clients construits au premier appel (--help et erreurs d'arguments sans import de supabase/mistralai)
+supabase = lazy_supabase(supabase_url, supabase_key)
+mistral = lazy_mistral(mistral_api_key)
+router = shared_router()
 
-def extract_correct_answers_from_text(file_path, question_num):
+def complete(**kwargs):
+    """Appel du chat par le wrapper commun (retries, disjoncteur, budget et échéance du document)."""
+    return call_api(mistral.chat.complete, **kwargs)
+
+def extract_correct_answers_from_text(document, question_num):
     """
-    Méthode 1 (RAPIDE): Extrait les réponses correctes du texte brut du PDF
+    Méthode 1 (RAPIDE): Extrait les réponses correctes du texte brut du PDF (Document déjà chargé)
     """
     print(f"🔍 Extraction textuelle pour la question {question_num}...")
-    
-    # Trouver le dossier outputs correspondant
-    pdf_name = os.path.basename(os.path.dirname(file_path))
-    markdown_path = f"qcm_extraction/temp/outputs/{pdf_name}/content.md"
-    
-    if not os.path.exists(markdown_path):
-        print(f"⚠️ Markdown non trouvé pour {pdf_name}")
-        return None
-    
-    # Lire le contenu Markdown
-    with open(markdown_path, "r", encoding="utf-8") as f:
-        content = f.read()
+    content = document.text
     
     # Patterns pour trouver les réponses correctes (du plus spécifique au plus général)
     patterns = [
@@ -125,20 +123,23 @@ RÉPONDS UNIQUEMENT AU FORMAT JSON:
             }
         ]
         
-        # Faire l'appel API
-        response = mistral.chat.complete(
-            model="mistral-large-latest",
-            messages=messages,
-            temperature=0.0,
-            response_format={"type": "json_object"}
-        )
+        # Faire l'appel API (modèle choisi par le routeur, escalade si la réponse n'est pas exploitable)
+        def call(model):
+            response = complete(
+                model=model,
+                messages=messages,
+                temperature=0.0,
+                response_format={"type": "json_object"}
+            )
+            
+            # Extraire le résultat
+            content = response.choices[0].message.content.strip()
+            return json.loads(content)
         
-        # Extraire le résultat
-        content = response.choices[0].message.content.strip()
-        result = json.loads(content)
+        result = router.run("vision_answers", VISION_FEATURES, call, lambda r: validate_vision_answers(r, question_num))
         
         # Valider et retourner
-        if "correct_answers" in result:
+        if result and "correct_answers" in result:
             letters = result["correct_answers"]
             if 1 <= len(letters) <= 5:
                 print(f"✅ Réponses identifiées par vision: {', '.join(letters)}")
@@ -209,16 +210,54 @@ def update_correct_answers(qcm_id, question_num, correct_letters, force=False):
     print(f"✅ {len(updates)} propositions mises à jour")
     return True
 
+def correct_all_pages(qcm_id, images_dir, page=None, force=False, workers=4):
+    """
+    Méthode 3 (QCM ENTIER): une analyse visuelle par page pour toutes les questions,
+    pages en parallèle, puis une seule mise à jour groupée
+    """
+    pages = list_page_images(images_dir) if os.path.isdir(images_dir) else []
+    if page:
+        pages = [(num, path) for num, path in pages if num == page]
+    
+    if not pages:
+        print(f"❌ Aucune page trouvée dans {images_dir}")
+        return False
+    
+    answers = verify_pages_with_vision(complete, router, pages, max_workers=workers)
+    if not answers:
+        print("⚠️ Pas de réponse trouvée par méthode visuelle")
+        return False
+    
+    report = apply_correct_answers(supabase, qcm_id, answers, dry_run=True)
+    print_answers_report(report)
+    if not report["changes"]:
+        return True
+    
+    # Demander confirmation sauf si force=True
+    if not force:
+        confirm = input(f"Confirmer la mise à jour de {len(report['changes'])} questions? (o/n): ").lower()
+        if confirm != 'o':
+            print("❌ Mise à jour annulée")
+            return False
+    
+    report = apply_correct_answers(supabase, qcm_id, answers)
+    print(f"✅ {report['updated']} propositions mises à jour")
+    return True
+
 def main():
     parser = argparse.ArgumentParser(description="Correction intelligente des réponses QCM")
     parser.add_argument("qcm_id", type=int, help="ID du QCM à vérifier")
-    parser.add_argument("question_num", type=int, help="Numéro de la question à vérifier")
+    parser.add_argument("question_num", type=int, nargs="?",
+                        help="Numéro de la question à vérifier (obligatoire sauf en mode pages)")
     parser.add_argument("--page", type=int, help="Numéro de page spécifique à analyser (optionnel)")
-    parser.add_argument("--mode", choices=["text", "vision", "smart"], default="smart", 
-                       help="Mode d'extraction: text (rapide), vision (précis), smart (hybride)")
+    parser.add_argument("--mode", choices=["text", "vision", "smart", "pages"], default="smart", 
+                       help="Mode d'extraction: text (rapide), vision (précis), smart (hybride), pages (tout le QCM, un appel par page)")
+    parser.add_argument("--workers", type=int, default=4, help="Pages analysées en parallèle en mode pages (défaut: 4)")
     parser.add_argument("--force", action="store_true", help="Appliquer les corrections sans confirmation")
     
     args = parser.parse_args()
+    if args.question_num is None and args.mode != "pages":
+        parser.error("question_num est obligatoire sauf avec --mode pages")
     
     # Trouver les images pour ce QCM
     pdf_folders = os.listdir("qcm_extraction/temp/pdfs")
@@ -254,20 +293,31 @@ def main():
     
     # Chemins d'accès aux fichiers
     images_dir = f"qcm_extraction/temp/images/{target_folder}"
+    markdown_path = f"qcm_extraction/temp/outputs/{target_folder}/content.md"
+    document = Document.from_file(markdown_path) if os.path.exists(markdown_path) else None
     
     # Choix des pages à analyser
     if args.page:
         pages_to_check = [args.page]
+    elif args.question_num is None:
+        pages_to_check = []
+    elif document and args.question_num in document.headings.questions:
+        # Page du titre de la question d'après l'index du Document, plus la suivante (propositions/correction)
+        pages_to_check = sorted({page for heading in document.headings.questions[args.question_num]
+                                 for page in (heading["page_num"], heading["page_num"] + 1)})
     else:
         # Estimation heuristique des pages (on suppose ~2 questions par page)
         base_page = max(1, (args.question_num // 2) + 2)  # +2 pour les pages d'entête
         pages_to_check = range(max(1, base_page-2), base_page+3)  # Pages autour de l'estimation
     
+    # Mode PAGES : toutes les questions du QCM, une requête vision par page
+    if args.mode == "pages":
+        correct_all_pages(args.qcm_id, images_dir, page=args.page, force=args.force, workers=args.workers)
+    
     # Mode TEXT : extraction textuelle uniquement (RAPIDE)
-    if args.mode == "text":
-        markdown_path = f"qcm_extraction/temp/outputs/{target_folder}/content.md"
-        if os.path.exists(markdown_path):
-            correct_answers = extract_correct_answers_from_text(markdown_path, args.question_num)
+    elif args.mode == "text":
+        if document:
+            correct_answers = extract_correct_answers_from_text(document, args.question_num)
             if correct_answers:
                 update_correct_answers(args.qcm_id, args.question_num, correct_answers, args.force)
             else:
@@ -291,11 +341,10 @@ def main():
     # Mode SMART : hybride (ÉQUILIBRÉ)
     else:  # mode == "smart"
         # 1. D'abord essayer extraction textuelle (rapide)
-        markdown_path = f"qcm_extraction/temp/outputs/{target_folder}/content.md"
         correct_answers = None
         
-        if os.path.exists(markdown_path):
-            correct_answers = extract_correct_answers_from_text(markdown_path, args.question_num)
+        if document:
+            correct_answers = extract_correct_answers_from_text(document, args.question_num)
         
         # 2. Si pas trouvé ou résultat ambigu, utiliser vision (lent mais précis)
         if not correct_answers:
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests du budget d'API par document (qcm_extraction/budget.py): plafonds
+d'appels, de tokens, de temps et d'échéance, budget propre à chaque thread.
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+from qcm_extraction.budget import (
+    DocumentBudget,
+    activate,
+    budget_allows,
+    current_budget,
+    current_deadline,
+    response_tokens,
+)
+
+
+def test_response_tokens():
+    assert response_tokens(SimpleNamespace(usage=SimpleNamespace(total_tokens=120))) == 120
+    assert response_tokens(SimpleNamespace(usage=SimpleNamespace(total_tokens=None, prompt_tokens=80,
+                                                                 completion_tokens=20))) == 100
+    assert response_tokens(SimpleNamespace()) == 0
+    assert response_tokens(None) == 0
+
+
+def test_call_limit():
+    budget = DocumentBudget(max_calls=2, deadline_seconds=None)
+    assert budget.allow() and budget.allow()
+    assert not budget.allow("Phase 2")
+    assert budget.exhausted_reason() == "appels"
+    assert budget.calls == 2 and budget.refused == 1
+
+
+def test_token_limit():
+    budget = DocumentBudget(max_tokens=150, deadline_seconds=None)
+    budget.charge(SimpleNamespace(usage=SimpleNamespace(total_tokens=100)))
+    assert not budget.exhausted
+    budget.charge(SimpleNamespace(usage=SimpleNamespace(total_tokens=100)))
+    assert budget.exhausted_reason() == "tokens"
+
+
+def test_time_counts_only_active_stages():
+    budget = DocumentBudget(max_seconds=0.05, deadline_seconds=None)
+    with activate(budget):
+        time.sleep(0.02)
+    time.sleep(0.06)   # en file entre deux étapes: pas compté
+    assert not budget.exhausted
+    with activate(budget):
+        time.sleep(0.04)
+        assert budget.exhausted_reason() == "temps"
+
+
+def test_deadline_counts_wall_clock():
+    budget = DocumentBudget(deadline_seconds=600)
+    assert budget.deadline.remaining() > 599
+    budget.deadline.expires_at -= 601
+    assert budget.exhausted_reason() == "délai"
+    assert DocumentBudget(deadline_seconds=None).deadline is None
+
+
+def test_activate_is_per_thread_and_nested():
+    outer, inner = DocumentBudget(), DocumentBudget()
+    assert current_budget() is None and current_deadline() is None
+    seen_in_thread = []
+    with activate(outer):
+        with activate(inner):
+            assert current_budget() is inner
+        assert current_budget() is outer
+        assert current_deadline() is outer.deadline
+        thread = threading.Thread(target=lambda: seen_in_thread.append(current_budget()))
+        thread.start()
+        thread.join()
+    assert current_budget() is None
+    assert seen_in_thread == [None]
+
+
+def test_budget_allows_refuses_escalation():
+    assert budget_allows()   # hors d'un document: pas de plafond
+    budget = DocumentBudget(max_calls=0, deadline_seconds=None)
+    with activate(budget):
+        assert not budget_allows("escalade")
+    assert budget.refused == 1
+    assert budget.summary()["exhausted"] == "appels"
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DU BUDGET D'API")
+    print("=" * 40)
+    test_response_tokens()
+    test_call_limit()
+    test_token_limit()
+    test_time_counts_only_active_stages()
+    test_deadline_counts_wall_clock()
+    test_activate_is_per_thread_and_nested()
+    test_budget_allows_refuses_escalation()
+    print("✅ Budget d'API validé")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests du découpage des entrées LLM (qcm_extraction/chunking.py): détection
+des titres de questions et regroupement en chunks sous un budget de tokens,
+sans perte de contenu ni coupure au milieu d'une question.
+"""
+
+from qcm_extraction.chunking import ChunkPacker, count_tokens, find_question_boundaries, split_at_questions
+
+QUESTION_TEMPLATE = """## Q{numero}. A propos de la membrane plasmique, on peut dire que :
+1. elle est formée d'une bicouche lipidique ;
+2. elle contient du cholestérol.
+
+A. Proposition A de la question {numero}.
+B. Proposition B de la question {numero}.
+C. Proposition C de la question {numero}.
+D. Proposition D de la question {numero}.
+E. Proposition E de la question {numero}.
+
+"""
+
+
+def make_questions(count: int) -> str:
+    return "".join(QUESTION_TEMPLATE.format(numero=numero) for numero in range(1, count + 1))
+
+
+def test_heading_forms():
+    text = (
+        "## Q16. A propos du noyau\nQ.17: Concernant l'ADN\nQuestion 18 : La mitose\n"
+        "**19.** La méiose\n## 20) Le cycle cellulaire\n"
+    )
+    assert [numero for _, numero in find_question_boundaries(text)] == [16, 17, 18, 19, 20]
+
+
+def test_enumerations_are_not_questions():
+    boundaries = find_question_boundaries(make_questions(3))
+    assert [numero for _, numero in boundaries] == [1, 2, 3]
+    assert find_question_boundaries("1. premier point\n2) second point\nA. proposition\n") == []
+
+
+def test_split_is_lossless():
+    text = "# Page 1\n\nEn-tête\n\n" + make_questions(4)
+    segments = split_at_questions(text)
+    assert "".join(segments) == text
+    assert len(segments) == 5
+    assert all(segment.startswith("## Q") for segment in segments[1:])
+
+
+def test_pack_respects_budget_and_boundaries():
+    text = make_questions(12)
+    question_tokens = count_tokens(QUESTION_TEMPLATE.format(numero=10))
+    packer = ChunkPacker(token_budget=question_tokens * 3)
+    groups = packer.pack_groups([text])
+    assert len(groups) > 1
+    assert "".join(piece for group in groups for piece in group) == text
+    for group in groups:
+        chunk = packer.separator.join(group)
+        assert count_tokens(chunk) <= packer.token_budget
+        # Chaque chunk commence par un titre: aucune question coupée entre deux appels
+        assert chunk.startswith("## Q")
+
+
+def test_oversized_question_is_kept_whole():
+    long_question = QUESTION_TEMPLATE.format(numero=1) + "Texte très long. " * 200
+    packer = ChunkPacker(token_budget=50)
+    chunks = packer.pack([long_question])
+    assert chunks == [long_question]
+
+
+def test_empty_sections_are_skipped():
+    assert ChunkPacker(token_budget=100).pack(["", "   ", "\n"]) == []
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DU DÉCOUPAGE EN CHUNKS")
+    print("=" * 40)
+    test_heading_forms()
+    test_enumerations_are_not_questions()
+    test_split_is_lossless()
+    test_pack_respects_budget_and_boundaries()
+    test_oversized_question_is_kept_whole()
+    test_empty_sections_are_skipped()
+    print("✅ Découpage en chunks validé")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests des échéances (qcm_extraction/deadline.py) et du délai des requêtes
+Supabase: chaque requête reçoit le temps restant du document actif dans le
+thread qui l'envoie, sans modifier le client partagé.
+"""
+
+import threading
+
+import pytest
+
+from qcm_extraction.budget import DocumentBudget, activate
+from qcm_extraction.clients import bound_db_timeouts, deadline_db_timeout
+from qcm_extraction.deadline import DB_TIMEOUT, MIN_CALL_TIMEOUT, Deadline, DeadlineExceeded, call_timeout
+
+
+class FakeRequest:
+    def __init__(self):
+        self.extensions = {"timeout": {"connect": DB_TIMEOUT, "read": DB_TIMEOUT, "write": DB_TIMEOUT, "pool": DB_TIMEOUT}}
+
+
+class FakeSession:
+    """Session httpx réduite aux hooks d'événements."""
+
+    def __init__(self):
+        self.event_hooks = {"request": [], "response": []}
+
+    def send(self, request):
+        for hook in self.event_hooks["request"]:
+            hook(request)
+        return request.extensions["timeout"]["read"]
+
+
+class FakeClient:
+    def __init__(self):
+        self.postgrest = type("Postgrest", (), {"session": FakeSession()})()
+
+
+def test_call_timeout():
+    assert call_timeout(None, 120) == 120
+    assert call_timeout(Deadline(5), 120) <= 5
+    assert call_timeout(Deadline(600), 120) == 120
+    with pytest.raises(DeadlineExceeded):
+        call_timeout(Deadline(0), 120)
+
+
+def test_db_timeout_follows_active_deadline():
+    assert deadline_db_timeout() is None
+    with activate(DocumentBudget(deadline_seconds=5)):
+        assert 4 < deadline_db_timeout() <= 5
+    with activate(DocumentBudget(deadline_seconds=600)):
+        assert deadline_db_timeout() == DB_TIMEOUT
+    expired = DocumentBudget(deadline_seconds=600)
+    expired.deadline.expires_at -= 601
+    with activate(expired):
+        # Au moins 1 s: l'état partiel doit pouvoir être enregistré
+        assert deadline_db_timeout() == MIN_CALL_TIMEOUT
+
+
+def test_shared_client_timeout_is_per_thread():
+    client = FakeClient()
+    bound_db_timeouts(client, deadline_db_timeout)
+    session = client.postgrest.session
+    results = {}
+    ready = threading.Barrier(2)
+
+    def send(name, budget):
+        with activate(budget):
+            ready.wait()
+            results[name] = session.send(FakeRequest())
+
+    threads = [
+        threading.Thread(target=send, args=("urgent", DocumentBudget(deadline_seconds=3))),
+        threading.Thread(target=send, args=("reader", None)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results["urgent"] <= 3
+    # Lecteur sans document actif: délai par défaut du client
+    assert results["reader"] == DB_TIMEOUT
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DES ÉCHÉANCES")
+    print("=" * 40)
+    test_call_timeout()
+    test_db_timeout_follows_active_deadline()
+    test_shared_client_timeout_is_per_thread()
+    print("✅ Échéances et délais validés")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests des figures de questions (qcm_extraction/figures.py): décodage base64
+par blocs, écart des images répétées sur plusieurs pages (logos) et
+rattachement de chaque figure à sa question par l'offset de sa référence.
+"""
+
+import base64
+import io
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+from qcm_extraction.document import Document
+from qcm_extraction.figures import decode_data_url, drop_repeated, link_figures, perceptual_hash
+
+
+def gradient_png(reverse: bool = False, shift: int = 0) -> bytes:
+    """Dégradé horizontal 64×32 (croissant ou décroissant), légèrement décalé avec `shift`."""
+    img = Image.new("L", (64, 32))
+    for x in range(64):
+        value = min(255, x * 4 + shift)
+        for y in range(32):
+            img.putpixel((x, y), 255 - value if reverse else value)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_decode_data_url_in_chunks():
+    data = bytes(range(256)) * 50
+    encoded = base64.b64encode(data).decode()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "img"
+        # Bloc non multiple de 4: arrondi pour ne jamais couper un quadruplet base64
+        assert decode_data_url(f"data:image/png;base64,{encoded}", path, chunk_size=1001) == len(data)
+        assert path.read_bytes() == data
+        assert decode_data_url(encoded, path, chunk_size=64) == len(data)
+        assert path.read_bytes() == data
+
+
+def write_figure(folder: Path, figure_id: str, page_num: int, png: bytes):
+    path = folder / f"page{page_num}_{figure_id}"
+    path.write_bytes(png)
+    return {"id": figure_id, "page_num": page_num, "path": str(path), "phash": perceptual_hash(path)}
+
+
+def test_repeated_images_are_dropped():
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        # Logo sur les pages 1 et 2 (à la gigue de compression près), schéma propre à la page 2
+        logo_1 = write_figure(folder, "img-0.jpeg", 1, gradient_png())
+        logo_2 = write_figure(folder, "img-1.jpeg", 2, gradient_png(shift=2))
+        schema = write_figure(folder, "img-2.jpeg", 2, gradient_png(reverse=True))
+        assert logo_1["phash"] is not None and logo_1["phash"] != schema["phash"]
+
+        kept = drop_repeated([schema, logo_2, logo_1])
+        assert [figure["id"] for figure in kept] == ["img-2.jpeg"]
+        # Les fichiers des images écartées sont supprimés, pas ceux des figures gardées
+        assert not Path(logo_1["path"]).exists() and not Path(logo_2["path"]).exists()
+        assert Path(schema["path"]).exists()
+
+
+def test_image_repeated_on_one_page_is_kept():
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        first = write_figure(folder, "img-0.jpeg", 3, gradient_png())
+        second = write_figure(folder, "img-1.jpeg", 3, gradient_png())
+        unreadable = {"id": "img-2.jpeg", "page_num": 4, "path": str(folder / "absent"), "phash": None}
+        kept = drop_repeated([second, first, unreadable])
+        assert [figure["id"] for figure in kept] == ["img-0.jpeg", "img-1.jpeg", "img-2.jpeg"]
+        assert perceptual_hash(folder / "absent") is None
+
+
+def test_link_figures_to_questions():
+    document = Document(
+        "# Page 1\n\n![img-0.jpeg](img-0.jpeg)\n\n"
+        "## Q1. Concernant le schéma ci-dessous :\n\n![img-1.jpeg](img-1.jpeg)\n\nA. Proposition.\n\n"
+        "## Q2. Concernant la membrane :\n\nA. Proposition.\n\n"
+        "# Page 2\n\n![img-2.jpeg](img-2.jpeg)\n\n## Q3. Concernant la mitose :\n"
+    )
+    figures = [
+        {"id": "img-0.jpeg", "page_num": 1},
+        {"id": "img-1.jpeg", "page_num": 1},
+        {"id": "img-2.jpeg", "page_num": 2},
+        {"id": "img-9.jpeg", "page_num": 2},   # sans référence dans le Markdown
+        {"id": "img-1.jpeg", "page_num": 5},   # page absente du document
+    ]
+    linked = link_figures(document, figures, {1, 2, 3})
+    assert [(figure["id"], figure["numero"]) for figure in linked] == [
+        ("img-0.jpeg", None), ("img-1.jpeg", 1), ("img-2.jpeg", 2), ("img-9.jpeg", None),
+    ]
+    assert linked[1]["offset"] == document.text.index("![img-1.jpeg]")
+    assert linked[3]["offset"] is None
+    # Seuls les titres des questions enregistrées délimitent les intervalles
+    assert link_figures(document, figures[1:2], {2, 3})[0]["numero"] is None
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DES FIGURES")
+    print("=" * 40)
+    test_decode_data_url_in_chunks()
+    test_repeated_images_are_dropped()
+    test_image_repeated_on_one_page_is_kept()
+    test_link_figures_to_questions()
+    print("✅ Figures validées")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Tests des empreintes de contenu (qcm_extraction/fingerprint.py): une colle qui
+recycle la plupart des questions d'une autre session est un candidat doublon,
+mais seules les métadonnées (type, année, UE) en font le même QCM.
+"""
+
+import random
+
+from qcm_extraction.fingerprint import (
+    DUPLICATE_THRESHOLD,
+    compute_fingerprint,
+    estimated_similarity,
+    find_duplicate_candidates,
+    group_duplicates,
+    same_exam,
+)
+
+VOCABULARY = (
+    "membrane noyau mitochondrie ribosome cytosquelette actine tubuline kinesine dynéine lysosome "
+    "peroxysome golgi reticulum vésicule endocytose exocytose glycolyse cycle krebs phosphorylation "
+    "transcription traduction réplication polymérase histone chromatine nucléosome centromère télomère "
+    "apoptose caspase mitose méiose cycline kinase récepteur ligand canal pompe transporteur gradient"
+).split()
+
+
+def make_stems(seed: int, count: int):
+    rng = random.Random(seed)
+    return [f"A propos de {' '.join(rng.choice(VOCABULARY) for _ in range(12))} :" for _ in range(count)]
+
+
+def make_exam(stems):
+    questions = []
+    for numero, stem in enumerate(stems, start=1):
+        propositions = "\n".join(f"{lettre}. Proposition {lettre} de la question {numero}." for lettre in "ABCDE")
+        questions.append(f"## Q{numero}. {stem}\n\n{propositions}\n")
+    return "# Page 1\n\n" + "\n".join(questions)
+
+
+SESSION_2022 = make_stems(2022, 30)
+# Concours blanc de l'année suivante: 27 questions reprises, 3 nouvelles
+SESSION_2023 = SESSION_2022[:27] + make_stems(2023, 3)
+OTHER_UE = make_stems(7, 30)
+
+
+def test_identical_exams():
+    a = compute_fingerprint(make_exam(SESSION_2022))
+    b = compute_fingerprint(make_exam(SESSION_2022))
+    assert a["questions_count"] == 30
+    assert estimated_similarity(a["signature"], b["signature"]) == 1.0
+
+
+def test_recycled_exam_is_only_a_candidate():
+    a = compute_fingerprint(make_exam(SESSION_2022))
+    b = compute_fingerprint(make_exam(SESSION_2023))
+    similarity = estimated_similarity(a["signature"], b["signature"])
+    # Questions recyclées: assez proches pour être candidats...
+    assert DUPLICATE_THRESHOLD <= similarity < 1.0
+    # ...mais ce n'est pas le même QCM
+    assert not same_exam(
+        {"type": "Concours Blanc N°1", "annee": "2021 / 2022", "ue": "UE1"},
+        {"type": "Concours Blanc N°1", "annee": "2022 / 2023", "ue": "UE1"},
+    )
+
+
+def test_unrelated_exams():
+    a = compute_fingerprint(make_exam(SESSION_2022))
+    b = compute_fingerprint(make_exam(OTHER_UE))
+    assert estimated_similarity(a["signature"], b["signature"]) < 0.3
+
+
+def test_similarity_edge_cases():
+    assert estimated_similarity([], []) == 0.0
+    assert estimated_similarity([1, 2], [1, 2, 3]) == 0.0
+    assert compute_fingerprint("# Page 1\n\n") is None
+
+
+def test_same_exam_normalization():
+    stored = {"type": "Colle N°2", "annee": "2021 / 2022", "ue": "UE3"}
+    assert same_exam(stored, {"type": "colle n°2", "annee": "2021/2022", "ue": "ue3"})
+    assert not same_exam(stored, {"type": "Colle N°2", "annee": "2021 / 2022", "ue": "UE4"})
+    # Une métadonnée manquante ne confirme rien
+    assert not same_exam({"type": None, "annee": None, "ue": None}, {"type": None, "annee": None, "ue": None})
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def select(self, *args):
+        return self
+
+    def ov(self, *args):
+        return self
+
+    def execute(self):
+        return type("Result", (), {"data": self.rows})()
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        assert name == "qcm_fingerprints"
+        return FakeQuery(self.rows)
+
+
+def test_candidates_are_sorted_and_filtered():
+    fingerprint = compute_fingerprint(make_exam(SESSION_2023))
+    rows = [
+        {"qcm_id": 1, "signature": compute_fingerprint(make_exam(OTHER_UE))["signature"]},
+        {"qcm_id": 2, "signature": compute_fingerprint(make_exam(SESSION_2022))["signature"]},
+        {"qcm_id": 3, "signature": fingerprint["signature"]},
+    ]
+    candidates = find_duplicate_candidates(FakeSupabase(rows), fingerprint)
+    assert [candidate["qcm_id"] for candidate in candidates] == [3, 2]
+    assert candidates[0]["similarity"] == 1.0
+
+
+def test_groups_are_not_transitive():
+    # A~B et B~C, mais A et C trop éloignés: pas de fusion A/C
+    stems_a = make_stems(1, 30)
+    stems_b = stems_a[:27] + make_stems(2, 3)
+    stems_c = stems_b[3:] + make_stems(3, 3)
+    signatures = {
+        qcm_id: compute_fingerprint(make_exam(stems))["signature"]
+        for qcm_id, stems in ((1, stems_a), (2, stems_b), (3, stems_c))
+    }
+    assert estimated_similarity(signatures[1], signatures[2]) >= DUPLICATE_THRESHOLD
+    assert estimated_similarity(signatures[2], signatures[3]) >= DUPLICATE_THRESHOLD
+    assert estimated_similarity(signatures[1], signatures[3]) < DUPLICATE_THRESHOLD
+    exam = {"type": "Colle N°1", "annee": "2022 / 2023", "ue": "UE1"}
+    metadata = {1: exam, 2: exam, 3: exam}
+    groups = group_duplicates(signatures, metadata, {(1, 2), (2, 3), (1, 3)})
+    assert groups == [[2, 3]]
+
+
+def test_groups_require_same_metadata():
+    signatures = {
+        1: compute_fingerprint(make_exam(SESSION_2022))["signature"],
+        2: compute_fingerprint(make_exam(SESSION_2023))["signature"],
+        3: compute_fingerprint(make_exam(SESSION_2022))["signature"],
+    }
+    metadata = {
+        1: {"type": "Concours Blanc N°1", "annee": "2021 / 2022", "ue": "UE1"},
+        2: {"type": "Concours Blanc N°1", "annee": "2022 / 2023", "ue": "UE1"},
+        3: {"type": "Concours Blanc N°1", "annee": "2021 / 2022", "ue": "UE1"},
+    }
+    assert group_duplicates(signatures, metadata, {(1, 2), (2, 3), (1, 3)}) == [[1, 3]]
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DES EMPREINTES DE CONTENU")
+    print("=" * 40)
+    test_identical_exams()
+    test_recycled_exam_is_only_a_candidate()
+    test_unrelated_exams()
+    test_similarity_edge_cases()
+    test_same_exam_normalization()
+    test_candidates_are_sorted_and_filtered()
+    test_groups_are_not_transitive()
+    test_groups_require_same_metadata()
+    print("✅ Empreintes de contenu validées")
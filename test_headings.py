@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests de l'index des titres (qcm_extraction/headings.py) qui remplace les
+récupérations par regex des Phases 1 et 2: titres Markdown ou en gras,
+questions poursuivies sur la page suivante et fenêtre de recherche des
+propositions.
+"""
+
+from qcm_extraction.document import Document
+from qcm_extraction.headings import PROPOSITIONS_WINDOW, HeadingIndex
+
+TEXT = (
+    "# Page 1\n\n"
+    "## Q1. A propos de la membrane plasmique :\n\n"
+    "A. Elle est formée d'une bicouche lipidique.\n"
+    "B. Elle contient du cholestérol.\n"
+    "C. Elle est imperméable à l'eau.\n"
+    "D. Elle porte des glycoprotéines.\n"
+    "E. Elle est asymétrique.\n\n"
+    "**2.** Concernant le noyau de la cellule :\n\n"
+    "A. Il contient la chromatine.\n"
+    "B. Il est entouré d'une double membrane.\n"
+    "C. Il communique par les pores nucléaires.\n\n"
+    "# Page 2\n\n"
+    "D. Le nucléole produit les ARN ribosomiques.\n"
+    "E. Il disparaît pendant la mitose.\n\n"
+    "## Q3. Concernant la mitochondrie :\n\n"
+    "A. Elle possède son propre ADN.\n"
+)
+
+
+def test_markdown_and_bold_headings():
+    index = Document(TEXT).headings
+    assert sorted(index.questions) == [1, 2, 3]
+    assert index.question_text(1) == "A propos de la membrane plasmique :"
+    assert index.question_text(2) == "Concernant le noyau de la cellule :"
+    assert [heading["page_num"] for heading in index.questions[3]] == [2]
+
+
+def test_propositions_of_a_question():
+    index = Document(TEXT).headings
+    propositions = index.question_propositions(1)
+    assert sorted(propositions) == ["A", "B", "C", "D", "E"]
+    assert propositions["C"] == "Elle est imperméable à l'eau."
+    assert index.question_propositions(3) == {"A": "Elle possède son propre ADN."}
+    assert index.question_propositions(9) == {}
+
+
+def test_question_continued_across_page_break():
+    index = Document(TEXT).headings
+    # D et E sont sur la page 2, avant le titre de Q3: elles restent rattachées à Q2
+    propositions = index.question_propositions(2)
+    assert sorted(propositions) == ["A", "B", "C", "D", "E"]
+    # L'en-tête de page borne le texte de C
+    assert propositions["C"] == "Il communique par les pores nucléaires."
+    assert propositions["E"] == "Il disparaît pendant la mitose."
+    assert index.question_at(TEXT.index("D. Le nucléole")) == 2
+    assert index.page_at(TEXT.index("D. Le nucléole")) == 2
+    block = index.question_block(2)
+    assert "pores nucléaires" in block and "mitose" in block and "mitochondrie" not in block
+
+
+def test_question_at_restricted_to_known_numbers():
+    index = Document(TEXT).headings
+    offset = TEXT.index("A. Elle possède")
+    assert index.question_at(offset) == 3
+    assert index.question_at(offset, numbers=[1, 2]) == 2
+    assert index.question_at(0) is None
+
+
+def test_propositions_window():
+    long_stem = "Énoncé très long " * ((PROPOSITIONS_WINDOW // 17) + 10)
+    text = f"## Q1. {long_stem}\n\nA. Proposition trop loin du titre.\n\n## Q2. Une question courte :\n\nA. Proposition proche du titre.\n"
+    index = HeadingIndex(text)
+    # Propositions au-delà de la fenêtre: ignorées, le bloc est tronqué à la fenêtre
+    assert index.question_propositions(1) == {}
+    block = index.question_block(1)
+    assert len(block) <= PROPOSITIONS_WINDOW and "trop loin" not in block
+    assert index.question_propositions(2) == {"A": "Proposition proche du titre."}
+
+
+def test_document_without_page_headers():
+    index = HeadingIndex("## Q5. Question sans en-tête de page :\n\nA. Première proposition.\n")
+    assert index.page_at(0) == 1
+    assert index.questions[5][0]["page_num"] == 1
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DE L'INDEX DES TITRES")
+    print("=" * 40)
+    test_markdown_and_bold_headings()
+    test_propositions_of_a_question()
+    test_question_continued_across_page_break()
+    test_question_at_restricted_to_known_numbers()
+    test_propositions_window()
+    test_document_without_page_headers()
+    print("✅ Index des titres validé")
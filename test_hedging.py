@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests des requêtes doublées (qcm_extraction/hedging.py): un appel plus lent
+que le percentile récent est doublé et la première réponse retenue, le taux
+de doublons est plafonné et les tokens du perdant sont comptés dans le budget.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from qcm_extraction.budget import DocumentBudget
+from qcm_extraction.hedging import Hedger, LatencyTracker, prompt_size_bucket
+
+ENDPOINT = "Chat.complete:mistral-small-latest"
+KWARGS = {"model": "mistral-small-latest", "messages": [{"role": "user", "content": "Q1 ?"}], "temperature": 0.0}
+
+
+class ScriptedAPI:
+    """Chaque appel dort la durée suivante du script puis répond (ou lève)."""
+
+    def __init__(self, *delays, error_on_first=False):
+        self.delays = list(delays)
+        self.error_on_first = error_on_first
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, **kwargs):
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+        time.sleep(self.delays[index])
+        if self.error_on_first and index == 0:
+            raise TimeoutError("primary timed out")
+        return SimpleNamespace(call=index, usage=SimpleNamespace(total_tokens=100))
+
+
+def warmed_hedger(latency=0.01, samples=20, **kwargs) -> Hedger:
+    hedger = Hedger(min_samples=samples, workers=4, **kwargs)
+    for _ in range(samples):
+        hedger.latencies.record(f"{ENDPOINT}|s", latency)
+    return hedger
+
+
+def test_prompt_size_bucket():
+    assert prompt_size_bucket(KWARGS) == "s"
+    assert prompt_size_bucket({"messages": [{"content": "x" * 10000}]}) == "m"
+    assert prompt_size_bucket({"messages": [SimpleNamespace(content=[{"text": "x" * 30000}])]}) == "l"
+    assert prompt_size_bucket({}) == "s"
+
+
+def test_percentile_needs_enough_samples():
+    tracker = LatencyTracker(window=100)
+    for latency in range(1, 11):
+        tracker.record("k", float(latency))
+    assert tracker.percentile("k", 0.95, min_samples=20) is None
+    assert tracker.percentile("k", 0.95, min_samples=10) == 10.0
+    assert tracker.percentile("k", 0.5, min_samples=10) == 6.0
+
+
+def test_no_hedge_without_history():
+    hedger = Hedger(min_samples=20, workers=2)
+    api = ScriptedAPI(0.05)
+    assert hedger.call(api.complete, (), KWARGS, ENDPOINT).call == 0
+    assert api.calls == 1
+    assert hedger.stats()[ENDPOINT] == {"calls": 1, "hedged": 0, "hedge_wins": 0}
+
+
+def test_slow_call_is_hedged_and_loser_is_charged():
+    hedger = warmed_hedger(max_ratio=1.0)
+    api = ScriptedAPI(0.3, 0.01)
+    budget = DocumentBudget(deadline_seconds=None)
+    response = hedger.call(api.complete, (), KWARGS, ENDPOINT, budget=budget)
+    assert response.call == 1                     # le doublon a répondu le premier
+    assert hedger.stats()[ENDPOINT] == {"calls": 1, "hedged": 1, "hedge_wins": 1}
+    assert budget.calls == 1                      # appel du doublon réservé sur le budget
+    time.sleep(0.4)                               # le perdant termine: ses tokens sont comptés
+    assert budget.tokens == 100
+
+
+def test_failed_primary_falls_back_to_hedge():
+    hedger = warmed_hedger(max_ratio=1.0)
+    api = ScriptedAPI(0.1, 0.2, error_on_first=True)
+    assert hedger.call(api.complete, (), KWARGS, ENDPOINT).call == 1
+
+
+def test_hedge_rate_is_capped():
+    hedger = warmed_hedger(latency=0.001, max_ratio=0.05)
+    api = ScriptedAPI(*[0.02] * 80)
+    for _ in range(40):
+        hedger.call(api.complete, (), KWARGS, ENDPOINT)
+    stats = hedger.stats()[ENDPOINT]
+    assert stats["calls"] == 40
+    assert stats["hedged"] <= 0.05 * 40
+
+
+def test_exhausted_budget_blocks_hedge():
+    hedger = warmed_hedger(max_ratio=1.0)
+    api = ScriptedAPI(0.1, 0.01)
+    budget = DocumentBudget(max_calls=0, deadline_seconds=None)
+    assert hedger.call(api.complete, (), KWARGS, ENDPOINT, budget=budget).call == 0
+    assert api.calls == 1
+    assert budget.refused == 1
+    assert hedger.stats()[ENDPOINT]["hedged"] == 0
+
+
+def test_unhedgeable_call_runs_in_caller_thread():
+    hedger = Hedger(min_samples=20, workers=1)
+    threads = []
+    hedger.call(lambda **kwargs: threads.append(threading.current_thread()), (), KWARGS, ENDPOINT)
+    assert threads == [threading.current_thread()]
+
+
+def test_busy_hedge_pool_does_not_delay_primaries():
+    hedger = warmed_hedger(latency=0.05, max_ratio=1.0)
+    hedger._executor = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    hedger._executor.submit(release.wait)         # pool des doublons occupé
+    try:
+        api = ScriptedAPI(0.01)
+        started = time.monotonic()
+        assert hedger.call(api.complete, (), KWARGS, ENDPOINT).call == 0
+        assert time.monotonic() - started < 0.5
+        # Latence enregistrée: durée de l'appel, sans attente d'un thread du pool
+        assert hedger.latencies.percentile(f"{ENDPOINT}|s", 1.0, min_samples=1) < 0.1
+    finally:
+        release.set()
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DES REQUÊTES DOUBLÉES")
+    print("=" * 40)
+    test_prompt_size_bucket()
+    test_percentile_needs_enough_samples()
+    test_no_hedge_without_history()
+    test_slow_call_is_hedged_and_loser_is_charged()
+    test_failed_primary_falls_back_to_hedge()
+    test_hedge_rate_is_capped()
+    test_exhausted_budget_blocks_hedge()
+    test_unhedgeable_call_runs_in_caller_thread()
+    test_busy_hedge_pool_does_not_delay_primaries()
+    print("✅ Requêtes doublées validées")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test du budget de démarrage: l'aide des commandes et l'analyse locale du
+Markdown ne doivent importer ni mistralai, ni supabase, ni PIL, pdf2image ou
+requests, et démarrer en moins de 200 ms (interpréteur compris).
+"""
+
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+BUDGET_SECONDS = 0.2
+HEAVY_MODULES = ("mistralai", "supabase", "PIL", "pdf2image", "requests", "pydantic", "httpx", "aiohttp")
+
+# Modules qui doivent rester légers à l'import
+LIGHT_MODULES = (
+    "qcm_extraction",
+    "qcm_extraction.extractor",
+    "qcm_extraction.document",
+    "qcm_extraction.pipeline",
+    "qcm_extraction.jobs",
+)
+
+# Commandes d'aide (sans clés API ni réseau)
+HELP_COMMANDS = (
+    ["extract_qcm.py", "--help"],
+    ["extract_qcm.py", "--version"],
+    ["scripts/main.py"],
+)
+
+
+def measure_import(module: str):
+    """Temps d'import d'un module dans un interpréteur neuf et modules lourds chargés."""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_command(args):
+    """Durée totale d'une commande (démarrage de l'interpréteur compris)."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True)
+    return time.perf_counter() - start
+
+
+def test_light_imports():
+    for module in LIGHT_MODULES:
+        result = measure_import(module)
+        print(f"📦 {module}: {result['elapsed'] * 1000:.0f} ms {result['heavy'] or ''}")
+        assert not result["heavy"], f"{module} importe {', '.join(result['heavy'])} dès l'import"
+        assert result["elapsed"] < BUDGET_SECONDS, f"{module}: {result['elapsed'] * 1000:.0f} ms > {BUDGET_SECONDS * 1000:.0f} ms"
+
+
+def test_help_commands():
+    for args in HELP_COMMANDS:
+        elapsed = min(measure_command(args) for _ in range(3))
+        print(f"⏱️ python {' '.join(args)}: {elapsed * 1000:.0f} ms")
+        assert elapsed < BUDGET_SECONDS, f"{' '.join(args)}: {elapsed * 1000:.0f} ms > {BUDGET_SECONDS * 1000:.0f} ms"
+
+
+if __name__ == "__main__":
+    print("🧪 TEST DU BUDGET DE DÉMARRAGE")
+    print("=" * 40)
+    test_light_imports()
+    test_help_commands()
+    print("✅ Budget de démarrage respecté")
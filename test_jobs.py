@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests de la file de jobs persistante (qcm_extraction/jobs.py): échecs
+replanifiés puis lettre morte, remise en file et résultat enregistré.
+"""
+
+import tempfile
+from pathlib import Path
+
+from qcm_extraction.jobs import JobQueue
+
+URL = "https://example.org/ue1-cb1-21-22.pdf"
+
+
+def test_failures_then_retry_clear_last_error():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(Path(tmp) / "jobs.sqlite3")
+        try:
+            queue.enqueue(URL, max_attempts=1)
+            job = queue.lease("worker-1")
+            assert queue.fail(job["id"], "worker-1", "RuntimeError: Phase 2", {"traceback": "..."}) == "dead"
+            assert queue.get(job_id=job["id"])["last_error"] == "RuntimeError: Phase 2"
+
+            assert queue.retry(job["id"])
+            retried = queue.get(job_id=job["id"])
+            assert retried["status"] == "pending"
+            assert retried["attempts"] == 0
+            assert retried["last_error"] is None
+            # Seules les lettres mortes sont remises en file
+            assert not queue.retry(job["id"])
+        finally:
+            queue.close()
+
+
+def test_failure_is_rescheduled_with_backoff():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(Path(tmp) / "jobs.sqlite3")
+        try:
+            queue.enqueue(URL, max_attempts=3)
+            job = queue.lease("worker-1")
+            assert queue.fail(job["id"], "worker-1", "TimeoutError") == "pending"
+            # Backoff: le job n'est pas immédiatement disponible
+            assert queue.lease("worker-2") is None
+            # Bail perdu: l'échec d'un autre worker est ignoré
+            assert queue.fail(job["id"], "worker-2", "TimeoutError") is None
+        finally:
+            queue.close()
+
+
+def test_complete_records_partial_result():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(Path(tmp) / "jobs.sqlite3")
+        try:
+            queue.enqueue(URL)
+            job = queue.lease("worker-1")
+            assert queue.complete(job["id"], "worker-1", {"qcm_db_id": 12, "partial": True})
+            done = queue.get(job_id=job["id"])
+            assert done["status"] == "done"
+            assert done["result"] == {"qcm_db_id": 12, "partial": True}
+        finally:
+            queue.close()
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DE LA FILE DE JOBS")
+    print("=" * 40)
+    test_failures_then_retry_clear_last_error()
+    test_failure_is_rescheduled_with_backoff()
+    test_complete_records_partial_result()
+    print("✅ File de jobs validée")
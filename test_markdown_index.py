@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests de l'index QCM → Markdown (qcm_extraction/markdown_index.py): des
+processus qui enregistrent leurs QCM en même temps ne perdent aucune entrée.
+"""
+
+import json
+import multiprocessing
+import tempfile
+from pathlib import Path
+
+from qcm_extraction.markdown_index import load_index, rebuild_index, register_markdown, save_index
+
+ENTRIES = 100
+
+
+def register_many(index_path: str, first_id: int):
+    for qcm_id in range(first_id, first_id + ENTRIES):
+        register_markdown(qcm_id, f"outputs/{qcm_id}/content.md", Path(index_path))
+
+
+def test_processes_do_not_lose_entries():
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = Path(tmp) / "index.json"
+        processes = [
+            multiprocessing.Process(target=register_many, args=(str(index_path), worker * 1000))
+            for worker in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
+        index = load_index(index_path)
+        assert len(index) == 4 * ENTRIES
+        assert index[3042] == "outputs/3042/content.md"
+        assert [p.name for p in Path(tmp).iterdir() if p.suffix == ".tmp"] == []
+
+
+def test_save_and_load_roundtrip():
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = Path(tmp) / "outputs" / "index.json"
+        assert load_index(index_path) == {}
+        save_index({2: "b.md", 1: "a.md"}, index_path)
+        register_markdown(3, "c.md", index_path)
+        assert load_index(index_path) == {1: "a.md", 2: "b.md", 3: "c.md"}
+
+
+class CappedQuery:
+    """Requête PostgREST factice: comme le serveur, au plus 1000 lignes par réponse."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.start, self.end = 0, None
+
+    def select(self, *args):
+        return self
+
+    def order(self, column):
+        self.rows = sorted(self.rows, key=lambda row: row[column])
+        return self
+
+    def range(self, start, end):
+        self.start, self.end = start, end + 1
+        return self
+
+    def execute(self):
+        rows = self.rows[self.start:self.end][:1000]
+        return type("Result", (), {"data": rows})()
+
+
+class CappedSupabase:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def table(self, name):
+        return CappedQuery(self.tables[name])
+
+
+def test_rebuild_index_reads_every_qcm():
+    # Plus de QCM que la limite de lignes de PostgREST: le dernier doit être rattaché
+    qcms = [{"id": qcm_id, "type": f"Colle N°{qcm_id}", "annee": "2022 / 2023", "ue_id": 1} for qcm_id in range(1, 1501)]
+    supabase = CappedSupabase({"ue": [{"id": 1, "numero": "UE1"}], "qcm": qcms})
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = Path(tmp) / "outputs"
+        for qcm_id in (1, 1500):
+            folder = outputs / f"colle_{qcm_id}"
+            folder.mkdir(parents=True)
+            (folder / "content.md").write_text("# Page 1\n", encoding="utf-8")
+            (folder / "metadata.json").write_text(json.dumps(
+                {"type": f"Colle N°{qcm_id}", "annee": "2022 / 2023", "ue": "UE1"}
+            ), encoding="utf-8")
+        index = rebuild_index(supabase, outputs, outputs / "index.json")
+        assert sorted(index) == [1, 1500]
+        assert index[1500].endswith("colle_1500/content.md")
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DE L'INDEX MARKDOWN")
+    print("=" * 40)
+    test_processes_do_not_lose_entries()
+    test_save_and_load_roundtrip()
+    test_rebuild_index_reads_every_qcm()
+    print("✅ Index Markdown sans perte")
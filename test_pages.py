@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests de l'état par page (qcm_extraction/pages.py): questions rattachées à
+chaque page et questions à réextraire quand des pages changent.
+"""
+
+from qcm_extraction.document import Document
+from qcm_extraction.pages import diff_page_states, page_hash, page_question_numbers
+
+
+def question(numero: int) -> str:
+    propositions = "\n".join(f"{lettre}. Proposition {lettre} de la question {numero}." for lettre in "ABCDE")
+    return f"## Q{numero}. A propos de la membrane :\n\n{propositions}\n"
+
+
+def pages(*contents):
+    return [{"page_num": page_num, "content": content} for page_num, content in enumerate(contents, start=1)]
+
+
+def test_questions_by_page():
+    by_page = page_question_numbers(pages(question(1) + question(2), question(3), "Page blanche"))
+    # La page 3 n'a pas de titre: elle est rattachée à la dernière question de la page précédente
+    assert by_page == {1: [1, 2], 2: [3], 3: [3]}
+
+
+def test_question_continued_across_pages():
+    first, continuation = question(2).split("C.")
+    by_page = page_question_numbers(pages(question(1) + first, "C." + continuation + question(3)))
+    assert by_page == {1: [1, 2], 2: [2, 3]}
+
+
+def test_answer_grid_page_is_not_a_heading():
+    # Une grille de correction ne contient pas de titre: seule la question précédente lui est rattachée
+    by_page = page_question_numbers(pages(question(1), question(2), "Correction\n\n1: A, B\n2: C, D, E"))
+    assert by_page[3] == [2]
+
+
+def test_known_numbers_filter():
+    by_page = page_question_numbers(pages(question(1) + question(2), question(3)), known_numbers={1, 3})
+    assert by_page == {1: [1], 2: [3]}
+
+
+def test_page_hash_ignores_whitespace():
+    assert page_hash("A.  texte\n\nB. suite") == page_hash("A. texte B. suite")
+    assert page_hash("A. texte") != page_hash("A. texte modifié")
+
+
+def test_diff_page_states():
+    stored = Document("# Page 1\n\n" + question(1) + "\n# Page 2\n\n" + question(2) + question(3)).page_state()
+    current = Document("# Page 1\n\n" + question(1) + "\n# Page 2\n\n" + question(2)
+                       + "\n# Page 3\n\n" + question(4)).page_state()
+    diff = diff_page_states(stored, current)
+    assert diff["changed_pages"] == [2, 3]
+    # Questions avant (Q3 disparue) comme après (Q4 ajoutée) la modification
+    assert diff["touched_questions"] == {2, 3, 4}
+
+
+def test_diff_removed_page_and_unchanged():
+    state = Document("# Page 1\n\n" + question(1) + "\n# Page 2\n\n" + question(2)).page_state()
+    assert diff_page_states(state, state) == {"changed_pages": [], "touched_questions": set()}
+    shorter = {1: state[1]}
+    assert diff_page_states(state, shorter) == {"changed_pages": [2], "touched_questions": {2}}
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DE L'ÉTAT PAR PAGE")
+    print("=" * 40)
+    test_questions_by_page()
+    test_question_continued_across_pages()
+    test_answer_grid_page_is_not_a_heading()
+    test_known_numbers_filter()
+    test_page_hash_ignores_whitespace()
+    test_diff_page_states()
+    test_diff_removed_page_and_unchanged()
+    print("✅ État par page validé")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests du pipeline d'étapes (qcm_extraction/pipeline.py): chaque document
+traverse les étapes dans l'ordre, un arrêt ou une exception le sort du
+pipeline, les files bornées freinent les étapes amont et chaque thread garde
+son propre contexte (un extracteur par thread).
+"""
+
+import threading
+import time
+
+from qcm_extraction.pipeline import StagePipeline
+
+
+def test_items_traverse_stages_in_order():
+    def stage(name):
+        def run(context, item):
+            item["trace"].append(name)
+        return run
+
+    pipeline = StagePipeline([("a", stage("a"), 2), ("b", stage("b"), 1), ("c", stage("c"), 3)])
+    items = [{"id": i, "trace": []} for i in range(10)]
+    finished = pipeline.run(items)
+    assert sorted(item["id"] for item in finished) == list(range(10))
+    assert all(item["trace"] == ["a", "b", "c"] for item in finished)
+    assert [stage["processed"] for stage in pipeline.stats()] == [10, 10, 10]
+
+
+def test_stop_and_failure_leave_the_pipeline():
+    def check(context, item):
+        if item == 1:
+            return False          # doublon: terminé sans les étapes suivantes
+        if item == 2:
+            raise RuntimeError("OCR illisible")
+
+    reached = []
+    pipeline = StagePipeline([("check", check, 1), ("save", lambda context, item: reached.append(item), 1)])
+    finished = pipeline.run([0, 1, 2, 3])
+    assert sorted(finished) == [0, 1, 2, 3]
+    assert sorted(reached) == [0, 3]
+    stats = {stage["stage"]: stage for stage in pipeline.stats()}
+    assert stats["check"]["failed"] == 1
+    assert stats["save"]["processed"] == 2
+
+
+def test_bounded_queues_apply_backpressure():
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fast(context, item):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+
+    def slow(context, item):
+        nonlocal in_flight
+        time.sleep(0.01)
+        with lock:
+            in_flight -= 1
+
+    pipeline = StagePipeline([("fast", fast, 4), ("slow", slow, 1)], queue_size=1)
+    pipeline.run(range(30))
+    # Documents entre les deux étapes: file de l'étape lente + son worker + workers amont bloqués
+    assert peak <= 1 + 1 + 4
+    assert pipeline.bottleneck() == "slow"
+
+
+def test_context_is_created_once_per_thread():
+    created = []
+
+    def init():
+        created.append(threading.get_ident())
+        return threading.get_ident()
+
+    def check_context(context, item):
+        assert context == threading.get_ident()
+
+    pipeline = StagePipeline([("a", check_context, 2), ("b", check_context, 3)], worker_init=init)
+    pipeline.run(range(20))
+    assert len(created) == len(set(created)) <= 5
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DU PIPELINE D'ÉTAPES")
+    print("=" * 40)
+    test_items_traverse_stages_in_order()
+    test_stop_and_failure_leave_the_pipeline()
+    test_bounded_queues_apply_backpressure()
+    test_context_is_created_once_per_thread()
+    print("✅ Pipeline d'étapes validé")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests du cache de lecture des QCM (qcm_extraction/reader.py): éviction LRU,
+expiration, invalidation et lecture concurrente d'une écriture (l'état
+antérieur n'est pas remis en cache).
+"""
+
+import time
+
+from qcm_extraction.reader import QCMCache, QCMReader
+
+
+def test_lru_eviction():
+    cache = QCMCache(maxsize=2)
+    cache.put(1, {"id": 1})
+    cache.put(2, {"id": 2})
+    assert cache.get(1) == {"id": 1}   # 1 devient le plus récent
+    cache.put(3, {"id": 3})
+    assert cache.get(2) is None
+    assert cache.get(1) == {"id": 1} and cache.get(3) == {"id": 3}
+    assert cache.stats() == {"size": 2, "hits": 3, "misses": 1}
+
+
+def test_ttl_expiry():
+    cache = QCMCache(ttl=0.05)
+    cache.put(1, {"id": 1})
+    assert cache.get(1) == {"id": 1}
+    time.sleep(0.1)
+    assert cache.get(1) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidation():
+    cache = QCMCache()
+    cache.put(1, {"id": 1})
+    cache.put(2, {"id": 2})
+    cache.invalidate(1)
+    assert cache.get(1) is None and cache.get(2) == {"id": 2}
+    cache.invalidate()
+    assert cache.get(2) is None
+
+
+def test_put_after_invalidation_is_dropped():
+    cache = QCMCache()
+    generation = cache.generation(1)
+    cache.invalidate(1)
+    cache.put(1, {"id": 1, "stale": True}, generation)
+    assert cache.get(1) is None
+    # Une invalidation d'un autre QCM ne périme pas la lecture
+    generation = cache.generation(1)
+    cache.invalidate(2)
+    cache.put(1, {"id": 1}, generation)
+    assert cache.get(1) == {"id": 1}
+    # Un vidage complet périme toutes les lectures en cours
+    generation = cache.generation(3)
+    cache.invalidate()
+    cache.put(3, {"id": 3}, generation)
+    assert cache.get(3) is None
+
+
+class FakeQuery:
+    def __init__(self, supabase):
+        self.supabase = supabase
+
+    def select(self, *args):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def in_(self, *args):
+        return self
+
+    def order(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    def execute(self):
+        self.supabase.reads += 1
+        rows = [{"id": 1, "type": "Colle N°1", "ue": {"numero": "UE1"}, "questions": [], "version": self.supabase.version}]
+        if self.supabase.write_during_read:
+            # Écriture d'un extracteur pendant la requête: la ligne lue est déjà périmée
+            self.supabase.write_during_read = False
+            self.supabase.version += 1
+            self.supabase.cache.invalidate(1)
+        return type("Result", (), {"data": rows})()
+
+
+class FakeSupabase:
+    def __init__(self, cache):
+        self.cache = cache
+        self.reads = 0
+        self.version = 1
+        self.write_during_read = False
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+def test_reader_does_not_cache_stale_read():
+    cache = QCMCache()
+    supabase = FakeSupabase(cache)
+    reader = QCMReader(supabase, cache)
+
+    supabase.write_during_read = True
+    assert reader.get_qcm(1)["version"] == 1
+    # La lecture périmée n'a pas été mise en cache: la suivante relit la nouvelle version
+    assert reader.get_qcm(1)["version"] == 2
+    assert reader.get_qcm(1)["version"] == 2
+    assert supabase.reads == 2
+
+    # Même règle pour les lectures par lot et par filtre
+    cache.invalidate()
+    supabase.write_during_read = True
+    reader.get_qcms([1])
+    supabase.write_during_read = True
+    reader.get_qcms(ue="UE1")
+    assert cache.get(1) is None
+    reader.get_qcms(ue="UE1")
+    assert cache.get(1)["version"] == 4
+
+
+def test_reader_returns_copies():
+    cache = QCMCache()
+    reader = QCMReader(FakeSupabase(cache), cache)
+    qcm = reader.get_qcm(1)
+    qcm["questions"].append({"numero": 99})
+    assert reader.get_qcm(1)["questions"] == []
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DU CACHE DE LECTURE")
+    print("=" * 40)
+    test_lru_eviction()
+    test_ttl_expiry()
+    test_invalidation()
+    test_put_after_invalidation_is_dropped()
+    test_reader_does_not_cache_stale_read()
+    test_reader_returns_copies()
+    print("✅ Cache de lecture validé")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Tests des retries des appels API (qcm_extraction/retry.py): classification des
+erreurs, `Retry-After`, transitions du disjoncteur et boucle de retries avec
+une fonction simulée et une attente injectée (aucun appel réseau, aucune pause).
+"""
+
+import time
+from email.utils import formatdate
+
+import pytest
+
+from qcm_extraction.budget import DocumentBudget
+from qcm_extraction.retry import (
+    APICallError,
+    CircuitBreaker,
+    RetryPolicy,
+    call_with_retry,
+    classify_error,
+    retry_after_seconds,
+)
+
+
+class HTTPError(Exception):
+    """Erreur SDK simulée: code HTTP et en-têtes portés par `raw_response`."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.raw_response = type("Response", (), {"status_code": status_code, "headers": headers or {}})()
+
+
+class ConnectError(Exception):
+    pass
+
+
+class FlakyAPI:
+    """Lève les erreurs données dans l'ordre, puis répond."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def complete(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"ok": True}
+
+
+def test_classify_error():
+    assert classify_error(HTTPError(429)) == "rate_limit"
+    assert classify_error(HTTPError(503)) == "server"
+    assert classify_error(HTTPError(400)) == "client"
+    assert classify_error(TimeoutError()) == "timeout"
+    assert classify_error(Exception("read timed out")) == "timeout"
+    assert classify_error(ConnectError()) == "network"
+    assert classify_error(ConnectionResetError()) == "network"
+    assert classify_error(Exception("Rate limit exceeded")) == "rate_limit"
+    assert classify_error(ValueError("?")) == "unknown"
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(HTTPError(429, {"retry-after": "7"})) == 7.0
+    assert retry_after_seconds(HTTPError(429, {"Retry-After": "-3"})) == 0.0
+    http_date = formatdate(time.time() + 20, usegmt=True)
+    assert 15 < retry_after_seconds(HTTPError(429, {"retry-after": http_date})) <= 20
+    assert retry_after_seconds(HTTPError(429, {"retry-after": "bientôt"})) is None
+    assert retry_after_seconds(HTTPError(429)) is None
+    assert retry_after_seconds(ValueError()) is None
+
+
+def test_breaker_transitions():
+    breaker = CircuitBreaker("test:transitions", failure_threshold=2, reset_timeout=0.05)
+    assert breaker.allow()
+    breaker.record_failure("client")      # 4xx: l'API répond, pas de panne
+    breaker.record_failure("server")
+    assert breaker.state == "closed"
+    breaker.record_failure("timeout")
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()                # demi-ouvert: un seul appel d'essai
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_failure("server")      # essai raté: rouvert
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release()                     # essai interrompu (échéance): ni succès ni échec
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.snapshot() == {"state": "closed", "consecutive_failures": 0, "times_opened": 2}
+
+
+def test_transient_errors_are_retried_with_injected_sleep():
+    api = FlakyAPI(HTTPError(503), TimeoutError("timed out"))
+    waits = []
+    result = call_with_retry(api.complete, endpoint="test:transient", policy=RetryPolicy(max_attempts=3),
+                             sleep=waits.append, model="m")
+    assert result == {"ok": True}
+    assert len(api.calls) == 3
+    assert len(waits) == 2 and all(0 <= wait <= 30 for wait in waits)
+
+
+def test_rate_limit_waits_for_retry_after():
+    api = FlakyAPI(HTTPError(429, {"retry-after": "4"}))
+    waits = []
+    call_with_retry(api.complete, endpoint="test:rate_limit", sleep=waits.append)
+    assert waits == [4.0]
+
+
+def test_long_retry_after_gives_up():
+    api = FlakyAPI(HTTPError(429, {"retry-after": "600"}))
+    with pytest.raises(APICallError) as error:
+        call_with_retry(api.complete, endpoint="test:retry_after", sleep=pytest.fail)
+    assert error.value.category == "rate_limit"
+    assert len(api.calls) == 1
+
+
+def test_client_errors_are_not_retried():
+    api = FlakyAPI(HTTPError(400))
+    with pytest.raises(APICallError) as error:
+        call_with_retry(api.complete, endpoint="test:client", sleep=pytest.fail)
+    assert error.value.category == "client"
+    assert error.value.attempts == 1
+
+
+def test_open_breaker_short_circuits():
+    api = FlakyAPI(*[HTTPError(502)] * 10)
+    for _ in range(2):
+        with pytest.raises(APICallError):
+            call_with_retry(api.complete, endpoint="test:breaker", policy=RetryPolicy(max_attempts=3),
+                            sleep=lambda seconds: None)
+    calls_before = len(api.calls)
+    with pytest.raises(APICallError) as error:
+        call_with_retry(api.complete, endpoint="test:breaker", sleep=pytest.fail)
+    assert error.value.category == "circuit_open"
+    assert len(api.calls) == calls_before
+
+
+def test_budget_and_timeout():
+    api = FlakyAPI()
+    budget = DocumentBudget(max_calls=1, deadline_seconds=600)
+    call_with_retry(api.complete, endpoint="test:budget", budget=budget, timeout=120, sleep=pytest.fail)
+    assert api.calls[0]["timeout_ms"] == 120_000
+    with pytest.raises(APICallError) as error:
+        call_with_retry(api.complete, endpoint="test:budget", budget=budget, sleep=pytest.fail)
+    assert error.value.category == "budget"
+    assert len(api.calls) == 1
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DES RETRIES ET DU DISJONCTEUR")
+    print("=" * 40)
+    test_classify_error()
+    test_retry_after_seconds()
+    test_breaker_transitions()
+    test_transient_errors_are_retried_with_injected_sleep()
+    test_rate_limit_waits_for_retry_after()
+    test_long_retry_after_gives_up()
+    test_client_errors_are_not_retried()
+    test_open_breaker_short_circuits()
+    test_budget_and_timeout()
+    print("✅ Retries et disjoncteur validés")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests de la réutilisation des propositions (qcm_extraction/reuse.py): le hash
+d'une question ne dépend ni de son numéro ni des en-têtes de pages, et les
+blocs trop courts ne sont jamais repris.
+"""
+
+from qcm_extraction.document import Document
+from qcm_extraction.reuse import REUSE_MIN_WORDS, find_reusable, normalize_block, question_hashes, record_reuse
+
+STEM = "Concernant la régulation de la glycolyse dans l'hépatocyte, on peut affirmer que :"
+PROPOSITIONS = (
+    "A. La phosphofructokinase 1 est activée par l'AMP.\n"
+    "B. L'ATP inhibe la phosphofructokinase 1.\n"
+    "C. Le citrate active la pyruvate kinase.\n"
+    "D. L'insuline favorise la glycolyse hépatique.\n"
+    "E. Le glucagon active la pyruvate kinase hépatique.\n"
+)
+
+
+def exam(numero: int, body: str = STEM + "\n\n" + PROPOSITIONS) -> Document:
+    return Document(f"# Page 1\n\n## Q{numero}. {body}\n## Q{numero + 1}. Question suivante :\n")
+
+
+def test_normalize_block():
+    assert normalize_block("# Page 3\n\nL'ATP inhibe la PFK-1 (étape 3) !") == "l atp inhibe la pfk 1 etape 3"
+    assert normalize_block("  ") == ""
+
+
+def test_hash_ignores_question_number():
+    hash_3 = question_hashes(exam(3), [3])[3]
+    hash_17 = question_hashes(exam(17), [17])[17]
+    assert hash_3 == hash_17
+
+
+def test_hash_ignores_page_headers():
+    split = STEM + "\n\n" + PROPOSITIONS.replace("C. Le citrate", "# Page 2\n\nC. Le citrate")
+    assert question_hashes(exam(1, split), [1]) == question_hashes(exam(1), [1])
+
+
+def test_hash_depends_on_propositions():
+    # Même énoncé générique, autres propositions: autre question
+    other = STEM + "\n\n" + PROPOSITIONS.replace("active la pyruvate", "inhibe la pyruvate")
+    assert question_hashes(exam(1, other), [1]) != question_hashes(exam(1), [1])
+
+
+def test_short_blocks_are_skipped():
+    short = "Concernant la glycolyse :\n\nA. Vrai.\nB. Faux.\n"
+    assert len(normalize_block(short).split()) < REUSE_MIN_WORDS
+    assert question_hashes(exam(1, short), [1]) == {}
+    # Question absente du document: ignorée
+    assert question_hashes(exam(1), [1, 9]).keys() == {1}
+
+
+class FakeTable:
+    def __init__(self, supabase, name):
+        self.supabase, self.name = supabase, name
+
+    def select(self, *args):
+        return self
+
+    def in_(self, column, values):
+        self.values = values
+        return self
+
+    def insert(self, rows):
+        self.supabase.inserted.extend(rows)
+        return self
+
+    def execute(self):
+        rows = [row for row in self.supabase.rows if row["question_hash"] in getattr(self, "values", [])]
+        return type("Result", (), {"data": rows})()
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.inserted = []
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+def test_find_and_record_reuse():
+    question_hash = question_hashes(exam(4), [4])[4]
+    supabase = FakeSupabase([{
+        "question_hash": question_hash, "propositions": '{"A": "texte A"}',
+        "correct_letters": ["A"], "source_question_id": "q-source",
+    }])
+    reused = find_reusable(supabase, {4: question_hash, 5: "inconnu"})
+    assert list(reused) == [4]
+    assert reused[4]["propositions"] == {"A": "texte A"}
+    assert find_reusable(supabase, {}) == {}
+
+    record_reuse(supabase, 12, {4: "q-4"}, reused)
+    assert supabase.inserted == [
+        {"qcm_id": 12, "question_id": "q-4", "question_hash": question_hash, "source_question_id": "q-source"}
+    ]
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DE LA RÉUTILISATION DES PROPOSITIONS")
+    print("=" * 40)
+    test_normalize_block()
+    test_hash_ignores_question_number()
+    test_hash_ignores_page_headers()
+    test_hash_depends_on_propositions()
+    test_short_blocks_are_skipped()
+    test_find_and_record_reuse()
+    print("✅ Réutilisation des propositions validée")
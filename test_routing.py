@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests du routeur (qcm_extraction/routing.py): plusieurs routeurs, threads et
+processus écrivant le même fichier de statistiques ne perdent aucun appel et
+ne font jamais échouer l'extraction; le choix du modèle privilégie le moins
+cher susceptible de réussir, la latence départageant les modèles sûrs.
+"""
+
+import json
+import multiprocessing
+import tempfile
+import threading
+from pathlib import Path
+
+from qcm_extraction.routing import ModelRouter
+
+FEATURES = {"tokens": 500, "questions": 3, "ocr_quality": "good"}
+RECORDS = 300
+
+
+def record_many(stats_path: str, count: int = RECORDS):
+    router = ModelRouter(Path(stats_path), save_every=7)
+    for i in range(count):
+        router.record("questions_page", "mistral-small-latest", FEATURES, success=i % 2 == 0, latency=0.01)
+    router.save()
+
+
+def total_calls(stats_path: Path) -> int:
+    with open(stats_path, "r", encoding="utf-8") as f:
+        return sum(entry["calls"] for entry in json.load(f).values())
+
+
+def test_threads_do_not_lose_stats():
+    with tempfile.TemporaryDirectory() as tmp:
+        stats_path = Path(tmp) / "stats.json"
+        threads = [threading.Thread(target=record_many, args=(str(stats_path),)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert total_calls(stats_path) == 4 * RECORDS
+        assert [p.name for p in Path(tmp).iterdir() if p.suffix == ".tmp"] == []
+
+
+def test_processes_do_not_lose_stats():
+    with tempfile.TemporaryDirectory() as tmp:
+        stats_path = Path(tmp) / "stats.json"
+        processes = [multiprocessing.Process(target=record_many, args=(str(stats_path),)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
+        assert total_calls(stats_path) == 4 * RECORDS
+
+
+def test_save_failure_does_not_raise():
+    with tempfile.TemporaryDirectory() as tmp:
+        # Le chemin des statistiques est un dossier: l'écriture échoue
+        stats_path = Path(tmp) / "stats.json"
+        stats_path.mkdir()
+        router = ModelRouter(stats_path, save_every=1)
+        router.record("metadata", "mistral-small-latest", FEATURES, success=True, latency=0.1)
+        assert router.run("metadata", FEATURES, lambda model: "ok", lambda result: None) == "ok"
+
+
+def routed(records, explore_rate=0.0):
+    """Routeur sans persistance ni exploration, alimenté par (modèle, succès, latence, nombre)."""
+    tmp = tempfile.mkdtemp()
+    router = ModelRouter(Path(tmp) / "stats.json", explore_rate=explore_rate, save_every=10 ** 6, save_interval=10 ** 6)
+    for model, success, latency, count in records:
+        for _ in range(count):
+            router.record("questions_page", model, FEATURES, success=success, latency=latency)
+    return router
+
+
+def test_cheapest_likely_model_is_chosen():
+    # A priori seuls: le modèle historique de la tâche (small) suffit
+    assert routed([]).choose("questions_page", FEATURES) == "mistral-small-latest"
+    router = routed([("mistral-small-latest", False, 1.0, 10)])
+    assert router.choose("questions_page", FEATURES) == "mistral-medium-latest"
+
+
+def test_latency_breaks_ties_between_likely_models():
+    # small et medium réussissent; small légèrement plus lent: le moins cher reste retenu
+    router = routed([("mistral-small-latest", True, 1.2, 10), ("mistral-medium-latest", True, 1.0, 10)])
+    assert router.choose("questions_page", FEATURES) == "mistral-small-latest"
+    # small nettement plus lent: medium, aussi sûr, est préféré
+    router = routed([("mistral-small-latest", True, 6.0, 10), ("mistral-medium-latest", True, 2.0, 10)])
+    assert router.choose("questions_page", FEATURES) == "mistral-medium-latest"
+    assert router.average_latency("questions_page", FEATURES, "mistral-medium-latest") == 2.0
+    assert router.average_latency("questions_page", FEATURES, "mistral-large-latest") is None
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DES STATISTIQUES DU ROUTEUR")
+    print("=" * 40)
+    test_threads_do_not_lose_stats()
+    test_processes_do_not_lose_stats()
+    test_save_failure_does_not_raise()
+    test_cheapest_likely_model_is_chosen()
+    test_latency_breaks_ties_between_likely_models()
+    print("✅ Statistiques du routeur sans perte")
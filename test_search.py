@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tests de la recherche plein texte hors ligne (qcm_extraction/search.py):
+normalisation des termes, requêtes à la `websearch_to_tsquery`, filtres et
+classement (énoncé avant proposition, proposition à demi-poids).
+"""
+
+import json
+
+from qcm_extraction.search import LocalSearchIndex, contenu_text, parse_query, search_questions, tokenize
+
+QCMS = [
+    {
+        "id": 1, "ue_numero": "UE1", "annee": "2021 / 2022", "type": "Colle N°1",
+        "questions": [
+            {"id": 11, "numero": 1, "contenu": {"text": "À propos des canaux ioniques de la membrane :"},
+             "reponses": [{"lettre": "A", "contenu": {"text": "Le canal sodique est voltage-dépendant."}},
+                          {"lettre": "B", "contenu": {"text": "La pompe Na/K consomme de l'ATP."}}]},
+            {"id": 12, "numero": 2, "contenu": json.dumps({"text": "Concernant la glycolyse :"}),
+             "reponses": [{"lettre": "A", "contenu": {"text": "Elle produit de l'ATP et du pyruvate."}},
+                          {"lettre": "B", "contenu": {"text": "Elle a lieu dans la mitochondrie."}}]},
+        ],
+    },
+    {
+        "id": 2, "ue_numero": "UE2", "annee": "2022 / 2023", "type": "Concours Blanc N°1",
+        "questions": [
+            {"id": 21, "numero": 1, "contenu": {"text": "Concernant la mitochondrie :"},
+             "reponses": [{"lettre": "A", "contenu": {"text": "Elle contient un canal ionique."}}]},
+        ],
+    },
+]
+
+
+def test_tokenize_normalizes_accents_stopwords_and_plurals():
+    assert tokenize("Les canaux IONIQUES de la membrane") == ["canal", "ioniqu", "membran"]
+    assert tokenize("canal ionique") == ["canal", "ioniqu"]
+    assert tokenize("À propos") == ["propo"]
+
+
+def test_parse_query():
+    assert parse_query('canal "pompe sodium" -glycolyse') == (["canal", "pomp", "sodium"], {"glycolys"})
+    assert parse_query("canal canaux") == (["canal"], set())
+    assert parse_query("   ") == ([], set())
+
+
+def test_contenu_text():
+    assert contenu_text({"text": "énoncé"}) == "énoncé"
+    assert contenu_text('{"text": "énoncé"}') == "énoncé"
+    assert contenu_text("texte brut") == "texte brut"
+    assert contenu_text(None) == ""
+
+
+def test_statement_ranks_above_proposition():
+    index = LocalSearchIndex.from_qcms(QCMS)
+    assert len(index) == 3
+    results = index.search("mitochondrie")
+    # Énoncé de la question 21 avant la proposition (demi-poids) de la question 12
+    assert [result["question_id"] for result in results] == [21, 12]
+    assert results[0]["rank"] > results[1]["rank"]
+    assert results[1]["texte"] == "Concernant la glycolyse :"
+
+
+def test_all_terms_in_one_document():
+    index = LocalSearchIndex.from_qcms(QCMS)
+    # "canal" et "ionique" dans l'énoncé de 11 et dans une même proposition de 21
+    assert {result["question_id"] for result in index.search("canal ionique")} == {11, 21}
+    # "glycolyse" et "pyruvate" ne sont jamais dans le même document
+    assert index.search("glycolyse pyruvate") == []
+
+
+def test_exclusion_filters_and_limit():
+    index = LocalSearchIndex.from_qcms(QCMS)
+    # Exclusion par document: la proposition « a lieu dans la mitochondrie » est écartée
+    assert [result["question_id"] for result in index.search("mitochondrie -lieu")] == [21]
+    assert [result["question_id"] for result in index.search("mitochondrie", ue="UE1")] == [12]
+    assert [result["question_id"] for result in index.search("mitochondrie", annee="2022 / 2023")] == [21]
+    assert len(index.search("mitochondrie", limit=1)) == 1
+    assert LocalSearchIndex().search("mitochondrie") == []
+
+
+class FakeRPC:
+    def __init__(self):
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return self
+
+    def execute(self):
+        return type("Result", (), {"data": [{"question_id": 21}]})()
+
+
+def test_server_search_parameters():
+    supabase = FakeRPC()
+    assert search_questions(supabase, "  ") == []
+    assert supabase.calls == []
+    assert search_questions(supabase, "mitochondrie", ue="UE2", limit=5) == [{"question_id": 21}]
+    assert supabase.calls == [("search_questions", {
+        "query": "mitochondrie", "ue_filter": "UE2", "annee_filter": None, "max_results": 5,
+    })]
+
+
+if __name__ == "__main__":
+    print("🧪 TESTS DE LA RECHERCHE PLEIN TEXTE")
+    print("=" * 40)
+    test_tokenize_normalizes_accents_stopwords_and_plurals()
+    test_parse_query()
+    test_contenu_text()
+    test_statement_ranks_above_proposition()
+    test_all_terms_in_one_document()
+    test_exclusion_filters_and_limit()
+    test_server_search_parameters()
+    print("✅ Recherche plein texte validée")
@@ -8,6 +8,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent / "qcm_extraction"))
 
 from extractor import QCMExtractor
+from qcm_extraction.report import fetch_question_rollup
 
 def main():
     """Test avec validation du nombre réel de questions"""
@@ -50,17 +51,14 @@ def main():
                         else:
                             print("✅ Séquence de questions complète")
                     
-                    # Compter les propositions
+                    # Compter les propositions (une requête agrégée sur la vue question_rollup)
                     props_count = 0
-                    for q_data in questions_result.data:
-                        if "id" in q_data:
-                            # Compter les propositions pour cette question
-                            props_result = extractor.supabase.table("reponses").select("lettre").eq("question_id", q_data["id"]).execute()
-                            q_props = len(props_result.data) if props_result.data else 0
-                            props_count += q_props
-                            
-                            if q_props != 5:
-                                print(f"⚠️ Question {q_data['numero']}: {q_props} propositions au lieu de 5")
+                    for q_data in fetch_question_rollup(extractor.supabase, qcm_id):
+                        q_props = q_data["propositions_count"]
+                        props_count += q_props
+                        
+                        if q_props != 5:
+                            print(f"⚠️ Question {q_data['numero']}: {q_props} propositions au lieu de 5")
                     
                     print(f"✅ Total propositions: {props_count}")
                     expected_props = len(question_numbers) * 5
@@ -1,4 +1,7 @@
 from qcm_extraction.extractor import QCMExtractor
+from qcm_extraction.routing import VISION_FEATURES, validate_vision_answers
+from qcm_extraction.answers import apply_correct_answers, print_answers_report
+from qcm_extraction.vision import list_page_images, verify_pages_with_vision
 import base64
 import json
 import os
@@ -54,23 +57,24 @@ N'ajoute AUCUN texte avant ou après ce JSON."""
             }
         ]
         
-        # Appeler l'API vision
-        response = extractor._call_api_with_retry(
-            extractor.client.chat.complete,
-            model="mistral-large-latest",  # Utiliser le modèle large qui a de meilleures capacités de vision
-            messages=messages,
-            temperature=0.0,
-            response_format={"type": "json_object"}
-        )
-        
-        if response is None:
-            print(f"❌ Échec de l'appel API vision pour la question {question_num}")
-            return None
+        # Appeler l'API vision (modèle choisi par le routeur, escalade si la réponse n'est pas exploitable)
+        def call(model):
+            response = extractor._call_api_with_retry(
+                extractor.client.chat.complete,
+                model=model,
+                messages=messages,
+                temperature=0.0,
+                response_format={"type": "json_object"}
+            )
+            # Extraire le JSON de la réponse
+            return json.loads(response.choices[0].message.content.strip())
         
         try:
-            # Extraire le JSON de la réponse
-            content = response.choices[0].message.content.strip()
-            result = json.loads(content)
+            result = extractor.router.run("vision_answers", VISION_FEATURES, call, lambda r: validate_vision_answers(r, question_num))
+            
+            if result is None:
+                print(f"❌ Échec de l'appel API vision pour la question {question_num}")
+                return None
             
             # Vérifier que la structure du résultat est correcte
             if "question_num" in result and "correct_answers" in result:
@@ -172,21 +176,17 @@ def main():
                         if "qcm_db_id" in metadata and metadata["qcm_db_id"] == QCM_ID:
                             print(f"✅ Trouvé les images pour le QCM ID {QCM_ID} dans {images_dir}")
                             
-                            # Vérifier la question 1 avec les pages 1-4
-                            question_num = 1
-                            for page_num in range(1, 6):  # Pages 1 à 5
-                                image_path = f"{images_dir}/page_{page_num}.jpg"
-                                if os.path.exists(image_path):
-                                    print(f"🔍 Vérification de la question {question_num} avec la page {page_num}...")
-                                    result = verify_correct_answers_with_vision(image_path, question_num)
-                                    
-                                    if result and "correct_answers" in result:
-                                        correct_letters = result["correct_answers"]
-                                        print(f"✅ Réponses correctes pour la question {question_num}: {', '.join(correct_letters)}")
-                                        
-                                        # Mettre à jour dans la base de données
-                                        update_correct_answers(QCM_ID, question_num, correct_letters)
-                                        break
+                            # Vérifier toutes les questions: une requête vision par page, pages en parallèle
+                            complete = lambda **kwargs: extractor._call_api_with_retry(extractor.client.chat.complete, **kwargs)
+                            answers = verify_pages_with_vision(complete, extractor.router, list_page_images(images_dir))
+                            
+                            if answers:
+                                print(f"✅ Réponses correctes identifiées pour {len(answers)} questions")
+                                
+                                # Mettre à jour dans la base de données (une mise à jour groupée)
+                                report = apply_correct_answers(extractor.supabase, QCM_ID, answers)
+                                print_answers_report(report)
+                                print(f"✅ {report['updated']} propositions mises à jour")
                 except Exception as e:
                     print(f"❌ Erreur lors de la lecture des métadonnées: {str(e)}")
     
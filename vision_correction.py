@@ -3,9 +3,12 @@ import json
 import base64
 import argparse
 import glob
-from supabase import create_client
 from dotenv import load_dotenv
-from mistralai import Mistral, UserMessage
+from qcm_extraction.clients import lazy_mistral, lazy_supabase
+from qcm_extraction.retry import call_api
+from qcm_extraction.routing import VISION_FEATURES, shared_router, validate_vision_answers
+from qcm_extraction.answers import apply_correct_answers, print_answers_report
+from qcm_extraction.vision import list_page_images, verify_pages_with_vision
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -15,9 +18,14 @@ supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_KEY')
 mistral_api_key = os.getenv('MISTRAL_API_KEY')
 
-# Initialiser les clients
-supabase = create_client(supabase_url, supabase_key)
-mistral = Mistral(api_key=mistral_api_key)
+# Clients construits au premier appel (--help et erreurs d'arguments sans import de supabase/mistralai)
+supabase = lazy_supabase(supabase_url, supabase_key)
+mistral = lazy_mistral(mistral_api_key)
+router = shared_router()
+
+def complete(**kwargs):
+    """Appel du chat par le wrapper commun (retries, disjoncteur, budget et échéance du document)."""
+    return call_api(mistral.chat.complete, **kwargs)
 
 def verify_with_vision(image_path, question_num):
     """
@@ -62,10 +70,10 @@ N'ajoute AUCUN texte avant ou après ce JSON."""
         }
     ]
     
-    # Appeler l'API vision
-    try:
-        response = mistral.chat.complete(
-            model="mistral-large-latest",
+    # Appeler l'API vision (modèle choisi par le routeur, escalade si la réponse n'est pas exploitable)
+    def call(model):
+        response = complete(
+            model=model,
             messages=messages,
             temperature=0.0,
             response_format={"type": "json_object"}
@@ -73,10 +81,13 @@ N'ajoute AUCUN texte avant ou après ce JSON."""
         
         # Extraire le JSON de la réponse
         content = response.choices[0].message.content.strip()
-        result = json.loads(content)
+        return json.loads(content)
+    
+    try:
+        result = router.run("vision_answers", VISION_FEATURES, call, lambda r: validate_vision_answers(r, question_num))
         
         # Vérifier que la structure du résultat est correcte
-        if "question_num" in result and "correct_answers" in result:
+        if result and "question_num" in result and "correct_answers" in result:
             verified_num = result["question_num"]
             
             # Vérifier que la réponse concerne bien la question demandée
@@ -204,11 +215,48 @@ def find_qcm_images(qcm_id):
     print(f"❌ Aucune image trouvée pour le QCM ID {qcm_id}")
     return None
 
+def verify_qcm_pages(qcm_id, images_dir, page=None, force=False, workers=4):
+    """
+    Vérifie toutes les questions d'un QCM page par page (un appel vision par page)
+    et applique les corrections en une mise à jour groupée.
+    """
+    pages = list_page_images(images_dir)
+    if page:
+        pages = [(num, path) for num, path in pages if num == page]
+    
+    if not pages:
+        print(f"❌ Aucune page trouvée dans {images_dir}")
+        return False
+    
+    answers = verify_pages_with_vision(complete, router, pages, max_workers=workers)
+    if not answers:
+        print("❌ Aucune réponse correcte identifiée sur les pages analysées")
+        return False
+    
+    print(f"✅ Réponses identifiées pour {len(answers)} questions")
+    report = apply_correct_answers(supabase, qcm_id, answers, dry_run=True)
+    print_answers_report(report)
+    if not report["changes"]:
+        return True
+    
+    # Demander confirmation avant de mettre à jour
+    if not force:
+        confirm = input(f"Confirmer la mise à jour de {len(report['changes'])} questions? (o/n): ").lower()
+        if confirm != 'o':
+            print("❌ Mise à jour annulée")
+            return False
+    
+    report = apply_correct_answers(supabase, qcm_id, answers)
+    print(f"✅ {report['updated']} propositions mises à jour")
+    return True
+
 def main():
     parser = argparse.ArgumentParser(description="Vérification et correction des réponses QCM avec API vision")
     parser.add_argument("qcm_id", type=int, help="ID du QCM à vérifier")
-    parser.add_argument("question_num", type=int, help="Numéro de la question à vérifier")
+    parser.add_argument("question_num", type=int, nargs="?",
+                        help="Numéro de la question à vérifier (sans numéro: toutes les questions, page par page)")
     parser.add_argument("--page", type=int, help="Numéro de page spécifique à analyser (optionnel)")
+    parser.add_argument("--workers", type=int, default=4, help="Nombre de pages analysées en parallèle (défaut: 4)")
     parser.add_argument("--force", action="store_true", help="Appliquer les corrections sans demander de confirmation")
     
     args = parser.parse_args()
@@ -219,6 +267,11 @@ def main():
     if not images_dir:
         return
     
+    # Sans numéro de question: vérification de tout le QCM, une requête par page
+    if args.question_num is None:
+        verify_qcm_pages(args.qcm_id, images_dir, page=args.page, force=args.force, workers=args.workers)
+        return
+    
     # Déterminer les pages à analyser
     if args.page:
         pages_to_check = [args.page]
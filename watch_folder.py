@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Ingestion automatique des PDF déposés dans un dossier
+
+Surveille un dossier (inotify via watchdog, sinon scan périodique) et extrait
+chaque nouveau PDF ou PDF modifié, identifié par le hash de son contenu, avec
+une concurrence bornée. Les fichiers en cours de copie sont ignorés jusqu'à ce
+qu'ils soient stables. Le PDF est envoyé directement à l'OCR, sans URL.
+
+Exemples:
+  python watch_folder.py                       # surveille pdf_downloads/
+  python watch_folder.py /data/qcm --workers 8
+  python watch_folder.py --once                # traite le dossier puis s'arrête
+"""
+
+import argparse
+import signal
+
+from dotenv import load_dotenv
+
+from qcm_extraction.watch import DEFAULT_POLL_SECONDS, DEFAULT_SETTLE_SECONDS, DEFAULT_STATE_PATH, FolderWatcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction des PDF déposés dans un dossier surveillé")
+    parser.add_argument("directory", nargs="?", default="pdf_downloads", help="Dossier à surveiller (défaut: pdf_downloads)")
+    parser.add_argument("--workers", type=int, default=4, help="Extractions en parallèle (défaut: 4)")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help=f"Secondes sans modification avant de traiter un fichier (défaut: {DEFAULT_SETTLE_SECONDS})")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_SECONDS, help="Intervalle de scan en secondes")
+    parser.add_argument("--state", default=str(DEFAULT_STATE_PATH), help="Fichier des PDF déjà traités")
+    parser.add_argument("--recursive", action="store_true", help="Inclure les sous-dossiers")
+    parser.add_argument("--force", action="store_true", help="Retraiter les PDF déjà vus")
+    parser.add_argument("--once", action="store_true", help="Traiter les PDF présents puis s'arrêter")
+    args = parser.parse_args()
+
+    load_dotenv()
+    from qcm_extraction.extractor import QCMExtractor
+
+    watcher = FolderWatcher(args.directory, QCMExtractor, workers=args.workers, settle_seconds=args.settle,
+                            poll_seconds=args.poll, state_path=args.state, recursive=args.recursive, force=args.force)
+    signal.signal(signal.SIGINT, lambda signum, frame: watcher.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+
+    print(f"📂 Dossier surveillé: {args.directory} ({args.workers} extractions en parallèle)")
+    watcher.run(once=args.once)
+    print("👋 Surveillance arrêtée")
+
+
+if __name__ == "__main__":
+    main()